@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+asyncio NetBox API client, used by the asyncio API backend
+
+Requires aiohttp, which is an optional dependency: pip install nrx[async]
+"""
+
+import asyncio
+import time
+from urllib.parse import urlencode, urlsplit
+
+import aiohttp
+
+from nrx.cassette import request_key
+from nrx.serialization import loads_json
+from nrx.governor import ConcurrencyGovernor, OVERLOAD_STATUS_CODES, READ_ONLY_POST_SUFFIXES, retry_after_seconds, \
+                         backoff_delay
+
+# Number of objects to request per page, NetBox caps it with MAX_PAGE_SIZE
+NB_PAGE_SIZE = 1000
+
+
+def is_connection_reset(e):
+    """Check if an aiohttp.ClientError is a connection dropped by the server after it was established"""
+    if isinstance(e, aiohttp.ClientConnectorError):
+        return False
+    return isinstance(e, (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError, aiohttp.ClientPayloadError))
+
+
+def query_params(params):
+    """Convert a dict of query parameters into a list of tuples, expanding list values into repeated keys"""
+    items = []
+    for k, v in params.items():
+        values = v if isinstance(v, (list, tuple)) else [v]
+        for value in values:
+            if isinstance(value, bool):
+                value = str(value).lower()
+            items.append((k, str(value)))
+    return items
+
+
+class NBClientError(Exception):
+    """NetBox API request failure, with HTTP status code when the server responded"""
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class AsyncNBClient:
+    """NetBox REST API client with all requests sharing one aiohttp connection pool
+
+    Use as an async context manager. `max_connections` caps the number of connections, and the `governor`,
+    a ConcurrencyGovernor, the number of requests in flight, like for the HTTP adapters of the sync backend.
+    Requests that NetBox responds to as overloaded, or resets the connection of, are retried up to the
+    retries of the governor, after the delay the server asked for with Retry-After, or with jittered
+    exponential backoff. `on_response` is called with the body size of each response. With a `cassette`,
+    responses are recorded into it, or replayed from it.
+    """
+    def __init__(self, api_url, token, timeout=10, tls_validate=True, max_connections=8, *,  # pylint: disable=too-many-arguments
+                 governor=None, on_response=None, cassette=None):
+        self.api_url = f"{api_url.rstrip('/')}/api/"
+        self.headers = {
+            'Authorization': f"Token {token}",
+            'Accept': 'application/json',
+        }
+        self.timeout = aiohttp.ClientTimeout(total=timeout if timeout > 0 else None)
+        self.tls_validate = tls_validate
+        self.max_connections = max(1, max_connections)
+        if governor is None:
+            governor = ConcurrencyGovernor(self.max_connections, adaptive=False, retries=0)
+        self.governor = governor
+        self.on_response = on_response
+        self.cassette = cassette
+        self.session = None
+        # Coroutines waiting for a slot of the governor
+        self.slots = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_connections, ssl=None if self.tls_validate else False)
+        self.session = aiohttp.ClientSession(connector=connector, headers=self.headers, timeout=self.timeout)
+        self.slots = asyncio.Condition()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def _send(self, method, url, query):
+        """Send a request with query parameters, return status, reason, headers, body and seconds it took"""
+        if self.cassette is not None and self.cassette.replay:
+            recorded = self.cassette.play(request_key(method, f"{url}?{urlencode(query)}"))
+            await asyncio.sleep(self.cassette.delay(recorded))
+            return recorded['status'], recorded['reason'], recorded['headers'], recorded['body'], recorded['elapsed']
+        started = time.monotonic()
+        async with self.session.request(method, url, params=query) as response:
+            body = await response.read()
+            return response.status, response.reason, response.headers, body, time.monotonic() - started
+
+    async def _acquire(self):
+        """Wait for a slot of the governor without blocking the event loop, return the start time of the request"""
+        async with self.slots:
+            while True:
+                started, wait = self.governor.try_acquire()
+                if started is not None:
+                    return started
+                try:
+                    await asyncio.wait_for(self.slots.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _release(self, started, endpoint, overloaded=False):
+        """Free the slot of a request, and wake up the coroutines waiting for one"""
+        self.governor.release(started, endpoint, overloaded)
+        async with self.slots:
+            self.slots.notify_all()
+
+    async def _retry_delay(self, headers, attempt):
+        """Wait before retrying a request, pausing all requests if the server asked to"""
+        self.governor.retried()
+        delay = retry_after_seconds(headers.get('Retry-After')) if headers is not None else None
+        if delay is None:
+            await asyncio.sleep(backoff_delay(attempt, self.governor.retry.backoff))
+        else:
+            # Requests wait for the end of the pause in _acquire()
+            self.governor.pause(delay)
+
+    async def _governed_send(self, method, url, query, retry):
+        """Send a request through the governor, return None if the connection was reset and retry is allowed"""
+        endpoint = urlsplit(url).path
+        started = await self._acquire()
+        try:
+            response = await self._send(method, url, query)
+        except asyncio.TimeoutError:
+            await self._release(started, endpoint, overloaded=True)
+            raise
+        except aiohttp.ClientError as e:
+            reset = is_connection_reset(e)
+            await self._release(started, endpoint, overloaded=reset)
+            if reset and retry:
+                return None
+            raise NBClientError(f"{method} {url} failed: {e}") from e
+        await self._release(started, endpoint, overloaded=response[0] in OVERLOAD_STATUS_CODES)
+        return response
+
+    async def _request(self, method, path, params=None):
+        url = f"{self.api_url}{path}"
+        query = query_params(params or {})
+        retries = self.governor.retry.retries if method == 'GET' or f"/{path}".endswith(READ_ONLY_POST_SUFFIXES) else 0
+        for attempt in range(1, retries + 2):
+            response = await self._governed_send(method, url, query, attempt <= retries)
+            if response is None:
+                await self._retry_delay(None, attempt)
+                continue
+            status, reason, headers, body, _ = response
+            if self.on_response is not None:
+                self.on_response(len(body))
+            if status in OVERLOAD_STATUS_CODES and attempt <= retries:
+                await self._retry_delay(headers, attempt)
+                continue
+            if self.cassette is not None and not self.cassette.replay:
+                self.cassette.record(request_key(method, f"{url}?{urlencode(query)}"), *response)
+            if status >= 400:
+                raise NBClientError(f"{method} {url}?{urlencode(query)} failed: {status} {reason}", status)
+            return loads_json(body)
+        return None
+
+    async def get(self, path, params=None):
+        """GET a single API resource"""
+        return await self._request('GET', path, params)
+
+    async def post(self, path, params=None):
+        """POST to an API resource without a body, as used by render-config"""
+        return await self._request('POST', path, params)
+
+    async def get_list(self, path, params=None):
+        """GET all pages of an API list. The first page is read to learn the total count, the rest are read concurrently"""
+        params = dict(params or {})
+        page = await self.get(path, params | {'limit': NB_PAGE_SIZE, 'offset': 0})
+        results = page['results']
+        # The server can cap the page size, use the actual size of the first page
+        page_size = len(results)
+        if page.get('next') and page_size > 0:
+            offsets = range(page_size, page['count'], page_size)
+            pages = await asyncio.gather(*[self.get(path, params | {'limit': page_size, 'offset': offset})
+                                           for offset in offsets])
+            for p in pages:
+                results.extend(p['results'])
+        return results
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+asyncio and GraphQL NetBox API backends of NBFactory, alternatives to the sync REST API backend
+"""
+
+import asyncio
+from urllib.parse import urlencode
+
+import requests
+from packaging import version
+
+from nrx.cassette import CASSETTE_CONFIG_KEY
+from nrx.configs import CONFIG_CACHE_CONFIG_KEY
+from nrx.fetch import AsyncBlockFetcher, BlockFetchError
+from nrx.governor import ConcurrencyGovernor
+from nrx.graphql_api import GraphQLClient, GraphQLError, graphql_devices_filter, rest_values, rest_interface, link_ends
+from nrx.log import debug, error, warning
+from nrx.stats import STATS_CONFIG_KEY
+
+
+class APIBackendsMixin:
+    """NBFactory methods to get NetBox data with the asyncio and GraphQL API backends"""
+    def _get_nb_network_async(self):
+        """Get NetBox data with the asyncio API backend and build the network graph"""
+        try:
+            from nrx.aio import AsyncNBClient, NBClientError  # pylint: disable=import-outside-toplevel
+        except ImportError as e:
+            error(f"asyncio API backend requires aiohttp, install it with: pip install nrx[async]. {e}")
+        stats = self.config.get(STATS_CONFIG_KEY)
+        max_connections = max(self.api_params['configs_workers'], self.api_params['blocks_workers'])
+        governor = ConcurrencyGovernor(max_connections, adaptive=self.api_params['adaptive_concurrency'],
+                                       retries=self.api_params['overload_retries'],
+                                       backoff=self.api_params['retry_backoff'])
+        client = AsyncNBClient(self.config['nb_api_url'], self.config['nb_api_token'],
+                               timeout=self.config['api_timeout'],
+                               tls_validate=self.config['tls_validate'],
+                               max_connections=max_connections, governor=governor,
+                               on_response=stats.count_response if stats is not None else None,
+                               cassette=self.config.get(CASSETTE_CONFIG_KEY))
+        try:
+            asyncio.run(self._aget_nb_network(client))
+        except BlockFetchError as e:
+            error("NetBox API failure, max attempts reached:", e)
+        except (NBClientError, asyncio.TimeoutError) as e:
+            error("NetBox API failure:", e)
+        debug(f"[HTTP] asyncio overload responses: {governor.stats['overloads']}, retries: {governor.stats['retries']}, "
+              f"lowest concurrency limit: {governor.stats['min_limit']} of {governor.max_limit}")
+        self._add_disconnected_devices_to_graph()
+
+    async def _aget_nb_network(self, client):
+        """Coroutine version of _get_nb_network, with all requests sharing the connection pool of the client"""
+        async with client:
+            endpoints = self.nb_session.dcim
+            with self._phase("devices") as phase:
+                for values in await client.get_list('dcim/devices/', self._devices_filter()):
+                    self._add_nb_device(endpoints.devices.return_obj(values, self.nb_session, endpoints.devices))
+                phase.count("devices", len(self.nb_net.devices))
+            if self._exports_configs():
+                with self._phase("configs") as phase:
+                    phase.count("configs", await self._aget_nb_device_configs(client))
+            if not self.config['export_links']:
+                return
+
+            async def query_interfaces(device_block):
+                pages = await asyncio.gather(*[client.get_list('dcim/interfaces/', {'device_id': device_block} | f)
+                                               for f in filters])
+                values = {v['id']: v for page in pages for v in page}
+                order = list(values)
+                if len(filters) > 1 and len(values) > 0:
+                    order = [v['id'] for v in await client.get_list('dcim/interfaces/', {'device_id': device_block}
+                                                                    | self._interfaces_order_filter(filters))]
+                records = [self._nb_interface_record(endpoints.interfaces.return_obj(values[i], self.nb_session,
+                                                                                     endpoints.interfaces))
+                           for i in order if i in values]
+                return [record for record in records if record is not None]
+            with self._phase("interfaces") as phase:
+                filters = self._interfaces_filters()
+                fetcher = self._block_fetcher("interfaces", query_interfaces, "device_id",
+                                              max(filters, key=lambda f: len(urlencode(f, doseq=True)), default=None),
+                                              AsyncBlockFetcher)
+                for record in await fetcher.fetch(self.nb_net.device_ids, self._block_size("interfaces")):
+                    self.nb_net.add_interface(*record)
+                phase.count("interfaces", len(self.nb_net.interfaces))
+            self._learn_block_size("interfaces", fetcher)
+
+            async def query_cables(cables_block):
+                return await client.get_list('dcim/cables/', {'id': cables_block})
+            fetcher = self._block_fetcher("cables", query_cables, "id", fetcher_class=AsyncBlockFetcher)
+            with self._phase("cables") as phase:
+                cables = [endpoints.cables.return_obj(values, self.nb_session, endpoints.cables)
+                          for values in await fetcher.fetch(sorted(self.nb_net.cable_ids), self._block_size("cables"))]
+                phase.count("cables", len(cables))
+            self._learn_block_size("cables", fetcher)
+            with self._phase("traces") as phase:
+                phase.count("cables", len(self._cables_to_trace(cables)))
+                if self.api_params['local_cable_tracing']:
+                    await self._atrace_cables_locally(client, cables, query_cables)
+                await self._aget_nb_traces(client, cables)
+            with self._phase("graph"):
+                for cable in cables:
+                    self._add_cable_to_graph(cable)
+
+    async def _aget_nb_device_configs(self, client):
+        """Render configurations for all exported devices concurrently, return the number of devices with one"""
+        async def get_device_config(d):
+            try:
+                config_response = await client.post(f"dcim/devices/{d['id']}/render-config/")
+                if "content" in config_response:
+                    if cache is not None:
+                        cache.put(d, config_response)
+                    return config_response["content"]
+            except Exception as e:
+                debug(f"{d['name']}: Get device configuration failed: {e}")
+            return ""
+        cache = self.config.get(CONFIG_CACHE_CONFIG_KEY)
+        uncached = self.nb_net.devices if cache is None else cache.lookup(self.nb_net.devices)
+        debug(f"Exporting configurations for {len(uncached)} of {len(self.nb_net.devices)} devices")
+        configs = await asyncio.gather(*[get_device_config(d) for d in uncached])
+        for d, config in zip(uncached, configs):
+            d["config"] = config
+        return len([d for d in self.nb_net.devices if len(d["config"]) > 0])
+
+    async def _atrace_cables_locally(self, client, cables, query_cables):
+        """Coroutine version of _trace_cables_locally"""
+        to_trace = self._cables_to_trace(cables)
+        if len(to_trace) == 0 or len(self.nb_net.site_ids) == 0:
+            return
+        debug(f"Tracing {len(to_trace)} cables through front and rear ports locally")
+        endpoints = self.nb_session.dcim
+        try:
+            front_ports, rear_ports = await asyncio.gather(client.get_list('dcim/front-ports/', self._ports_filter()),
+                                                           client.get_list('dcim/rear-ports/', self._ports_filter()))
+            front_ports = [endpoints.front_ports.return_obj(v, self.nb_session, endpoints.front_ports) for v in front_ports]
+            rear_ports = [endpoints.rear_ports.return_obj(v, self.nb_session, endpoints.rear_ports) for v in rear_ports]
+            fetcher = self._block_fetcher("cables", query_cables, "id", fetcher_class=AsyncBlockFetcher)
+            port_cables = [endpoints.cables.return_obj(values, self.nb_session, endpoints.cables)
+                           for values in await fetcher.fetch(self._port_cable_ids(cables, front_ports + rear_ports),
+                                                             self._block_size("cables"))]
+        except Exception as e:
+            warning("NetBox API failure at get front and rear ports, cables will be traced by NetBox:", e)
+            return
+        self._resolve_traces(self._cable_paths(cables + port_cables, front_ports, rear_ports), to_trace)
+
+    async def _aget_nb_traces(self, client, cables):
+        """Trace cables that do not connect two interfaces directly, concurrently, ahead of building the graph"""
+        interfaces = [interface for _, interface in self._cables_to_trace(cables)]
+        traces = await asyncio.gather(*[client.get(f"dcim/interfaces/{i.id}/trace/") for i in interfaces])
+        for interface, trace in zip(interfaces, traces):
+            # Same structure as returned by pynetbox TraceableRecord.trace()
+            segments = []
+            for a_terminations, cable, b_terminations in trace:
+                segments.append(interface._build_termination_data(a_terminations))  # pylint: disable=protected-access
+                segments.append(cable)
+                segments.append(interface._build_termination_data(b_terminations))  # pylint: disable=protected-access
+            self.nb_net.traces[interface.id] = segments
+
+    def _get_nb_network_graphql(self):
+        """Get devices with their interfaces and link peers from NetBox GraphQL API, and build the network graph"""
+        if self.nb_api_version < version.parse("4.0"):
+            error(f"GraphQL API backend requires NetBox 4.0 or later, found {self.nb_api_version}")
+        client = GraphQLClient(self.nb_session.http_session, self.config['nb_api_url'], self.config['nb_api_token'])
+        filters, client_tags = graphql_devices_filter(self.nb_api_version.release[:2],
+                                              [site.id for site in self.nb_sites],
+                                              self.config['export_device_roles'],
+                                              self.config['export_tags'])
+        endpoints = self.nb_session.dcim
+        devices = []
+        try:
+            with self._phase("devices") as phase:
+                for device in client.devices(filters, self.api_params['graphql_page_size'], self.config.get('device_fields')):
+                    device_tags = [tag['slug'] for tag in device['tags']]
+                    if any(tag not in device_tags for tag in client_tags):
+                        continue
+                    values = rest_values({k: v for k, v in device.items() if k != 'interfaces'})
+                    self._add_nb_device(endpoints.devices.return_obj(values, self.nb_session, endpoints.devices))
+                    devices.append(device)
+                phase.count("devices", len(self.nb_net.devices))
+            self._export_nb_device_configs()
+            if self.config['export_links']:
+                with self._phase("graph"):
+                    self._add_graphql_links(devices)
+        except GraphQLError as e:
+            error("NetBox GraphQL API failure:", e)
+        except (requests.Timeout, requests.exceptions.HTTPError) as e:
+            error("NetBox GraphQL API failure:", e)
+        self._add_disconnected_devices_to_graph()
+
+    def _add_graphql_links(self, devices):
+        """Add interfaces of devices from GraphQL API, then their links in the order of cable IDs, like the REST API backend"""
+        endpoints = self.nb_session.dcim
+        links = {}
+        for device in devices:
+            for interface in device['interfaces']:
+                # Same selection as REST API filter: cabled=True, connected=True
+                if interface['cable'] is None or len(interface['connected_endpoints']) == 0:
+                    continue
+                self._add_nb_interface(endpoints.interfaces.return_obj(rest_interface(interface, device),
+                                                                       self.nb_session, endpoints.interfaces))
+                if int(interface['id']) in self.nb_net.interfaces_by_id:
+                    links.setdefault(int(interface['cable']['id']), link_ends(interface, device))
+        for cable_id in sorted(links):
+            edge = [endpoints.interfaces.return_obj(end, self.nb_session, endpoints.interfaces) for end in links[cable_id]]
+            self._add_edge_to_graph(edge, cable_id)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cables between exported devices from NetBox REST API, traced through patch panels, and links they form in the graph
+"""
+
+import pynetbox
+import requests
+
+from nrx.fetch import BlockFetchError
+from nrx.log import debug, warning
+from nrx.paths import CablePaths
+
+# Content types of cable terminations by API endpoint, for pynetbox versions that do not provide them
+NB_TERMINATION_TYPES = {'interfaces': 'dcim.interface', 'front-ports': 'dcim.frontport', 'rear-ports': 'dcim.rearport'}
+
+
+class CablesMixin:
+    """NBFactory methods to get cables from NetBox and add the links they form to the graph"""
+    def _unwrap_termination(self, term):
+        """Unwrap cable termination object, handling pynetbox 7.6.1+ GenericListObject."""
+        # In pynetbox 7.6.1+, terminations are wrapped in GenericListObject
+        # GenericListObject has 'object', 'object_id', and 'object_type' attributes
+        # We need to extract the 'object' which contains the actual interface
+        if hasattr(term, 'object'):
+            # pynetbox 7.6.1+ format - get the object attribute
+            return term.object
+        # Fallback for older versions - return as-is
+        return term
+
+    def _is_interface(self, obj):
+        """Check if an object is an Interface, handling pynetbox version differences."""
+        # Check by isinstance first (preferred)
+        if isinstance(obj, pynetbox.models.dcim.Interfaces):
+            return True
+        # Fallback: check by class name and attributes for compatibility
+        # This handles cases where the object type might differ across pynetbox versions
+        class_name = obj.__class__.__name__
+        if class_name == 'Interfaces' and hasattr(obj, 'device') and hasattr(obj, 'name'):
+            return True
+        return False
+
+    def _interface_to_trace(self, cable):
+        """Return the interface to trace the cable from, if only one of its terminations is an interface"""
+        if len(cable.a_terminations) == 1 and len(cable.b_terminations) == 1:
+            # Unwrap terminations (pynetbox 7.6.1+ wraps them in GenericListObject)
+            term_a = self._unwrap_termination(cable.a_terminations[0])
+            term_b = self._unwrap_termination(cable.b_terminations[0])
+            if self._is_interface(term_a) and not self._is_interface(term_b):
+                return term_a
+            if self._is_interface(term_b) and not self._is_interface(term_a):
+                return term_b
+        return None
+
+    def _trace_cable(self, cable):
+        if len(cable.a_terminations) == 1 and len(cable.b_terminations) == 1:
+            # Unwrap terminations (pynetbox 7.6.1+ wraps them in GenericListObject)
+            term_a = self._unwrap_termination(cable.a_terminations[0])
+            term_b = self._unwrap_termination(cable.b_terminations[0])
+
+            if self._is_interface(term_a) and self._is_interface(term_b):
+                return [term_a, term_b]
+            interface = self._interface_to_trace(cable)
+            if interface is not None:
+                if interface.id in self.nb_net.traces:
+                    trace = self.nb_net.traces[interface.id]
+                else:
+                    trace = interface.trace()
+                if len(trace) > 0:
+                    if len(trace[0]) == 1 and len(trace[-1]) == 1:
+                        side_a = trace[0][0]
+                        side_b = trace[-1][0]
+                        if self._is_interface(side_a) and self._is_interface(side_b):
+                            debug(f"Traced {side_a.device} {side_a.name} <-> {side_b.device} {side_b.name}: {trace}")
+                            return [side_a, side_b]
+            debug(f"Skipping {cable} as both terminations are not interfaces or cannot be traced")
+            return []
+        if len(cable.a_terminations) < 1 or len(cable.b_terminations) < 1:
+            debug(f"Skipping {cable} as one or both sides are not connected")
+            return []
+        debug(f"Skipping {cable} as it has more than one termination on one or both sides")
+        return []
+
+    def _fetch_nb_cables(self, cable_ids):
+        """Fetch cables by sorted IDs, and resolve their paths through patch panels if local tracing is enabled
+
+        Cables between two interfaces are returned as link tuples, other cables as records.
+        """
+        size = len(cable_ids)
+        block_size = self._block_size("cables")
+        debug(f"Exporting {size} cables to build the network graph, in blocks of up to {block_size}")
+        fetcher = self._block_fetcher("cables", self._query_cable_links, "id")
+        cables = list(fetcher.fetch(cable_ids, block_size))
+        self._learn_block_size("cables", fetcher)
+        if self.api_params['local_cable_tracing']:
+            with self._phase("traces"):
+                self._trace_cables_locally([cable for cable in cables if not isinstance(cable, tuple)])
+        return cables
+
+    def _query_cables(self, cables_block):
+        """Query a block of cable IDs"""
+        return self.nb_blocks_session.dcim.cables.filter(id=cables_block)
+
+    def _query_cable_links(self, cables_block):
+        """Query a block of cable IDs, converting cables between two interfaces to links as they are read
+
+        Other cables are returned as records, to be traced through patch panels or skipped.
+        """
+        return (self._cable_link(cable) or cable for cable in self._query_cables(cables_block))
+
+    def _cable_link(self, cable):
+        """Return (cable ID, a device ID, a interface ID, b device ID, b interface ID) of a cable between two interfaces"""
+        if len(cable.a_terminations) == 1 and len(cable.b_terminations) == 1:
+            term_a = self._unwrap_termination(cable.a_terminations[0])
+            term_b = self._unwrap_termination(cable.b_terminations[0])
+            if self._is_interface(term_a) and self._is_interface(term_b):
+                return (cable.id, term_a.device.id, term_a.id, term_b.device.id, term_b.id)
+        return None
+
+    def _cables_to_trace(self, cables):
+        """Return (cable, interface) pairs for cables that connect an interface to a front or rear port"""
+        to_trace = []
+        for cable in cables:
+            interface = self._interface_to_trace(cable)
+            if interface is not None and interface.id not in self.nb_net.traces:
+                to_trace.append((cable, interface))
+        return to_trace
+
+    def _ports_filter(self):
+        """Return NetBox API filter for cabled front and rear ports in the sites of exported devices"""
+        return {'site_id': sorted(self.nb_net.site_ids), 'cabled': True}
+
+    def _trace_cables_locally(self, cables):
+        """Resolve paths of cables to patch panels from bulk-fetched front ports, rear ports and their cables
+
+        Paths that can't be resolved, for example when they leave the exported sites, are traced by NetBox later.
+        """
+        to_trace = self._cables_to_trace(cables)
+        if len(to_trace) == 0 or len(self.nb_net.site_ids) == 0:
+            return
+        debug(f"Tracing {len(to_trace)} cables through front and rear ports locally")
+        try:
+            front_ports = list(self.nb_session.dcim.front_ports.filter(**self._ports_filter()))
+            rear_ports = list(self.nb_session.dcim.rear_ports.filter(**self._ports_filter()))
+            fetcher = self._block_fetcher("cables", self._query_cables, "id")
+            port_cables = list(fetcher.fetch(self._port_cable_ids(cables, front_ports + rear_ports),
+                                             self._block_size("cables")))
+        except (BlockFetchError, requests.Timeout, requests.exceptions.HTTPError,
+                pynetbox.core.query.RequestError, pynetbox.core.query.ContentError) as e:
+            warning("NetBox API failure at get front and rear ports, cables will be traced by NetBox:", e)
+            return
+        self._resolve_traces(self._cable_paths(cables + port_cables, front_ports, rear_ports), to_trace)
+
+    def _port_cable_ids(self, cables, ports):
+        """Return sorted IDs of cables attached to ports, which are not among cables already fetched"""
+        known = {cable.id for cable in cables}
+        return sorted({port.cable.id for port in ports if port.cable is not None} - known)
+
+    def _termination(self, term):
+        """Return (object_type, object_id, object) of a cable termination"""
+        obj = self._unwrap_termination(term)
+        # pynetbox 7.6.1+ GenericListObject carries the content type, otherwise derive it from the object URL
+        object_type = vars(term).get('object_type')
+        if object_type is None:
+            url = str(getattr(obj, 'url', '') or '')
+            object_type = next((t for path, t in NB_TERMINATION_TYPES.items() if f"/dcim/{path}/" in url), None)
+        return (object_type, obj.id, obj)
+
+    def _cable_paths(self, cables, front_ports, rear_ports):
+        """Build CablePaths from cables, front ports and rear ports"""
+        paths = CablePaths()
+        for cable in cables:
+            paths.add_cable(cable.id,
+                            [self._termination(t) for t in cable.a_terminations],
+                            [self._termination(t) for t in cable.b_terminations])
+        for port in front_ports:
+            paths.add_front_port(port.id, port.rear_port.id, port.rear_port_position)
+        for port in rear_ports:
+            paths.add_rear_port(port.id, port.positions)
+        return paths
+
+    def _resolve_traces(self, paths, to_trace):
+        """Store paths resolved from interfaces to their far end interfaces in the same shape as cable traces"""
+        resolved = 0
+        for cable, interface in to_trace:
+            far_end = paths.far_end('dcim.interface', interface.id)
+            if far_end is not None:
+                self.nb_net.traces[interface.id] = [[interface], cable, [far_end]]
+                resolved += 1
+        debug(f"Resolved {resolved} of {len(to_trace)} cable paths locally")
+
+    def _get_nb_cables(self):
+        # NetBox returns cables ordered by ID, sorting the IDs keeps the same order across the blocks
+        with self._phase("cables") as phase:
+            cables = self._fetch_nb_cables(sorted(self.nb_net.cable_ids))
+            phase.count("cables", len(cables))
+        # Cables to patch panels are traced ahead of building the graph, which adds all links in cable order
+        with self._phase("traces") as phase:
+            edges = {cable.id: self._trace_cable(cable) for cable in cables if not isinstance(cable, tuple)}
+            phase.count("cables", len(edges))
+        with self._phase("graph"):
+            for cable in cables:
+                if isinstance(cable, tuple):
+                    self._add_link_to_graph(*cable)
+                else:
+                    self._add_edge_to_graph(edges[cable.id], cable.id)
+
+    def _add_cable_to_graph(self, cable):
+        if isinstance(cable, tuple):
+            self._add_link_to_graph(*cable)
+        else:
+            self._add_edge_to_graph(self._trace_cable(cable), cable.id)
+
+    def _add_edge_to_graph(self, edge, cable_id):
+        """Add a link between [a, b] interfaces, and their devices, to the graph"""
+        if len(edge) == 2:
+            self._add_link_to_graph(cable_id, edge[0].device.id, edge[0].id, edge[1].device.id, edge[1].id)
+
+    def _add_link_to_graph(self, cable_id, a_device_id, a_interface_id, b_device_id, b_interface_id):
+        """Add a link over a cable between interfaces, and their devices, to the graph by NetBox IDs"""
+        d_a = self.nb_net.devices_by_id.get(a_device_id)
+        d_b = self.nb_net.devices_by_id.get(b_device_id)
+        if d_a is None or d_b is None:
+            debug("One or both devices for this connection are not in the export graph")
+            return
+        self.G.add_nodes_from([
+            (d_a["node_id"], {"side": "a", "type": "device", "device": d_a}),
+            (d_b["node_id"], {"side": "b", "type": "device", "device": d_b}),
+        ])
+        i_a = self.nb_net.interfaces_by_id.get(a_interface_id)
+        i_b = self.nb_net.interfaces_by_id.get(b_interface_id)
+        if i_a is None or i_b is None:
+            debug("One or both interfaces for this connection are not in the export graph")
+            return
+        # Interface records are added to the graph as dicts, the form graph formats and templates expect
+        self.G.add_nodes_from([
+            (i_a["node_id"], {"side": "a", "type": "interface", "interface": dict(i_a)}),
+            (i_b["node_id"], {"side": "b", "type": "interface", "interface": dict(i_b)}),
+        ])
+        self.G.add_edges_from([
+            (d_a["node_id"], i_a["node_id"]),
+            (d_b["node_id"], i_b["node_id"]),
+        ])
+        self.G.add_edges_from([
+            (i_a["node_id"], i_b["node_id"]),
+        ])
+        self.nb_net.links.append((cable_id, a_interface_id, b_interface_id))
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Persistent on-disk cache of NetBox API responses
+
+A cached response is reused without a request when NetBox logged no changes of the object types it depends on
+since it was stored (its change epoch), and fetched again otherwise. The latest change of each object type is
+tracked in the cache directory, and updated from the NetBox change log entries logged since the previous run.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from nrx.governor import GovernedHTTPAdapter, READ_ONLY_POST_SUFFIXES
+from nrx.serialization import dumps_json, loads_json
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, concurrent processes then rely on atomic file replacement only
+    fcntl = None
+
+# Key of the HTTPCache in the nrx configuration, present with --cache
+HTTP_CACHE_CONFIG_KEY = 'api_http_cache'
+# Requests with this header are sent to the server and not cached
+CACHE_BYPASS_HEADER = 'X-Nrx-Cache-Bypass'
+# POST requests that only read data from NetBox
+CACHEABLE_POST_SUFFIXES = READ_ONLY_POST_SUFFIXES
+# Response headers kept in the cache
+CACHED_HEADERS = ['Content-Type', 'API-Version']
+# Share of the maximum size to shrink the cache to when evicting
+CACHE_EVICT_TARGET = 0.9
+CACHE_LOCK_NAME = ".lock"
+# File with the latest NetBox change of each object type
+CACHE_EPOCHS_NAME = "epochs.json"
+
+# Object types of cables and the ports they connect, which link peers and cable paths depend on
+CABLE_OBJECT_TYPES = ['dcim.cable', 'dcim.cabletermination', 'dcim.interface', 'dcim.frontport', 'dcim.rearport',
+                      'circuits.circuit', 'circuits.circuittermination']
+# NetBox object types that GET responses of API endpoints depend on, including nested objects. Responses of other
+# endpoints, and of POST requests like rendered configurations, depend on objects of any type
+ENDPOINT_OBJECT_TYPES = {
+    'dcim/sites': ['dcim.site', 'dcim.region', 'dcim.sitegroup', 'ipam.asn', 'tenancy.tenant', 'extras.tag',
+                   'extras.customfield'],
+    'dcim/devices': ['dcim.device', 'dcim.site', 'dcim.location', 'dcim.rack', 'dcim.platform', 'dcim.devicetype',
+                     'dcim.manufacturer', 'dcim.devicerole', 'dcim.virtualchassis', 'ipam.ipaddress',
+                     'virtualization.cluster', 'tenancy.tenant', 'extras.tag', 'extras.customfield',
+                     'extras.configcontext', 'extras.configtemplate'],
+    'dcim/interfaces': CABLE_OBJECT_TYPES + ['dcim.device', 'dcim.module', 'dcim.macaddress', 'ipam.vlan', 'ipam.vrf',
+                                             'wireless.wirelesslan', 'wireless.wirelesslink', 'extras.tag',
+                                             'extras.customfield'],
+    'dcim/cables': CABLE_OBJECT_TYPES + ['dcim.device', 'tenancy.tenant', 'extras.tag', 'extras.customfield'],
+    'dcim/front-ports': CABLE_OBJECT_TYPES + ['dcim.device', 'dcim.module', 'extras.tag', 'extras.customfield'],
+    'dcim/rear-ports': CABLE_OBJECT_TYPES + ['dcim.device', 'dcim.module', 'extras.tag', 'extras.customfield'],
+    'extras/tags': ['extras.tag'],
+    'extras/config-templates': ['extras.configtemplate', 'core.datasource', 'core.datafile', 'extras.tag'],
+    'extras/config-contexts': ['extras.configcontext', 'core.datasource', 'core.datafile', 'extras.tag'],
+}
+
+
+def endpoint_object_types(request):
+    """Return object types a GET response of NetBox API depends on, or None if it depends on objects of any type"""
+    path = request.path_url.split('?')[0]
+    if request.method != 'GET' or '/api/' not in path:
+        return None
+    endpoint = "/".join(path.split('/api/', 1)[1].split('/')[:2])
+    return ENDPOINT_OBJECT_TYPES.get(endpoint)
+
+
+class HTTPCache:
+    """Directory of cached HTTP responses, shared by concurrent nrx processes
+
+    Each entry is a file with a line of JSON metadata followed by the response body. Entries are replaced
+    atomically, so reading does not need a lock. Writers hold a shared lock, and eviction of the least
+    recently used entries holds an exclusive one. Failures to write don't fail requests: the first one is kept
+    in `write_error`, and no more entries are stored after it.
+    """
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        # The latest NetBox change, and the latest changes of object types that changed since the cache was started
+        # or reset with 'base' as the epoch of all other types, None when unknown
+        self.epochs = None
+        self.stats = {'hits': 0, 'misses': 0}
+        self.stats_lock = threading.Lock()
+        self.write_error = None
+        os.makedirs(self.path, exist_ok=True)
+
+    def count(self, stat):
+        """Increment a cache statistics counter"""
+        with self.stats_lock:
+            self.stats[stat] += 1
+
+    @contextmanager
+    def lock(self, exclusive=False):
+        """Hold a lock on the cache directory"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.path, CACHE_LOCK_NAME), 'a', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_epochs(self):
+        """Return epochs stored in the cache directory, or None"""
+        try:
+            with open(os.path.join(self.path, CACHE_EPOCHS_NAME), 'rb') as f:
+                epochs = loads_json(f.read())
+        except (OSError, ValueError):
+            return None
+        if not isinstance(epochs, dict) or not {'change', 'base', 'types'} <= set(epochs):
+            return None
+        return epochs
+
+    def _write_epochs(self, epochs):
+        """Store epochs in the cache directory, atomically"""
+        path = os.path.join(self.path, CACHE_EPOCHS_NAME)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with self.lock():
+                with open(tmp_path, 'wb') as f:
+                    f.write(dumps_json(epochs).encode('utf-8'))
+                os.replace(tmp_path, path)
+        except OSError as e:
+            self._write_failed(e, tmp_path)
+
+    def update_epochs(self, change, read_changes):
+        """Update epochs of object types to the latest NetBox change, return the object types that changed, None for all
+
+        read_changes is called with the change of the previous run, and returns the changes logged after it,
+        or None if they can't be read. Without them, all object types get the latest change as their epoch.
+        """
+        if change is None:
+            self.epochs = None
+            return None
+        epochs = self._read_epochs()
+        if epochs is not None and epochs['change']['id'] == change['id']:
+            self.epochs = epochs
+            return set()
+        changes = None
+        if epochs is not None and epochs['change']['id'] < change['id']:
+            changes = read_changes(epochs['change'])
+        if changes is None or all(c.get('id') != change['id'] for c in changes):
+            self.epochs = {'change': change, 'base': change['id'], 'types': {}}
+            self._write_epochs(self.epochs)
+            return None
+        changed = set()
+        for c in changes:
+            object_type = c.get('changed_object_type')
+            if isinstance(object_type, str):
+                epochs['types'][object_type] = max(epochs['types'].get(object_type, 0), c['id'])
+                changed.add(object_type)
+        epochs['change'] = change
+        self.epochs = epochs
+        self._write_epochs(self.epochs)
+        return changed
+
+    def epoch(self, request):
+        """Return the change epoch of a request: the latest change of the object types its response depends on"""
+        if self.epochs is None:
+            return None
+        object_types = endpoint_object_types(request)
+        if object_types is None:
+            return self.epochs['change']['id']
+        return max(self.epochs['types'].get(t, self.epochs['base']) for t in object_types)
+
+    def key(self, request):
+        """Return cache key of a prepared request: method, URL, body and headers that change the response"""
+        h = hashlib.sha256()
+        for part in [request.method, request.url, request.headers.get('Authorization', ''),
+                     request.headers.get('Accept', '')]:
+            h.update(str(part).encode('utf-8'))
+            h.update(b'\0')
+        body = request.body or b''
+        h.update(body.encode('utf-8') if isinstance(body, str) else body)
+        return h.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key):
+        """Return (metadata, body) of a cached entry, or None"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                metadata = loads_json(f.readline())
+                body = f.read()
+            # Modification time tracks the last use of the entry for eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return metadata, body
+
+    def put(self, key, metadata, body):
+        """Store an entry, unless writing to the cache failed before"""
+        if self.write_error is not None:
+            return
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with self.lock():
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(tmp_path, 'wb') as f:
+                    f.write(dumps_json(metadata).encode('utf-8'))
+                    f.write(b'\n')
+                    f.write(body)
+                os.replace(tmp_path, path)
+        except OSError as e:
+            self._write_failed(e, tmp_path)
+
+    def _write_failed(self, e, tmp_path):
+        """Keep the first error of writing to the cache, and remove what was written"""
+        with self.stats_lock:
+            if self.write_error is None:
+                self.write_error = e
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+    def _entries(self):
+        """Return (mtime, size, path) of all entries"""
+        entries = []
+        for subdir in os.scandir(self.path):
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def size(self):
+        """Return total size of the cached entries, in bytes"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits into its maximum size"""
+        with self.lock(exclusive=True):
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            if total <= self.max_size:
+                return 0
+            target = self.max_size * CACHE_EVICT_TARGET
+            removed = 0
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            return removed
+
+
+class CachingHTTPAdapter(GovernedHTTPAdapter):
+    """HTTPAdapter that serves NetBox API responses from HTTPCache, with a default timeout like TimeoutHTTPAdapter
+
+    Responses served from the cache don't count against the concurrency governor.
+    """
+    def __init__(self, cache, timeout, *args, **kwargs):
+        self.cache = cache
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def _cacheable(self, request):
+        if CACHE_BYPASS_HEADER in request.headers:
+            return False
+        if request.method == 'GET':
+            return True
+        return request.method == 'POST' and request.path_url.split('?')[0].endswith(CACHEABLE_POST_SUFFIXES)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if timeout is None:
+            timeout = self.timeout
+        if not self._cacheable(request):
+            request.headers.pop(CACHE_BYPASS_HEADER, None)
+            return super().send(request, stream, timeout, verify, cert, proxies)
+        key = self.cache.key(request)
+        epoch = self.cache.epoch(request)
+        cached = self.cache.get(key)
+        if cached is not None:
+            metadata, body = cached
+            if epoch is not None and metadata['epoch'] == epoch:
+                self.cache.count('hits')
+                return self._response(request, metadata, body)
+        response = super().send(request, stream, timeout, verify, cert, proxies)
+        self.cache.count('misses')
+        if response.status_code == 200:
+            metadata = {
+                'method': request.method,
+                'url': request.url,
+                'status': response.status_code,
+                'headers': {k: response.headers[k] for k in CACHED_HEADERS if k in response.headers},
+                'epoch': epoch,
+                'stored': time.time(),
+            }
+            self.cache.put(key, metadata, response.content)
+        return response
+
+    def _response(self, request, metadata, body):
+        """Build a response from a cached entry"""
+        response = Response()
+        response.status_code = metadata['status']
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(metadata['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body  # pylint: disable=protected-access
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Record and replay of NetBox API traffic
+
+A cassette is a gzip-compressed file of JSON lines: a header, then a line for each request with the response
+nrx used, its body and the time it took. Responses NetBox asked to retry are not recorded, only the ones that
+followed. Requests are matched by method, path, query parameters and body, regardless of the server URL and of
+the order of query parameters, and requests with the same key are served in the order they were recorded.
+Request headers, with the API token, are not recorded.
+"""
+
+import gzip
+import hashlib
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from nrx.__about__ import __version__
+from nrx.governor import ConcurrencyGovernor, GovernedHTTPAdapter
+from nrx.serialization import dumps_json, loads_json
+
+# Key of the Cassette in the nrx configuration, present with --record or --replay
+CASSETTE_CONFIG_KEY = 'api_cassette'
+CASSETTE_TYPE = 'nrx_cassette'
+CASSETTE_VERSION = 1
+# Response headers kept in the cassette
+RECORDED_HEADERS = ['Content-Type', 'API-Version', 'ETag', 'Last-Modified']
+
+
+class CassetteError(Exception):
+    """A cassette can't be read, or has no response for a request to replay"""
+
+
+def request_key(method, url, body=None):
+    """Return the key of a request: method, path, sorted query parameters, and a digest of the body"""
+    parts = urlsplit(url)
+    key = f"{method} {parts.path}?{urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))}"
+    if body:
+        key += f" {hashlib.sha256(body.encode('utf-8') if isinstance(body, str) else body).hexdigest()}"
+    return key
+
+
+class Cassette:
+    """NetBox API requests and responses, recorded into a file or replayed from it
+
+    The file is opened for recording, or read for replay, with the first request. Use as a context manager
+    to close it. In replay, responses are delayed by the time they took when recorded, multiplied by `latency`.
+    """
+    def __init__(self, path, replay=False, latency=0.0):
+        self.path = path
+        self.replay = replay
+        self.latency = latency
+        # Recorded responses by request key, in the order they were recorded
+        self.responses = {}
+        self.stats = {'recorded': 0, 'replayed': 0}
+        self.lock = threading.Lock()
+        self.file = None
+        self.loaded = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the file of a recording cassette"""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def _create(self):
+        """Create the file to record into, with the header"""
+        try:
+            self.file = gzip.open(self.path, 'wt', encoding='utf-8')
+        except OSError as e:
+            raise CassetteError(f"Can't write cassette {self.path}: {e}") from e
+        header = {'type': CASSETTE_TYPE, 'version': CASSETTE_VERSION, 'nrx': __version__,
+                  'recorded': datetime.now(timezone.utc).isoformat(timespec='seconds')}
+        self.file.write(dumps_json(header) + '\n')
+
+    def _load(self):
+        """Read responses to replay"""
+        self.loaded = True
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                header = loads_json(f.readline())
+                if header.get('type') != CASSETTE_TYPE or header.get('version') != CASSETTE_VERSION:
+                    raise CassetteError(f"{self.path} is not a cassette of a supported version")
+                for line in f:
+                    response = loads_json(line)
+                    self.responses.setdefault(response['key'], deque()).append(response)
+        except (OSError, EOFError, ValueError, KeyError, AttributeError) as e:
+            raise CassetteError(f"Can't read cassette {self.path}: {e}") from e
+
+    def record(self, key, status, reason, headers, content, elapsed):  # pylint: disable=too-many-arguments
+        """Record a response to the request with a key, which took elapsed seconds"""
+        line = dumps_json({
+            'key': key,
+            'status': status,
+            'reason': reason,
+            'headers': {k: headers[k] for k in RECORDED_HEADERS if k in headers},
+            # Bytes that are not UTF-8 are kept as escaped surrogates
+            'body': content.decode('utf-8', errors='surrogateescape'),
+            'elapsed': round(elapsed, 6),
+        })
+        with self.lock:
+            if self.file is None:
+                self._create()
+            self.file.write(line + '\n')
+            self.stats['recorded'] += 1
+
+    def play(self, key):
+        """Return the next recorded response to the request with a key, with the body as bytes
+
+        The last response to a key is served to all following requests with the same key.
+        """
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            responses = self.responses.get(key)
+            if responses is None:
+                raise CassetteError(f"No recorded response for {key} in cassette {self.path}")
+            response = responses.popleft() if len(responses) > 1 else responses[0]
+            self.stats['replayed'] += 1
+        return response | {'body': response['body'].encode('utf-8', errors='surrogateescape')}
+
+    def delay(self, response):
+        """Return seconds to delay a replayed response with"""
+        return response['elapsed'] * self.latency
+
+    def http_adapter(self, timeout, governor=None, **pool_params):
+        """Return an HTTP adapter recording responses into the cassette, or serving them from it"""
+        if self.replay:
+            # Replayed responses were recorded after any retries, so the limit is fixed and nothing is retried
+            governor = ConcurrencyGovernor(pool_params.get('pool_maxsize', DEFAULT_POOLSIZE), adaptive=False, retries=0)
+            return ReplayHTTPAdapter(self, governor=governor, **pool_params)
+        return RecordingHTTPAdapter(self, timeout, governor=governor, **pool_params)
+
+
+class RecordingHTTPAdapter(GovernedHTTPAdapter):
+    """HTTPAdapter recording responses into a Cassette, with a default timeout like TimeoutHTTPAdapter"""
+    def __init__(self, cassette, timeout, *args, **kwargs):
+        self.cassette = cassette
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if timeout is None:
+            timeout = self.timeout
+        started = time.monotonic()
+        response = super().send(request, stream, timeout, verify, cert, proxies)
+        if not stream:
+            self.cassette.record(request_key(request.method, request.url, request.body), response.status_code,
+                                 response.reason, response.headers, response.content, time.monotonic() - started)
+        return response
+
+
+class ReplayHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter serving responses from a Cassette, without connecting to the server
+
+    Replayed requests hold a slot of the governor while they are delayed, like requests to the server would.
+    """
+    def __init__(self, cassette, *args, governor, **kwargs):
+        self.cassette = cassette
+        self.governor = governor
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        started = self.governor.acquire()
+        try:
+            recorded = self.cassette.play(request_key(request.method, request.url, request.body))
+            time.sleep(self.cassette.delay(recorded))
+        finally:
+            self.governor.release(started, urlsplit(request.url).path)
+        response = Response()
+        response.status_code = recorded['status']
+        response.reason = recorded['reason']
+        response.headers = CaseInsensitiveDict(recorded['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = recorded['body']  # pylint: disable=protected-access
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+
+def use_cassette(config, record=None, replay=None, latency=0.0):
+    """Put a Cassette recording into the record path, or replaying the replay path, into the configuration
+
+    Return the cassette to close it as a context manager, or a context manager that does nothing without a path.
+    """
+    if record is None and replay is None:
+        return nullcontext()
+    config[CASSETTE_CONFIG_KEY] = Cassette(replay if replay is not None else record, replay is not None, latency)
+    return config[CASSETTE_CONFIG_KEY]
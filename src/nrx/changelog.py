@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+NetBox change log: object changes logged by NetBox, which tell the state of data an export is built from
+
+Change log requests always go to NetBox, bypassing the API response cache. Requests that fail raise
+requests.RequestException, or ValueError for responses that are not JSON.
+"""
+
+from nrx.cache import CACHE_BYPASS_HEADER
+
+# NetBox change log endpoints, of NetBox 4.1 and later, and of earlier versions
+OBJECT_CHANGES_PATHS = ['core/object-changes', 'extras/object-changes']
+# Page size of change log queries
+CHANGES_PAGE_SIZE = 1000
+
+
+class ChangeLog:
+    """Change log of a NetBox instance"""
+    def __init__(self, http_session, api_url, token):
+        self.http_session = http_session
+        self.api_url = api_url
+        self.headers = {
+            'Authorization': f"Token {token}",
+            'Accept': 'application/json',
+            CACHE_BYPASS_HEADER: '1',
+        }
+
+    def changes(self, params, all_pages=True):
+        """Return object changes matching params, newest first, or None if NetBox has no change log endpoint"""
+        for path in OBJECT_CHANGES_PATHS:
+            url = f"{self.api_url}/api/{path}/"
+            changes = []
+            page_params = params
+            while url is not None:
+                response = self.http_session.get(url, params=page_params, headers=self.headers)
+                if response.status_code == 404 and len(changes) == 0:
+                    break
+                response.raise_for_status()
+                page = response.json()
+                changes.extend(page.get('results', []))
+                # the next page URL carries the query parameters
+                url, page_params = (page.get('next') if all_pages else None), None
+            else:
+                return changes
+        return None
+
+    def latest(self):
+        """Return ID and time of the latest object change, or None if NetBox has no change log endpoint"""
+        changes = self.changes({'limit': 1}, all_pages=False)
+        if changes is None:
+            return None
+        if len(changes) == 0:
+            return {'id': 0, 'time': None}
+        return {'id': changes[0].get('id'), 'time': changes[0].get('time')}
+
+    def since(self, change):
+        """Return object changes logged after a change, or None if NetBox has no change log endpoint"""
+        params = {'limit': CHANGES_PAGE_SIZE}
+        if change['time'] is not None:
+            params['time_after'] = change['time']
+        changes = self.changes(params)
+        if changes is None:
+            return None
+        return [c for c in changes if c.get('id', 0) > change['id']]
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Persistent cache of device configurations rendered by NetBox
+
+A configuration is rendered again only when one of its inputs changed since it was cached: the device, its
+role or platform, which can assign it another config template, the config template that rendered it, or any
+config context. Inputs are compared by their last_updated values, so changes of other objects a template
+reads, like interfaces of the device, don't invalidate the cache.
+Configurations of each NetBox instance are kept in a gzip-compressed JSON file, replaced atomically.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from nrx.serialization import dump_json, load_json
+
+# Key of the ConfigCache in the nrx configuration, present with --config-cache
+CONFIG_CACHE_CONFIG_KEY = 'device_config_cache'
+CONFIG_CACHE_NAME = "configs"
+CONFIG_CACHE_VERSION = 1
+# Fields of config templates and contexts read to tell their revisions
+REVISION_FIELDS = 'id,last_updated'
+# Fields of device roles and platforms read to tell their revisions, by the slugs devices are exported with
+SLUG_REVISION_FIELDS = 'slug,last_updated'
+
+
+def api_headers(token):
+    """Return headers of NetBox API requests with a token"""
+    return {
+        'Authorization': f"Token {token}",
+        'Content-Type': 'application/json',
+        'Accept': 'application/json'
+    }
+
+
+def list_objects(http_session, url, params, headers):
+    """Return objects of all pages of a NetBox API list"""
+    objects = []
+    while url is not None:
+        response = http_session.get(url, params=params, headers=headers)
+        response.raise_for_status()
+        page = response.json()
+        objects.extend(page.get('results', []))
+        # the next page URL carries the query parameters
+        url, params = page.get('next'), None
+    return objects
+
+
+def contexts_revision(contexts):
+    """Return a digest of IDs and last_updated values of config contexts, which changes with any of them"""
+    revisions = sorted((c['id'], c.get('last_updated')) for c in contexts)
+    # json serializes the same way with any serialization backend, so the digest does not depend on it
+    return hashlib.sha256(json.dumps(revisions).encode('utf-8')).hexdigest()
+
+
+class ConfigCache:
+    """Device configurations rendered by a NetBox instance, by device ID, with revisions of their inputs
+
+    Revisions of config templates and contexts are read from NetBox once with read_revisions(). Entries are
+    loaded with the first lookup, and the ones stored during the run are merged into the file by save().
+    """
+    def __init__(self, path):
+        self.path = path
+        # Cached entries by device ID, as a string like JSON object keys
+        self.entries = None
+        # Entries stored during this run
+        self.updated = {}
+        # last_updated of config templates by ID, of device roles and platforms by slug, and the digest of config
+        # contexts, of this run
+        self.templates = {}
+        self.roles = {}
+        self.platforms = {}
+        self.contexts = None
+        self.stats = {'hits': 0, 'misses': 0}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_api(cls, cache_dir, api_url):
+        """Return the cache of configurations rendered by NetBox at api_url, in a file of cache_dir"""
+        name = hashlib.sha256(api_url.rstrip('/').encode('utf-8')).hexdigest()[:16]
+        return cls(os.path.join(cache_dir, f"{name}.json.gz"))
+
+    def read_revisions(self, http_session, api_url, headers):
+        """Read revisions of config templates, config contexts, device roles and platforms from NetBox"""
+        params = {'fields': REVISION_FIELDS, 'limit': 1000}
+        templates = list_objects(http_session, f"{api_url}/api/extras/config-templates/", params, headers)
+        contexts = list_objects(http_session, f"{api_url}/api/extras/config-contexts/", params, headers)
+        params = {'fields': SLUG_REVISION_FIELDS, 'limit': 1000}
+        roles = list_objects(http_session, f"{api_url}/api/dcim/device-roles/", params, headers)
+        platforms = list_objects(http_session, f"{api_url}/api/dcim/platforms/", params, headers)
+        self.templates = {t['id']: t.get('last_updated') for t in templates}
+        self.roles = {r['slug']: r.get('last_updated') for r in roles}
+        self.platforms = {p['slug']: p.get('last_updated') for p in platforms}
+        self.contexts = contexts_revision(contexts)
+
+    def _read(self):
+        """Return entries of the cache file, none if it does not exist or can't be read"""
+        try:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                data = load_json(f)
+        except (OSError, EOFError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != CONFIG_CACHE_VERSION:
+            return {}
+        return data.get('devices', {})
+
+    def _revision(self, device, template_id):
+        """Return revision of the inputs of a device configuration rendered with a config template"""
+        return {
+            'device': device.get('last_updated'),
+            'role': [device.get('role'), self.roles.get(device.get('role'))],
+            'platform': [device.get('platform'), self.platforms.get(device.get('platform'))],
+            'template': [template_id, self.templates.get(template_id)],
+            'contexts': self.contexts,
+        }
+
+    def get(self, device):
+        """Return the cached configuration of a device, or None if there is none or its inputs changed"""
+        with self.lock:
+            if self.entries is None:
+                self.entries = self._read()
+            entry = self.entries.get(str(device['id']))
+            if entry is None or device.get('last_updated') is None or \
+               entry['revision'] != self._revision(device, entry['revision']['template'][0]):
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            return entry['content']
+
+    def put(self, device, response):
+        """Store the render-config response of a device"""
+        template = response.get('configtemplate')
+        if device.get('last_updated') is None or not isinstance(template, dict) or template.get('id') not in self.templates:
+            return
+        entry = {'revision': self._revision(device, template['id']), 'content': response['content']}
+        with self.lock:
+            self.updated[str(device['id'])] = entry
+            if self.entries is not None:
+                self.entries[str(device['id'])] = entry
+
+    def lookup(self, devices):
+        """Set configurations of devices that are cached, return the devices to render"""
+        uncached = []
+        for d in devices:
+            config = self.get(d)
+            if config is None:
+                uncached.append(d)
+            else:
+                d["config"] = config
+        return uncached
+
+    def save(self):
+        """Merge entries stored during this run into the cache file, return the number of them
+
+        Raises OSError if the file can't be written, the entries are then kept to be saved again.
+        """
+        with self.lock:
+            if len(self.updated) == 0:
+                return 0
+            # Entries stored by other nrx processes since the file was read are kept
+            entries = self._read() | self.updated
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                    dump_json({'version': CONFIG_CACHE_VERSION, 'devices': entries}, f)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            saved = len(self.updated)
+            self.updated = {}
+            return saved
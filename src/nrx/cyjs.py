@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cytoscape JSON (CYJS) files of network graphs
+
+Graphs are written element by element straight from the NetworkX graph, without building the nx.cytoscape_data
+copy of it first. By default, files are indented by 4 spaces, the same as json.dump of nx.cytoscape_data.
+Compact files have no indentation, an element per line, and leave out null and empty fields of nodes and edges.
+Files with .gz and .zst extensions are compressed with gzip and Zstandard. Zstandard requires an optional
+dependency: pip install nrx[zstd]
+
+Graphs are read from the whole text of the file, parsed with orjson when it is installed. For graphs that don't
+fit in memory that way, they can be streamed instead, element by element: the file is memory-mapped, or
+decompressed, and parsed in chunks, and each node and edge is added to the NetworkX graph as soon as it is parsed,
+without the text of the whole file or its nx.cytoscape_graph input in memory. Streaming takes about half the
+memory, and about twice the time.
+"""
+
+import codecs
+import gzip
+import json
+import mmap
+import re
+
+import networkx as nx
+
+from nrx.serialization import dumps_json, loads_json
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CYJS_EXTENSION = ".cyjs"
+# Compression of CYJS files by extension of the file name
+CYJS_COMPRESSIONS = {'gz': ".gz", 'zst': ".zst"}
+CYJS_INDENT = 4
+# Size of the chunks CYJS files are parsed in, in bytes
+CYJS_CHUNK_SIZE = 1024 * 1024
+
+JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class CYJSError(Exception):
+    """A CYJS file can't be opened with the requested compression"""
+
+
+class CYJSDecodeError(ValueError):
+    """A CYJS file is not valid JSON, or not a graph"""
+
+
+def cyjs_file_name(name, compression=''):
+    """Return the name of a CYJS file of a graph, with the extension of a compression if there is one"""
+    return name + CYJS_EXTENSION + CYJS_COMPRESSIONS.get(compression or '', '')
+
+
+def open_cyjs(path, mode='r'):
+    """Open a CYJS file for reading or writing, 'r' or 'w' mode for text or 'rb' for bytes, decompressing
+    or compressing it according to its extension"""
+    text_mode = mode if mode.endswith('b') else f"{mode}t"
+    encoding = None if mode.endswith('b') else 'utf-8'
+    if str(path).endswith(CYJS_COMPRESSIONS['gz']):
+        return gzip.open(path, text_mode, encoding=encoding)
+    if str(path).endswith(CYJS_COMPRESSIONS['zst']):
+        if zstandard is None:
+            raise CYJSError(f"{path} is compressed with Zstandard, which requires: pip install nrx[zstd]")
+        return zstandard.open(path, text_mode, encoding=encoding)
+    return open(path, mode, encoding=encoding)  # pylint: disable=consider-using-with
+
+
+def compact_data(data):
+    """Return a dict without null and empty values, in nested dicts as well"""
+    compacted = {}
+    for k, v in data.items():
+        if isinstance(v, dict):
+            v = compact_data(v)
+        if v is None or (isinstance(v, (str, list, dict)) and len(v) == 0):
+            continue
+        compacted[k] = v
+    return compacted
+
+
+def node_elements(G):
+    """Yield CYJS elements of graph nodes, as nx.cytoscape_data has them"""
+    for n, attrs in G.nodes.items():
+        data = dict(attrs)
+        data['id'] = attrs.get('id') or str(n)
+        data['value'] = n
+        data['name'] = attrs.get('name') or str(n)
+        yield {'data': data}
+
+
+def edge_elements(G):
+    """Yield CYJS elements of graph edges, as nx.cytoscape_data has them"""
+    if G.is_multigraph():
+        for u, v, key, attrs in G.edges(keys=True, data=True):
+            yield {'data': dict(attrs) | {'source': u, 'target': v, 'key': key}}
+    else:
+        for u, v, attrs in G.edges(data=True):
+            yield {'data': dict(attrs) | {'source': u, 'target': v}}
+
+
+def _indented(obj, level):
+    """Return obj as JSON indented the way json.dump indents it at a nesting level"""
+    # JSON strings have their line breaks escaped, so each line break is between JSON tokens
+    return json.dumps(obj, indent=CYJS_INDENT).replace("\n", "\n" + " " * CYJS_INDENT * level)
+
+
+def _write_elements(f, elements, compact):
+    """Write elements of an array, each on a new line, and close the array, return the number of elements"""
+    count = 0
+    for element in elements:
+        if compact:
+            f.write(f"{',' if count > 0 else ''}\n{dumps_json({'data': compact_data(element['data'])})}")
+        else:
+            f.write(f"{',' if count > 0 else ''}\n{' ' * CYJS_INDENT * 3}{_indented(element, 3)}")
+        count += 1
+    if count > 0:
+        f.write("\n" if compact else "\n" + " " * CYJS_INDENT * 2)
+    f.write("]")
+    return count
+
+
+def write_cyjs(G, f, compact=False):
+    """Write a graph into a text file object as CYJS, return the numbers of nodes and edges written"""
+    pad = " " * CYJS_INDENT
+    if compact:
+        f.write(f'{{"data":{dumps_json(list(G.graph.items()))},"directed":{dumps_json(G.is_directed())},'
+                f'"multigraph":{dumps_json(G.is_multigraph())},"elements":{{"nodes":[')
+    else:
+        f.write(f'{{\n{pad}"data": {_indented(list(G.graph.items()), 1)},\n'
+                f'{pad}"directed": {dumps_json(G.is_directed())},\n{pad}"multigraph": {dumps_json(G.is_multigraph())},\n'
+                f'{pad}"elements": {{\n{pad * 2}"nodes": [')
+    nodes = _write_elements(f, node_elements(G), compact)
+    f.write(',"edges":[' if compact else f',\n{pad * 2}"edges": [')
+    edges = _write_elements(f, edge_elements(G), compact)
+    f.write("}}" if compact else f"\n{pad}}}\n}}")
+    return nodes, edges
+
+
+class _JSONStream:
+    """Parser of JSON values one by one from a stream of UTF-8 bytes read in chunks"""
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        # Values are parsed one by one, so keys are shared across objects here, like json.load shares them
+        keys = {}
+        self.json_decoder = json.JSONDecoder(object_pairs_hook=lambda pairs: {keys.setdefault(k, k): v for k, v in pairs})
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """Append the next chunk of the stream to the unparsed part of the buffer"""
+        chunk = self.stream.read(self.chunk_size)
+        self.eof = len(chunk) == 0
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+
+    def peek(self):
+        """Skip whitespace, return the next character, or an empty string at the end of the stream"""
+        while True:
+            self.pos = JSON_WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self._fill()
+
+    def expect(self, chars):
+        """Consume the next character, which has to be one of chars, and return it"""
+        c = self.peek()
+        if c == "" or c not in chars:
+            raise CYJSDecodeError(f"expected one of '{chars}', got '{c or 'end of file'}'")
+        self.pos += 1
+        return c
+
+    def value(self):
+        """Parse the next JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+                # A number at the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise CYJSDecodeError(e.msg) from e
+            self._fill()
+
+    def members(self):
+        """Yield keys of an object, the caller parses the value of each key before the next one"""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise CYJSDecodeError(f"expected an object key, got {key!r}")
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+    def items(self):
+        """Yield values of an array"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+class _MappedFile:
+    """Sequential reader of a memory-mapped file, which releases the pages it has read"""
+    def __init__(self, mapped):
+        self.mapped = mapped
+        self.pos = 0
+        self.released = 0
+
+    def read(self, size):
+        """Return the next size bytes of the file, or less at its end"""
+        chunk = self.mapped[self.pos:self.pos + size]
+        self.pos += len(chunk)
+        end = self.pos - self.pos % mmap.PAGESIZE
+        if hasattr(mmap, 'MADV_DONTNEED') and end > self.released:
+            self.mapped.madvise(mmap.MADV_DONTNEED, self.released, end - self.released)
+            self.released = end
+        return chunk
+
+
+def iter_cyjs(stream, chunk_size=CYJS_CHUNK_SIZE):
+    """Yield (key, value) of top-level CYJS fields, and ('nodes', element) and ('edges', element) of each
+    element, while parsing a stream of UTF-8 bytes"""
+    parser = _JSONStream(stream, chunk_size)
+    for key in parser.members():
+        if key == 'elements':
+            for kind in parser.members():
+                if kind in ('nodes', 'edges'):
+                    for element in parser.items():
+                        yield kind, element
+                else:
+                    parser.value()
+        else:
+            yield key, parser.value()
+    if parser.peek() != "":
+        raise CYJSDecodeError("extra data after the graph")
+
+
+def _empty_graph(fields):
+    """Return an empty graph of the type of CYJS fields"""
+    G = nx.MultiGraph() if fields['multigraph'] else nx.Graph()
+    return G.to_directed() if fields['directed'] else G
+
+
+def read_cyjs(stream, chunk_size=CYJS_CHUNK_SIZE):
+    """Read a graph from a stream of CYJS bytes, the way nx.cytoscape_graph creates it from CYJS data"""
+    fields = {'data': [], 'directed': False, 'multigraph': False}
+    G = None
+    try:
+        for key, value in iter_cyjs(stream, chunk_size):
+            if key not in ('nodes', 'edges'):
+                if G is not None and key in ('directed', 'multigraph'):
+                    raise CYJSDecodeError(f"'{key}' has to precede graph elements")
+                fields[key] = value
+                continue
+            G = _empty_graph(fields) if G is None else G
+            data = value['data']
+            if key == 'nodes':
+                G.add_node(data['value'])
+                G.nodes[data['value']].update(data)
+            elif fields['multigraph']:
+                key = data.get('key', 0)
+                G.add_edge(data['source'], data['target'], key=key)
+                G.edges[data['source'], data['target'], key].update(data)
+            else:
+                G.add_edge(data['source'], data['target'])
+                G.edges[data['source'], data['target']].update(data)
+    except (KeyError, TypeError) as e:
+        raise CYJSDecodeError(f"not a CYJS graph, element without {e}") from e
+    G = _empty_graph(fields) if G is None else G
+    G.graph = dict(fields['data'])
+    return G
+
+
+def read_cyjs_file(path, stream=False, chunk_size=CYJS_CHUNK_SIZE):
+    """Read a graph from a CYJS file, decompressing it according to its extension
+
+    With stream=True, the graph is read element by element, from the memory-mapped file if it is not compressed.
+    """
+    if not stream:
+        with open_cyjs(path, 'rb') as f:
+            text = f.read()
+        if len(text) == 0:
+            raise CYJSDecodeError("empty file")
+        try:
+            return nx.cytoscape_graph(loads_json(text))
+        except json.JSONDecodeError as e:
+            raise CYJSDecodeError(e.msg) from e
+        except (KeyError, TypeError, AttributeError, nx.NetworkXError) as e:
+            raise CYJSDecodeError(f"not a CYJS graph: {e}") from e
+    if str(path).endswith(tuple(CYJS_COMPRESSIONS.values())):
+        with open_cyjs(path, 'rb') as f:
+            return read_cyjs(f, chunk_size)
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            raise CYJSDecodeError("empty file")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return read_cyjs(_MappedFile(mapped), chunk_size)
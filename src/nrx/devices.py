@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Devices and their configurations from NetBox REST API
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from packaging import version
+from requests.exceptions import RequestException, Timeout, HTTPError
+
+from nrx.configs import CONFIG_CACHE_CONFIG_KEY, api_headers
+from nrx.fetch import PageFetcher
+from nrx.log import debug
+from nrx.serialization import loads_json
+
+# Number of threads pynetbox fetches pages of a query with, in sessions with threading=True,
+# and number of device pages fetched concurrently ahead of their processing
+NB_PYNETBOX_THREADS = 4
+# NetBox device fields nrx reads to initialize device data, requested from NetBox regardless of templates.
+# Records miss no attribute nrx accesses, otherwise pynetbox would fetch each device again to get it.
+# last_updated tells whether a cached device configuration is still valid
+NB_DEVICE_RECORD_FIELDS = ['id', 'url', 'display', 'name', 'site', 'platform', 'device_type', 'role', 'device_role',
+                           'primary_ip4', 'primary_ip6', 'last_updated']
+
+
+class DevicesMixin:
+    """NBFactory methods to get devices and their configurations from NetBox"""
+    def _devices_filter(self):
+        """Return NetBox API filter for devices by site, tags and device roles, with the device fields to return"""
+        devices_filter = {}
+        if len(self.nb_sites) > 0:
+            site_ids = []
+            for site in self.nb_sites:
+                debug(f'Site ID: {site.id} - Site Name: {site.name}')
+                site_ids.append(str(site.id))
+            devices_filter['site_id'] = site_ids
+        devices_filter['tag'] = self.config['export_tags']
+        devices_filter['role'] = self.config['export_device_roles']
+        fields = self.config.get('device_fields')
+        if fields is not None:
+            if 'config_context' not in fields:
+                # Rendering config contexts is the most expensive part of device queries
+                devices_filter['exclude'] = 'config_context'
+            if self.nb_api_version >= version.parse("4.0"):
+                devices_filter['fields'] = ",".join(sorted(set(fields) | set(NB_DEVICE_RECORD_FIELDS)))
+        return devices_filter
+
+    def _get_nb_devices(self):
+        """Get device list from NetBox filtered by site, tags and device roles, page by page in the order of NetBox"""
+        fetcher = PageFetcher(self._query_devices_page, workers=NB_PYNETBOX_THREADS)
+        for record in fetcher.fetch(self.api_params['page_size']):
+            self._add_device_record(*record)
+
+    def _query_devices_page(self, offset, limit, devices_filter=None):
+        """Query a page of devices, return their nrx records and the total number of devices"""
+        if devices_filter is None:
+            devices_filter = self._devices_filter()
+        devices = self.nb_blocks_session.dcim.devices.filter(offset=offset, limit=limit, **devices_filter)
+        # Records are converted as they are read, the total number is known once the page is read
+        records = [self._nb_device_record(device) for device in devices]
+        return records, len(devices)
+
+    def _nb_device_record(self, device):
+        """Return (device ID, site ID, device data) for a pynetbox device"""
+        return device.id, device.site.id if device.site is not None else None, self._init_device(device)
+
+    def _add_nb_device(self, device):
+        return self._add_device_record(*self._nb_device_record(device))
+
+    def _add_device_record(self, device_id, site_id, d):
+        self.nb_net.add_device(device_id, d)
+        if site_id is not None:
+            self.nb_net.site_ids.add(site_id)
+        debug("Added device:", d)
+        return d
+
+    def _init_device(self, device):
+        """Initialize device data with the exported fields from NetBox"""
+        # Start with raw device data from NetBox, limited to the fields templates use
+        fields = self.config.get('device_fields')
+        d = {k: v for k, v in dict(device).items() if fields is None or k in fields or k in NB_DEVICE_RECORD_FIELDS}
+
+        # Add nrx-specific fields
+        d["type"] = "device"
+        d["node_id"] = -1
+
+        # Extract nested object fields for backward compatibility and template convenience
+        # Site
+        d["site"] = device.site.name if device.site is not None else ""
+
+        # Platform
+        if device.platform is not None:
+            d["platform"] = device.platform.slug
+            d["platform_name"] = device.platform.name
+        else:
+            d["platform"] = "unknown"
+            d["platform_name"] = "unknown"
+
+        # Device Type / Model and Vendor
+        if device.device_type is not None:
+            d["model"] = device.device_type.slug
+            d["model_name"] = device.device_type.model
+            if device.device_type.manufacturer is not None:
+                d["vendor"] = device.device_type.manufacturer.slug
+                d["vendor_name"] = device.device_type.manufacturer.name
+            else:
+                d["vendor"] = "unknown"
+                d["vendor_name"] = "unknown"
+        else:
+            d["model"] = "unknown"
+            d["model_name"] = "unknown"
+            d["vendor"] = "unknown"
+            d["vendor_name"] = "unknown"
+
+        # Role
+        d["role"], d["role_name"] = self._device_role(device)
+
+        # Generate name if not set
+        if d.get("name") is None or len(d.get("name", "")) == 0:
+            d["name"] = f"{d['role']}-{device.id}"
+
+        # Primary IPs
+        d["primary_ip4"] = device.primary_ip4.address if device.primary_ip4 is not None else ""
+        d["primary_ip6"] = device.primary_ip6.address if device.primary_ip6 is not None else ""
+
+        # Config is populated later by _get_nb_device_configs, once the final device set is known
+        d["config"] = ""
+
+        return d
+
+    def _device_role(self, device):
+        """Return the slug and the name of the device role, handling NetBox 3.x vs 4.x difference"""
+        # NetBox 3.x uses device_role
+        role = device.role if self.nb_api_version >= version.parse("4.0") else getattr(device, 'device_role', None)
+        if role is None:
+            return "unknown", "unknown"
+        return role.slug, role.name
+
+    def _export_nb_device_configs(self, devices=None):
+        """Get configurations of all exported devices, or of a list of them, if the output format uses them"""
+        if self._exports_configs():
+            with self._phase("configs") as phase:
+                phase.count("configs", self._get_nb_device_configs(devices))
+
+    def _get_nb_device_configs(self, devices=None, pool=None):
+        """Get configurations for all exported devices, or for a list of them, from NetBox, using a pool of concurrent workers
+
+        Return the number of devices with a configuration. A pool shared with other lists of devices can be given.
+        """
+        if devices is None:
+            devices = self.nb_net.devices
+        cache = self.config.get(CONFIG_CACHE_CONFIG_KEY)
+        uncached = devices if cache is None else cache.lookup(devices)
+        workers = max(1, self.api_params['configs_workers'])
+        debug(f"Exporting configurations for {len(uncached)} of {len(devices)} devices, with {workers} workers")
+        with ThreadPoolExecutor(max_workers=workers) if pool is None else nullcontext(pool) as configs_pool:
+            # map() returns results in the order of the devices list
+            for d, config in zip(uncached, configs_pool.map(self._get_device_config, uncached)):
+                d["config"] = config
+        return len([d for d in devices if len(d["config"]) > 0])
+
+    def _get_device_config(self, device):
+        """Get device config from NetBox, and store it in the config cache if it is enabled"""
+        headers = api_headers(self.config['nb_api_token'])
+        url = f"{self.config['nb_api_url']}/api/dcim/devices/{device['id']}/render-config/"
+        try:
+            # Shared session reuses pooled connections, and the API response cache when it is enabled.
+            # Its adapter applies the API timeout
+            response = self.nb_session.http_session.post(url, headers=headers, verify=self.config['tls_validate'])
+            response.raise_for_status()  # Raises an HTTPError if the response status is an error
+            config_response = loads_json(response.text)
+            if "content" in config_response:
+                if self.config.get(CONFIG_CACHE_CONFIG_KEY) is not None:
+                    self.config[CONFIG_CACHE_CONFIG_KEY].put(device, config_response)
+                return config_response["content"]
+        except HTTPError as e:
+            debug(f"{device['name']}: Get device configuration request failed: {e}")
+        except (Timeout, RequestException) as e:
+            debug(f"{device['name']}: Get device configuration failed: {e}")
+        except ValueError as e:
+            debug(f"{device['name']}: Get device configuration failed: can't parse rendered configuration - {e}")
+        return ""
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Block fetch engine for NetBox API queries filtered by lists of object IDs, and ordered concurrent pagination
+"""
+
+import asyncio
+import threading
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# HTTP status codes that mean the block of IDs was too large for the server to handle
+BLOCK_TOO_LARGE_STATUS_CODES = [414]
+
+
+class BlockFetchError(Exception):
+    """Raised when a block of IDs can't be fetched even after reducing its size"""
+
+
+def response_status_code(e):
+    """Return HTTP status code from requests, pynetbox or aiohttp exception, if there is one"""
+    # aiohttp.ClientResponseError has 'status'
+    if isinstance(getattr(e, 'status', None), int):
+        return e.status
+    # requests.HTTPError has 'response', pynetbox RequestError has 'req'
+    for attr in ['response', 'req']:
+        response = getattr(e, attr, None)
+        if response is not None:
+            return getattr(response, 'status_code', None)
+    return None
+
+
+def is_block_too_large(e):
+    """Check if the exception indicates that a smaller block of IDs might succeed"""
+    if isinstance(e, (requests.Timeout, asyncio.TimeoutError)):
+        return True
+    return response_status_code(e) in BLOCK_TOO_LARGE_STATUS_CODES
+
+
+# Query parameter that carries the IDs, and how many URL bytes are available for them
+URLBudget = namedtuple('URLBudget', ['param', 'length'])
+
+
+def id_param_length(param, object_id):
+    """Return number of URL bytes taken by one ID in a query filter: &param=ID"""
+    return len(param) + len(str(object_id)) + 2
+
+
+class BlockFetcher:
+    """Fetch objects from NetBox in blocks of IDs, dispatching the blocks concurrently
+
+    `query` is called with a list of IDs and returns the objects for that block. Results are
+    merged in the order of the blocks, so the output does not depend on the number of workers.
+
+    Blocks are packed with as many IDs as fit into `url_budget`, up to the current block size. The
+    block size doubles after each round of blocks fetched without retries, and never grows back to
+    a size that failed. The resulting `block_size` can be reused as a starting point for the next
+    fetch. With `adaptive=False`, the block size stays fixed.
+    """
+    def __init__(self, query, workers=1, max_attempts=3, on_retry=None, url_budget=None, adaptive=True):
+        self.query = query
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+        self.on_retry = on_retry
+        self.url_budget = url_budget
+        self.adaptive = adaptive
+        self.block_size = 1
+        # Smallest block size that failed as too large
+        self.failed_size = None
+        self.lock = threading.Lock()
+
+    def _next_block(self, ids, start):
+        """Return the block of IDs starting at position start, limited by block size and URL budget"""
+        end = min(start + self.block_size, len(ids))
+        if self.url_budget is not None:
+            used = 0
+            for i in range(start, end):
+                used += id_param_length(self.url_budget.param, ids[i])
+                if used > self.url_budget.length and i > start:
+                    return ids[start:i]
+        return ids[start:end]
+
+    def _next_round(self, ids, start):
+        """Return blocks to dispatch concurrently, one per worker"""
+        blocks = []
+        while start < len(ids) and len(blocks) < self.workers:
+            blocks.append(self._next_block(ids, start))
+            start += len(blocks[-1])
+        return blocks
+
+    def _start(self, block_size):
+        self.block_size = max(1, block_size)
+        self.failed_size = None
+
+    def _grow(self, previous_failed_size):
+        """Shrink block size below the smallest failed size, or double it if no block failed since previous_failed_size"""
+        if self.failed_size is not None:
+            self.block_size = max(1, min(self.block_size, self.failed_size // 2))
+        if self.adaptive and self.failed_size == previous_failed_size:
+            grown = self.block_size * 2
+            if self.failed_size is not None:
+                grown = min(grown, self.failed_size - 1)
+            self.block_size = max(self.block_size, grown)
+
+    def fetch(self, ids, block_size):
+        """Yield objects for all the IDs, in the order of the blocks"""
+        self._start(block_size)
+        start = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while start < len(ids):
+                blocks = self._next_round(ids, start)
+                failed_size = self.failed_size
+                # map() returns results in the order of the blocks, regardless of completion order
+                for results in pool.map(self._fetch_block, blocks):
+                    yield from results
+                start += sum(len(block) for block in blocks)
+                self._grow(failed_size)
+
+    def _failed(self, e, block, attempt):
+        """Handle a block that failed as too large: raise if it can't be split any more, or register the failure"""
+        if attempt >= self.max_attempts or len(block) < 2:
+            raise BlockFetchError(f"block of {len(block)} IDs failed after {attempt} attempts: {e}") from e
+        with self.lock:
+            if self.failed_size is None or len(block) < self.failed_size:
+                self.failed_size = len(block)
+        if self.on_retry is not None:
+            self.on_retry(e, len(block))
+
+    def _fetch_block(self, block, attempt=1):
+        """Fetch a single block, splitting it in halves if the server can't handle its size"""
+        try:
+            return list(self.query(block))
+        except Exception as e:
+            if not is_block_too_large(e):
+                raise
+            self._failed(e, block, attempt)
+            half = (len(block) + 1) // 2
+            return self._fetch_block(block[:half], attempt + 1) + self._fetch_block(block[half:], attempt + 1)
+
+
+class AsyncBlockFetcher(BlockFetcher):
+    """BlockFetcher for coroutine queries, with each round of blocks dispatched at once on the event loop
+
+    Concurrency is also bounded by the connection pool of the client used by `query`.
+    """
+    async def fetch(self, ids, block_size):  # pylint: disable=invalid-overridden-method
+        """Return objects for all the IDs, in the order of the blocks"""
+        self._start(block_size)
+        start = 0
+        results = []
+        while start < len(ids):
+            blocks = self._next_round(ids, start)
+            failed_size = self.failed_size
+            for block_results in await asyncio.gather(*[self._fetch_block(block) for block in blocks]):
+                results.extend(block_results)
+            start += sum(len(block) for block in blocks)
+            self._grow(failed_size)
+        return results
+
+    async def _fetch_block(self, block, attempt=1):  # pylint: disable=invalid-overridden-method
+        """Fetch a single block, splitting it in halves if the server can't handle its size"""
+        try:
+            return list(await self.query(block))
+        except Exception as e:
+            if not is_block_too_large(e):
+                raise
+            self._failed(e, block, attempt)
+            half = (len(block) + 1) // 2
+            halves = await asyncio.gather(self._fetch_block(block[:half], attempt + 1),
+                                          self._fetch_block(block[half:], attempt + 1))
+            return halves[0] + halves[1]
+
+
+class PageFetcher:
+    """Fetch all pages of a list query concurrently, yielding objects in the order of the pages
+
+    `query` is called with offset and limit, and returns the objects of that page and the total number of objects.
+    After the first page, up to `workers` pages are fetched ahead of the consumer, so no more than that many
+    pages are held in memory at once, regardless of the size of the result.
+    """
+    def __init__(self, query, workers=1):
+        self.query = query
+        self.workers = max(1, workers)
+
+    def fetch(self, page_size):
+        """Yield objects of all pages"""
+        objects, count = self.query(0, page_size)
+        yield from objects
+        if len(objects) == 0 or len(objects) >= count:
+            return
+        # The server may cap the page size, following pages are planned with the size it returned
+        page_size = min(page_size, len(objects))
+        offsets = iter(range(len(objects), count, page_size))
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = deque(pool.submit(self.query, offset, page_size) for _, offset in zip(range(self.workers), offsets))
+            while len(pending) > 0:
+                objects, _ = pending.popleft().result()
+                offset = next(offsets, None)
+                if offset is not None:
+                    pending.append(pool.submit(self.query, offset, page_size))
+                yield from objects
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Adaptive concurrency governor for NetBox API requests
+
+The number of requests in flight is capped by a limit adjusted AIMD-style: it grows by one request per round
+of successful requests, and is halved when NetBox shows signs of overload: 429, 502, 503 or 504 responses,
+timeouts, or latency growing well beyond what the same endpoint usually takes. Overloaded requests that only
+read data are retried with jittered exponential backoff, and a Retry-After header pauses all new requests.
+Connections reset by NetBox after they were established are retried too. Failures to connect, including TLS
+errors, are not a sign of overload, and are raised right away.
+"""
+
+import email.utils
+import random
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError
+
+# HTTP status codes NetBox, or a proxy in front of it, responds with when it is overloaded
+OVERLOAD_STATUS_CODES = [429, 502, 503, 504]
+# POST requests that only read data from NetBox, and can be retried like GET requests
+READ_ONLY_POST_SUFFIXES = ('/render-config/', '/graphql/')
+# Share of the limit kept after an overload
+LIMIT_DECREASE_FACTOR = 0.5
+# Latency above this multiple of the usual latency of an endpoint is a sign of overload
+LATENCY_OVERLOAD_FACTOR = 4
+# Latency, in seconds, below which requests are never considered slow
+LATENCY_OVERLOAD_MIN = 1.0
+# Weight of the latest request in the usual latency of an endpoint
+LATENCY_EWMA_WEIGHT = 0.1
+# Longest wait before a retry, in seconds, including waits requested by Retry-After
+MAX_RETRY_DELAY = 60
+
+# Number of times an overloaded request is retried, and the base delay between the attempts, in seconds
+RetryPolicy = namedtuple('RetryPolicy', ['retries', 'backoff'])
+
+
+def retry_after_seconds(value):
+    """Return seconds to wait from a Retry-After header value, either delay-seconds or an HTTP date, or None"""
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def backoff_delay(attempt, backoff):
+    """Return a delay before the retry attempt, exponential in the number of attempts with full jitter"""
+    return random.uniform(0, min(MAX_RETRY_DELAY, backoff * 2 ** (attempt - 1)))
+
+
+def is_read_only(request):
+    """Check if a prepared request only reads data, and can be sent again"""
+    if request.method in ['GET', 'HEAD', 'OPTIONS']:
+        return True
+    return request.method == 'POST' and urlsplit(request.url).path.endswith(READ_ONLY_POST_SUFFIXES)
+
+
+def is_connection_reset(e):
+    """Check if a requests.ConnectionError is a connection dropped by the server after it was established"""
+    # requests wraps errors reading a response as they are, and failures to connect into MaxRetryError
+    return not isinstance(e, requests.exceptions.SSLError) and len(e.args) > 0 and isinstance(e.args[0], ProtocolError)
+
+
+class ConcurrencyGovernor:
+    """Limit on NetBox API requests in flight, shared by all threads of an export
+
+    Requests hold a slot between acquire(), or try_acquire() for callers that wait on their own, and release().
+    The limit starts at `max_limit`, the concurrency nrx is configured for, is halved on overload and grows back
+    by one request per round of successful requests. Overloads reported by requests that started before the last
+    decrease don't decrease it again, as they were caused by the same load. With `adaptive=False`, the limit
+    stays fixed and only retries apply.
+
+    `retries` and `backoff` are the number of times an overloaded request is retried, and the base delay
+    between the attempts, in seconds. They are kept in `retry`, a RetryPolicy.
+    """
+    def __init__(self, max_limit, adaptive=True, retries=4, backoff=1.0):
+        self.max_limit = max(1, max_limit)
+        self.adaptive = adaptive
+        self.retry = RetryPolicy(max(0, retries), backoff)
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        # Requests wait until this time.monotonic() value, as asked by Retry-After
+        self.paused_until = 0.0
+        self.decreased_at = 0.0
+        # Usual latency by endpoint path
+        self.latency = {}
+        self.stats = {'requests': 0, 'overloads': 0, 'retries': 0, 'min_limit': self.max_limit}
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        """Wait for a free slot and the end of a pause, return the start time of the request"""
+        with self.cond:
+            while True:
+                started, wait = self._try_acquire()
+                if started is not None:
+                    return started
+                self.cond.wait(wait)
+
+    def try_acquire(self):
+        """Take a free slot without waiting, return (start time, None), or (None, seconds to wait or None for a slot)"""
+        with self.cond:
+            return self._try_acquire()
+
+    def _try_acquire(self):
+        """try_acquire() with the condition held"""
+        wait = self.paused_until - time.monotonic()
+        if wait > 0:
+            return None, wait
+        if self.in_flight >= int(self.limit):
+            return None, None
+        self.in_flight += 1
+        self.stats['requests'] += 1
+        return time.monotonic(), None
+
+    def release(self, started, endpoint, overloaded=False):
+        """Free the slot of a request to endpoint started at started, and adjust the limit to its outcome"""
+        latency = time.monotonic() - started
+        with self.cond:
+            self.in_flight -= 1
+            if overloaded:
+                self.stats['overloads'] += 1
+            if overloaded or self._slow(endpoint, latency):
+                self._decrease(started)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.cond.notify_all()
+
+    def pause(self, seconds):
+        """Hold new requests for a number of seconds"""
+        with self.cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + min(seconds, MAX_RETRY_DELAY))
+            self.cond.notify_all()
+
+    def retried(self):
+        """Count a retry of an overloaded request"""
+        with self.cond:
+            self.stats['retries'] += 1
+
+    def _slow(self, endpoint, latency):
+        """Check if the latency is well beyond the usual latency of the endpoint, and update the usual one"""
+        usual = self.latency.get(endpoint)
+        if usual is None:
+            self.latency[endpoint] = latency
+            return False
+        slow = latency > LATENCY_OVERLOAD_MIN and latency > usual * LATENCY_OVERLOAD_FACTOR
+        if not slow:
+            self.latency[endpoint] = usual + (latency - usual) * LATENCY_EWMA_WEIGHT
+        return slow
+
+    def _decrease(self, started):
+        if not self.adaptive or started < self.decreased_at:
+            return
+        self.limit = max(1.0, self.limit * LIMIT_DECREASE_FACTOR)
+        self.decreased_at = time.monotonic()
+        self.stats['min_limit'] = min(self.stats['min_limit'], int(self.limit))
+
+
+class GovernedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that sends requests through a ConcurrencyGovernor, retrying overloaded read-only requests
+
+    Timeouts are reported to the governor and raised, so that block fetches can retry them with smaller blocks.
+    Other connection errors are raised, unless the server reset a connection while NetBox was handling the request.
+    """
+    def __init__(self, *args, governor=None, **kwargs):
+        self.governor = governor
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if self.governor is None:
+            return super().send(request, stream, timeout, verify, cert, proxies)
+        endpoint = urlsplit(request.url).path
+        attempt = 1
+        while True:
+            started = self.governor.acquire()
+            try:
+                response = super().send(request, stream, timeout, verify, cert, proxies)
+            except requests.Timeout:
+                self.governor.release(started, endpoint, overloaded=True)
+                raise
+            except requests.ConnectionError as e:
+                # A connection reset by the server under load
+                reset = is_connection_reset(e)
+                self.governor.release(started, endpoint, overloaded=reset)
+                if not reset or attempt > self.governor.retry.retries or not is_read_only(request):
+                    raise
+                delay = backoff_delay(attempt, self.governor.retry.backoff)
+            else:
+                overloaded = response.status_code in OVERLOAD_STATUS_CODES
+                self.governor.release(started, endpoint, overloaded)
+                if not overloaded or attempt > self.governor.retry.retries or not is_read_only(request):
+                    return response
+                delay = self._retry_delay(response, attempt)
+            self.governor.retried()
+            time.sleep(delay)
+            attempt += 1
+
+    def _retry_delay(self, response, attempt):
+        """Return the delay before retrying an overloaded response, pausing all requests if the server asked to"""
+        response.close()
+        delay = retry_after_seconds(response.headers.get('Retry-After'))
+        if delay is None:
+            return backoff_delay(attempt, self.governor.retry.backoff)
+        self.governor.pause(delay)
+        # Requests wait for the end of the pause in acquire()
+        return 0
+
+
+class TimeoutHTTPAdapter(GovernedHTTPAdapter):
+    """HTTPAdapter with custom API timeout"""
+    def __init__(self, timeout, *args, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if timeout is None:
+            timeout = self.timeout
+        return super().send(request, stream, timeout, verify, cert, proxies)
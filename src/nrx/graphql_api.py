@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+NetBox GraphQL API queries, used by the graphql API backend
+
+Devices are requested together with their interfaces, cables and link peers in one nested query,
+paginated by devices. Results are converted to the same shape as NetBox REST API objects, so the
+rest of the export pipeline can handle them as pynetbox records.
+"""
+
+import json
+
+# GraphQL selections of NetBox device fields nrx can request, by REST API field name. Other fields, like the URL
+# of the device, are not available in GraphQL API
+GRAPHQL_DEVICE_FIELDS = {
+    'id':                 "id",
+    'display':            "display",
+    'name':               "name",
+    'device_type':        "device_type { id display model slug manufacturer { id display name slug } }",
+    'role':               "role { id display name slug }",
+    'tenant':             "tenant { id display name slug }",
+    'platform':           "platform { id display name slug }",
+    'serial':             "serial",
+    'asset_tag':          "asset_tag",
+    'site':               "site { id display name slug }",
+    'location':           "location { id display name slug }",
+    'rack':               "rack { id display name }",
+    'position':           "position",
+    'face':               "face",
+    'latitude':           "latitude",
+    'longitude':          "longitude",
+    'status':             "status",
+    'airflow':            "airflow",
+    'primary_ip4':        "primary_ip4 { id display address }",
+    'primary_ip6':        "primary_ip6 { id display address }",
+    'oob_ip':             "oob_ip { id display address }",
+    'cluster':            "cluster { id display name }",
+    'virtual_chassis':    "virtual_chassis { id display name }",
+    'vc_position':        "vc_position",
+    'vc_priority':        "vc_priority",
+    'description':        "description",
+    'comments':           "comments",
+    'config_template':    "config_template { id display name }",
+    'local_context_data': "local_context_data",
+    'config_context':     "config_context",
+    'tags':               "tags { id display name slug }",
+    'custom_fields':      "custom_fields",
+    'created':            "created",
+    'last_updated':       "last_updated",
+}
+# Device fields nrx derives its own device attributes from, and matches device tags with, requested regardless of templates
+GRAPHQL_DEVICE_RECORD_FIELDS = ['id', 'display', 'name', 'site', 'platform', 'device_type', 'role',
+                                'primary_ip4', 'primary_ip6', 'tags', 'last_updated']
+
+# Interface fields needed to select exported interfaces and find the other end of their links
+GRAPHQL_INTERFACE_FIELDS = """
+    id
+    name
+    type
+    cable_end
+    tags { id name slug }
+    cable { id terminations { cable_end } }
+    link_peers { __typename ... on InterfaceType { id name device { id name } } }
+    connected_endpoints { __typename ... on InterfaceType { id name device { id name } } }
+"""
+
+# Fields with NetBox choice values, which GraphQL returns as enum names made of the field name and the value,
+# like STATUS_ACTIVE for active or TYPE_1000BASE_T for 1000base-t
+GRAPHQL_CHOICE_FIELDS = ['status', 'airflow', 'face', 'type']
+# Labels of NetBox choices by field and value, for choice fields of exported device data
+NB_CHOICE_LABELS = {
+    'status': {'offline': "Offline", 'active': "Active", 'planned': "Planned", 'staged': "Staged", 'failed': "Failed",
+               'inventory': "Inventory", 'decommissioning': "Decommissioning"},
+    'airflow': {'front-to-rear': "Front to rear", 'rear-to-front': "Rear to front", 'left-to-right': "Left to right",
+                'right-to-left': "Right to left", 'side-to-rear': "Side to rear", 'rear-to-side': "Rear to side",
+                'bottom-to-top': "Bottom to top", 'top-to-bottom': "Top to bottom", 'passive': "Passive",
+                'mixed': "Mixed"},
+    'face': {'front': "Front", 'rear': "Rear"},
+}
+# NetBox choice values with characters other than the hyphens enum names replace with underscores
+NB_CHOICE_DOTTED_VALUES = ['2.5gbase-t', '2.5gbase-x-sfp', '1.6tbase-cr8', '1.6tbase-dr8', '1.6tbase-dr8-2',
+                           'ieee802.11a', 'ieee802.11g', 'ieee802.11n', 'ieee802.11ac', 'ieee802.11ad',
+                           'ieee802.11ax', 'ieee802.11ay', 'ieee802.11be', 'ieee802.15.1', 'ieee802.15.4']
+
+
+class GraphQLError(Exception):
+    """NetBox GraphQL API returned errors"""
+
+
+def graphql_literal(value):
+    """Format a Python value as a GraphQL input literal"""
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{k}: {graphql_literal(v)}" for k, v in value.items()) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(graphql_literal(v) for v in value) + "]"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    return json.dumps(str(value))
+
+
+def graphql_devices_filter(nb_api_version_tuple, site_ids, roles, tags):
+    """Return GraphQL devices filter and the list of tags that still have to be matched by the client
+
+    NetBox 4.3 replaced filters generated from REST filtersets with typed lookups. The typed lookups
+    can't express AND logic for multiple tags of the same device, these are matched by the client.
+    """
+    filters = {}
+    if nb_api_version_tuple < (4, 3):
+        if len(site_ids) > 0:
+            filters['site_id'] = [str(s) for s in site_ids]
+        if len(roles) > 0:
+            filters['role'] = list(roles)
+        if len(tags) > 0:
+            filters['tag'] = list(tags)
+        return filters, []
+    if len(site_ids) > 0:
+        filters['site'] = {'id': {'in_list': [str(s) for s in site_ids]}}
+    if len(roles) > 0:
+        filters['role'] = {'slug': {'in_list': list(roles)}}
+    return filters, list(tags)
+
+
+def device_selection(fields):
+    """Return GraphQL selection of device fields, all the ones nrx can request if fields is None"""
+    if fields is None:
+        fields = GRAPHQL_DEVICE_FIELDS
+    selected = [f for f in GRAPHQL_DEVICE_FIELDS if f in fields or f in GRAPHQL_DEVICE_RECORD_FIELDS]
+    return " ".join(GRAPHQL_DEVICE_FIELDS[f] for f in selected)
+
+
+def devices_query(filters, offset, limit, device_fields=None):
+    """Return GraphQL query for a page of devices with their interfaces, and with device_fields like device_selection()"""
+    arguments = f"pagination: {graphql_literal({'offset': offset, 'limit': limit})}"
+    if len(filters) > 0:
+        arguments = f"filters: {graphql_literal(filters)}, {arguments}"
+    return (f"query {{ device_list({arguments}) {{ {device_selection(device_fields)} "
+            f"interfaces {{ {GRAPHQL_INTERFACE_FIELDS} }} }} }}")
+
+
+def choice_enum_name(field, value):
+    """Return GraphQL enum name of a NetBox choice value of a field, like STATUS_ACTIVE"""
+    return f"{field}_" + "".join(c if c.isalnum() else "_" for c in value).upper()
+
+
+def choice_value(field, name):
+    """Convert GraphQL enum name of a NetBox choice of a field, like TYPE_1000BASE_T, into its value, like 1000base-t"""
+    if not isinstance(name, str):
+        return name
+    for value in list(NB_CHOICE_LABELS.get(field, {})) + NB_CHOICE_DOTTED_VALUES:
+        if choice_enum_name(field.upper(), value) == name:
+            return value
+    prefix = f"{field.upper()}_"
+    return (name[len(prefix):] if name.startswith(prefix) else name).lower().replace("_", "-")
+
+
+def rest_choice(field, name):
+    """Return REST API value of a NetBox choice from its GraphQL enum name, labeled by its value if there is no label"""
+    value = choice_value(field, name)
+    return {'value': value, 'label': NB_CHOICE_LABELS.get(field, {}).get(value, value)}
+
+
+def rest_values(values):
+    """Convert GraphQL object values to the shape of REST API objects: integer IDs and choice fields as value dicts"""
+    if isinstance(values, list):
+        return [rest_values(v) for v in values]
+    if not isinstance(values, dict):
+        return values
+    converted = {}
+    for k, v in values.items():
+        if k == 'id' and isinstance(v, str) and v.isdigit():
+            converted[k] = int(v)
+        elif k in GRAPHQL_CHOICE_FIELDS and isinstance(v, str):
+            converted[k] = rest_choice(k, v)
+        elif k == '__typename':
+            continue
+        else:
+            converted[k] = rest_values(v)
+    return converted
+
+
+def rest_interface(interface, device):
+    """Return REST-like values of a GraphQL interface nested under device"""
+    values = rest_values({k: v for k, v in interface.items() if k not in ['link_peers', 'connected_endpoints']})
+    values['device'] = {'id': int(device['id']), 'name': device['name']}
+    return values
+
+
+def link_ends(interface, device):
+    """Return [a, b] REST-like values of interfaces linked over the cable of a GraphQL interface, or [] if there is no such link
+
+    Matches the logic of tracing cables with REST API: the cable must have exactly one termination on each end.
+    If the link peer is an interface, the ends follow the cable A and B sides. Otherwise, the link goes from
+    the interface to its connected endpoint through pass-through ports.
+    """
+    cable = interface.get('cable')
+    if cable is None:
+        return []
+    cable_ends = [t['cable_end'] for t in cable['terminations']]
+    if cable_ends.count('A') != 1 or cable_ends.count('B') != 1:
+        return []
+    this = {'id': int(interface['id']), 'name': interface['name'],
+            'device': {'id': int(device['id']), 'name': device['name']}}
+    peers = interface['link_peers']
+    if len(peers) == 1 and peers[0]['__typename'] == 'InterfaceType':
+        peer = rest_values(peers[0])
+        return [this, peer] if interface['cable_end'] == 'A' else [peer, this]
+    endpoints = interface['connected_endpoints']
+    if len(endpoints) == 1 and endpoints[0]['__typename'] == 'InterfaceType':
+        return [this, rest_values(endpoints[0])]
+    return []
+
+
+class GraphQLClient:
+    """NetBox GraphQL API client over a requests session"""
+    def __init__(self, http_session, api_url, token):
+        self.http_session = http_session
+        self.url = f"{api_url.rstrip('/')}/graphql/"
+        self.headers = {
+            'Authorization': f"Token {token}",
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+        }
+
+    def query(self, query):
+        """Run a GraphQL query and return its data"""
+        response = self.http_session.post(self.url, headers=self.headers, json={'query': query})
+        response.raise_for_status()
+        result = response.json()
+        if result.get('errors'):
+            raise GraphQLError("; ".join(e.get('message', str(e)) for e in result['errors']))
+        return result['data']
+
+    def devices(self, filters, page_size, device_fields=None):
+        """Yield devices with their interfaces, reading pages of page_size devices until a short page"""
+        page_size = max(1, page_size)
+        offset = 0
+        while True:
+            page = self.query(devices_query(filters, offset, page_size, device_fields))['device_list']
+            yield from page
+            if len(page) < page_size:
+                return
+            offset += page_size
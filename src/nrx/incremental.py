@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Incremental export: snapshots of exported graphs, and NetBox changes to apply to them
+
+A snapshot is a CYJS graph exported with the NetBox change log position it was built at, and the filters
+it was built with. Changes logged since then are mapped to the devices whose records or links have to be
+fetched again, the rest of the graph is taken from the snapshot.
+"""
+
+# Graph attribute with the snapshot metadata
+SNAPSHOT_KEY = 'nrx_snapshot'
+SNAPSHOT_VERSION = 1
+# Configuration keys that must match between a snapshot and the export that updates it
+SNAPSHOT_FILTER_KEYS = ['nb_api_url', 'export_sites', 'export_tags', 'export_device_roles', 'export_interface_tags',
+                        'export_configs', 'export_links', 'device_fields']
+
+# Changes of devices: their records are fetched again
+DEVICE_TYPES = ['dcim.device']
+# Changes of device components that form links: links of their devices are fetched again
+INTERFACE_TYPES = ['dcim.interface']
+# Changes of pass-through objects, which can alter cable paths of any interface: all links are fetched again
+PATH_TYPES = ['dcim.frontport', 'dcim.rearport', 'circuits.circuit', 'circuits.circuittermination']
+# Changes of objects referenced by device records, or used to select and render them: all devices are fetched again
+DEVICE_RECORD_TYPES = ['dcim.site', 'dcim.location', 'dcim.rack', 'dcim.platform', 'dcim.devicetype', 'dcim.manufacturer',
+                       'dcim.devicerole', 'dcim.virtualchassis', 'tenancy.tenant', 'extras.tag', 'extras.customfield',
+                       'extras.configcontext', 'extras.configtemplate']
+# Changes of objects that do not affect exported data
+IGNORED_TYPES = ['dcim.consoleport', 'dcim.consoleserverport', 'dcim.powerport', 'dcim.poweroutlet', 'dcim.powerfeed',
+                 'dcim.powerpanel', 'dcim.devicebay', 'dcim.modulebay', 'dcim.inventoryitem', 'extras.journalentry',
+                 'extras.savedfilter', 'extras.bookmark', 'ipam.prefix', 'ipam.vlan', 'ipam.vlangroup', 'ipam.vrf',
+                 'ipam.aggregate', 'ipam.iprange', 'ipam.asn', 'ipam.service']
+
+
+def snapshot_filters(config):
+    """Return configuration values a snapshot is built with"""
+    return {k: config.get(k) for k in SNAPSHOT_FILTER_KEYS}
+
+
+def change_type(change):
+    """Return object type and action of a NetBox object change"""
+    action = change.get('action')
+    if isinstance(action, dict):
+        action = action.get('value')
+    return change.get('changed_object_type'), action
+
+
+def change_data(change, key):
+    """Return a field of the object from a NetBox object change, from the data after the change if present"""
+    for data in [change.get('postchange_data'), change.get('prechange_data')]:
+        if isinstance(data, dict) and data.get(key) is not None:
+            return data[key]
+    return None
+
+
+class Snapshot:
+    """Devices, interfaces and links of a graph exported with a snapshot metadata"""
+    def __init__(self, graph):
+        self.metadata = graph.graph.get(SNAPSHOT_KEY)
+        self.devices = []
+        self.interfaces = []
+        # Interface NetBox ID to the NetBox ID of its device
+        self.interface_devices = {}
+        # Links in the order they were added to the graph, as (cable, a interface, b interface) NetBox IDs
+        self.links = []
+        if isinstance(self.metadata, dict):
+            self.links = [tuple(link) for link in self.metadata.get('links', [])]
+        for n, attrs in graph.nodes(data=True):
+            if attrs.get('type') == 'device':
+                self.devices.append(attrs['device'])
+            elif attrs.get('type') == 'interface':
+                self._add_interface(graph, n, attrs)
+        self.devices.sort(key=lambda d: d['device_index'])
+        self.interfaces.sort(key=lambda i: i['interface_index'])
+
+    def _add_interface(self, graph, n, attrs):
+        interface = attrs['interface']
+        self.interfaces.append(interface)
+        for peer in graph.adj[n]:
+            if graph.nodes[peer].get('type') == 'device':
+                self.interface_devices[interface['id']] = graph.nodes[peer]['device']['id']
+
+    def mismatch(self, filters):
+        """Return the reason the snapshot can't be updated for an export with filters, or None if it can"""
+        if not isinstance(self.metadata, dict):
+            return "the graph has no snapshot data"
+        if self.metadata.get('version') != SNAPSHOT_VERSION:
+            return f"unsupported snapshot version {self.metadata.get('version')}"
+        if self.metadata.get('filters') != filters:
+            return "the snapshot was exported with different filters"
+        return None
+
+    def cable_of(self, interface_id):
+        """Return NetBox ID of the cable connected to an interface at the time of the snapshot"""
+        return self.metadata['interface_cables'].get(str(interface_id))
+
+
+class ChangeSet:
+    """Devices affected by NetBox object changes logged after a snapshot"""
+    def __init__(self, snapshot, changes):
+        self.snapshot = snapshot
+        # Devices to fetch again, and devices whose links to fetch again, by NetBox IDs
+        self.devices = set()
+        self.link_devices = set()
+        self.all_devices = False
+        self.all_links = False
+        # Objects that are not in the snapshot, to look up their devices in NetBox
+        self.interfaces = set()
+        self.cables = set()
+        # Reason to fall back to a full export
+        self.full_reason = None
+        self.cable_interfaces = {}
+        for interface_id, cable_id in snapshot.metadata['interface_cables'].items():
+            self.cable_interfaces.setdefault(cable_id, []).append(int(interface_id))
+        # A link through patch panels changes at both ends when the cable at one of its ends changes
+        for cable_id, a_interface_id, b_interface_id in snapshot.links:
+            self.cable_interfaces.setdefault(cable_id, []).extend([a_interface_id, b_interface_id])
+        primary_ips = {}
+        for d in snapshot.devices:
+            for key in ['primary_ip4', 'primary_ip6']:
+                if d.get(key):
+                    primary_ips[d[key]] = d['id']
+        for change in changes:
+            self._add_change(change, primary_ips)
+
+    def _add_change(self, change, primary_ips):
+        object_type, action = change_type(change)
+        object_id = change.get('changed_object_id')
+        if object_type in DEVICE_TYPES:
+            # Links of devices that join the export are fetched once the new set of devices is known
+            self.devices.add(object_id)
+        elif object_type in INTERFACE_TYPES:
+            self._add_interface_change(change)
+        elif object_type == 'dcim.cabletermination':
+            self._add_termination_change(change)
+        elif object_type == 'dcim.cable':
+            self._add_cable_change(object_id, action)
+        elif object_type in PATH_TYPES:
+            self.all_links = True
+        elif object_type in DEVICE_RECORD_TYPES:
+            self.all_devices = True
+        elif object_type == 'ipam.ipaddress':
+            # Addresses that are primary IPs of exported devices, new primary IPs are logged as device changes
+            for data in [change.get('prechange_data'), change.get('postchange_data')]:
+                if isinstance(data, dict) and data.get('address') in primary_ips:
+                    self.devices.add(primary_ips[data['address']])
+        elif object_type not in IGNORED_TYPES:
+            self.full_reason = f"changes of {object_type} objects can't be applied incrementally"
+
+    def _add_cable_change(self, cable_id, action):
+        if cable_id in self.cable_interfaces:
+            for interface_id in self.cable_interfaces[cable_id]:
+                self.add_link_interface(interface_id)
+        elif action != 'delete':
+            self.cables.add(cable_id)
+
+    def _add_interface_change(self, change):
+        device_id = None
+        if change.get('related_object_type') == 'dcim.device':
+            device_id = change.get('related_object_id')
+        if device_id is None:
+            device_id = change_data(change, 'device')
+        if device_id is not None:
+            self.link_devices.add(device_id)
+        else:
+            self.add_link_interface(change.get('changed_object_id'))
+
+    def _add_termination_change(self, change):
+        # NetBox logs cable terminations with the terminated object as the related object
+        related_type = change.get('related_object_type')
+        if related_type in INTERFACE_TYPES:
+            self.add_link_interface(change.get('related_object_id'))
+        elif related_type in PATH_TYPES or related_type is None:
+            self.all_links = True
+
+    def add_link_interface(self, interface_id):
+        """Fetch links of the device an interface belongs to, or look up the device if the interface is not in the snapshot"""
+        device_id = self.snapshot.interface_devices.get(interface_id)
+        if device_id is not None:
+            self.link_devices.add(device_id)
+        elif interface_id is not None:
+            self.interfaces.add(interface_id)
+
+    def add_termination(self, object_type, device_id):
+        """Apply a termination of a cable that is not in the snapshot"""
+        if object_type in INTERFACE_TYPES and device_id is not None:
+            self.link_devices.add(device_id)
+        elif object_type in PATH_TYPES:
+            self.all_links = True
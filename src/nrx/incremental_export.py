@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Incremental export: the graph is built from a snapshot of a previous export, patched with NetBox changes
+"""
+
+import os
+
+import networkx as nx
+import pynetbox
+import requests
+
+from nrx.cyjs import CYJSError, read_cyjs_file
+from nrx.fetch import BlockFetchError
+from nrx.incremental import Snapshot, ChangeSet, SNAPSHOT_KEY, SNAPSHOT_VERSION, snapshot_filters
+from nrx.log import debug, error, warning
+
+
+class IncrementalExportMixin:
+    """NBFactory methods to update a snapshot graph with NetBox changes logged after it"""
+    def _load_snapshot(self):
+        """Load the snapshot graph to update incrementally, or return None if there is none"""
+        path = self.config['incremental_snapshot']
+        if not os.path.exists(path):
+            print(f"Snapshot {path} does not exist yet, exporting all data")
+            return None
+        try:
+            return Snapshot(read_cyjs_file(path, self.config.get('cyjs_stream', False)))
+        except (OSError, CYJSError, ValueError, KeyError, TypeError, nx.NetworkXError) as e:
+            warning(f"Can't read snapshot {path}, exporting all data:", e)
+        return None
+
+    def _incremental_change_set(self, snapshot):
+        """Return (ChangeSet, None) with NetBox changes logged after the snapshot, or (None, reason) if it can't be updated"""
+        reason = snapshot.mismatch(snapshot_filters(self.config))
+        if reason is not None:
+            return None, reason
+        if self.nb_change is None:
+            return None, "NetBox change log is not available"
+        changes = self._read_change_log("since", snapshot.metadata['change'])
+        if changes is None:
+            return None, "NetBox change log is not available"
+        debug(f"NetBox changes since the snapshot: {len(changes)}")
+        change_set = ChangeSet(snapshot, changes)
+        if change_set.full_reason is not None:
+            return None, change_set.full_reason
+        return change_set, None
+
+    def _get_nb_network_incremental(self):
+        """Build the network graph from a snapshot and NetBox changes logged after it, return False if that's not possible"""
+        with self._phase("snapshot"):
+            snapshot = self._load_snapshot()
+        if snapshot is None:
+            return False
+        change_set, reason = self._incremental_change_set(snapshot)
+        if change_set is None:
+            print(f"Can't update snapshot {self.config['incremental_snapshot']} incrementally, exporting all data: {reason}")
+            return False
+        try:
+            with self._phase("changes"):
+                self._resolve_change_set(change_set)
+            with self._phase("devices") as phase:
+                refreshed = self._patch_nb_devices(snapshot, change_set)
+                phase.count("devices", len(refreshed))
+            print(f"Updated {len(refreshed)} of {len(self.nb_net.devices)} devices from NetBox")
+            self._export_nb_device_configs(refreshed)
+            if self.config['export_links']:
+                with self._phase("links"):
+                    self._patch_nb_links(snapshot, change_set)
+            self._add_disconnected_devices_to_graph()
+        except BlockFetchError as e:
+            error("NetBox API failure, max attempts reached:", e)
+        except (requests.Timeout, requests.exceptions.HTTPError,
+                pynetbox.core.query.RequestError, pynetbox.core.query.ContentError) as e:
+            error("NetBox API failure", e)
+        return True
+
+    def _resolve_change_set(self, change_set):
+        """Look up devices of changed cables and interfaces that are not in the snapshot"""
+        if len(change_set.cables) > 0:
+            fetcher = self._block_fetcher("cables", self._query_cables, "id")
+            for cable in fetcher.fetch(sorted(change_set.cables), self._block_size("cables")):
+                for term in list(cable.a_terminations) + list(cable.b_terminations):
+                    object_type, _, obj = self._termination(term)
+                    device = getattr(obj, 'device', None)
+                    change_set.add_termination(object_type, device.id if device is not None else None)
+        if len(change_set.interfaces) > 0:
+            # Blocks of interface IDs are sized apart from blocks of devices to get interfaces of
+            fetcher = self._block_fetcher("interfaces", self._query_interfaces_by_id, "id")
+            for interface in fetcher.fetch(sorted(change_set.interfaces), self._block_size("interface_ids")):
+                change_set.link_devices.add(interface.device.id)
+            self._learn_block_size("interface_ids", fetcher)
+
+    def _query_interfaces_by_id(self, interfaces_block):
+        """Query a block of interface IDs"""
+        return self.nb_blocks_session.dcim.interfaces.filter(id=interfaces_block)
+
+    def _query_devices_by_id(self, devices_block):
+        """Query a block of device IDs, with the export filter"""
+        return self.nb_blocks_session.dcim.devices.filter(id=devices_block, **self._devices_filter())
+
+    def _patch_nb_devices(self, snapshot, change_set):
+        """Add devices from the snapshot and NetBox, return records of the devices fetched from NetBox"""
+        if change_set.all_devices:
+            self._get_nb_devices()
+            refreshed = list(self.nb_net.devices)
+        else:
+            fetched = {}
+            if len(change_set.devices) > 0:
+                fetcher = self._block_fetcher("devices", self._query_devices_by_id, "id", self._devices_filter())
+                fetched = {device.id: device for device in fetcher.fetch(sorted(change_set.devices),
+                                                                       self._block_size("devices"))}
+                self._learn_block_size("devices", fetcher)
+            refreshed = []
+            # Devices keep their order from the snapshot, devices that joined the export are added after them
+            for d in snapshot.devices:
+                if d['id'] not in change_set.devices:
+                    self.nb_net.add_device(d['id'], d)
+                elif d['id'] in fetched:
+                    refreshed.append(self._add_nb_device(fetched.pop(d['id'])))
+            for device in fetched.values():
+                refreshed.append(self._add_nb_device(device))
+            self.nb_net.site_ids.update(snapshot.metadata['site_ids'])
+        # Links of devices that joined the export have to be fetched
+        change_set.link_devices.update(set(self.nb_net.device_ids) - {d['id'] for d in snapshot.devices})
+        return refreshed
+
+    def _patch_nb_links(self, snapshot, change_set):
+        """Add links from the snapshot between devices with no changes, and fetch links of the other devices"""
+        relink = set(self.nb_net.device_ids) if change_set.all_links else change_set.link_devices
+        kept = set()
+        for i in snapshot.interfaces:
+            device_id = snapshot.interface_devices.get(i['id'])
+            if device_id in self.nb_net.devices_by_id and device_id not in relink:
+                self.nb_net.add_interface(i['id'], snapshot.cable_of(i['id']), i)
+                kept.add(i['id'])
+        # Links as (cable ID, a device ID, a interface ID, b device ID, b interface ID)
+        links = [(c, snapshot.interface_devices[a], a, snapshot.interface_devices[b], b)
+                 for c, a, b in snapshot.links if a in kept and b in kept]
+        kept_count = len(self.nb_net.interfaces)
+        device_ids = [d for d in self.nb_net.device_ids if d in relink]
+        debug(f"Fetching links of {len(device_ids)} devices, keeping {len(links)} links from the snapshot")
+        if len(device_ids) > 0:
+            self._get_nb_interfaces(device_ids)
+            cable_ids = {i.cable_id for i in self.nb_net.interfaces[kept_count:]}
+            for cable in self._fetch_nb_cables(sorted(cable_ids)):
+                if isinstance(cable, tuple):
+                    links.append(cable)
+                    continue
+                edge = self._trace_cable(cable)
+                if len(edge) == 2:
+                    links.append((cable.id, edge[0].device.id, edge[0].id, edge[1].device.id, edge[1].id))
+        # Links are added in the order of cables, the same way a full export adds them
+        for link in sorted(links, key=lambda l: l[0]):
+            self._add_link_to_graph(*link)
+
+    def _record_snapshot(self):
+        """Store NetBox change log position and filters of the export in the graph, to update it incrementally later"""
+        if self.nb_change is None:
+            warning("NetBox change log is not available, the exported graph can't be updated incrementally")
+            return
+        interface_ids = {self.G.nodes[n]['interface']['id'] for n in self.G.nodes if self.G.nodes[n]['type'] == 'interface'}
+        self.G.graph[SNAPSHOT_KEY] = {
+            'version': SNAPSHOT_VERSION,
+            'change': self.nb_change,
+            'filters': snapshot_filters(self.config),
+            'site_ids': sorted(self.nb_net.site_ids),
+            'interface_cables': {str(i.id): i.cable_id for i in self.nb_net.interfaces if i.id in interface_ids},
+            'links': self.nb_net.links,
+        }
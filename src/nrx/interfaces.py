@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Interfaces of exported devices from NetBox REST API
+"""
+
+from urllib.parse import urlencode
+
+import pynetbox
+from packaging import version
+
+from nrx.fetch import response_status_code, BLOCK_TOO_LARGE_STATUS_CODES
+from nrx.log import debug, warning
+from nrx.records import InterfaceRecord
+
+# Filter for interfaces that can form links between exported devices
+NB_INTERFACES_FILTER = {'kind': 'physical', 'cabled': True, 'connected': True}
+# Physical interface types that can't form Ethernet links, left out by NetBox. nrx exports interfaces of *base* types
+# only, so types missing from the list, like ones added by later NetBox versions, are still left out by nrx
+NB_NON_ETHERNET_INTERFACE_TYPES = ['other', 'gsm', 'cdma', 'lte', 't1', 'e1', 't3', 'e3',
+                                   'sonet-oc3', 'sonet-oc12', 'sonet-oc48', 'sonet-oc192', 'sonet-oc768',
+                                   'sonet-oc1920', 'sonet-oc3840', '1gfc-sfp', '2gfc-sfp', '4gfc-sfp', '8gfc-sfpp',
+                                   '16gfc-sfpp', '32gfc-sfp28', '128gfc-qsfp28', 'infiniband-sdr', 'infiniband-ddr',
+                                   'infiniband-qdr', 'infiniband-fdr10', 'infiniband-fdr', 'infiniband-edr',
+                                   'cisco-stackwise', 'cisco-stackwise-plus', 'cisco-flexstack', 'cisco-flexstack-plus',
+                                   'juniper-vcp', 'extreme-summitstack', 'extreme-summitstack-128',
+                                   'extreme-summitstack-256', 'extreme-summitstack-512']
+
+
+class InterfacesMixin:
+    """NBFactory methods to get interfaces of exported devices from NetBox"""
+    def _interfaces_filters(self):
+        """Return NetBox API filters for interfaces to export, the results of their queries are merged
+
+        NetBox leaves out interfaces of non-Ethernet types and, with export_interface_tags, interfaces without
+        any of the tags. As NetBox matches all tags of a query, each tag is queried separately. Types and tags
+        of the interfaces are checked by nrx as well, which filters them alone without server_interface_filters.
+        The filters are decided once, before blocks of devices are queried with them.
+        """
+        if not self.api_params['server_interface_filters']:
+            return [NB_INTERFACES_FILTER]
+        tags = None
+        if len(self.config.get('export_interface_tags', [])) > 0:
+            # Interfaces are filtered by tag slugs, while export_interface_tags are tag names
+            tags = list(self.nb_session.extras.tags.filter(name=self.config['export_interface_tags']))
+            if len(tags) == 0:
+                return []
+        interfaces_filter = dict(NB_INTERFACES_FILTER)
+        types_filter = {'type__n': NB_NON_ETHERNET_INTERFACE_TYPES}
+        # Short URLs leave more room for device IDs than the types filter saves
+        if len(urlencode(types_filter, doseq=True)) <= self.api_params['url_max_length'] // 4 and \
+           self._accepts_interfaces_filter(interfaces_filter | types_filter):
+            interfaces_filter |= types_filter
+        if tags is None:
+            return [interfaces_filter]
+        return [interfaces_filter | {'tag': tag.slug} for tag in tags]
+
+    def _accepts_interfaces_filter(self, interfaces_filter):
+        """Check if NetBox accepts a filter of interfaces, with a query of their count
+
+        NetBox versions that don't know some of the interface types reject the types filter with 400 Bad Request,
+        and servers with URL limits shorter than url_max_length may not fit it into a URL even without device IDs.
+        """
+        try:
+            self.nb_session.dcim.interfaces.count(**interfaces_filter)
+        except pynetbox.core.query.RequestError as e:
+            if response_status_code(e) not in [400] + BLOCK_TOO_LARGE_STATUS_CODES:
+                raise
+            warning("NetBox API rejected interface types filter, interfaces will be filtered by nrx:", e)
+            return False
+        return True
+
+    def _interfaces_order_filter(self, filters):
+        """Return NetBox API filter to list IDs of all the interfaces matching any of the filters, in NetBox order"""
+        return {k: v for k, v in filters[0].items() if k != 'tag'} | self._id_fields()
+
+    def _id_fields(self):
+        """Return NetBox API filter to list objects with their IDs only"""
+        return {'fields': 'id'} if self.nb_api_version >= version.parse("4.0") else {'brief': 1}
+
+    def _query_interfaces(self, device_block, filters):
+        """Query interfaces matching the filters for a block of device IDs, return nrx records of the exported ones
+
+        Interfaces are read page by page, and each one is converted to its record as soon as it is read. Results
+        of several filters are merged in the order NetBox lists the interfaces.
+        """
+        return (record for _, record in self._query_device_interfaces(device_block, filters))
+
+    def _query_device_interfaces(self, device_block, filters):
+        """Query interfaces like _query_interfaces, yield (device ID, nrx record) pairs of the exported ones"""
+        if len(filters) == 1:
+            interfaces = self._filter_interfaces(device_block, filters[0])
+        else:
+            interfaces = self._merge_interfaces(device_block, filters)
+        for interface in interfaces:
+            record = self._nb_interface_record(interface)
+            if record is not None:
+                yield interface.device.id, record
+
+    def _filter_interfaces(self, device_block, interfaces_filter):
+        """Return interfaces of a block of device IDs matching the filter"""
+        return self.nb_blocks_session.dcim.interfaces.filter(device_id=device_block, limit=self.api_params['page_size'],
+                                                             **interfaces_filter)
+
+    def _merge_interfaces(self, device_block, filters):
+        """Return interfaces of a block of device IDs matching any of the filters, in the order NetBox lists them"""
+        interfaces = {}
+        for interfaces_filter in filters:
+            for interface in self._filter_interfaces(device_block, interfaces_filter):
+                interfaces[interface.id] = interface
+        if len(interfaces) == 0:
+            return []
+        order = self._filter_interfaces(device_block, self._interfaces_order_filter(filters))
+        return [interfaces[i.id] for i in order if i.id in interfaces]
+
+    def _get_nb_interfaces(self, device_ids=None):
+        """Get interfaces from NetBox filtered by devices we already have in the network topology, or by device_ids"""
+        if device_ids is None:
+            device_ids = self.nb_net.device_ids
+        size = len(device_ids)
+        block_size = self._block_size("interfaces")
+        debug(f"Exporting interfaces from with {size} devices, in blocks of up to {block_size}")
+        filters = self._interfaces_filters()
+        fetcher = self._block_fetcher("interfaces", lambda block: self._query_interfaces(block, filters), "device_id",
+                                      max(filters, key=lambda f: len(urlencode(f, doseq=True)), default=None))
+        for record in fetcher.fetch(device_ids, block_size):
+            self.nb_net.add_interface(*record)
+        self._learn_block_size("interfaces", fetcher)
+
+    def _add_nb_interface(self, interface):
+        record = self._nb_interface_record(interface)
+        if record is not None:
+            self.nb_net.add_interface(*record)
+
+    def _nb_interface_record(self, interface):
+        """Return (interface ID, cable ID, InterfaceRecord) for a pynetbox interface, or None if it is not exported"""
+        if "base" in interface.type.value: # only ethernet interfaces
+            if len(self.config['export_interface_tags']) > 0:
+                tag_match = False
+            for tag in interface.tags:
+                if tag.name in self.config['export_interface_tags']: # implementing OR tag matching logic
+                    tag_match = True
+                    break
+            if len(self.config['export_interface_tags']) > 0 and not tag_match:
+                debug(f"{interface.device} : {interface} skipping, doesn't have any of the required tags")
+                return None
+            debug(f"{interface.device} : {interface} adding as {interface.type.value}")
+            return interface.id, interface.cable.id, InterfaceRecord(interface.id, interface.name)
+        return None
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Messages of nrx on STDERR
+"""
+
+import sys
+
+# Debug messages are printed with --debug
+DEBUG_ON = False
+
+
+def errlog(*args, **kwargs):
+    """print message on STDERR"""
+    print(*args, file=sys.stderr, **kwargs)
+
+def error(*args, **kwargs):
+    """log as error and exit"""
+    errlog("Error:", *args, **kwargs)
+    sys.exit(1)
+
+def warning(*args, **kwargs):
+    """log as warning"""
+    errlog("Warning:", *args, **kwargs)
+
+def debug(*args, **kwargs):
+    """log as debug"""
+    if DEBUG_ON:
+        errlog("Debug:", *args, **kwargs)
+
+def error_debug(err, d):
+    if not DEBUG_ON:
+        err += " Use --debug to see the full error message."
+    debug(d)
+    error(err)
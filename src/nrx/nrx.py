@@ -31,37 +31,84 @@ import os
 import sys
 import argparse
 from argparse import RawDescriptionHelpFormatter
-import json
 import math
-import ast
 import textwrap
 import zipfile
+from urllib.parse import urlencode
 # Third-party library imports
 import toml
 import pynetbox
 import requests
-from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException, Timeout, HTTPError
 import urllib3
 import networkx as nx
 import jinja2
+import jinja2.meta
 import yaml
 from packaging import version
 
 # Single source version
 from nrx.__about__ import __version__
+from nrx.fetch import BlockFetcher, BlockFetchError, URLBudget
+from nrx.records import NBNetwork
+from nrx.stats import ExportStats, STATS_CONFIG_KEY, export_phase, http_connection_stats
+from nrx.cache import HTTP_CACHE_CONFIG_KEY
+from nrx.cassette import CASSETTE_CONFIG_KEY, use_cassette
+from nrx.serialization import loads_json, load_yaml, dump_yaml
+from nrx.cyjs import CYJSError, CYJS_COMPRESSIONS, cyjs_file_name, open_cyjs, read_cyjs_file, write_cyjs
+from nrx.topology_snapshot import TopologySnapshot, TopologySnapshotError, SNAPSHOT_FILE_EXTENSION
+from nrx.configs import CONFIG_CACHE_CONFIG_KEY, CONFIG_CACHE_NAME
+from nrx import log
+from nrx.log import error, warning, debug, error_debug
+from nrx.session import SessionMixin
+from nrx.devices import DevicesMixin
+from nrx.sites import SitesMixin
+from nrx.interfaces import InterfacesMixin
+from nrx.cables import CablesMixin
+from nrx.incremental_export import IncrementalExportMixin
+from nrx.backends import APIBackendsMixin
 
 # DEFINE GLOBAL VARs HERE
 
-DEBUG_ON = False
 NRX_CONFIG_DIR = ".nr"
 NRX_DEFAULT_CONFIG_NAME = "nrx.conf"
 NRX_VERSIONS_NAME = "versions.yaml"
 NRX_FORMATS_NAME = "formats.yaml"
 NRX_MAP_NAME = "platform_map.yaml"
+NRX_API_STATE_NAME = "api_state.yaml"
+NRX_API_CACHE_NAME = "cache"
 NRX_REPOSITORY = "https://github.com/netreplica/nrx"
 NRX_TEMPLATES_REPOSITORY = "https://github.com/netreplica/templates"
 NRX_REPOSITORY_TIMEOUT = 10
+# Output formats that do not use device configurations, unless the formats map tells otherwise with startup_config_mode
+NRX_FORMATS_WITHOUT_CONFIGS = ['graphite', 'd2']
+# Supported NetBox API client backends
+NRX_API_BACKENDS = ['sync', 'asyncio', 'graphql']
+# Default NetBox API bulk queries optimization parameters
+NB_API_PARAMS_DEFAULTS = {
+    'interfaces_block_size':    4,
+    'cables_block_size':        64,
+    'devices_block_size':       64,
+    'interface_ids_block_size': 64,
+    'configs_workers':          8,
+    'blocks_workers':           4,
+    'graphql_page_size':        50,
+    'url_max_length':           4000,
+    'adaptive_blocks':          True,
+    'local_cable_tracing':      True,
+    'pool_connections':         1,
+    'pool_maxsize':             0,
+    'page_size':                250,
+    'adaptive_concurrency':     True,
+    'overload_retries':         4,
+    'retry_backoff':            1.0,
+    'server_interface_filters': True,
+    'site_workers':             4,
+}
+# Value of EXPORT_DEVICE_FIELDS to export all device fields
+NRX_ALL_DEVICE_FIELDS = '*'
+# URL bytes reserved for limit and offset parameters added by pagination
+NB_PAGINATION_PARAMS_LENGTH = 32
 
 
 def nrx_config_dir():
@@ -72,29 +119,9 @@ def nrx_default_config_path():
     """Return path to the default nrx configuration file"""
     return f"{nrx_config_dir()}/{NRX_DEFAULT_CONFIG_NAME}"
 
-def errlog(*args, **kwargs):
-    """print message on STDERR"""
-    print(*args, file=sys.stderr, **kwargs)
-
-def error(*args, **kwargs):
-    """log as error and exit"""
-    errlog("Error:", *args, **kwargs)
-    sys.exit(1)
-
-def warning(*args, **kwargs):
-    """log as warning"""
-    errlog("Warning:", *args, **kwargs)
-
-def debug(*args, **kwargs):
-    """log as debug"""
-    if DEBUG_ON:
-        errlog("Debug:", *args, **kwargs)
-
-def error_debug(err, d):
-    if not DEBUG_ON:
-        err += " Use --debug to see the full error message."
-    debug(d)
-    error(err)
+def nrx_api_state_path():
+    """Return path to the file with NetBox API parameters learned by previous runs"""
+    return f"{nrx_config_dir()}/{NRX_API_STATE_NAME}"
 
 def create_output_directory(topology_name, config_dir):
     dir_name = "."
@@ -160,13 +187,38 @@ def unzip_file(zip_path, dir_path, log_context="[UNZIP]"):
     except (zipfile.BadZipFile, FileNotFoundError, Exception) as e:
         error(f"{log_context} Can't unzip {zip_path}: {e}")
 
+def format_uses_configs(config):
+    """Check if the selected output format consumes device configurations"""
+    if config['output_format'] in ['cyjs', 'gml', 'snapshot']:
+        # Graph exports keep configurations for later conversion
+        return True
+    format_params = config.get('format')
+    if format_params is not None and 'startup_config_mode' in format_params:
+        return format_params['startup_config_mode'] not in [None, '', 'none']
+    return config['output_format'] not in NRX_FORMATS_WITHOUT_CONFIGS
+
+def export_device_fields(config, topo):
+    """Return sorted names of NetBox device fields to export, or None to export all of them"""
+    if len(config['export_device_fields']) > 0:
+        if NRX_ALL_DEVICE_FIELDS in config['export_device_fields']:
+            return None
+        return sorted(set(config['export_device_fields']))
+    if config['output_format'] in ['cyjs', 'gml', 'snapshot']:
+        # Graph exports keep all device data for later conversion
+        return None
+    fields = topo.template_device_fields()
+    if fields is None:
+        debug("[TEMPLATE] Device fields used by templates can't be determined, exporting all of them")
+        return None
+    return sorted(fields)
+
 def load_yaml_from_file(file, log_context="[LOAD_YAML]"):
     """Load YAML from a file"""
     yaml_data = None
     try:
         with open(file, 'r', encoding='utf-8') as f:
             try:
-                yaml_data = yaml.safe_load(f)
+                yaml_data = load_yaml(f)
             except yaml.YAMLError as e:
                 warning(f"{log_context} Can't parse {file}: {e}")
             f.close()
@@ -174,42 +226,49 @@ def load_yaml_from_file(file, log_context="[LOAD_YAML]"):
         debug(f"{log_context} Can't read {file}: {e}")
     return yaml_data
 
-class TimeoutHTTPAdapter(HTTPAdapter):
-    """HTTPAdapter with custom API timeout"""
-    def __init__(self, timeout, *args, **kwargs):
-        self.timeout = timeout
-        super().__init__(*args, **kwargs)
-
-    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
-        if timeout is None:
-            timeout = self.timeout
-        return super().send(request, stream, timeout, verify, cert, proxies)
-
-class NBNetwork:
-    """Class to hold network topology data exported from NetBox"""
-    def __init__(self):
-        self.config = {}
-        self.nodes = []
-        self.devices = []
-        self.cable_ids = []
-        self.interfaces = []
-        self.device_ids = []
-        self.interface_ids = []
-
-
-class NBFactory:
-    """Class to export network topology data from NetBox"""
+def load_api_state(api_url):
+    """Load NetBox API parameters learned by previous runs against api_url"""
+    state = load_yaml_from_file(nrx_api_state_path(), "[API_STATE]")
+    if isinstance(state, dict) and isinstance(state.get(api_url), dict):
+        return state[api_url]
+    return {}
+
+def save_api_state(api_url, params):
+    """Save NetBox API parameters learned during this run, if the configuration directory exists"""
+    if not os.path.isdir(nrx_config_dir()):
+        return
+    path = nrx_api_state_path()
+    state = load_yaml_from_file(path, "[API_STATE]")
+    if not isinstance(state, dict):
+        state = {}
+    state[api_url] = params
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            dump_yaml(state, f)
+    except OSError as e:
+        debug(f"[API_STATE] Can't write {path}: {e}")
+
+
+class NBFactory(SessionMixin, DevicesMixin, SitesMixin, InterfacesMixin, CablesMixin, IncrementalExportMixin,
+                APIBackendsMixin):
+    """Class to export network topology data from NetBox
+
+    Methods to get devices, interfaces and cables, of the per-site pipelines, of the incremental export and of the
+    asyncio and GraphQL API backends come from mixins, in modules of their own.
+    """
     def __init__(self, config):
         self.config = config
         self.nb_net = NBNetwork()
+        self.api_params = NB_API_PARAMS_DEFAULTS | config['nb_api_params']
+        # Block sizes learned by previous runs replace the configured ones as starting points, except in record and replay
+        self.learned_params = {}
+        if self.api_params['adaptive_blocks'] and config.get(CASSETTE_CONFIG_KEY) is None:
+            self.learned_params = load_api_state(config['nb_api_url'])
         # Determine the name of the topology if not provided in the configuration
-        if len(config['topology_name']) > 0:
-            self.topology_name = config['topology_name']
-        elif len(config['export_sites']) > 0:
-            self.topology_name = "-".join(config['export_sites'])
-        elif len(config['export_tags']) > 0:
-            self.topology_name = "-".join(config['export_tags'])
-        self.G = nx.Graph(name=self.topology_name)
+        topology_name = config['topology_name']
+        if len(topology_name) == 0:
+            topology_name = "-".join(config['export_sites'] or config['export_tags'])
+        self.G = nx.Graph(name=topology_name)
         self.nb_session = pynetbox.api(self.config['nb_api_url'],
                                        token=self.config['nb_api_token'],
                                        threading=True)
@@ -217,16 +276,28 @@ class NBFactory:
         if not config['tls_validate']:
             self.nb_session.http_session.verify = False
             urllib3.disable_warnings()
-        if config['api_timeout'] > 0:
-            adapter = TimeoutHTTPAdapter(config['api_timeout'])
-            self.nb_session.http_session.mount("http://", adapter)
-            self.nb_session.http_session.mount("https://", adapter)
+        self._mount_http_adapter()
+        # Blocks of interfaces and cables are fetched concurrently by BlockFetcher, so pages within each block
+        # are read sequentially, in order, through the same HTTP session
+        self.nb_blocks_session = pynetbox.api(self.config['nb_api_url'],
+                                              token=self.config['nb_api_token'],
+                                              threading=False)
+        self.nb_blocks_session.http_session = self.nb_session.http_session
         print(f"Connecting to NetBox at: {config['nb_api_url']}")
-        self.nb_api_version = version.parse(self.nb_session.version)
+        # The latest NetBox object change, read before any other data, marks the state of data this export is built from
+        self.nb_change = None
+        with self._phase("connect"):
+            if self.http_cache is not None or config.get('incremental_snapshot'):
+                self.nb_change = self._read_change_log("latest")
+                self._update_cache_epochs(self.nb_change)
+            self.nb_api_version = version.parse(self.nb_session.version)
         if len(config['export_sites']) > 0:
             debug(f"Fetching sites: {config['export_sites']}")
             try:
-                self.nb_sites = self.nb_session.dcim.sites.filter(name=config['export_sites'])
+                with self._phase("sites") as phase:
+                    # A RecordSet is read once, while the sites are listed in every device query
+                    self.nb_sites = list(self.nb_session.dcim.sites.filter(name=config['export_sites']))
+                    phase.count("sites", len(self.nb_sites))
             except (pynetbox.core.query.RequestError, pynetbox.core.query.ContentError) as e:
                 error("NetBox API failure at get site:", e)
             if self.nb_sites is None or len(self.nb_sites) == 0:
@@ -236,295 +307,155 @@ class NBFactory:
         else:
             print(f"Fetching devices with tags: {','.join(config['export_tags'])}")
 
-        try:
-            self._get_nb_devices()
-            if self.config['export_links']:
-                self._get_nb_objects("interfaces", self.config['nb_api_params']['interfaces_block_size'])
-                self._get_nb_objects("cables", self.config['nb_api_params']['cables_block_size'])
-            self._add_disconnected_devices_to_graph()
-        except (pynetbox.core.query.RequestError, pynetbox.core.query.ContentError) as e:
-            error("NetBox API failure", e)
+        self._get_nb_network()
 
 
     def graph(self):
         return self.G
 
 
-    def _get_nb_objects(self, kind, block_size):
-        attempts, max_attempts = 0, 3
-        while attempts < max_attempts:
-            try:
-                if kind == "interfaces":
-                    self._get_nb_interfaces(block_size)
-                elif kind == "cables":
-                    self._get_nb_cables(block_size)
-                break # success, break out of while loop
-            except (requests.Timeout, requests.exceptions.HTTPError) as e:
-                if isinstance(e, requests.exceptions.HTTPError) and e.response.status_code != 414:
-                    error(f"NetBox API failure at get {kind}:", e)
-                else:
-                    warning(f"NetBox API failure at get {kind}, will reduce block size and retry:", e)
-                    attempts += 1
-                    block_size = block_size // 2
-            except (pynetbox.core.query.RequestError, pynetbox.core.query.ContentError) as e:
-                error(f"NetBox API failure at get {kind}:", e)
-        if attempts == max_attempts:
-            error(f"NetBox API failure at get {kind}, max attempts reached")
+    @property
+    def topology_name(self):
+        return self.G.name
 
 
-    def _get_nb_devices(self):
-        """Get device list from NetBox filtered by site, tags and device roles"""
-        devices = []
-        if len(self.nb_sites) == 0:
-            devices = self.nb_session.dcim.devices.filter(tag=self.config['export_tags'],
-                                                          role=self.config['export_device_roles'])
-        else:
-            site_ids = []
-            for site in self.nb_sites:
-                debug(f'Site ID: {site.id} - Site Name: {site.name}')
-                site_ids.append(str(site.id))
-            devices = self.nb_session.dcim.devices.filter(site_id=site_ids,
-                                                        tag=self.config['export_tags'],
-                                                        role=self.config['export_device_roles'])
-        for device in devices:
-            d = self._init_device(device)
-            self.nb_net.nodes.append(d)
-            d["node_id"] = len(self.nb_net.nodes) - 1
-            self.nb_net.devices.append(d)
-            d["device_index"] = len(self.nb_net.devices) - 1 # do not use insert with self.nb_net.devices!
-            # index of the device in the devices list will match its ID index in device_ids list
-            self.nb_net.device_ids.append(device.id)
-            debug("Added device:", d)
-
-
-    def _get_nb_interfaces(self, block_size = 4):
-        """Get interfaces from NetBox filtered by devices we already have in the network topology"""
-        size = len(self.nb_net.device_ids)
-        debug(f"Exporting interfaces from with {size} devices, in blocks of {block_size}")
-        for i in range(0, size, block_size):
-            device_block = self.nb_net.device_ids[i:i + block_size]
-            for interface in list(self.nb_session.dcim.interfaces.filter(device_id=device_block,
-                                                                         kind="physical",
-                                                                         cabled=True,
-                                                                         connected=True)):
-                if "base" in interface.type.value: # only ethernet interfaces
-                    if len(self.config['export_interface_tags']) > 0:
-                        tag_match = False
-                    for tag in interface.tags:
-                        if tag.name in self.config['export_interface_tags']: # implementing OR tag matching logic
-                            tag_match = True
-                            break
-                    if len(self.config['export_interface_tags']) > 0 and not tag_match:
-                        debug(f"{interface.device} : {interface} skipping, doesn't have any of the required tags")
-                        continue
-                    debug(f"{interface.device} : {interface} adding as {interface.type.value}")
-                    i = {
-                        "id": interface.id,
-                        "type": "interface",
-                        "name": interface.name,
-                        "node_id": -1,
-                    }
-                    self.nb_net.nodes.append(i)
-                    i["node_id"] = len(self.nb_net.nodes) - 1
-                    self.nb_net.interfaces.append(i)
-                    i["interface_index"] = len(self.nb_net.interfaces) - 1 # do not use insert with self.nb_net.interfaces!
-                    # index of the interface in the interfaces list will match its ID index in interface_ids list
-                    self.nb_net.interface_ids.append(interface.id)
-                    self.nb_net.cable_ids.append(interface.cable.id)
-
-
-    def _init_device(self, device):
-        """Initialize device data with all available fields from NetBox"""
-        # Start with all raw device data from NetBox
-        d = dict(device)
-
-        # Add nrx-specific fields
-        d["type"] = "device"
-        d["node_id"] = -1
-
-        # Extract nested object fields for backward compatibility and template convenience
-        # Site
-        d["site"] = device.site.name if device.site is not None else ""
-
-        # Platform
-        if device.platform is not None:
-            d["platform"] = device.platform.slug
-            d["platform_name"] = device.platform.name
-        else:
-            d["platform"] = "unknown"
-            d["platform_name"] = "unknown"
-
-        # Device Type / Model and Vendor
-        if device.device_type is not None:
-            d["model"] = device.device_type.slug
-            d["model_name"] = device.device_type.model
-            if device.device_type.manufacturer is not None:
-                d["vendor"] = device.device_type.manufacturer.slug
-                d["vendor_name"] = device.device_type.manufacturer.name
-            else:
-                d["vendor"] = "unknown"
-                d["vendor_name"] = "unknown"
+    @property
+    def http_cache(self):
+        """Cache of NetBox API responses with --cache, or None"""
+        return self.config.get(HTTP_CACHE_CONFIG_KEY)
+
+
+    def _phase(self, name):
+        """Return a context manager recording stats of an export phase, with --stats"""
+        return export_phase(self.config, name)
+
+
+    def _exports_configs(self):
+        """Check if device configurations are exported"""
+        return self.config['export_configs'] and format_uses_configs(self.config)
+
+
+    def _get_nb_network(self):
+        """Get devices, their configurations, interfaces and cables from NetBox, and build the network graph"""
+        self._open_config_cache()
+        if self.config.get('incremental_snapshot') and self._get_nb_network_incremental():
+            debug(f"Updated snapshot {self.config['incremental_snapshot']} with NetBox changes")
+        elif self.config.get('api_backend', 'sync') == 'asyncio':
+            self._get_nb_network_async()
+        elif self.config.get('api_backend', 'sync') == 'graphql':
+            self._get_nb_network_graphql()
         else:
-            d["model"] = "unknown"
-            d["model_name"] = "unknown"
-            d["vendor"] = "unknown"
-            d["vendor_name"] = "unknown"
-
-        # Role (handle NetBox 3.x vs 4.x difference)
-        if self.nb_api_version >= version.parse("4.0"):
-            if device.role is not None:
-                d["role"] = device.role.slug
-                d["role_name"] = device.role.name
-            else:
-                d["role"] = "unknown"
-                d["role_name"] = "unknown"
+            try:
+                self._get_nb_network_sync()
+            except (pynetbox.core.query.RequestError, pynetbox.core.query.ContentError) as e:
+                error("NetBox API failure", e)
+        if self.api_params['adaptive_blocks'] and len(self.learned_params) > 0:
+            save_api_state(self.config['nb_api_url'], self.learned_params)
+        if self.http_cache is not None:
+            self._close_http_cache()
+        if self.config.get(CONFIG_CACHE_CONFIG_KEY) is not None:
+            with self._phase("config cache") as phase:
+                cache = self.config[CONFIG_CACHE_CONFIG_KEY]
+                try:
+                    debug(f"[CACHE] Configs: {cache.stats}, stored: {cache.save()}")
+                except OSError as e:
+                    warning(f"Can't save device configurations to {cache.path}:", e)
+                phase.count("hits", cache.stats['hits'])
+                phase.count("misses", cache.stats['misses'])
+        if log.DEBUG_ON:
+            http_stats = http_connection_stats(self.nb_session.http_session)
+            debug(f"[HTTP] Requests: {http_stats['requests']}, connections opened: {http_stats['connections']}, "
+                  f"reused: {http_stats['requests'] - http_stats['connections']}")
+            governor = self.nb_session.http_session.get_adapter(self.config['nb_api_url']).governor
+            debug(f"[HTTP] Overload responses: {governor.stats['overloads']}, retries: {governor.stats['retries']}, "
+                  f"lowest concurrency limit: {governor.stats['min_limit']} of {governor.max_limit}")
+        if self.config.get('incremental_snapshot'):
+            self._record_snapshot()
+
+
+    def _get_nb_network_sync(self):
+        """Get NetBox data with the sync API backend, per site concurrently if there are several of them"""
+        if len(self.nb_sites) > 1 and self.api_params['site_workers'] > 1:
+            with self._phase("site pipelines") as phase:
+                self._get_nb_objects("sites")
+                phase.count("devices", len(self.nb_net.devices))
+                phase.count("interfaces", len(self.nb_net.interfaces))
         else:
-            # NetBox 3.x uses device_role
-            if hasattr(device, 'device_role') and device.device_role is not None:
-                d["role"] = device.device_role.slug
-                d["role_name"] = device.device_role.name
-            else:
-                d["role"] = "unknown"
-                d["role_name"] = "unknown"
+            with self._phase("devices") as phase:
+                self._get_nb_devices()
+                phase.count("devices", len(self.nb_net.devices))
+            # Configurations are retrieved only after the final device set is known
+            self._export_nb_device_configs()
+            if self.config['export_links']:
+                with self._phase("interfaces") as phase:
+                    self._get_nb_objects("interfaces")
+                    phase.count("interfaces", len(self.nb_net.interfaces))
+        if self.config['export_links']:
+            self._get_nb_objects("cables")
+        self._add_disconnected_devices_to_graph()
 
-        # Generate name if not set
-        if d.get("name") is None or len(d.get("name", "")) == 0:
-            d["name"] = f"{d['role']}-{device.id}"
 
-        # Primary IPs
-        d["primary_ip4"] = device.primary_ip4.address if device.primary_ip4 is not None else ""
-        d["primary_ip6"] = device.primary_ip6.address if device.primary_ip6 is not None else ""
+    def _get_nb_objects(self, kind):
+        try:
+            if kind == "sites":
+                self._get_nb_sites()
+            elif kind == "interfaces":
+                self._get_nb_interfaces()
+            elif kind == "cables":
+                self._get_nb_cables()
+        except BlockFetchError as e:
+            error(f"NetBox API failure at get {kind}, max attempts reached:", e)
+        except (requests.Timeout, requests.exceptions.HTTPError) as e:
+            error(f"NetBox API failure at get {kind}:", e)
+        except (pynetbox.core.query.RequestError, pynetbox.core.query.ContentError) as e:
+            error(f"NetBox API failure at get {kind}:", e)
 
-        # Config (if export is enabled)
-        d["config"] = self._get_device_config(device) if self.config["export_configs"] else ""
 
-        return d
+    def _block_fetcher(self, kind, query, param, params=None, fetcher_class=BlockFetcher, workers=None):
+        """Create a BlockFetcher for kind of objects filtered by param, retrying with smaller blocks on 414 and timeouts
 
-    def _get_device_config(self, device):
-        """Get device config from NetBox"""
-        headers = {
-            'Authorization': f"Token {self.config['nb_api_token']}",
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        }
-        url = f"{self.config['nb_api_url']}/api/dcim/devices/{device.id}/render-config/"
-        try:
-            response = requests.post(url, headers=headers, timeout=self.config['api_timeout'], verify=self.config['tls_validate'])
-            response.raise_for_status()  # Raises an HTTPError if the response status is an error
-            config_response = ast.literal_eval(response.text)
-            if "content" in config_response:
-                return config_response["content"]
-        except HTTPError as e:
-            debug(f"{device.name}: Get device configuration request failed: {e}")
-        except (Timeout, RequestException) as e:
-            debug(f"{device.name}: Get device configuration failed: {e}")
-        except SyntaxError as e:
-            debug(f"{device.name}: Get device configuration failed: can't parse rendered configuration - {e}")
-        return ""
-
-    def _unwrap_termination(self, term):
-        """Unwrap cable termination object, handling pynetbox 7.6.1+ GenericListObject."""
-        # In pynetbox 7.6.1+, terminations are wrapped in GenericListObject
-        # GenericListObject has 'object', 'object_id', and 'object_type' attributes
-        # We need to extract the 'object' which contains the actual interface
-        if hasattr(term, 'object'):
-            # pynetbox 7.6.1+ format - get the object attribute
-            return term.object
-        # Fallback for older versions - return as-is
-        return term
-
-    def _is_interface(self, obj):
-        """Check if an object is an Interface, handling pynetbox version differences."""
-        # Check by isinstance first (preferred)
-        if isinstance(obj, pynetbox.models.dcim.Interfaces):
-            return True
-        # Fallback: check by class name and attributes for compatibility
-        # This handles cases where the object type might differ across pynetbox versions
-        class_name = obj.__class__.__name__
-        if class_name == 'Interfaces' and hasattr(obj, 'device') and hasattr(obj, 'name'):
-            return True
-        return False
+        Blocks of IDs are sized to fit url_max_length, together with the rest of the query params. Blocks are
+        fetched by blocks_workers, unless the number of workers is given.
+        """
+        def on_retry(e, size):
+            warning(f"NetBox API failure at get {kind} for a block of {size}, will reduce block size and retry:", e)
+        url = f"{self.config['nb_api_url']}/api/dcim/{kind}/?{urlencode(params or {}, doseq=True)}"
+        url_budget = URLBudget(param, self.api_params['url_max_length'] - len(url) - NB_PAGINATION_PARAMS_LENGTH)
+        if workers is None:
+            workers = self.api_params['blocks_workers']
+        return fetcher_class(query, workers=workers, on_retry=on_retry,
+                             url_budget=url_budget, adaptive=self.api_params['adaptive_blocks'])
+
+    def _block_size(self, kind):
+        """Return the block size to start fetching kind of objects with"""
+        param = f"{kind}_block_size"
+        return self.learned_params.get(param, self.api_params[param])
+
+    def _learn_block_size(self, kind, fetcher):
+        """Keep the block size the fetcher ended up with, for the next run"""
+        if self.api_params['adaptive_blocks']:
+            self.learned_params[f"{kind}_block_size"] = fetcher.block_size
 
-    def _trace_cable(self, cable):
-        if len(cable.a_terminations) == 1 and len(cable.b_terminations) == 1:
-            # Unwrap terminations (pynetbox 7.6.1+ wraps them in GenericListObject)
-            term_a = self._unwrap_termination(cable.a_terminations[0])
-            term_b = self._unwrap_termination(cable.b_terminations[0])
-
-            if self._is_interface(term_a) and self._is_interface(term_b):
-                return [term_a, term_b]
-            interface = None
-            if self._is_interface(term_a):
-                interface = term_a
-            elif self._is_interface(term_b):
-                interface = term_b
-            if interface is not None:
-                trace = interface.trace()
-                if len(trace) > 0:
-                    if len(trace[0]) == 1 and len(trace[-1]) == 1:
-                        side_a = trace[0][0]
-                        side_b = trace[-1][0]
-                        if self._is_interface(side_a) and self._is_interface(side_b):
-                            debug(f"Traced {side_a.device} {side_a.name} <-> {side_b.device} {side_b.name}: {trace}")
-                            return [side_a, side_b]
-            debug(f"Skipping {cable} as both terminations are not interfaces or cannot be traced")
-            return []
-        if len(cable.a_terminations) < 1 or len(cable.b_terminations) < 1:
-            debug(f"Skipping {cable} as one or both sides are not connected")
-            return []
-        debug(f"Skipping {cable} as it has more than one termination on one or both sides")
-        return []
-
-    def _add_cable_to_graph(self, cable):
-        edge = self._trace_cable(cable)
-        if len(edge) == 2:
-            int_a = edge[0]
-            int_b = edge[1]
-            try:
-                d_a = self.nb_net.devices[self.nb_net.device_ids.index(int_a.device.id)]
-                d_b = self.nb_net.devices[self.nb_net.device_ids.index(int_b.device.id)]
-                self.G.add_nodes_from([
-                    (d_a["node_id"], {"side": "a", "type": "device", "device": d_a}),
-                    (d_b["node_id"], {"side": "b", "type": "device", "device": d_b}),
-                ])
-                i_a = self.nb_net.interfaces[self.nb_net.interface_ids.index(int_a.id)]
-                i_b = self.nb_net.interfaces[self.nb_net.interface_ids.index(int_b.id)]
-                self.G.add_nodes_from([
-                    (i_a["node_id"], {"side": "a", "type": "interface", "interface": i_a}),
-                    (i_b["node_id"], {"side": "b", "type": "interface", "interface": i_b}),
-                ])
-                self.G.add_edges_from([
-                    (d_a["node_id"], i_a["node_id"]),
-                    (d_b["node_id"], i_b["node_id"]),
-                ])
-                self.G.add_edges_from([
-                    (i_a["node_id"], i_b["node_id"]),
-                ])
-            except ValueError:
-                debug("One or both devices for this connection are not in the export graph")
-
-    def _get_nb_cables(self, block_size):
-        size = len(self.nb_net.cable_ids)
-        debug(f"Exporting {size} cables to build the network graph, in blocks of {block_size}")
-        for i in range(0, size, block_size):
-            cables_block = self.nb_net.cable_ids[i:i + block_size]
-            for cable in list(self.nb_session.dcim.cables.filter(id=cables_block)):
-                self._add_cable_to_graph(cable)
 
     def _add_disconnected_devices_to_graph(self):
-        """Add devices that have no connections to the graph"""
-        for device in self.nb_net.devices:
-            node_id = device["node_id"]
-            if node_id not in self.G.nodes:
-                debug(f"Adding disconnected device: {device['name']}")
-                self.G.add_node(node_id, type="device", device=device)
+        """Add devices that have no connections to the graph, which completes it"""
+        with self._phase("graph") as phase:
+            for device in self.nb_net.devices:
+                node_id = device["node_id"]
+                if node_id not in self.G.nodes:
+                    debug(f"Adding disconnected device: {device['name']}")
+                    self.G.add_node(node_id, type="device", device=device)
+            phase.count("nodes", self.G.number_of_nodes())
+            phase.count("edges", self.G.number_of_edges())
 
     def export_graph_gml(self):
         export_file = self.topology_name + ".gml"
         dir_path = create_output_directory(self.topology_name, self.config['output_dir'])
         export_path = f"{dir_path}/{export_file}"
         try:
-            nx.write_gml(self.G, export_path)
+            with self._phase("write") as phase:
+                nx.write_gml(self.G, export_path)
+                phase.count("files")
         except OSError as e:
             error(f"Writing to {export_path}:", e)
         except nx.exception.NetworkXError as e:
@@ -532,19 +463,38 @@ class NBFactory:
         print(f"GML graph saved to: {export_path}")
 
     def export_graph_json(self):
-        cyjs = nx.cytoscape_data(self.G)
         dir_path = create_output_directory(self.topology_name, self.config['output_dir'])
-        export_file = self.topology_name + ".cyjs"
+        export_file = cyjs_file_name(self.topology_name, self.config.get('cyjs_compression'))
         export_path = f"{dir_path}/{export_file}"
         try:
-            with open(export_path, 'w', encoding='utf-8') as f:
-                json.dump(cyjs, f, indent=4)
-        except OSError as e:
+            with self._phase("write") as phase, open_cyjs(export_path, 'w') as f:
+                nodes, edges = write_cyjs(self.G, f, compact=self.config.get('cyjs_compact', False))
+                phase.count("files")
+                phase.count("elements", nodes + edges)
+        except (OSError, CYJSError) as e:
             error(f"Writing to {export_path}:", e)
         except TypeError as e:
             error("Can't export as JSON:", e)
         print(f"CYJS graph saved to: {export_path}")
 
+    def export_graph_snapshot(self):
+        dir_path = create_output_directory(self.topology_name, self.config['output_dir'])
+        export_path = f"{dir_path}/{self.topology_name}{SNAPSHOT_FILE_EXTENSION}"
+        try:
+            with self._phase("write") as phase:
+                TopologySnapshot.from_graph(self.G).write(export_path)
+                phase.count("files")
+        except (OSError, TopologySnapshotError) as e:
+            error(f"Writing to {export_path}:", e)
+        print(f"Topology snapshot saved to: {export_path}")
+
+# Output formats of the graph itself, by the NBFactory method that exports it
+NB_GRAPH_EXPORTS = {
+    'gml':      NBFactory.export_graph_gml,
+    'cyjs':     NBFactory.export_graph_json,
+    'snapshot': NBFactory.export_graph_snapshot,
+}
+
 class NetworkTopology:
     """Class to create network topology artifacts"""
     def __init__(self, config):
@@ -575,7 +525,7 @@ class NetworkTopology:
             'nodes':           {'_path_': f"{self.config['output_format']}/nodes", '_description_': 'node', '_require_map_': False}
         }
         self.files_path = '.'
-        if self.config['output_format'] != 'cyjs':
+        if self.config['output_format'] not in ['cyjs', 'snapshot']:
             self.config['format'] = self._read_formats_map(config['formats_map'])
 
 
@@ -596,8 +546,10 @@ class NetworkTopology:
 
 
     def build_from_file(self, file):
-        """Build network topology from a CYJS file"""
-        self._read_network_graph(file)
+        """Build network topology from a CYJS file, or a topology snapshot with --input snapshot"""
+        with export_phase(self.config, "read") as phase:
+            self._read_network_graph(file)
+            phase.count("files")
         self._build_topology()
 
     def build_from_graph(self, graph):
@@ -621,17 +573,18 @@ class NetworkTopology:
 
 
     def _read_network_graph(self, file):
-        """Read network topology graph from a CYJS file"""
-        print(f"Reading CYJS topology graph: {file}")
-        cyjs = {}
+        """Read network topology graph from a CYJS file, or a topology snapshot"""
+        source = "topology snapshot" if self.config.get('input_source') == 'snapshot' else "CYJS topology graph"
+        print(f"Reading {source}: {file}")
         try:
-            with open(file, 'r', encoding='utf-8') as f:
-                cyjs = json.load(f)
-        except OSError as e:
-            error("Can't read CYJS topology graph:", e)
-        except json.decoder.JSONDecodeError as e:
-            error("Can't parse CYJS topology graph:", e)
-        self.G = nx.cytoscape_graph(cyjs)
+            if source == "topology snapshot":
+                self.G = TopologySnapshot.read(file).graph()
+            else:
+                self.G = read_cyjs_file(file, self.config.get('cyjs_stream', False))
+        except (OSError, CYJSError) as e:
+            error(f"Can't read {source}:", e)
+        except ValueError as e:
+            error(f"Can't parse {source}:", e)
 
     def _append_if_node_is_device(self, n):
         """Append a device node to the topology"""
@@ -730,17 +683,20 @@ class NetworkTopology:
     def _build_topology(self):
         """ Parse graph G into lists of: nodes and links.
         Keep list of interfaces per device in `device_interfaces_map`, and then add them to each device"""
-        try:
-            if self.topology['name'] is None and "name" in self.G.graph.keys():
-                self.topology['name'] = self.G.graph["name"]
-            for n in self.G.nodes:
-                if not self._append_if_node_is_device(n):
-                    self._append_if_node_is_interface(n)
-            self._initialize_emulated_interface_names()
-        except KeyError as e:
-            error(f"Incomplete data to build topology, {e} key is missing")
-
-        self._rank_nodes()
+        with export_phase(self.config, "topology") as phase:
+            try:
+                if self.topology['name'] is None and "name" in self.G.graph.keys():
+                    self.topology['name'] = self.G.graph["name"]
+                for n in self.G.nodes:
+                    if not self._append_if_node_is_device(n):
+                        self._append_if_node_is_interface(n)
+                self._initialize_emulated_interface_names()
+            except KeyError as e:
+                error(f"Incomplete data to build topology, {e} key is missing")
+
+            self._rank_nodes()
+            phase.count("nodes", len(self.topology['nodes']))
+            phase.count("links", len(self.topology['links']))
 
     def export_topology(self):
         """Export network topology through Jinja2 templates"""
@@ -751,9 +707,11 @@ class NetworkTopology:
         # Create a directory for output files
         self.files_path = create_output_directory(self.topology['name'], self.config['output_dir'])
         # Generate topology data structure
-        self.topology['rendered_nodes'] = self._render_emulated_nodes()
-        self._initialize_emulated_links()
-        self._render_topology()
+        with export_phase(self.config, "render") as phase:
+            self.topology['rendered_nodes'] = self._render_emulated_nodes()
+            phase.count("nodes", len(self.topology['rendered_nodes']))
+            self._initialize_emulated_links()
+            self._render_topology()
 
     def _initialize_emulated_links(self):
         """Initialize emulated links"""
@@ -767,6 +725,38 @@ class NetworkTopology:
             link_id += 1
 
 
+    def template_device_fields(self):
+        """Return names of variables and attributes referenced by templates of the output format, including the
+        templates they include, or None if the templates can't be analyzed. Device data is rendered through these
+        templates, so device fields outside of this set are not used"""
+        names = self.j2env.list_templates(filter_func=lambda n: n.startswith(f"{self.config['output_format']}/"))
+        if len(names) == 0:
+            return None
+        fields = set()
+        parsed = set()
+        while len(names) > 0:
+            name = names.pop()
+            if name in parsed:
+                continue
+            parsed.add(name)
+            try:
+                source = self.j2env.loader.get_source(self.j2env, name)[0]
+                parsed_template = self.j2env.parse(source)
+            except (OSError, jinja2.TemplateError) as e:
+                debug(f"[TEMPLATE] Can't parse '{name}': {e}")
+                return None
+            fields.update(jinja2.meta.find_undeclared_variables(parsed_template))
+            # Device fields are also accessed as attributes of node variables, e.g. in topology templates
+            fields.update(n.attr for n in parsed_template.find_all(jinja2.nodes.Getattr))
+            fields.update(n.arg.value for n in parsed_template.find_all(jinja2.nodes.Getitem)
+                          if isinstance(n.arg, jinja2.nodes.Const) and isinstance(n.arg.value, str))
+            for ref in jinja2.meta.find_referenced_templates(parsed_template):
+                if ref is None:
+                    # Included template name is computed at render time
+                    return None
+                names.append(ref)
+        return fields
+
     def _get_platform_template(self, ttype, platform, is_required = False):
         """Get a Jinja2 template for a given type and platform, as well as initialize template params"""
         template = None
@@ -884,7 +874,7 @@ class NetworkTopology:
     def _load_yaml_from_template_file(self, file, log_context = "[LOAD_YAML]"):
         template = self._get_template_with_file(file)
         try:
-            return yaml.load(template.render(self.config), Loader=yaml.SafeLoader)
+            return load_yaml(template.render(self.config))
         except jinja2.TemplateError as e:
             error(f"{log_context} Rendering {file} template as format map: {e}")
         except yaml.scanner.ScannerError as e:
@@ -960,9 +950,9 @@ class NetworkTopology:
             topo_file += f".{self.config['output_format']}.{format_params['file_format']}"
         try:
             topo_path = f"{self.files_path}/{topo_file}"
-            with open(topo_path, "w", encoding="utf-8") as f:
+            with export_phase(self.config, "write") as phase, open(topo_path, "w", encoding="utf-8") as f:
                 f.write(topo)
-                f.close()
+                phase.count("files")
         except OSError as e:
             error(f"Can't write into {topo_path}", e)
 
@@ -974,13 +964,13 @@ class NetworkTopology:
         try:
             f = self.config['format']['file_format'].lower()
             if f == 'json':
-                topo_dict = ast.literal_eval(topo)
+                topo_dict = loads_json(topo)
             elif f == 'yaml':
-                topo_dict = yaml.safe_load(topo)
+                topo_dict = load_yaml(topo)
                 if 'lab' in topo_dict and 'notes' in topo_dict['lab'] and 'motd' not in topo_dict:
                     # CML
                     topo_dict['motd'] = topo_dict['lab']['notes']
-        except (SyntaxError, yaml.scanner.ScannerError) as e:
+        except (ValueError, yaml.YAMLError) as e:
             debug("Can't parse topology as a dictionary:", e)
         if 'motd' in topo_dict:
             print(f"{topo_dict['motd']}")
@@ -1010,9 +1000,9 @@ class NetworkTopology:
                 int_map_file = f"{d}_interface_map.json"
                 int_map_path = f"{self.files_path}/{int_map_file}"
                 try:
-                    with open(int_map_path, "w", encoding="utf-8") as f:
+                    with export_phase(self.config, "write") as phase, open(int_map_path, "w", encoding="utf-8") as f:
                         f.write(interface_map)
-                        f.close()
+                        phase.count("files")
                 except OSError as e:
                     error(f"Can't write into {int_map_path}", e)
                 print(f"Created '{p}' interface map: {int_map_path}")
@@ -1033,9 +1023,9 @@ class NetworkTopology:
             config_file = f"{name}.config"
             config_path = f"{self.files_path}/{config_file}"
             try:
-                with open(config_path, "w", encoding="utf-8") as f:
+                with export_phase(self.config, "write") as phase, open(config_path, "w", encoding="utf-8") as f:
                     f.write(config)
-                    f.close()
+                    phase.count("files")
             except OSError as e:
                 error(f"Can't write into {config_path}", e)
             print(f"Created device configuration file: {config_path}")
@@ -1044,11 +1034,17 @@ class NetworkTopology:
 
 def arg_input_check(s):
     """Check if input source is supported"""
-    allowed_values = ['netbox', 'cyjs']
+    allowed_values = ['netbox', 'cyjs', 'snapshot']
     if s in allowed_values:
         return s
     raise argparse.ArgumentTypeError(f"input source has to be one of {allowed_values}")
 
+def arg_api_backend_check(s):
+    """Check if NetBox API backend is supported"""
+    if s in NRX_API_BACKENDS:
+        return s
+    raise argparse.ArgumentTypeError(f"API backend has to be one of {NRX_API_BACKENDS}")
+
 def parse_args():
     """CLI arguments parser"""
     args_parser = argparse.ArgumentParser(prog='nrx',
@@ -1070,10 +1066,24 @@ def parse_args():
                                                         const=__version__, action=NrxInitAction, metavar='VERSION')
     args_parser.add_argument('-c', '--config',      required=False, help=f"configuration file, default: $HOME/{NRX_CONFIG_DIR}/{NRX_DEFAULT_CONFIG_NAME}",
                                                         default=nrx_default_config_path())
-    args_parser.add_argument('-i', '--input',       required=False, help='input source: netbox (default) | cyjs',
+    args_parser.add_argument('-i', '--input',       required=False, help='input source: netbox (default) | cyjs | snapshot',
                                                         default='netbox', type=arg_input_check,)
-    args_parser.add_argument('-o', '--output',      required=False, help='output format: cyjs | clab | air | cml | graphite | d2 or any other format supported by provided templates')
+    args_parser.add_argument('-o', '--output',      required=False, help='output format: cyjs | snapshot | clab | air | cml | graphite | d2 or any other format supported by provided templates')
     args_parser.add_argument('-a', '--api',         required=False, help='netbox API URL')
+    args_parser.add_argument(      '--api-backend', required=False, help='netbox API client backend: sync (default) | asyncio | graphql',
+                                                        type=arg_api_backend_check, metavar='BACKEND')
+    args_parser.add_argument(      '--cache',       required=False, help=f"cache netbox API responses in $HOME/{NRX_CONFIG_DIR}/{NRX_API_CACHE_NAME} (disabled by default)",
+                                                        action=argparse.BooleanOptionalAction)
+    args_parser.add_argument(      '--config-cache', required=False, help=f"reuse device configurations rendered by netbox before, cached in $HOME/{NRX_CONFIG_DIR}/{CONFIG_CACHE_NAME}, \
+                                                                          unless the device, its config template or config contexts changed (disabled by default)",
+                                                        action=argparse.BooleanOptionalAction)
+    args_parser.add_argument(      '--compact',     required=False, help='write CYJS without indentation and empty fields', action=argparse.BooleanOptionalAction)
+    args_parser.add_argument(      '--compress',    required=False, help='compress CYJS output: gz | zst', choices=list(CYJS_COMPRESSIONS))
+    args_parser.add_argument(      '--stream',      required=False, help='read CYJS input element by element, for graphs that don\'t fit in memory',
+                                                        action=argparse.BooleanOptionalAction)
+    args_parser.add_argument(      '--incremental', required=False, help='update a CYJS graph exported with --incremental before, \
+                                                                          by applying netbox changes logged since then. requires -o cyjs',
+                                                        metavar='SNAPSHOT')
     sites_group.add_argument('-s', '--site',        required=False, help='netbox site to export, cannot be combined with --sites')
     sites_group.add_argument(      '--sites',       required=False, help='netbox sites to export, for multiple tags use a comma-separated list: \
                                                                           site1,site2,site3 (uses OR logic)')
@@ -1097,6 +1107,14 @@ def parse_args():
     args_parser.add_argument('-D', '--dir',         required=False, help='save files into specified directory. \
                                                                           nested relative and absolute paths are OK \
                                                                           (topology name is used by default)')
+    args_parser.add_argument(      '--stats',       required=False, help='print time, API requests, bytes received and objects of each export phase. \
+                                                                          optionally, also write them into a JSON FILE',
+                                                        nargs='?', const='', metavar='FILE')
+    cassette_group = args_parser.add_mutually_exclusive_group()
+    cassette_group.add_argument(   '--record',      required=False, help='record netbox API responses into a CASSETTE file', metavar='CASSETTE')
+    cassette_group.add_argument(   '--replay',      required=False, help='export from netbox API responses recorded into a CASSETTE file, without connecting to netbox', metavar='CASSETTE')
+    args_parser.add_argument(      '--replay-latency', required=False, help='delay replayed responses by the time they took when recorded, optionally multiplied by FACTOR',
+                                                        type=float, nargs='?', const=1.0, default=0.0, metavar='FACTOR')
 
     args = args_parser.parse_args()
     debug(f"arguments {args}")
@@ -1107,8 +1125,7 @@ def parse_args():
 class NrxDebugAction(argparse.Action):
     """Argparse action to turn on debug output"""
     def __call__(self, parser, namespace, values, option_string=None):
-        global DEBUG_ON
-        DEBUG_ON = True
+        log.DEBUG_ON = True
 
 
 class NrxInitAction(argparse.Action):
@@ -1144,7 +1161,7 @@ def get_versions(nrx_version):
     except (HTTPError, Timeout, RequestException) as e:
         error(f"[VERSIONS] Downloading versions map from {versions_url} failed: {e}")
     if r.status_code == 200:
-        versions = yaml.safe_load(r.text)
+        versions = load_yaml(r.text)
         debug(f"[VERSIONS] Retrieved versions map for {nrx_version}:", versions)
         return versions
     error(f"[VERSIONS] Can't download versions map from {versions_url}, status code: {r.status_code}")
@@ -1230,7 +1247,16 @@ def load_toml_config(filename):
         'nb_api_token': '',
         'tls_validate': True,
         'api_timeout': 10,
+        'api_backend': 'sync',
+        'api_cache': False,
+        'api_cache_dir': f"{nrx_config_dir()}/{NRX_API_CACHE_NAME}",
+        'api_cache_max_size': 256,
+        'config_cache': False,
+        'config_cache_dir': f"{nrx_config_dir()}/{CONFIG_CACHE_NAME}",
         'output_format': 'cyjs',
+        'cyjs_compact': False,
+        'cyjs_compression': '',
+        'cyjs_stream': False,
         'export_device_roles': ["router", "core-switch", "access-switch", "distribution-switch", "tor-switch"],
         'device_role_levels': {
             'unknown':              0,
@@ -1250,14 +1276,12 @@ def load_toml_config(filename):
         'topology_name': '',
         'export_configs': True,
         'export_links': True,
+        'export_device_fields': [],
         'templates_path': ["./templates", f"{nrx_config_dir()}/templates"],
         'formats_map': NRX_FORMATS_NAME,
         'platform_map': NRX_MAP_NAME,
         'output_dir': '',
-        'nb_api_params': {
-            'interfaces_block_size':    4,
-            'cables_block_size':        64,
-        },
+        'nb_api_params': dict(NB_API_PARAMS_DEFAULTS),
     }
     if filename is not None and len(filename) > 0:
         try:
@@ -1266,6 +1290,8 @@ def load_toml_config(filename):
                 for k in config:
                     if k.upper() in nb_config:
                         config[k] = nb_config[k.upper()]
+                # Keep defaults for the API parameters not present in the file
+                config['nb_api_params'] = NB_API_PARAMS_DEFAULTS | config['nb_api_params']
 
                 # Apply backward compatibility for EXPORT_SITE
                 apply_export_site_backward_compatibility(nb_config, config)
@@ -1279,7 +1305,7 @@ def load_toml_config(filename):
         except argparse.ArgumentTypeError as e:
             error(f"Unsupported configuration: {e}")
 
-    path_config_keys = ['templates_path', 'platform_map', 'output_dir']
+    path_config_keys = ['templates_path', 'platform_map', 'output_dir', 'api_cache_dir', 'config_cache_dir']
     for k in path_config_keys:
         if isinstance(config[k], str):
             config[k] = os.path.expandvars(config[k])
@@ -1293,10 +1319,22 @@ def apply_boolean_arg(config, arg_value, config_key):
         config[config_key] = not arg_value
     return config
 
+def apply_optional_arg(config, arg_value, config_key):
+    """Apply optional argument to config, if it was given"""
+    if arg_value is not None:
+        config[config_key] = arg_value
+    return config
+
 def config_apply_netbox_args(config, args):
     """Apply netbox-related arguments to the configuration and validate it"""
     if args.api is not None and len(args.api) > 0:
         config['nb_api_url'] = args.api
+    if args.api_backend is not None:
+        config['api_backend'] = args.api_backend
+    try:
+        arg_api_backend_check(config['api_backend'])
+    except argparse.ArgumentTypeError as e:
+        error(f"Unsupported configuration: {e}")
     if len(config['nb_api_url']) == 0:
         error("Need an API URL to connect to NetBox.\nUse --api argument, NB_API_URL environment variable or key in --config file")
     if len(config['nb_api_token']) == 0:
@@ -1316,6 +1354,12 @@ def config_apply_netbox_args(config, args):
 
     apply_boolean_arg(config, args.noconfigs, 'export_configs')
     apply_boolean_arg(config, args.nolinks, 'export_links')
+    apply_optional_arg(config, args.cache, 'api_cache')
+    apply_optional_arg(config, args.config_cache, 'config_cache')
+    apply_optional_arg(config, args.compact, 'cyjs_compact')
+    apply_optional_arg(config, args.compress, 'cyjs_compression')
+    if args.incremental is not None and len(args.incremental) > 0:
+        config['incremental_snapshot'] = args.incremental
 
     return config
 
@@ -1344,14 +1388,16 @@ def load_config(args):
     # Override config values with arguments and validate
     if args.input is not None and len(args.input) > 0:
         config['input_source'] = args.input
-        if config['input_source'] == 'cyjs' and (args.file is None or len(args.file) == 0):
-            error("Provide a path to CYJS graph using --file")
+        if config['input_source'] in ['cyjs', 'snapshot'] and (args.file is None or len(args.file) == 0):
+            error(f"Provide a path to {config['input_source']} graph using --file")
         if config['input_source'] == 'netbox':
             config = config_apply_netbox_args(config, args)
 
     if args.insecure:
         config['tls_validate'] = False
 
+    apply_optional_arg(config, args.stream, 'cyjs_stream')
+
     if args.name is not None and len(args.name) > 0:
         config['topology_name'] = args.name
 
@@ -1361,6 +1407,9 @@ def load_config(args):
     if config['input_source'] == config['output_format']:
         error(f"Input and output formats must be different, got '{config['output_format']}'")
 
+    if config.get('incremental_snapshot') and config['output_format'] != 'cyjs':
+        error(f"Incremental export requires cyjs output format, got '{config['output_format']}'")
+
     if args.map is not None and len(args.map) > 0:
         config['platform_map'] = args.map
 
@@ -1373,22 +1422,40 @@ def load_config(args):
     if args.dir is not None and len(args.dir) > 0:
         config['output_dir'] = args.dir
 
-    # Do not export configs for formats that do not support it TODO use startup_config_mode parameter
-    if config['output_format'] in ['graphite', 'd2']:
-        config['export_configs'] = False
-
     return config
 
+def report_stats(config, path):
+    """Print export stats, and write them into a JSON file if path is not empty"""
+    stats = config.get(STATS_CONFIG_KEY)
+    if stats is None:
+        return
+    print(stats.table())
+    if len(path) > 0:
+        try:
+            stats.write_json(path)
+        except OSError as e:
+            error(f"Can't write export stats into {path}:", e)
+        print(f"Export stats saved to: {path}")
+
 def cli():
     """Main entry for CLI execution, called from main() in __init__.py"""
     # Parameters
     args = parse_args()
     config = load_config(args)
-
+    if args.stats is not None:
+        config[STATS_CONFIG_KEY] = ExportStats()
+    with use_cassette(config, args.record, args.replay, args.replay_latency):
+        result = export(config, args)
+    report_stats(config, args.stats or "")
+    return result
+
+def export(config, args):
+    """Export the topology from the input source into the output format"""
     nb_network = None
     topo = NetworkTopology(config)
 
     if config['input_source'] == 'netbox':
+        config['device_fields'] = export_device_fields(config, topo)
         try:
             nb_network = NBFactory(config)
         except (requests.exceptions.SSLError, requests.exceptions.ConnectionError) as e:
@@ -1402,19 +1469,16 @@ def cli():
                 error_debug(f"Can't connect to {config['nb_api_url']}.", e)
         except Exception as e:
             error("Exporting from NetBox:", e)
-        if config['output_format'] == 'gml':
-            nb_network.export_graph_gml()
-            return 0
-        if config['output_format'] == 'cyjs':
-            nb_network.export_graph_json()
+        if config['output_format'] in NB_GRAPH_EXPORTS:
+            NB_GRAPH_EXPORTS[config['output_format']](nb_network)
             return 0
 
-    if config['input_source'] == 'cyjs':
+    if config['input_source'] in ['cyjs', 'snapshot']:
         topo.build_from_file(args.file)
     else:
         topo.build_from_graph(nb_network.graph())
 
-    if config['output_format'] != 'cyjs':
+    if config['output_format'] not in ['cyjs', 'snapshot']:
         topo.export_topology()
     else:
         if nb_network is None:
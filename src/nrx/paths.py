@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Local cable path tracing through front and rear ports of patch panels
+"""
+
+INTERFACE_TYPE = 'dcim.interface'
+FRONT_PORT_TYPE = 'dcim.frontport'
+REAR_PORT_TYPE = 'dcim.rearport'
+
+# Upper limit of cables in a path, protects from loops in cabling data
+MAX_PATH_CABLES = 64
+
+
+class CablePaths:
+    """Cables, front ports and rear ports, to follow paths from interfaces to their far end interfaces
+
+    Follows the same rules as NetBox cable paths: a front port leads to a position of its rear port,
+    and a rear port with several positions leads back to the front port at the position the path entered
+    the opposite rear port with. Terminations are (object_type, object_id, object) tuples, the object
+    of the far end interface is returned as is.
+    """
+    def __init__(self):
+        self.cables = {}
+        self.port_cables = {}
+        self.front_ports = {}
+        self.rear_ports = {}
+        self.rear_fronts = {}
+
+    def add_cable(self, cable_id, a_terminations, b_terminations):
+        """Add a cable with lists of terminations on its A and B ends"""
+        self.cables[cable_id] = (a_terminations, b_terminations)
+        for object_type, object_id, _ in a_terminations + b_terminations:
+            self.port_cables[(object_type, object_id)] = cable_id
+
+    def add_front_port(self, port_id, rear_port_id, rear_port_position):
+        """Add a front port mapped to a position of a rear port"""
+        self.front_ports[port_id] = (rear_port_id, rear_port_position)
+        self.rear_fronts[(rear_port_id, rear_port_position)] = port_id
+
+    def add_rear_port(self, port_id, positions):
+        """Add a rear port with a number of positions"""
+        self.rear_ports[port_id] = positions
+
+    def far_end(self, object_type, object_id):
+        """Return the object of the interface at the far end of the path, or None if the path can't be resolved"""
+        positions = []
+        current = (object_type, object_id)
+        for _ in range(MAX_PATH_CABLES):
+            cable_id = self.port_cables.get(current)
+            if cable_id is None:
+                return None
+            a_terminations, b_terminations = self.cables[cable_id]
+            if current in [(t[0], t[1]) for t in a_terminations]:
+                near, far = a_terminations, b_terminations
+            else:
+                near, far = b_terminations, a_terminations
+            if len(near) != 1 or len(far) != 1:
+                return None
+            far_type, far_id, far_object = far[0]
+            if far_type == INTERFACE_TYPE:
+                return far_object
+            if far_type == FRONT_PORT_TYPE:
+                current = self._rear_of(far_id, positions)
+            elif far_type == REAR_PORT_TYPE:
+                current = self._front_of(far_id, positions)
+            else:
+                return None
+            if current is None:
+                return None
+        return None
+
+    def _rear_of(self, front_port_id, positions):
+        """Pass from a front port to its rear port, remembering the position for rear ports with several positions"""
+        if front_port_id not in self.front_ports:
+            return None
+        rear_port_id, position = self.front_ports[front_port_id]
+        if rear_port_id not in self.rear_ports:
+            return None
+        if self.rear_ports[rear_port_id] > 1:
+            positions.append(position)
+        return (REAR_PORT_TYPE, rear_port_id)
+
+    def _front_of(self, rear_port_id, positions):
+        """Pass from a rear port to the front port at the position the path entered the opposite rear port with"""
+        if rear_port_id not in self.rear_ports:
+            return None
+        if self.rear_ports[rear_port_id] > 1:
+            if len(positions) == 0:
+                return None
+            position = positions.pop()
+        else:
+            position = 1
+        front_port_id = self.rear_fronts.get((rear_port_id, position))
+        if front_port_id is None:
+            return None
+        return (FRONT_PORT_TYPE, front_port_id)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compact records of network topology objects, held by NBNetwork for the duration of an export
+
+A record keeps its fields in __slots__ rather than in a per-object dict, which takes a fraction of the memory
+for exports with hundreds of thousands of interfaces. Records read like the dicts they replace, and are
+converted to dicts when they are added to the graph.
+"""
+
+import sys
+from collections.abc import Mapping
+
+
+class InterfaceRecord(Mapping):
+    """Interface with the fields it is exported with, and the NetBox ID of its cable
+
+    Reads as a dict with id, type, name, node_id and interface_index keys. The cable ID is not exported.
+    Names are interned, as the same names repeat across devices.
+    """
+    __slots__ = ('id', 'name', 'node_id', 'interface_index', 'cable_id')
+    KEYS = ('id', 'type', 'name', 'node_id', 'interface_index')
+    type = "interface"
+
+    def __init__(self, interface_id, name, cable_id=None):
+        self.id = interface_id
+        self.name = sys.intern(name) if isinstance(name, str) else name
+        self.node_id = -1
+        self.interface_index = -1
+        self.cable_id = cable_id
+
+    @classmethod
+    def from_dict(cls, i, cable_id=None):
+        """Create a record from interface data of an exported graph"""
+        return cls(i['id'], i.get('name'), cable_id)
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.KEYS or key == 'type':
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return f"InterfaceRecord({dict(self)})"
+
+
+class NBNetwork:
+    """Class to hold network topology data exported from NetBox"""
+    def __init__(self):
+        # Number of device and interface records, the next record gets it as its node ID
+        self.node_count = 0
+        self.devices = []
+        self.cable_ids = set()
+        # InterfaceRecord objects, they carry NetBox IDs of the interfaces and their cables
+        self.interfaces = []
+        self.device_ids = []
+        # NetBox ID to record indexes, for constant-time lookups when assembling links
+        self.devices_by_id = {}
+        self.interfaces_by_id = {}
+        # NetBox IDs of sites the exported devices belong to
+        self.site_ids = set()
+        # Cable traces retrieved ahead of building the graph, by NetBox interface ID
+        self.traces = {}
+        # Links added to the graph, as (cable ID, a interface ID, b interface ID) NetBox IDs
+        self.links = []
+
+    @property
+    def interface_ids(self):
+        """NetBox IDs of the interfaces, in the order of the interfaces list"""
+        return [i.id for i in self.interfaces]
+
+    def add_device(self, device_id, d):
+        """Add a device record with NetBox device_id"""
+        d["node_id"] = self.node_count
+        self.node_count += 1
+        self.devices.append(d)
+        d["device_index"] = len(self.devices) - 1 # do not use insert with self.devices!
+        # index of the device in the devices list will match its ID index in device_ids list
+        self.device_ids.append(device_id)
+        self.devices_by_id[device_id] = d
+
+    def add_interface(self, interface_id, cable_id, i):
+        """Add an interface with NetBox interface_id, connected via cable_id, from its record or interface data"""
+        if interface_id in self.interfaces_by_id:
+            return False
+        if not isinstance(i, InterfaceRecord):
+            i = InterfaceRecord.from_dict(i | {'id': interface_id})
+        i.cable_id = cable_id
+        i.node_id = self.node_count
+        self.node_count += 1
+        self.interfaces.append(i)
+        i.interface_index = len(self.interfaces) - 1 # do not use insert with self.interfaces!
+        self.interfaces_by_id[interface_id] = i
+        # both ends of a cable share the same ID, the set keeps only one copy of it
+        self.cable_ids.add(cable_id)
+        return True
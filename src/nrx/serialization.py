@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+JSON and YAML serialization with accelerated backends, when they are available
+
+JSON is parsed and serialized by orjson, an optional dependency: pip install nrx[speedups]. YAML is parsed
+and serialized by the libyaml bindings of PyYAML, included in most of its builds. Without them, the standard
+json module and the pure-Python PyYAML loader and dumper are used. Data the accelerated backends reject, like
+NaN values or integers above 64 bits, falls back to the standard ones as well.
+
+orjson indents by 2 spaces only, so indented JSON is written by the json module, in the format of files
+nrx always wrote.
+"""
+
+import json
+
+import yaml
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from yaml import CSafeLoader as YAMLSafeLoader, CSafeDumper as YAMLSafeDumper
+except ImportError:
+    from yaml import SafeLoader as YAMLSafeLoader, SafeDumper as YAMLSafeDumper
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+YAML_BACKEND = 'libyaml' if YAMLSafeLoader.__name__.startswith('C') else 'pyyaml'
+
+
+def loads_json(data):
+    """Parse JSON from a str, bytes or bytearray"""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # json accepts what orjson rejects, like NaN, and reports the same errors as before otherwise
+            pass
+    return json.loads(data)
+
+
+def load_json(f):
+    """Parse JSON from a file object opened in text or binary mode"""
+    return loads_json(f.read())
+
+
+def dumps_json(obj, indent=None):
+    """Serialize obj to a JSON str, compact or indented by indent spaces"""
+    if orjson is not None and indent is None:
+        try:
+            return orjson.dumps(obj).decode('utf-8')
+        except TypeError:
+            pass
+    return json.dumps(obj, indent=indent)
+
+
+def dump_json(obj, f, indent=None):
+    """Serialize obj as JSON into a file object opened in text mode"""
+    if orjson is not None and indent is None:
+        f.write(dumps_json(obj))
+    else:
+        json.dump(obj, f, indent=indent)
+
+
+def load_yaml(stream):
+    """Parse a YAML document from a str or a file object, like yaml.safe_load"""
+    return yaml.load(stream, Loader=YAMLSafeLoader)
+
+
+def dump_yaml(data, stream=None, **kwargs):
+    """Serialize data as YAML into a stream, or return it as a str without one, like yaml.safe_dump"""
+    return yaml.dump(data, stream, Dumper=YAMLSafeDumper, **kwargs)
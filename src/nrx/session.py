@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+HTTP session of NBFactory with NetBox: the adapter all API requests go through, caches and the change log
+"""
+
+from requests.exceptions import RequestException
+
+from nrx.cache import HTTPCache, CachingHTTPAdapter, HTTP_CACHE_CONFIG_KEY
+from nrx.cassette import CASSETTE_CONFIG_KEY
+from nrx.changelog import ChangeLog
+from nrx.configs import ConfigCache, CONFIG_CACHE_CONFIG_KEY, api_headers
+from nrx.devices import NB_PYNETBOX_THREADS
+from nrx.governor import ConcurrencyGovernor, TimeoutHTTPAdapter
+from nrx.log import debug, warning
+from nrx.stats import STATS_CONFIG_KEY
+
+
+class SessionMixin:
+    """NBFactory methods to set up the HTTP session with NetBox, and the caches of its responses"""
+    def _mount_http_adapter(self):
+        """Mount HTTP adapter with the API timeout, serving responses from the cache if it is enabled
+
+        All NetBox API requests go through this adapter. Its connection pool keeps a connection alive for each
+        concurrent request, so the pool is sized to the largest number of them unless pool_maxsize is set.
+        Requests are sent through a ConcurrencyGovernor, which backs off when NetBox is overloaded.
+        """
+        timeout = self.config['api_timeout'] if self.config['api_timeout'] > 0 else None
+        pool_maxsize = self.api_params['pool_maxsize']
+        if pool_maxsize <= 0:
+            pool_maxsize = max(self.api_params['configs_workers'], self.api_params['blocks_workers'], NB_PYNETBOX_THREADS)
+        # Requests in flight are capped at the pool size, and fewer while NetBox shows signs of overload
+        governor = ConcurrencyGovernor(pool_maxsize, adaptive=self.api_params['adaptive_concurrency'],
+                                       retries=self.api_params['overload_retries'],
+                                       backoff=self.api_params['retry_backoff'])
+        pool_params = {'pool_connections': max(1, self.api_params['pool_connections']), 'pool_maxsize': pool_maxsize,
+                       'governor': governor}
+        if self.config.get(CASSETTE_CONFIG_KEY) is not None:
+            adapter = self.config[CASSETTE_CONFIG_KEY].http_adapter(timeout, **pool_params)
+        elif self.config.get('api_cache', False) and self._open_http_cache():
+            adapter = CachingHTTPAdapter(self.config[HTTP_CACHE_CONFIG_KEY], timeout, **pool_params)
+        else:
+            adapter = TimeoutHTTPAdapter(timeout, **pool_params)
+        debug(f"[HTTP] Connection pool size: {pool_maxsize}")
+        self.nb_session.http_session.mount("http://", adapter)
+        self.nb_session.http_session.mount("https://", adapter)
+        if self.config.get(STATS_CONFIG_KEY) is not None:
+            self.nb_session.http_session.hooks['response'].append(self.config[STATS_CONFIG_KEY].response_hook)
+
+    def _open_http_cache(self):
+        """Open the cache of NetBox API responses, return False if its directory can't be created"""
+        try:
+            self.config[HTTP_CACHE_CONFIG_KEY] = HTTPCache(self.config['api_cache_dir'],
+                                                           self.config['api_cache_max_size'] * 1024 * 1024)
+        except OSError as e:
+            warning(f"Can't use {self.config['api_cache_dir']} to cache NetBox API responses:", e)
+            return False
+        return True
+
+    def _close_http_cache(self):
+        """Evict the least recently used API responses, and warn if responses could not be stored"""
+        cache = self.config[HTTP_CACHE_CONFIG_KEY]
+        if cache.write_error is not None:
+            warning(f"Can't store NetBox API responses in {cache.path}:", cache.write_error)
+            return
+        try:
+            debug(f"[CACHE] Responses: {cache.stats}, evicted entries: {cache.evict()}")
+        except OSError as e:
+            warning(f"Can't evict NetBox API responses from {cache.path}:", e)
+
+    def _open_config_cache(self):
+        """Open the cache of rendered device configurations with --config-cache, reading revisions of their inputs
+
+        The cache is not used in record and replay, or when device configurations are not exported.
+        """
+        if not self.config.get('config_cache', False) or self.config.get(CASSETTE_CONFIG_KEY) is not None or \
+           not self._exports_configs():
+            return
+        cache = ConfigCache.for_api(self.config['config_cache_dir'], self.config['nb_api_url'])
+        try:
+            with self._phase("config cache"):
+                cache.read_revisions(self.nb_session.http_session, self.config['nb_api_url'],
+                                     api_headers(self.config['nb_api_token']))
+        except (RequestException, ValueError, KeyError) as e:
+            debug(f"[CACHE] Can't read revisions of config templates and contexts, configurations are not cached: {e}")
+            return
+        debug(f"[CACHE] Using {cache.path} for device configurations")
+        self.config[CONFIG_CACHE_CONFIG_KEY] = cache
+
+    def _read_change_log(self, method, *args):
+        """Return the result of a ChangeLog method by name, or None if the change log is not available"""
+        change_log = ChangeLog(self.nb_session.http_session, self.config['nb_api_url'], self.config['nb_api_token'])
+        try:
+            return getattr(change_log, method)(*args)
+        except (RequestException, ValueError) as e:
+            debug(f"Can't read NetBox change log: {e}")
+        return None
+
+    def _update_cache_epochs(self, change):
+        """Update epochs of cached API responses to the latest NetBox object change"""
+        if self.http_cache is not None:
+            changed = self.http_cache.update_epochs(change, lambda since: self._read_change_log("since", since))
+            debug(f"[CACHE] Using {self.config['api_cache_dir']}, NetBox change: "
+                  f"{change['id'] if change is not None else None}, changed object types: "
+                  f"{sorted(changed) if changed is not None else 'all'}")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Per-site pipelines to get devices, their configurations and interfaces of several sites from NetBox concurrently
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from nrx.devices import NB_PYNETBOX_THREADS
+from nrx.fetch import PageFetcher
+from nrx.log import debug
+
+
+def nb_device_order(name, device_id):
+    """Return sort key of a device in the order NetBox lists devices: by name with numbers ordered naturally, then ID"""
+    if name is None:
+        return True, [], device_id
+    return False, [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)], device_id
+
+
+def worker_shares(workers, parts):
+    """Split workers between parts, the remainder going to the first parts, with at least one worker for each part"""
+    share, remainder = divmod(workers, parts)
+    return [max(1, share + (1 if i < remainder else 0)) for i in range(parts)]
+
+
+class SitesMixin:
+    """NBFactory methods to get NetBox data of each exported site in its own pipeline"""
+    def _get_nb_sites(self):
+        """Get devices, their configurations and interfaces of each exported site concurrently
+
+        Each site goes through its own device, configuration and interface pipeline, up to site_workers sites at
+        a time. Sites share one pool of configs_workers to render configurations, and split blocks_workers
+        between the sites fetched at a time, each getting at least one worker. Devices of all the sites are added to the network in the order NetBox lists them, followed
+        by their interfaces, so node IDs and indexes are the same as with a single pipeline. Cables, which may
+        connect devices of different sites, are fetched once all sites are merged.
+        """
+        workers = min(len(self.nb_sites), self.api_params['site_workers'])
+        debug(f"Exporting {len(self.nb_sites)} sites, with {workers} workers")
+        filters = self._interfaces_filters() if self.config['export_links'] else []
+        # Sites are started in order, so consecutive sites are the ones fetched at a time
+        shares = worker_shares(self.api_params['blocks_workers'], workers)
+        with ThreadPoolExecutor(max_workers=max(1, self.api_params['configs_workers'])) as configs_pool, \
+             ThreadPoolExecutor(max_workers=workers) as pool:
+            sites = list(pool.map(lambda i: self._get_nb_site(self.nb_sites[i], filters, configs_pool, shares[i % workers]),
+                                  range(len(self.nb_sites))))
+        devices = []
+        interfaces = {}
+        for site_devices, site_interfaces in sites:
+            devices.extend(site_devices)
+            for device_id, record in site_interfaces:
+                interfaces.setdefault(device_id, []).append(record)
+        for record in sorted(devices, key=lambda r: nb_device_order(r[2].get("name"), r[0])):
+            self._add_device_record(*record)
+        for device_id in self.nb_net.device_ids:
+            for record in interfaces.get(device_id, []):
+                self.nb_net.add_interface(*record)
+
+    def _get_nb_site(self, site, interfaces_filters, configs_pool, blocks_workers):
+        """Get device records of a site with their configurations, and (device ID, record) pairs of their interfaces
+
+        Configurations are rendered in configs_pool, and interfaces are fetched with blocks_workers, the share of
+        the site.
+        """
+        devices_filter = self._devices_filter() | {'site_id': [str(site.id)]}
+        fetcher = PageFetcher(lambda offset, limit: self._query_devices_page(offset, limit, devices_filter),
+                              workers=NB_PYNETBOX_THREADS)
+        devices = list(fetcher.fetch(self.api_params['page_size']))
+        debug(f"Site {site.name}: {len(devices)} devices")
+        if self._exports_configs():
+            self._get_nb_device_configs([d for _, _, d in devices], configs_pool)
+        if len(interfaces_filters) == 0 or len(devices) == 0:
+            return devices, []
+        fetcher = self._block_fetcher("interfaces", lambda block: self._query_device_interfaces(block, interfaces_filters),
+                                      "device_id", max(interfaces_filters, key=lambda f: len(urlencode(f, doseq=True))),
+                                      workers=blocks_workers)
+        interfaces = list(fetcher.fetch([device_id for device_id, _, _ in devices], self._block_size("interfaces")))
+        self._learn_block_size("interfaces", fetcher)
+        return devices, interfaces
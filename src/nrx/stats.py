@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Export statistics: wall time, NetBox API requests, bytes received and objects of each export phase
+
+Phases are started from the thread that drives the export, and may be nested: a nested phase is accounted
+to itself only, so each request and each second is reported once. Phases with the same name are summed up.
+Requests are counted as responses arrive, from all threads, and assigned to the phase running at the time.
+"""
+
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+from nrx.__about__ import __version__
+from nrx.serialization import dump_json
+
+# Key of ExportStats in the nrx configuration, present with --stats
+STATS_CONFIG_KEY = 'export_stats'
+KIB = 1024
+
+
+class PhaseStats:
+    """Wall time, API requests, bytes received and numbers of objects by kind of an export phase"""
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.requests = 0
+        self.bytes = 0
+        self.objects = {}
+
+    def count(self, kind, n=1):
+        """Count n objects of a kind handled by the phase"""
+        self.objects[kind] = self.objects.get(kind, 0) + n
+
+    def add(self, other):
+        """Add up time, requests, bytes and objects of another phase"""
+        self.seconds += other.seconds
+        self.requests += other.requests
+        self.bytes += other.bytes
+        for kind, n in other.objects.items():
+            self.count(kind, n)
+
+    def as_dict(self):
+        """Return the stats as a dict for JSON export"""
+        return {'name': self.name, 'seconds': round(self.seconds, 6), 'requests': self.requests,
+                'bytes': self.bytes, 'objects': dict(self.objects)}
+
+
+class ExportStats:
+    """Stats of export phases, and of the whole export since the object was created"""
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.bytes = 0
+        # Phases by name, in the order they first started
+        self.phases = {}
+        # Totals of phases nested in each running phase, innermost last
+        self.running = []
+        self.lock = threading.Lock()
+
+    def count_response(self, nbytes):
+        """Count an API response with a body of nbytes"""
+        with self.lock:
+            self.requests += 1
+            self.bytes += nbytes
+
+    def response_hook(self, response, *args, **kwargs):  # pylint: disable=unused-argument
+        """requests session hook counting responses, with bodies of the ones that are not streamed"""
+        self.count_response(0 if kwargs.get('stream') else len(response.content))
+
+    @contextmanager
+    def phase(self, name):
+        """Record stats of a phase running in the context, yield its PhaseStats to count objects"""
+        self.phases.setdefault(name, PhaseStats(name))
+        stats = PhaseStats(name)
+        nested = PhaseStats(name)
+        started = (time.monotonic(), self.requests, self.bytes)
+        self.running.append(nested)
+        try:
+            yield stats
+        finally:
+            self.running.pop()
+            total = PhaseStats(name)
+            total.seconds = time.monotonic() - started[0]
+            total.requests = self.requests - started[1]
+            total.bytes = self.bytes - started[2]
+            if len(self.running) > 0:
+                self.running[-1].add(total)
+            stats.seconds = total.seconds - nested.seconds
+            stats.requests = total.requests - nested.requests
+            stats.bytes = total.bytes - nested.bytes
+            self.phases[name].add(stats)
+
+    def total(self):
+        """Return stats of the whole export so far"""
+        stats = PhaseStats('total')
+        stats.seconds = time.monotonic() - self.started
+        stats.requests = self.requests
+        stats.bytes = self.bytes
+        return stats
+
+    def table(self):
+        """Return the stats as a text table"""
+        lines = [f"{'phase':<16} {'time, s':>9} {'requests':>9} {'KiB received':>13}  objects"]
+        for stats in list(self.phases.values()) + [self.total()]:
+            objects = ", ".join(f"{n} {kind}" for kind, n in stats.objects.items())
+            lines.append(f"{stats.name:<16} {stats.seconds:>9.3f} {stats.requests:>9} {stats.bytes / KIB:>13.1f}  {objects}")
+        return "\n".join(lines)
+
+    def as_dict(self):
+        """Return the stats as a dict for JSON export, with nrx version and time of the export"""
+        return {
+            'version': __version__,
+            'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'total': self.total().as_dict(),
+            'phases': [stats.as_dict() for stats in self.phases.values()],
+        }
+
+    def write_json(self, path):
+        """Write the stats into a JSON file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            dump_json(self.as_dict(), f, indent=4)
+
+
+def export_phase(config, name):
+    """Return a context manager recording a phase in the export stats of the configuration, if there are any"""
+    stats = config.get(STATS_CONFIG_KEY)
+    if stats is None:
+        return nullcontext(PhaseStats(name))
+    return stats.phase(name)
+
+
+def http_connection_stats(http_session):
+    """Return numbers of requests sent and connections opened through the connection pools of an HTTP session"""
+    stats = {'requests': 0, 'connections': 0}
+    for adapter in set(http_session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                stats['requests'] += pool.num_requests
+                stats['connections'] += pool.num_connections
+    return stats
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+
+# nrx - network topology exporter by netreplica
+
+# Copyright 2024 Netreplica Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Topology snapshots: binary files of exported graphs, to convert into several formats without parsing CYJS
+
+A snapshot keeps graph nodes, device and interface records in columns. Each field of the records is a column:
+integers are kept in arrays, strings as a table of distinct values with an array of indexes into it, other
+values, like nested dicts, as JSON. Edges are not kept one by one: a snapshot has the list of interfaces of each
+device, and links between interfaces as two arrays of interface rows. Edges have no attributes, except for the
+source and target of edges read from CYJS, which are not kept. Rows of devices are indexed by device name, to look up
+a device and its interfaces without building the graph.
+
+The file is a header with a magic number, the format version and the length of the JSON description of the
+columns, followed by the description and the arrays of little-endian integers of standard sizes, compressed
+with zlib together.
+"""
+
+import struct
+import zlib
+from functools import cached_property
+
+import networkx as nx
+
+from nrx.serialization import dumps_json, loads_json
+
+SNAPSHOT_FILE_EXTENSION = ".nrxs"
+SNAPSHOT_FILE_MAGIC = b"NRXS"
+SNAPSHOT_FILE_VERSION = 1
+# Magic number, version, and length of the JSON description of columns
+SNAPSHOT_FILE_HEADER = struct.Struct("<4sHQ")
+# Node types of exported graphs, the attribute of each node with its record is named after its type
+NODE_TYPES = ('device', 'interface')
+# Edge attributes of graphs read from CYJS, with the nodes the edge connects anyway
+CYJS_EDGE_KEYS = {'source', 'target'}
+INT64_RANGE = range(-2 ** 63, 2 ** 63)
+# A field a record does not have
+MISSING = object()
+# Columns of a snapshot, other than the description of its arrays
+SNAPSHOT_COLUMNS = ('graph', 'keys', 'nodes', 'record_positions', 'devices', 'interfaces', 'device_names',
+                    'device_interfaces', 'links')
+
+
+class TopologySnapshotError(ValueError):
+    """A graph can't be kept in a topology snapshot, or a file is not one"""
+
+
+def _index_code(size):
+    """Return the struct format character of the smallest unsigned integers for indexes up to size"""
+    for code, limit in (('B', 2 ** 8), ('H', 2 ** 16)):
+        if size <= limit:
+            return code
+    return 'I'
+
+
+def _array_column(code, values, arrays):
+    """Append an array of values with a struct format character to arrays, return a column description with its
+    position"""
+    arrays.append((code, tuple(values)))
+    return {'array': len(arrays) - 1}
+
+
+def _array(column, arrays):
+    """Return values of the array of a column"""
+    return arrays[column['array']][1]
+
+
+def _encode_column(values, arrays):
+    """Return the description of a column of values, with rows of MISSING values, appending its array to arrays"""
+    present = [v for v in values if v is not MISSING]
+    missing = [i for i, v in enumerate(values) if v is MISSING]
+    if all(type(v) is int and v in INT64_RANGE for v in present):  # pylint: disable=unidiomatic-typecheck
+        column = _array_column('q', [0 if v is MISSING else v for v in values], arrays) | {'type': 'int'}
+    elif all(isinstance(v, str) for v in present):
+        table = list(dict.fromkeys(present))
+        indexes = {s: i for i, s in enumerate(table)}
+        column = _array_column(_index_code(len(table)), [indexes.get(v, 0) for v in values], arrays)
+        column |= {'type': 'str', 'table': table}
+    else:
+        column = {'type': 'json', 'values': [None if v is MISSING else v for v in values]}
+    return column | {'missing': missing}
+
+
+def _decode_column(column, arrays):
+    """Return values of a column, with placeholders in rows of missing values"""
+    if column['type'] == 'json':
+        return column['values']
+    values = _array(column, arrays)
+    if column['type'] == 'str':
+        table = column['table']
+        return [table[i] for i in values]
+    return list(values)
+
+
+def _encode_records(records, arrays):
+    """Return the description of a table of records, a column per field in the order fields appear in"""
+    fields = dict.fromkeys(k for r in records for k in r)
+    return {'size': len(records),
+            'columns': {k: _encode_column([r.get(k, MISSING) for r in records], arrays) for k in fields}}
+
+
+def _decode_records(table, arrays):
+    """Return records of a table as dicts"""
+    fields = list(table['columns'])
+    columns = [_decode_column(c, arrays) for c in table['columns'].values()]
+    records = [dict(zip(fields, row)) for row in zip(*columns)] if fields else [{} for _ in range(table['size'])]
+    for k, column in table['columns'].items():
+        for i in column['missing']:
+            del records[i][k]
+    return records
+
+
+def _graph_columns(G):
+    """Return node keys, node attributes without records with the position of the record among them, and device
+    and interface records of a graph"""
+    if G.is_directed() or G.is_multigraph():
+        raise TopologySnapshotError("only undirected graphs without parallel edges can be kept in a snapshot")
+    keys, nodes, positions, records = [], [], [], {t: [] for t in NODE_TYPES}
+    for n, attrs in G.nodes.items():
+        node_type = attrs.get('type')
+        if node_type not in NODE_TYPES or not isinstance(attrs.get(node_type), dict):
+            raise TopologySnapshotError(f"node {n} is neither a device nor an interface with its record")
+        keys.append(n)
+        nodes.append({k: v for k, v in attrs.items() if k != node_type})
+        positions.append(list(attrs).index(node_type))
+        records[node_type].append(attrs[node_type])
+    return keys, nodes, positions, records
+
+
+def _edge_columns(G):
+    """Return rows of interfaces of each device, as offsets into a list of interface rows and the list, and rows
+    of interfaces at both ends of each link"""
+    rows = {t: {} for t in NODE_TYPES}
+    for n, attrs in G.nodes.items():
+        rows[attrs['type']][n] = len(rows[attrs['type']])
+    links = ([], [])
+    for u, v, attrs in G.edges(data=True):
+        if not CYJS_EDGE_KEYS.issuperset(attrs) or G.nodes[u]['type'] == G.nodes[v]['type'] == 'device':
+            raise TopologySnapshotError(f"edge {u}-{v} is neither between a device and an interface, nor a link")
+        if G.nodes[u]['type'] == G.nodes[v]['type']:
+            links[0].append(rows['interface'][u])
+            links[1].append(rows['interface'][v])
+    offsets, device_interfaces = [0], []
+    for d in rows['device']:
+        device_interfaces.extend(rows['interface'][i] for i in G.adj[d])
+        offsets.append(len(device_interfaces))
+    return offsets, device_interfaces, links
+
+
+class TopologySnapshot:
+    """Columns of a topology graph, with lists of interfaces by device and an index of device rows by name"""
+    def __init__(self, columns, arrays):
+        self.columns = columns
+        self.arrays = arrays
+
+    @classmethod
+    def from_graph(cls, G):
+        """Create a snapshot of a graph exported by nrx"""
+        keys, nodes, positions, records = _graph_columns(G)
+        offsets, device_interfaces, links = _edge_columns(G)
+        names = (d.get('name') for d in records['device'])
+        arrays = []
+        columns = {
+            'graph': G.graph,
+            'keys': _encode_column(keys, arrays),
+            'nodes': _encode_records(nodes, arrays),
+            'record_positions': _encode_column(positions, arrays),
+            'devices': _encode_records(records['device'], arrays),
+            'interfaces': _encode_records(records['interface'], arrays),
+            'device_names': {name: row for row, name in enumerate(names) if isinstance(name, str)},
+            'device_interfaces': [_array_column('I', offsets, arrays), _array_column('I', device_interfaces, arrays)],
+            'links': [_array_column('I', links[0], arrays), _array_column('I', links[1], arrays)],
+        }
+        return cls(columns, arrays)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Create a snapshot from the contents of a snapshot file"""
+        if len(data) < SNAPSHOT_FILE_HEADER.size:
+            raise TopologySnapshotError("not a topology snapshot")
+        magic, version, length = SNAPSHOT_FILE_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_FILE_MAGIC:
+            raise TopologySnapshotError("not a topology snapshot")
+        if version != SNAPSHOT_FILE_VERSION:
+            raise TopologySnapshotError(f"unsupported topology snapshot version {version}")
+        try:
+            body = zlib.decompress(memoryview(data)[SNAPSHOT_FILE_HEADER.size:])
+            columns = loads_json(body[:length])
+            arrays, offset = [], length
+            for code, size in columns['arrays']:
+                layout = struct.Struct(f"<{size}{code}")
+                arrays.append((code, layout.unpack_from(body, offset)))
+                offset += layout.size
+            missing = [c for c in SNAPSHOT_COLUMNS if c not in columns]
+        except (zlib.error, struct.error, KeyError, TypeError, ValueError) as e:
+            raise TopologySnapshotError(f"corrupted topology snapshot: {e}") from e
+        if len(missing) > 0:
+            raise TopologySnapshotError(f"corrupted topology snapshot: no {', '.join(missing)}")
+        return cls(columns, arrays)
+
+    @classmethod
+    def read(cls, path):
+        """Read a snapshot from a file"""
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+    def to_bytes(self):
+        """Return the contents of a snapshot file"""
+        data = [struct.pack(f"<{len(values)}{code}", *values) for code, values in self.arrays]
+        description = dumps_json(self.columns | {'arrays': [(code, len(values)) for code, values in self.arrays]})
+        description = description.encode('utf-8')
+        header = SNAPSHOT_FILE_HEADER.pack(SNAPSHOT_FILE_MAGIC, SNAPSHOT_FILE_VERSION, len(description))
+        return header + zlib.compress(description + b"".join(data))
+
+    def write(self, path):
+        """Write the snapshot into a file, return its size in bytes"""
+        data = self.to_bytes()
+        with open(path, 'wb') as f:
+            f.write(data)
+        return len(data)
+
+    @cached_property
+    def devices(self):
+        """Device records, by row"""
+        return _decode_records(self.columns['devices'], self.arrays)
+
+    @cached_property
+    def interfaces(self):
+        """Interface records, by row"""
+        return _decode_records(self.columns['interfaces'], self.arrays)
+
+    def device(self, name):
+        """Return the record of a device by name, or None if there is no such device"""
+        row = self.columns['device_names'].get(name)
+        return None if row is None else self.devices[row]
+
+    def device_interfaces(self, name):
+        """Return records of interfaces of a device by name, in the order they were added to the graph"""
+        row = self.columns['device_names'].get(name)
+        if row is None:
+            return []
+        offsets, rows = (_array(c, self.arrays) for c in self.columns['device_interfaces'])
+        return [self.interfaces[i] for i in rows[offsets[row]:offsets[row + 1]]]
+
+    def _nodes(self):
+        """Return (key, attributes) of graph nodes, and keys of device and interface nodes by row"""
+        keys = _decode_column(self.columns['keys'], self.arrays)
+        records = {t: iter(_decode_records(self.columns[f"{t}s"], self.arrays)) for t in NODE_TYPES}
+        positions = _decode_column(self.columns['record_positions'], self.arrays)
+        nodes = []
+        rows = {t: [] for t in NODE_TYPES}
+        for n, attrs, position in zip(keys, _decode_records(self.columns['nodes'], self.arrays), positions):
+            node_type = attrs['type']
+            if position == len(attrs):
+                attrs[node_type] = next(records[node_type])
+            else:
+                items = list(attrs.items())
+                items.insert(position, (node_type, next(records[node_type])))
+                attrs = dict(items)
+            nodes.append((n, attrs))
+            rows[node_type].append(n)
+        return nodes, rows
+
+    def graph(self):
+        """Return the NetworkX graph of the snapshot, with nodes and edges in the order of the exported graph"""
+        G = nx.Graph()
+        G.graph = dict(self.columns['graph'])
+        nodes, rows = self._nodes()
+        G.add_nodes_from(nodes)
+        offsets, device_interfaces = (_array(c, self.arrays) for c in self.columns['device_interfaces'])
+        for row, d in enumerate(rows['device']):
+            G.add_edges_from((d, rows['interface'][i]) for i in device_interfaces[offsets[row]:offsets[row + 1]])
+        a, b = (_array(c, self.arrays) for c in self.columns['links'])
+        G.add_edges_from((rows['interface'][i], rows['interface'][j]) for i, j in zip(a, b))
+        return G
+
+    def size(self):
+        """Return the numbers of nodes and edges of the graph"""
+        device_interfaces = _array(self.columns['device_interfaces'][1], self.arrays)
+        links = _array(self.columns['links'][0], self.arrays)
+        return self.columns['nodes']['size'], len(device_interfaces) + len(links)
@@ -0,0 +1,83 @@
+"""Throughput benchmark of NetBox data acquisition from the stand-in server.
+
+Exports synthetic topologies of 100, 1k and 10k routers from the stand-in NetBox server, running in a separate
+process with latency and errors injected into its responses, and reports export time, number of requests and
+devices and interfaces acquired per second, with the time of each export phase.
+
+Run from the repository root: PYTHONPATH=./src python -m tests.bench.acquisition [--devices 100,1000,10000]
+[--latency SECONDS] [--error-rate RATE] [--backend sync|asyncio|graphql] [--param NAME=VALUE ...]
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import yaml
+
+from nrx.nrx import NBFactory
+from nrx.stats import ExportStats, STATS_CONFIG_KEY
+from tests.unit.netbox_stub import Faults, NetBoxStub, stub_config, synthetic_topology
+
+SITES = 4
+PATCH_EVERY = 10
+
+
+def api_param(value):
+    """Parse NAME=VALUE of an NB_API_PARAMS parameter, with the value in TOML/YAML scalar syntax"""
+    name, _, value = value.partition('=')
+    return name, yaml.safe_load(value)
+
+
+def measure(url, backend, nb_api_params):
+    """Export all sites of the topology, return time in seconds, the export stats and numbers of devices and interfaces"""
+    config = stub_config(url, backend, nb_api_params)
+    config['export_sites'] = [f"DC{s + 1}" for s in range(SITES)]
+    config[STATS_CONFIG_KEY] = ExportStats()
+    start = time.perf_counter()
+    nb_factory = NBFactory(config)
+    elapsed = time.perf_counter() - start
+    return elapsed, config[STATS_CONFIG_KEY], len(nb_factory.nb_net.devices), len(nb_factory.nb_net.interfaces)
+
+
+def run(devices, args):
+    """Serve a topology of a number of routers from a separate process, and measure its export"""
+    stub = NetBoxStub(synthetic_topology(devices, sites=SITES, patch_every=PATCH_EVERY))
+    stub.faults = Faults(latency=args.latency, error_rate=args.error_rate)
+    # The server runs in its own process, so that it does not compete with nrx for the interpreter
+    server = multiprocessing.get_context('fork').Process(target=stub.server.serve_forever, daemon=True)
+    server.start()
+    try:
+        return measure(stub.url, args.backend, dict(args.param))
+    finally:
+        server.terminate()
+        stub.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', default="100,1000,10000", help="comma-separated numbers of routers")
+    parser.add_argument('--latency', type=float, default=0.002, help="seconds added to each response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument('--backend', default='sync', help="NetBox API client backend")
+    parser.add_argument('--param', type=api_param, action='append', default=[], metavar='NAME=VALUE',
+                        help="NB_API_PARAMS parameter, can be repeated")
+    args = parser.parse_args()
+    results = []
+    with tempfile.TemporaryDirectory() as home:
+        # Learned block sizes are not saved into the configuration directory of the user
+        os.environ['HOME'] = home
+        for devices in [int(n) for n in args.devices.split(',')]:
+            elapsed, stats, exported, interfaces = run(devices, args)
+            print(f"{devices} routers, {args.backend} backend:")
+            print(stats.table())
+            print()
+            results.append((devices, interfaces, elapsed, stats.total().requests, exported / elapsed, interfaces / elapsed))
+    print(f"{'routers':>8} {'interfaces':>10} {'time, s':>8} {'requests':>9} {'devices/s':>10} {'interfaces/s':>13}")
+    for devices, interfaces, elapsed, requests, devices_rate, interfaces_rate in results:
+        print(f"{devices:>8} {interfaces:>10} {elapsed:>8.1f} {requests:>9} {devices_rate:>10.0f} {interfaces_rate:>13.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Benchmark of reading CYJS graphs.
+
+Writes a synthetic Clos topology, or reads another CYJS file, as indented, compact and gzip-compressed CYJS,
+and reads each file back with json.load and nx.cytoscape_graph, the way nrx read graphs before, with nrx.cyjs
+as a whole, the default, and with its streaming reader. Reports the size of each file, and the time and peak Python memory of reading it,
+measured with tracemalloc in a separate round.
+
+Run from the repository root: PYTHONPATH=./src python -m tests.bench.cyjs [--leaves N | --file CYJS]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import networkx as nx
+
+from nrx.cyjs import cyjs_file_name, open_cyjs, read_cyjs_file, write_cyjs
+from tests.unit.topologies import clos
+
+MIB = 1024 * 1024
+
+
+def read_json(path):
+    """Read a graph from a CYJS file as a whole"""
+    with open_cyjs(path, 'rb') as f:
+        return nx.cytoscape_graph(json.load(f))
+
+
+def read_stream(path):
+    """Read a graph from a CYJS file element by element"""
+    return read_cyjs_file(path, stream=True)
+
+
+def measure(read, path):
+    """Return time in seconds and peak traced memory in bytes of reading a graph"""
+    start = time.perf_counter()
+    read(path)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    read(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--leaves', type=int, default=200, help="leaves of the Clos topology, default: 200")
+    parser.add_argument('--file', help="CYJS file to read instead of a synthetic topology")
+    args = parser.parse_args()
+    if args.file:
+        G = read_cyjs_file(args.file)
+    else:
+        G = clos(args.leaves, spines=16, servers=8, uplinks=2)
+    print(f"Graph of {G.number_of_nodes()} nodes and {G.number_of_edges()} edges")
+    print(f"{'file':<16} {'size, MiB':>10} {'reader':>8} {'time, s':>8} {'peak, MiB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, compact, compression in [("indented", False, ''), ("compact", True, ''), ("compact, gz", True, 'gz')]:
+            path = os.path.join(tmp, cyjs_file_name(label.replace(", ", "-"), compression))
+            with open_cyjs(path, 'w') as f:
+                write_cyjs(G, f, compact)
+            for reader, read in [("json", read_json), ("whole", read_cyjs_file), ("stream", read_stream)]:
+                elapsed, peak = measure(read, path)
+                print(f"{label:<16} {os.path.getsize(path) / MIB:>10.1f} {reader:>8} {elapsed:>8.2f} {peak / MIB:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
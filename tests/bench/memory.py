@@ -0,0 +1,82 @@
+"""Memory benchmark of NetBox data acquisition over a synthetic topology.
+
+Exports a ring of routers with 100k interfaces from the stand-in NetBox server, running in a separate
+process, and reports peak and retained Python memory measured with tracemalloc for several page sizes.
+Peak memory above the retained graph data grows with the page size, not with the number of objects.
+
+Run from the repository root: PYTHONPATH=./src python -m tests.bench.memory [--interfaces N]
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import tracemalloc
+
+from nrx.nrx import NBFactory
+from tests.unit.netbox_stub import NetBoxData, NetBoxStub, stub_config
+
+INTERFACES_PER_DEVICE = 50
+PAGE_SIZES = [50, 250, 1000]
+MIB = 1024 * 1024
+
+
+def ring_data(interfaces):
+    """Routers in a ring, with odd interfaces of each router cabled to even interfaces of the next one."""
+    data = NetBoxData()
+    data.add_site(1, "DC1")
+    devices = max(2, interfaces // INTERFACES_PER_DEVICE)
+    for n in range(devices):
+        data.add_device(n + 1, f"r{n:05}", 1)
+        for k in range(INTERFACES_PER_DEVICE):
+            data.add_interface(n * INTERFACES_PER_DEVICE + k + 1, n + 1, f"eth{k + 1}")
+    for n in range(devices):
+        m = (n + 1) % devices
+        for k in range(0, INTERFACES_PER_DEVICE, 2):
+            data.add_cable(n * INTERFACES_PER_DEVICE + k + 1,
+                           ("dcim.interface", n * INTERFACES_PER_DEVICE + k + 1),
+                           ("dcim.interface", m * INTERFACES_PER_DEVICE + k + 2))
+    return data
+
+
+def measure(url, page_size):
+    """Export the topology, return time in seconds, peak and retained memory in bytes, and the graph size."""
+    config = stub_config(url, 'sync', {'page_size': page_size})
+    config['export_configs'] = False
+    tracemalloc.start()
+    start = time.perf_counter()
+    nb_factory = NBFactory(config)
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, retained, len(nb_factory.nb_net.interfaces)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--interfaces', type=int, default=100000, help="number of interfaces in the topology")
+    args = parser.parse_args()
+    print(f"Building a topology with {args.interfaces} interfaces")
+    stub = NetBoxStub(ring_data(args.interfaces))
+    # The server runs in its own process, so that its memory is not traced
+    server = multiprocessing.get_context('fork').Process(target=stub.server.serve_forever, daemon=True)
+    server.start()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as home:
+            # Learned block sizes are not saved into the configuration directory of the user
+            os.environ['HOME'] = home
+            for page_size in PAGE_SIZES:
+                results.append((page_size,) + measure(stub.url, page_size))
+    finally:
+        server.terminate()
+        stub.server.server_close()
+    print(f"{'page size':>10} {'interfaces':>10} {'time, s':>8} {'peak, MiB':>10} {'retained, MiB':>14} {'transient, MiB':>15}")
+    for page_size, elapsed, peak, retained, interfaces in results:
+        print(f"{page_size:>10} {interfaces:>10} {elapsed:>8.1f} {peak / MIB:>10.1f} {retained / MIB:>14.1f} "
+              f"{(peak - retained) / MIB:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Memory benchmark of interface records held by NBNetwork.
+
+Adds interfaces of a synthetic topology to NBNetwork, and to a network that keeps them the way nrx did before
+records, as dicts with a list of node records, a list of interface IDs and a dict of their cable IDs. Reports
+Python memory retained by each, measured with tracemalloc.
+
+Run from the repository root: PYTHONPATH=./src python -m tests.bench.records [--interfaces N]
+"""
+
+import argparse
+import tracemalloc
+
+from nrx.nrx import NBNetwork
+from nrx.records import InterfaceRecord
+
+INTERFACES_PER_DEVICE = 50
+MIB = 1024 * 1024
+
+
+class DictNetwork(NBNetwork):
+    """NBNetwork with interfaces kept as dicts, and the indexes nrx kept for them before records"""
+    def __init__(self):
+        super().__init__()
+        self.nodes = []
+        self.dict_interface_ids = []
+        self.interface_cables = {}
+
+    def add_interface(self, interface_id, cable_id, i):
+        if interface_id in self.interfaces_by_id:
+            return False
+        self.nodes.append(i)
+        i["node_id"] = len(self.nodes) - 1
+        self.interfaces.append(i)
+        i["interface_index"] = len(self.interfaces) - 1
+        self.dict_interface_ids.append(interface_id)
+        self.interfaces_by_id[interface_id] = i
+        self.cable_ids.add(cable_id)
+        self.interface_cables[interface_id] = cable_id
+        return True
+
+
+def interfaces_of(count):
+    """Yield (interface ID, cable ID, name) of interfaces, with a pair of interfaces per cable"""
+    for n in range(count):
+        yield 100000 + n, 500000 + n // 2, f"Ethernet{n % INTERFACES_PER_DEVICE // 8 + 1}/{n % 8 + 1}"
+
+
+def measure(nb_net, interfaces, interface_record):
+    """Add interfaces to the network, return retained memory in bytes"""
+    tracemalloc.start()
+    for interface_id, cable_id, name in interfaces_of(interfaces):
+        nb_net.add_interface(interface_id, cable_id, interface_record(interface_id, name))
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--interfaces', type=int, default=200000, help="number of interfaces")
+    args = parser.parse_args()
+    dicts = measure(DictNetwork(), args.interfaces,
+                    lambda interface_id, name: {"id": interface_id, "type": "interface", "name": name, "node_id": -1})
+    records = measure(NBNetwork(), args.interfaces, InterfaceRecord)
+    print(f"{'interfaces':>10} {'dicts, MiB':>11} {'records, MiB':>13} {'reduction':>10}")
+    print(f"{args.interfaces:>10} {dicts / MIB:>11.1f} {records / MIB:>13.1f} {1 - records / dicts:>10.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark of rendering synthetic topologies from CYJS files.
+
+Generates fat-tree, Clos, ring or campus topologies of increasing sizes, writes them as CYJS files the way nrx
+exports them, and reads and renders each one with NetworkTopology. Reports time of reading, building and
+rendering the topology and writing files, with the size of the CYJS file and devices rendered per second.
+Templates render every device as a Containerlab node by default; use --templates and --output to render
+with other templates, such as a checkout of netreplica/templates.
+
+Run from the repository root: PYTHONPATH=./src python -m tests.bench.render [--topology fat-tree]
+[--sizes 8,16,32] [--templates DIR --output FORMAT] [--dir DIR]
+"""
+
+import argparse
+import contextlib
+import os
+import pathlib
+import tempfile
+import time
+
+from nrx.nrx import NetworkTopology
+from nrx.stats import ExportStats, STATS_CONFIG_KEY
+from tests.unit.topologies import campus, clos, fat_tree, render_config, ring, write_cyjs, write_templates
+
+MIB = 1024 * 1024
+# Generators of each topology by size, with default sizes of up to about ten thousand devices
+TOPOLOGIES = {
+    'fat-tree': (fat_tree, "8,16,32"),
+    'clos': (lambda leaves: clos(leaves, spines=4, servers=16), "10,100,500"),
+    'ring': (ring, "100,1000,10000"),
+    'campus': (lambda buildings: campus(buildings, access=16), "10,100,500"),
+}
+
+
+def measure(cyjs_path, config):
+    """Read and render a CYJS file, return time in seconds and the stats"""
+    config[STATS_CONFIG_KEY] = ExportStats()
+    start = time.perf_counter()
+    # nrx reports each file it writes, which would be tens of thousands of lines
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        topo = NetworkTopology(config)
+        topo.build_from_file(cyjs_path)
+        topo.export_topology()
+    return time.perf_counter() - start, config[STATS_CONFIG_KEY]
+
+
+def run(args, work_dir):
+    """Generate and render topologies of each size, return rows of the summary"""
+    generator, default_sizes = TOPOLOGIES[args.topology]
+    templates = pathlib.Path(args.templates) if args.templates is not None else work_dir / "templates"
+    if args.templates is None:
+        write_templates(templates)
+    results = []
+    for size in [int(n) for n in (args.sizes or default_sizes).split(',')]:
+        G = generator(size)
+        cyjs_path = work_dir / f"{args.topology}-{size}.cyjs"
+        write_cyjs(G, cyjs_path)
+        config = render_config(templates, work_dir / f"{args.topology}-{size}", output_format=args.output)
+        elapsed, stats = measure(cyjs_path, config)
+        print(f"{args.topology} of size {size}:")
+        print(stats.table())
+        print()
+        phases = stats.phases
+        devices = phases['topology'].objects['nodes']
+        results.append((size, devices, phases['topology'].objects['links'], os.path.getsize(cyjs_path) / MIB,
+                        [phases[p].seconds if p in phases else 0.0 for p in ['read', 'topology', 'render', 'write']],
+                        devices / elapsed))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--topology', choices=list(TOPOLOGIES), default='fat-tree', help="topology to generate")
+    parser.add_argument('--sizes', help="comma-separated sizes: arity of a fat-tree, number of leaves of a Clos, "
+                                        "routers of a ring or buildings of a campus")
+    parser.add_argument('--templates', help="directory with templates, platform_map.yaml and formats.yaml")
+    parser.add_argument('--output', default='clab', help="output format of the templates")
+    parser.add_argument('--dir', help="directory to keep CYJS files and rendered topologies in")
+    args = parser.parse_args()
+    if args.dir is not None:
+        os.makedirs(args.dir, exist_ok=True)
+        results = run(args, pathlib.Path(args.dir))
+    else:
+        with tempfile.TemporaryDirectory() as work_dir:
+            results = run(args, pathlib.Path(work_dir))
+    print(f"{'size':>6} {'devices':>8} {'links':>7} {'CYJS, MiB':>10} {'read, s':>8} {'topology, s':>12} "
+          f"{'render, s':>10} {'write, s':>9} {'devices/s':>10}")
+    for size, devices, links, cyjs_size, seconds, rate in results:
+        read, topology, render, write = seconds
+        print(f"{size:>6} {devices:>8} {links:>7} {cyjs_size:>10.1f} {read:>8.2f} {topology:>12.2f} "
+              f"{render:>10.2f} {write:>9.2f} {rate:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
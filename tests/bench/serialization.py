@@ -0,0 +1,64 @@
+"""Benchmark of JSON and YAML serialization backends on a CYJS graph.
+
+Parses and serializes the graph of tests/lrg/data/lrg.cyjs, or of another CYJS file, with the standard json
+module and orjson, and as YAML with the pure-Python PyYAML loader and dumper and with libyaml. Reports the best
+time of several rounds of each operation, and the speedup of the backend nrx uses over the standard one.
+
+Run from the repository root: PYTHONPATH=./src python -m tests.bench.serialization [--file CYJS] [--rounds N]
+"""
+
+import argparse
+import json
+import os
+import time
+
+import yaml
+
+from nrx import serialization
+from nrx.serialization import dumps_json, dump_yaml, load_yaml, loads_json
+
+LRG_CYJS = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "lrg", "data", "lrg.cyjs"))
+MIB = 1024 * 1024
+
+
+def best_time(operation, rounds):
+    """Return the shortest time in seconds of running operation for a number of rounds"""
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        operation()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def measure(text, rounds):
+    """Return (operation, standard seconds, nrx seconds) of each operation on CYJS text"""
+    data = json.loads(text)
+    yaml_text = yaml.safe_dump(data)
+    return [
+        ("JSON load", best_time(lambda: json.loads(text), rounds), best_time(lambda: loads_json(text), rounds)),
+        ("JSON dump", best_time(lambda: json.dumps(data), rounds), best_time(lambda: dumps_json(data), rounds)),
+        ("JSON dump, indent=4", best_time(lambda: json.dumps(data, indent=4), rounds),
+         best_time(lambda: dumps_json(data, indent=4), rounds)),
+        ("YAML load", best_time(lambda: yaml.safe_load(yaml_text), rounds),
+         best_time(lambda: load_yaml(yaml_text), rounds)),
+        ("YAML dump", best_time(lambda: yaml.safe_dump(data), rounds), best_time(lambda: dump_yaml(data), rounds)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--file', default=LRG_CYJS, help="CYJS file to serialize, default: the lrg fixture")
+    parser.add_argument('--rounds', type=int, default=5, help="rounds of each operation, the best one is reported")
+    args = parser.parse_args()
+    with open(args.file, 'r', encoding='utf-8') as f:
+        text = f.read()
+    print(f"{args.file}: {len(text) / MIB:.1f} MiB, JSON backend: {serialization.JSON_BACKEND}, "
+          f"YAML backend: {serialization.YAML_BACKEND}")
+    print(f"{'operation':<20} {'standard, s':>12} {'nrx, s':>8} {'speedup':>8}")
+    for operation, standard, accelerated in measure(text, max(1, args.rounds)):
+        print(f"{operation:<20} {standard:>12.4f} {accelerated:>8.4f} {standard / accelerated:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Benchmark of loading topology snapshots against CYJS.
+
+Writes the graph of tests/lrg/data/lrg.cyjs, or of another CYJS file, as indented, compact and gzip-compressed
+CYJS and as a topology snapshot, and loads each file into a NetworkX graph: CYJS with json.load and
+nx.cytoscape_graph, and with nrx as a whole and streamed, the snapshot with TopologySnapshot. Reports the size
+of each file, and the best load time of several rounds with the speedup over json.load of the indented file.
+
+Run from the repository root: PYTHONPATH=./src python -m tests.bench.snapshot [--file CYJS] [--rounds N]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+
+import networkx as nx
+
+from nrx.cyjs import cyjs_file_name, open_cyjs, read_cyjs_file, write_cyjs
+from nrx.topology_snapshot import SNAPSHOT_FILE_EXTENSION, TopologySnapshot
+from tests.bench.serialization import LRG_CYJS, best_time
+
+KIB = 1024
+
+
+def read_json(path):
+    """Read a graph from a CYJS file as a whole"""
+    with open_cyjs(path, 'rb') as f:
+        return nx.cytoscape_graph(json.load(f))
+
+
+def read_stream(path):
+    """Read a graph from a CYJS file element by element"""
+    return read_cyjs_file(path, stream=True)
+
+
+def write_files(G, dir_path):
+    """Write the graph in each format, return (label, path, load function) of the files"""
+    files = []
+    for label, compact, compression in [("CYJS", False, ''), ("CYJS compact", True, ''), ("CYJS compact, gz", True, 'gz')]:
+        path = os.path.join(dir_path, cyjs_file_name(label.replace(", ", "-").replace(" ", "-"), compression))
+        with open_cyjs(path, 'w') as f:
+            write_cyjs(G, f, compact)
+        files.append((label, path, read_json))
+        files.append((label, path, read_cyjs_file))
+        files.append((label, path, read_stream))
+    path = os.path.join(dir_path, "snapshot" + SNAPSHOT_FILE_EXTENSION)
+    TopologySnapshot.from_graph(G).write(path)
+    files.append(("snapshot", path, lambda p: TopologySnapshot.read(p).graph()))
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--file', default=LRG_CYJS, help="CYJS file with the graph, default: the lrg fixture")
+    parser.add_argument('--rounds', type=int, default=5, help="rounds of each load, the best one is reported")
+    args = parser.parse_args()
+    G = read_cyjs_file(args.file)
+    print(f"{args.file}: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
+    print(f"{'file':<18} {'size, KiB':>10} {'reader':>16} {'load, s':>8} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = None
+        for label, path, load in write_files(G, tmp):
+            elapsed = best_time(lambda: load(path), max(1, args.rounds))  # pylint: disable=cell-var-from-loop
+            baseline = baseline or elapsed
+            reader = {read_json: "json.load", read_cyjs_file: "read_cyjs_file", read_stream: "stream"}.get(load, "TopologySnapshot")
+            print(f"{label:<18} {os.path.getsize(path) / KIB:>10.1f} {reader:>16} {elapsed:>8.4f} {baseline / elapsed:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
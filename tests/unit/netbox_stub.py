@@ -0,0 +1,650 @@
+"""Local stand-in for the NetBox REST API endpoints used by nrx."""
+
+import json
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+NB_DEFAULT_PAGE_SIZE = 50
+NB_MAX_PAGE_SIZE = 1000
+
+
+class NetBoxData:
+    """In-memory NetBox objects, serialized the way NetBox REST API returns them.
+
+    Object URLs are relative, the stub makes them absolute when responding.
+    """
+    def __init__(self):
+        self.sites = {}
+        self.devices = {}
+        self.interfaces = {}
+        # Front and rear ports by endpoint
+        self.ports = {"front-ports": {}, "rear-ports": {}}
+        self.cables = {}
+        self.configs = {}
+        # Config templates and contexts by ID, and device roles and platforms by slug, by endpoint, with
+        # last_updated values telling revisions of the inputs of rendered configurations
+        self.config_inputs = {
+            "config-templates": {1: {"id": 1, "name": "default", "last_updated": "2024-01-01T00:00:00Z"}},
+            "config-contexts": {1: {"id": 1, "name": "ntp", "last_updated": "2024-01-01T00:00:00Z"}},
+            "device-roles": {},
+            "platforms": {},
+        }
+        self.tags = {}
+        # Interface types NetBox accepts in type filters, None accepts any like NetBox versions that know all of them
+        self.interface_types = None
+        # Values derived from devices, interfaces, cables and ports, cleared when they are added
+        self.derived = {}
+
+    def url(self, endpoint, object_id):
+        """Return API URL of an object."""
+        return f"/api/dcim/{endpoint}/{object_id}/"
+
+    def tag(self, name):
+        """Return a tag by name, adding it with a slug made of the name."""
+        if name not in self.tags:
+            self.tags[name] = {"id": len(self.tags) + 1, "url": f"/api/extras/tags/{len(self.tags) + 1}/",
+                               "name": name, "slug": name.lower().replace(" ", "-")}
+        return self.tags[name]
+
+    def add_site(self, site_id, name):
+        """Add a site."""
+        self.sites[site_id] = {"id": site_id, "url": self.url("sites", site_id), "display": name,
+                               "name": name, "slug": name.lower()}
+
+    def add_device(self, device_id, name, site_id, role="router", platform="eos", tags=None):
+        """Add a device."""
+        self.derived.clear()
+        site = self.sites[site_id]
+        for endpoint, slug in [("device-roles", role), ("platforms", platform)]:
+            self.config_inputs[endpoint].setdefault(slug, {"id": 1, "name": slug.title(), "slug": slug,
+                                                           "last_updated": "2024-01-01T00:00:00Z"})
+        self.devices[device_id] = {
+            "id": device_id, "url": self.url("devices", device_id), "display": name, "name": name,
+            "device_type": {"id": 1, "url": self.url("device-types", 1), "display": "Generic", "model": "Generic",
+                            "slug": "generic",
+                            "manufacturer": {"id": 1, "url": self.url("manufacturers", 1), "display": "Acme",
+                                             "name": "Acme", "slug": "acme"}},
+            "role": {"id": 1, "url": self.url("device-roles", 1), "display": role, "name": role.title(), "slug": role},
+            "platform": {"id": 1, "url": self.url("platforms", 1), "display": platform, "name": platform.upper(),
+                         "slug": platform},
+            "site": {"id": site["id"], "url": site["url"], "display": site["name"], "name": site["name"],
+                     "slug": site["slug"]},
+            "status": {"value": "active", "label": "Active"},
+            "primary_ip4": None,
+            "primary_ip6": None,
+            "serial": f"SN{device_id:06}",
+            "tags": [self.tag(t) for t in (tags or [])],
+            "custom_fields": {},
+            "config_context": {"ntp": ["10.0.0.1"]},
+            "last_updated": "2024-01-01T00:00:00Z",
+        }
+
+    def _port(self, endpoint, port_id, device_id, name):
+        device = self.devices[device_id]
+        return {"id": port_id, "url": self.url(endpoint, port_id), "display": name, "name": name,
+                "device": {"id": device_id, "url": device["url"], "display": device["name"], "name": device["name"]},
+                "cable": None, "cable_end": None}
+
+    def add_interface(self, interface_id, device_id, name, if_type="1000base-t", tags=None):
+        """Add a physical interface."""
+        self.derived.clear()
+        interface = self._port("interfaces", interface_id, device_id, name)
+        interface["type"] = {"value": if_type, "label": if_type}
+        interface["kind"] = "physical"
+        interface["tags"] = [self.tag(t) for t in (tags or [])]
+        self.interfaces[interface_id] = interface
+
+    def add_front_port(self, port_id, device_id, name, rear_port_id, position=1):
+        """Add a front port mapped to a position of a rear port."""
+        self.derived.clear()
+        port = self._port("front-ports", port_id, device_id, name)
+        port["rear_port"] = {"id": rear_port_id, "url": self.url("rear-ports", rear_port_id)}
+        port["rear_port_position"] = position
+        self.ports["front-ports"][port_id] = port
+
+    def add_rear_port(self, port_id, device_id, name, positions=1):
+        """Add a rear port."""
+        self.derived.clear()
+        port = self._port("rear-ports", port_id, device_id, name)
+        port["positions"] = positions
+        self.ports["rear-ports"][port_id] = port
+
+    def _termination(self, object_type, object_id):
+        port = self._ports(object_type)[object_id]
+        return {"object_type": object_type, "object_id": object_id,
+                "object": {k: v for k, v in port.items() if k not in ["cable", "cable_end", "tags", "type", "kind"]}}
+
+    def _ports(self, object_type):
+        return {"dcim.interface": self.interfaces, "dcim.frontport": self.ports["front-ports"],
+                "dcim.rearport": self.ports["rear-ports"]}[object_type]
+
+    def add_cable(self, cable_id, a, b):
+        """Add a cable between (object_type, object_id) terminations a and b."""
+        self.derived.clear()
+        self.cables[cable_id] = {"id": cable_id, "url": self.url("cables", cable_id), "display": f"#{cable_id}",
+                                 "a_terminations": [self._termination(*a)],
+                                 "b_terminations": [self._termination(*b)]}
+        for (object_type, object_id), cable_end in ((a, "A"), (b, "B")):
+            self._ports(object_type)[object_id]["cable"] = {"id": cable_id, "url": self.url("cables", cable_id),
+                                                            "display": f"#{cable_id}"}
+            self._ports(object_type)[object_id]["cable_end"] = cable_end
+
+    def _far_end(self, object_type, object_id):
+        """Return (object_type, object_id) of the other end of the cable attached to a port."""
+        port = self._ports(object_type)[object_id]
+        if port["cable"] is None:
+            return None
+        cable = self.cables[port["cable"]["id"]]
+        a, b = cable["a_terminations"][0], cable["b_terminations"][0]
+        near, far = (a, b) if (a["object_type"], a["object_id"]) == (object_type, object_id) else (b, a)
+        return cable, near, far
+
+    def trace(self, interface_id):
+        """Return cable trace segments from an interface, through front and rear ports."""
+        segments = []
+        current = ("dcim.interface", interface_id)
+        position = 1
+        while current is not None:
+            far_end = self._far_end(*current)
+            if far_end is None:
+                break
+            cable, near, far = far_end
+            segments.append([[near["object"]], {"id": cable["id"], "url": cable["url"]}, [far["object"]]])
+            if far["object_type"] == "dcim.frontport":
+                front_port = self.ports["front-ports"][far["object_id"]]
+                position = front_port["rear_port_position"]
+                current = ("dcim.rearport", front_port["rear_port"]["id"])
+            elif far["object_type"] == "dcim.rearport":
+                front_port_id = self.front_port_ids().get((far["object_id"], position))
+                current = ("dcim.frontport", front_port_id) if front_port_id is not None else None
+            else:
+                current = None
+        return segments
+
+    def graphql_device(self, device, fields):
+        """Return selected fields of a device with its interfaces, the way NetBox GraphQL API returns them"""
+        values = graphql_values({k: v for k, v in device.items() if k in fields})
+        if "status" in fields:
+            values["status"] = f"STATUS_{device['status']['value'].upper()}"
+        values["interfaces"] = []
+        for i in sorted((i for i in self.interfaces.values() if i["device"]["id"] == device["id"]),
+                        key=lambda i: i["name"]):
+            interface = graphql_values({k: v for k, v in i.items() if k not in ["device", "type", "kind", "cable"]})
+            interface["type"] = "TYPE_" + i["type"]["value"].replace("-", "_").replace(".", "_").upper()
+            interface["cable"] = None
+            interface["link_peers"] = []
+            interface["connected_endpoints"] = []
+            if i["cable"] is not None:
+                cable = self.cables[i["cable"]["id"]]
+                interface["cable"] = {"id": str(cable["id"]),
+                                      "terminations": [{"cable_end": "A"} for _ in cable["a_terminations"]] +
+                                                      [{"cable_end": "B"} for _ in cable["b_terminations"]]}
+                _, _, far = self._far_end("dcim.interface", i["id"])
+                interface["link_peers"] = [self.graphql_port(far["object_type"], far["object_id"])]
+                segments = self.trace(i["id"])
+                if self.connected(i):
+                    interface["connected_endpoints"] = [self.graphql_port("dcim.interface", segments[-1][2][0]["id"])]
+            values["interfaces"].append(interface)
+        return values
+
+    def graphql_port(self, object_type, object_id):
+        """Return GraphQL representation of a port as a link peer or an endpoint"""
+        port = self._ports(object_type)[object_id]
+        typename = {"dcim.interface": "InterfaceType", "dcim.frontport": "FrontPortType",
+                    "dcim.rearport": "RearPortType"}[object_type]
+        return {"__typename": typename, "id": str(port["id"]), "name": port["name"],
+                "device": {"id": str(port["device"]["id"]), "name": port["device"]["name"]}}
+
+    def connected(self, interface):
+        """Check if an interface has a cable path ending on another interface."""
+        connected = self.derived.setdefault("connected", {})
+        if interface["id"] not in connected:
+            segments = self.trace(interface["id"])
+            connected[interface["id"]] = len(segments) > 0 and "interfaces" in segments[-1][2][0]["url"]
+        return connected[interface["id"]]
+
+    def front_port_ids(self):
+        """Return front port IDs by (rear port ID, position)."""
+        if "front_port_ids" not in self.derived:
+            self.derived["front_port_ids"] = {(p["rear_port"]["id"], p["rear_port_position"]): p["id"]
+                                              for p in self.ports["front-ports"].values()}
+        return self.derived["front_port_ids"]
+
+    def device_positions(self):
+        """Return positions of devices by ID, in the order NetBox lists them."""
+        if "device_positions" not in self.derived:
+            ordered = sorted(self.devices.values(), key=device_order)
+            self.derived["device_positions"] = {d["id"]: i for i, d in enumerate(ordered)}
+        return self.derived["device_positions"]
+
+    def device_interfaces(self):
+        """Return interface IDs by device ID, to answer queries by device IDs without scanning all interfaces."""
+        if "device_interfaces" not in self.derived:
+            device_interfaces = {}
+            for i in self.interfaces.values():
+                device_interfaces.setdefault(i["device"]["id"], []).append(i["id"])
+            self.derived["device_interfaces"] = device_interfaces
+        return self.derived["device_interfaces"]
+
+
+def device_order(device):
+    """Return sort key of a device in the order NetBox lists devices: by name with numbers ordered naturally, then ID."""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", device["name"])], device["id"]
+
+
+def graphql_values(values):
+    """Convert REST API values to GraphQL API values: IDs become strings, URLs are not available"""
+    if isinstance(values, list):
+        return [graphql_values(v) for v in values]
+    if not isinstance(values, dict):
+        return values
+    return {k: str(v) if k == "id" else graphql_values(v) for k, v in values.items() if k != "url"}
+
+
+def graphql_selection(query, field):
+    """Return names of the fields selected at the top level of the selection of a field in a GraphQL query"""
+    start = query.index("{", query.index(")", query.index(field))) + 1
+    names, depth, token = [], 0, ""
+    for c in query[start:]:
+        if c.isalnum() or c == "_":
+            token += c
+            continue
+        if depth == 0 and token:
+            names.append(token)
+        token = ""
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            if depth == 0:
+                break
+            depth -= 1
+    return names
+
+
+def is_true(query, key):
+    """Check if a boolean filter is set to true, the way Django accepts it"""
+    return query.get(key, [""])[0].lower() == "true"
+
+
+def matches(values, wanted):
+    """Check if any of the object values is in the list of wanted filter values."""
+    return any(str(v) in wanted for v in values)
+
+
+def by_ids(objects, wanted):
+    """Return objects with IDs from the list of wanted filter values."""
+    return [objects[int(i)] for i in set(wanted) if int(i) in objects]
+
+
+class Faults:
+    """Latency and errors the stand-in server injects into its responses.
+
+    Each request waits `latency` seconds. The next `overloads` requests, and other requests with probability
+    `error_rate`, are answered with `status`, and with a Retry-After header if `retry_after` is set. Connections
+    of the next `resets` requests are closed without a response.
+    """
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.overloads = 0
+        self.resets = 0
+        self.status = 429
+        self.retry_after = None
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def inject(self):
+        """Delay a request, return True if it is to be answered with an error."""
+        if self.latency > 0:
+            sleep(self.latency)
+        with self.lock:
+            if self.overloads > 0:
+                self.overloads -= 1
+                return True
+            return self.error_rate > 0 and self.random.random() < self.error_rate
+
+    def reset(self):
+        """Return True if the connection of a request is to be closed without a response."""
+        with self.lock:
+            if self.resets > 0:
+                self.resets -= 1
+                return True
+            return False
+
+
+class NetBoxStub:
+    """Threaded HTTP server emulating the NetBox REST API over NetBoxData."""
+    def __init__(self, data=None, api_version="4.1", max_url_length=None):
+        self.max_url_length = max_url_length
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.data = data if data is not None else NetBoxData()
+        self.api_version = api_version
+        # Object changes log, None emulates NetBox without the change log endpoint
+        self.object_changes = None
+        self.faults = Faults()
+        self.requests = []
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Request handler bound to the stub."""
+            # Keep connections alive between requests, like NetBox behind a web server
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                pass
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Handle GET requests."""
+                stub.requests.append(("GET", self.path))
+                if self.overloaded():
+                    return
+                if stub.max_url_length is not None and len(stub.url + self.path) > stub.max_url_length:
+                    self.respond(414, {"detail": "Request-URI Too Long"})
+                    return
+                status, body = stub.get(self.path)
+                self.respond(status, body)
+
+            def do_POST(self):  # pylint: disable=invalid-name
+                """Handle POST requests."""
+                stub.requests.append(("POST", self.path))
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length) if length > 0 else b""
+                if self.overloaded():
+                    return
+                status, body = stub.post(self.path, body)
+                self.respond(status, body)
+
+            def overloaded(self):
+                """Answer with an error if the stub injects one."""
+                faults = stub.faults
+                if faults.reset():
+                    self.close_connection = True  # pylint: disable=attribute-defined-outside-init
+                    return True
+                if not faults.inject():
+                    return False
+                headers = {"Retry-After": faults.retry_after} if faults.retry_after is not None else {}
+                self.respond(faults.status, {"detail": "Request was throttled."}, headers=headers)
+                return True
+
+            def respond(self, status, body, headers=None):
+                """Send JSON response."""
+                payload = json.dumps(body).replace('"/api/', f'"{stub.url}/api/').encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("API-Version", stub.api_version)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+    def _list(self, path, query, objects):
+        if objects is None:
+            return 400, {"detail": "Invalid filter values."}
+        limit = min(int(query.get("limit", [NB_DEFAULT_PAGE_SIZE])[0]) or NB_MAX_PAGE_SIZE, NB_MAX_PAGE_SIZE)
+        offset = int(query.get("offset", [0])[0])
+        page = objects[offset:offset + limit]
+        next_url = None
+        if offset + limit < len(objects):
+            # like NetBox, the next page keeps the filters of the query
+            filters = {k: v for k, v in query.items() if k not in ["limit", "offset"]}
+            next_url = f"{self.url}{path}?{urlencode(filters, doseq=True)}&limit={limit}&offset={offset + limit}"
+        return 200, {"count": len(objects), "next": next_url, "previous": None, "results": page}
+
+    def get(self, path):
+        """Return status and body for a GET request."""
+        parts = urlsplit(path)
+        query = parse_qs(parts.query)
+        route = parts.path.strip("/").split("/")
+        data = self.data
+        if route == ["api"]:
+            return 200, {}
+        if len(route) == 5 and route[2] == "interfaces" and route[4] == "trace":
+            return 200, data.trace(int(route[3]))
+        if len(route) == 4 and route[3].isdigit():
+            obj = self._objects(route[2]).get(int(route[3]))
+            return (200, obj) if obj is not None else (404, {"detail": "Not found."})
+        if len(route) != 3:
+            return 404, {"detail": "Not found."}
+        endpoint = route[2]
+        if endpoint in ["sites", "tags"]:
+            named = data.sites if endpoint == "sites" else data.tags
+            objects = [o for o in named.values() if "name" not in query or o["name"] in query["name"]]
+        elif endpoint == "devices":
+            objects = self._devices(query)
+        elif endpoint == "interfaces":
+            objects = self._interfaces(query)
+        elif endpoint in ["front-ports", "rear-ports"]:
+            objects = self._ports(endpoint, query)
+        elif route[1:] == ["core", "object-changes"] and self.object_changes is not None:
+            objects = [c for c in self.object_changes if "time_after" not in query or c["time"] >= query["time_after"][0]]
+            objects.sort(key=lambda c: -c["id"])
+        elif route[1] in ["extras", "dcim"] and endpoint in data.config_inputs:
+            objects = list(data.config_inputs[endpoint].values())
+        elif endpoint == "cables":
+            objects = list(data.cables.values()) if "id" not in query else by_ids(data.cables, query["id"])
+            objects.sort(key=lambda c: c["id"])
+        else:
+            return 404, {"detail": "Not found."}
+        return self._list(parts.path, query, objects)
+
+    def add_object_change(self, time, object_type="dcim.device", object_id=0, action="update", related=None):
+        """Log a change of an object at an ISO time string, related is (object_type, object_id) of the related object."""
+        if self.object_changes is None:
+            self.object_changes = []
+        related_type, related_id = related if related is not None else (None, None)
+        self.object_changes.append({"id": len(self.object_changes) + 1, "time": time,
+                                    "action": {"value": action, "label": action.capitalize()},
+                                    "changed_object_type": object_type, "changed_object_id": object_id,
+                                    "related_object_type": related_type, "related_object_id": related_id,
+                                    "prechange_data": None, "postchange_data": None})
+
+    def _objects(self, endpoint):
+        data = self.data
+        return {"sites": data.sites, "devices": data.devices, "interfaces": data.interfaces,
+                "cables": data.cables, **data.ports}.get(endpoint, {})
+
+    def _ports(self, endpoint, query):
+        objects = []
+        for p in self._objects(endpoint).values():
+            site_id = self.data.devices[p["device"]["id"]]["site"]["id"]
+            if "site_id" in query and not matches([site_id], query["site_id"]):
+                continue
+            if is_true(query, "cabled") and p["cable"] is None:
+                continue
+            objects.append(p)
+        objects.sort(key=lambda p: (p["device"]["name"], p["name"]))
+        return objects
+
+    def _devices(self, query):
+        objects = []
+        for d in self.data.devices.values():
+            if "id" in query and not matches([d["id"]], query["id"]):
+                continue
+            if "site_id" in query and not matches([d["site"]["id"]], query["site_id"]):
+                continue
+            if "role" in query and not matches([d["role"]["slug"]], query["role"]):
+                continue
+            # tag filter uses AND logic
+            if any(t not in [tag["slug"] for tag in d["tags"]] for t in query.get("tag", [])):
+                continue
+            objects.append(d)
+        objects.sort(key=device_order)
+        if "exclude" in query:
+            objects = [{k: v for k, v in d.items() if k not in query["exclude"][0].split(",")} for d in objects]
+        if "fields" in query:
+            objects = [{k: v for k, v in d.items() if k in query["fields"][0].split(",")} for d in objects]
+        return objects
+
+    def graphql(self, query):
+        """Answer device_list GraphQL query, with the selected device fields, and all fields of nested objects.
+
+        Supports pagination and filters by site_id, role and tag generated from REST filtersets.
+        """
+        pagination = re.search(r"pagination: \{offset: (\d+), limit: (\d+)\}", query)
+        offset, limit = int(pagination.group(1)), int(pagination.group(2))
+        rest_query = {}
+        for key in ["site_id", "role", "tag"]:
+            values = re.search(key + r": \[([^\]]*)\]", query)
+            if values is not None:
+                rest_query[key] = json.loads(f"[{values.group(1)}]")
+        fields = graphql_selection(query, "device_list")
+        devices = [self.data.graphql_device(d, fields) for d in self._devices(rest_query)[offset:offset + limit]]
+        return {"data": {"device_list": devices}}
+
+    def _interfaces(self, query):
+        """Return interfaces matching the query, or None if it filters by types NetBox doesn't know."""
+        known = self.data.interface_types
+        if known is not None and not set(query.get("type", []) + query.get("type__n", [])) <= set(known):
+            return None
+        device_position = self.data.device_positions()
+        objects = []
+        if "id" in query:
+            interfaces = by_ids(self.data.interfaces, query["id"])
+        elif "device_id" in query:
+            interfaces = by_ids(self.data.interfaces, [i for device_id in set(query["device_id"])
+                                                       for i in self.data.device_interfaces().get(int(device_id), [])])
+        else:
+            interfaces = self.data.interfaces.values()
+        for i in interfaces:
+            if is_true(query, "cabled") and i["cable"] is None:
+                continue
+            if is_true(query, "connected") and not self.data.connected(i):
+                continue
+            if i["type"]["value"] in query.get("type__n", []):
+                continue
+            # tag filter uses AND logic
+            if any(t not in [tag["slug"] for tag in i["tags"]] for t in query.get("tag", [])):
+                continue
+            objects.append(i)
+        objects.sort(key=lambda i: (device_position[i["device"]["id"]], i["name"]))
+        if "brief" in query:
+            objects = [{k: i[k] for k in ["id", "url", "display", "device", "name", "cable"]} for i in objects]
+        if "fields" in query:
+            objects = [{k: v for k, v in i.items() if k in query["fields"][0].split(",")} for i in objects]
+        return objects
+
+    def post(self, path, body=b""):
+        """Return status and body for a POST request."""
+        route = urlsplit(path).path.strip("/").split("/")
+        if route == ["graphql"]:
+            return 200, self.graphql(json.loads(body)["query"])
+        if len(route) == 5 and route[2] == "devices" and route[4] == "render-config":
+            device = self.data.devices.get(int(route[3]))
+            if device is None:
+                return 404, {"detail": "Not found."}
+            # like NetBox, the config template has fields with JSON literals
+            template = {"id": 1, "data_synced": None, "auto_sync_enabled": False}
+            return 200, {"configtemplate": template, "content": self.data.configs.get(device["id"], "")}
+        return 404, {"detail": "Not found."}
+
+
+def patch_panel_topology():
+    """Two routers connected directly, and through a pair of patch panels."""
+    data = NetBoxData()
+    data.add_site(1, "DC1")
+    data.add_device(1, "r1", 1)
+    data.add_device(2, "r2", 1)
+    data.add_device(3, "pp1", 1, role="patch-panel")
+    data.add_device(4, "pp2", 1, role="patch-panel")
+    data.add_interface(11, 1, "eth1")
+    data.add_interface(12, 1, "eth2")
+    data.add_interface(21, 2, "eth1")
+    data.add_interface(22, 2, "eth2")
+    data.add_rear_port(41, 3, "rear1")
+    data.add_rear_port(42, 4, "rear1")
+    data.add_front_port(31, 3, "front1", 41)
+    data.add_front_port(32, 4, "front1", 42)
+    data.add_cable(100, ("dcim.interface", 11), ("dcim.interface", 21))
+    data.add_cable(101, ("dcim.interface", 12), ("dcim.frontport", 31))
+    data.add_cable(102, ("dcim.rearport", 41), ("dcim.rearport", 42))
+    data.add_cable(103, ("dcim.frontport", 32), ("dcim.interface", 22))
+    data.configs = {1: "hostname r1", 2: "hostname r2"}
+    return data
+
+
+def stub_config(url, api_backend='sync', nb_api_params=None):
+    """Export configuration for the stand-in server: routers of site DC1, with configs and links"""
+    return {
+        'nb_api_url': url,
+        'nb_api_token': 'test_token',
+        'tls_validate': True,
+        'api_timeout': 10,
+        'api_backend': api_backend,
+        'output_format': 'cyjs',
+        'export_sites': ['DC1'],
+        'export_tags': [],
+        'export_interface_tags': [],
+        'export_device_roles': ['router'],
+        'topology_name': '',
+        'export_configs': True,
+        'export_links': True,
+        'nb_api_params': nb_api_params or {},
+    }
+
+
+def add_patch_ports(data, devices, interface_id):
+    """Add a front port and its rear port to the patch panel in the site of an interface, return their IDs."""
+    panel_id = devices + data.devices[data.interfaces[interface_id]["device"]["id"]]["site"]["id"]
+    rear_id = len(data.ports["rear-ports"]) + len(data.ports["front-ports"]) + 2
+    data.add_rear_port(rear_id, panel_id, f"rear{rear_id // 2}")
+    data.add_front_port(rear_id - 1, panel_id, f"front{rear_id // 2}", rear_id)
+    return rear_id - 1, rear_id
+
+
+def patched_cables(data, devices, a, b):
+    """Return cables of a link between interfaces a and b through patch panels in the sites of both."""
+    a_front, a_rear = add_patch_ports(data, devices, a)
+    b_front, b_rear = add_patch_ports(data, devices, b)
+    return [(("dcim.interface", a), ("dcim.frontport", a_front)),
+            (("dcim.rearport", a_rear), ("dcim.rearport", b_rear)),
+            (("dcim.frontport", b_front), ("dcim.interface", b))]
+
+
+def synthetic_topology(devices, interfaces=8, sites=1, patch_every=0):
+    """Routers in a ring spread over sites, with configurations, and links to the next router in the ring.
+
+    Odd interfaces of each router are cabled to even interfaces of the next one, and routers are assigned
+    to sites in turns, so that with several sites most of the links are between sites. With patch_every,
+    every patch_every-th link runs through front and rear ports of a patch panel in the site of each router.
+    """
+    data = NetBoxData()
+    for s in range(sites):
+        data.add_site(s + 1, f"DC{s + 1}")
+    for n in range(devices):
+        data.add_device(n + 1, f"r{n:05}", n % sites + 1)
+        data.configs[n + 1] = f"hostname r{n:05}"
+        for k in range(interfaces):
+            data.add_interface(n * interfaces + k + 1, n + 1, f"eth{k + 1}")
+    if patch_every > 0:
+        for s in range(sites):
+            data.add_device(devices + s + 1, f"pp{s + 1}", s + 1, role="patch-panel")
+    links = [(n * interfaces + k + 1, (n + 1) % devices * interfaces + k + 2)
+             for n in range(devices) for k in range(0, interfaces - 1, 2)]
+    cable_id = 0
+    for link, (a, b) in enumerate(links, start=1):
+        if patch_every <= 0 or link % patch_every != 0:
+            cables = [(("dcim.interface", a), ("dcim.interface", b))]
+        else:
+            cables = patched_cables(data, devices, a, b)
+        for cable in cables:
+            cable_id += 1
+            data.add_cable(cable_id, *cable)
+    return data
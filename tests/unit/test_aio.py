@@ -0,0 +1,111 @@
+"""Unit tests for the asyncio NetBox API backend."""
+
+import asyncio
+import json
+
+import networkx as nx
+import pytest
+
+from nrx.nrx import NBFactory
+from nrx.governor import ConcurrencyGovernor
+from .netbox_stub import NetBoxStub, patch_panel_topology, stub_config
+
+pytest.importorskip("aiohttp")
+
+from nrx.aio import AsyncNBClient, NBClientError  # pylint: disable=wrong-import-position,wrong-import-order
+
+
+def export_cyjs(url, api_backend, local_cable_tracing=True):
+    """Export the graph from the stand-in server as CYJS data."""
+    nb_factory = NBFactory(stub_config(url, api_backend, {'interfaces_block_size': 1, 'cables_block_size': 2,
+                                                          'local_cable_tracing': local_cable_tracing}))
+    return json.dumps(nx.cytoscape_data(nb_factory.graph()), indent=4)
+
+
+class TestAsyncBackend:
+    """Test that the asyncio backend builds the same graph as the default backend."""
+
+    def test_same_graph_as_sync_backend(self):
+        """Test that both backends produce identical CYJS data, including traced links and configs."""
+        with NetBoxStub(patch_panel_topology()) as stub:
+            sync_cyjs = export_cyjs(stub.url, 'sync')
+            stub.requests.clear()
+            async_cyjs = export_cyjs(stub.url, 'asyncio')
+            async_requests = list(stub.requests)
+        assert async_cyjs == sync_cyjs
+        cyjs = json.loads(async_cyjs)
+        devices = [n['data']['device'] for n in cyjs['elements']['nodes'] if n['data']['type'] == 'device']
+        assert sorted(d['name'] for d in devices) == ['r1', 'r2']
+        assert {d['name']: d['config'] for d in devices} == {'r1': 'hostname r1', 'r2': 'hostname r2'}
+        # two links, each with one edge between interfaces and two edges between interfaces and devices
+        assert len(cyjs['elements']['edges']) == 6
+        # paths through patch panels were resolved from ports fetched by the asyncio client
+        assert any(path.startswith('/api/dcim/front-ports/') for _, path in async_requests)
+        assert not any(path.endswith('/trace/') for _, path in async_requests)
+        assert sum(1 for method, _ in async_requests if method == 'POST') == 2
+
+    def test_traces_without_local_cable_tracing(self):
+        """Test that cables to patch panels are traced by NetBox when local cable tracing is off."""
+        with NetBoxStub(patch_panel_topology()) as stub:
+            sync_cyjs = export_cyjs(stub.url, 'sync', local_cable_tracing=False)
+            stub.requests.clear()
+            async_cyjs = export_cyjs(stub.url, 'asyncio', local_cable_tracing=False)
+            async_requests = list(stub.requests)
+        assert async_cyjs == sync_cyjs
+        assert any(path.endswith('/trace/') for _, path in async_requests)
+
+    def test_overload_retries(self):
+        """Test that overloaded requests are retried until retries run out, and decrease the concurrency limit."""
+        governor = ConcurrencyGovernor(8, retries=2, backoff=0.01)
+
+        async def get_sites(url, overloads):
+            async with AsyncNBClient(url, "test_token", governor=governor) as client:
+                stub.faults.overloads = overloads
+                return await client.get_list("dcim/sites/")
+
+        with NetBoxStub(patch_panel_topology()) as stub:
+            stub.faults.status = 503
+            assert [s['name'] for s in asyncio.run(get_sites(stub.url, 2))] == ['DC1']
+            with pytest.raises(NBClientError) as e:
+                asyncio.run(get_sites(stub.url, 3))
+            assert e.value.status == 503
+            assert len(stub.requests) == 3 + 3
+        assert governor.stats['overloads'] == 5 and governor.stats['retries'] == 4
+        assert governor.stats['min_limit'] < governor.max_limit
+        assert governor.in_flight == 0
+
+    def test_governed_concurrency(self):
+        """Test that requests in flight never exceed the limit of the governor."""
+        governor = ConcurrencyGovernor(2, adaptive=False)
+        in_flight = []
+
+        async def get_sites(url):
+            async with AsyncNBClient(url, "test_token", governor=governor,
+                                     on_response=lambda size: in_flight.append(governor.in_flight)) as client:
+                return await asyncio.gather(*[client.get("dcim/sites/") for _ in range(6)])
+
+        with NetBoxStub(patch_panel_topology()) as stub:
+            stub.faults.latency = 0.01
+            assert len(asyncio.run(get_sites(stub.url))) == 6
+        assert len(in_flight) == 6 and max(in_flight) <= 2
+        assert governor.in_flight == 0
+
+    def test_connection_resets(self):
+        """Test that connections reset by the server are retried, and failures to connect are raised right away."""
+        governor = ConcurrencyGovernor(8, retries=2, backoff=0.01)
+
+        async def get_sites(url):
+            async with AsyncNBClient(url, "test_token", governor=governor) as client:
+                return await client.get("dcim/sites/")
+
+        with NetBoxStub(patch_panel_topology()) as stub:
+            stub.faults.resets = 2
+            assert asyncio.run(get_sites(stub.url))['count'] == 1
+            assert len(stub.requests) == 3
+            url = stub.url
+        # aiohttp itself retries requests on connections that were reused from its pool
+        retries = governor.stats['retries']
+        assert retries >= 1
+        with pytest.raises(NBClientError):
+            asyncio.run(get_sites(url))
+        assert governor.stats['retries'] == retries
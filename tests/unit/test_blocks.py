@@ -0,0 +1,103 @@
+"""Unit tests for adaptive blocks of IDs in NetBox API queries."""
+
+import json
+
+import networkx as nx
+import yaml
+
+from nrx.nrx import NBFactory
+from .netbox_stub import NetBoxData, NetBoxStub, stub_config
+
+
+def ring_topology(size):
+    """Routers connected in a ring, with IDs of different widths."""
+    data = NetBoxData()
+    data.add_site(1, "DC1")
+    for n in range(size):
+        data.add_device(1000 * n + 7, f"r{n:03}", 1)
+        data.add_interface(1000 * n + 8, 1000 * n + 7, "eth1")
+        data.add_interface(1000 * n + 9, 1000 * n + 7, "eth2")
+    for n in range(size):
+        m = (n + 1) % size
+        data.add_cable(n + 1, ("dcim.interface", 1000 * n + 9), ("dcim.interface", 1000 * m + 8))
+    return data
+
+
+def blocks_requests(stub):
+    """Return paths of interfaces and cables queries by blocks of IDs made to the stand-in server."""
+    return [path for _, path in stub.requests
+            if path.startswith(('/api/dcim/interfaces/', '/api/dcim/cables/')) and 'id=' in path]
+
+
+def export_cyjs(url, nb_api_params):
+    """Export the graph from the stand-in server as CYJS data."""
+    return json.dumps(nx.cytoscape_data(NBFactory(stub_config(url, 'sync', nb_api_params)).graph()), indent=4)
+
+
+class TestAdaptiveBlocks:
+    """Test blocks of IDs sized by URL length budget and learned across runs."""
+
+    def test_blocks_fit_url_length(self, monkeypatch, tmp_path):
+        """Test that no query exceeds the URL length limit, and the graph is the same as with fixed small blocks."""
+        monkeypatch.setenv('HOME', str(tmp_path))
+        with NetBoxStub(ring_topology(60)) as stub:
+            fixed_cyjs = export_cyjs(stub.url, {'adaptive_blocks': False, 'interfaces_block_size': 1,
+                                                'cables_block_size': 1})
+            fixed_requests = blocks_requests(stub)
+            stub.requests.clear()
+            stub.max_url_length = 400
+            adaptive_cyjs = export_cyjs(stub.url, {'url_max_length': 400, 'interfaces_block_size': 1,
+                                                   'cables_block_size': 1})
+            adaptive_requests = blocks_requests(stub)
+        assert adaptive_cyjs == fixed_cyjs
+        assert all(len(stub.url + path) <= 400 for path in adaptive_requests)
+        assert len(adaptive_requests) < len(fixed_requests) / 3
+
+    def test_block_size_is_reduced_when_url_is_too_long(self, monkeypatch, tmp_path):
+        """Test that a URL length budget larger than the server limit is recovered from with 414 retries."""
+        monkeypatch.setenv('HOME', str(tmp_path))
+        with NetBoxStub(ring_topology(60)) as stub:
+            expected_cyjs = export_cyjs(stub.url, {})
+            stub.max_url_length = 300
+            assert export_cyjs(stub.url, {'url_max_length': 4000, 'cables_block_size': 64}) == expected_cyjs
+            assert len(blocks_requests(stub)) > 0
+
+    def test_learned_block_sizes_are_saved(self, monkeypatch, tmp_path):
+        """Test that block sizes learned in one run are saved and used as starting points in the next run."""
+        monkeypatch.setenv('HOME', str(tmp_path))
+        (tmp_path / '.nr').mkdir()
+        with NetBoxStub(ring_topology(60)) as stub:
+            export_cyjs(stub.url, {'interfaces_block_size': 1, 'cables_block_size': 1})
+            with open(tmp_path / '.nr' / 'api_state.yaml', encoding='utf-8') as f:
+                state = yaml.safe_load(f)
+            learned = state[stub.url]
+            assert learned['interfaces_block_size'] > 1
+            assert learned['cables_block_size'] > 1
+            stub.requests.clear()
+            export_cyjs(stub.url, {'interfaces_block_size': 1, 'cables_block_size': 1})
+            interfaces_requests = [path for path in blocks_requests(stub) if path.startswith('/api/dcim/interfaces/')]
+            # all 60 devices fit into the first block of the learned size
+            assert interfaces_requests[0].count('device_id=') == min(60, learned['interfaces_block_size'])
+
+    def test_no_state_without_config_directory(self, monkeypatch, tmp_path):
+        """Test that learned block sizes are not saved when the configuration directory does not exist."""
+        monkeypatch.setenv('HOME', str(tmp_path))
+        with NetBoxStub(ring_topology(8)) as stub:
+            export_cyjs(stub.url, {})
+        assert not (tmp_path / '.nr').exists()
+
+
+class TestPagination:
+    """Test that devices and interfaces are read page by page."""
+
+    def test_small_pages(self, monkeypatch, tmp_path):
+        """Test that small concurrent pages export the same graph as pages with all objects."""
+        monkeypatch.setenv('HOME', str(tmp_path))
+        with NetBoxStub(ring_topology(30)) as stub:
+            expected_cyjs = export_cyjs(stub.url, {'page_size': 1000})
+            stub.requests.clear()
+            assert export_cyjs(stub.url, {'page_size': 4}) == expected_cyjs
+            devices_requests = [path for _, path in stub.requests if path.startswith('/api/dcim/devices/?')]
+            interfaces_requests = [path for path in blocks_requests(stub) if path.startswith('/api/dcim/interfaces/')]
+        assert len(devices_requests) == 8
+        assert all('limit=4' in path for path in devices_requests + interfaces_requests)
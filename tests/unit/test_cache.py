@@ -0,0 +1,131 @@
+"""Unit tests for the on-disk NetBox API response cache."""
+
+import json
+import os
+import threading
+
+import networkx as nx
+
+from nrx.nrx import NBFactory
+from nrx.cache import HTTPCache
+from .netbox_stub import NetBoxStub, patch_panel_topology, stub_config
+
+
+def export_cyjs(url, cache_dir):
+    """Export the graph from the stand-in server with the response cache, return CYJS data and the cache statistics."""
+    config = stub_config(url)
+    config.update({'api_cache': True, 'api_cache_dir': str(cache_dir), 'api_cache_max_size': 16})
+    nb_factory = NBFactory(config)
+    return json.dumps(nx.cytoscape_data(nb_factory.graph()), indent=4), nb_factory.http_cache.stats
+
+
+class TestCachedExport:
+    """Test that cached responses build the same graph, with fewer requests to NetBox."""
+
+    def test_unchanged_epoch(self, tmp_path):
+        """Test that a second run without NetBox changes only reads the change log."""
+        with NetBoxStub(patch_panel_topology()) as stub:
+            stub.add_object_change("2024-01-01T00:00:00Z")
+            first_cyjs, _ = export_cyjs(stub.url, tmp_path)
+            stub.requests.clear()
+            second_cyjs, stats = export_cyjs(stub.url, tmp_path)
+            assert stub.requests == [("GET", "/api/core/object-changes/?limit=1")]
+        assert second_cyjs == first_cyjs
+        assert stats['misses'] == 0 and stats['hits'] > 0
+
+    def test_epochs_of_object_types(self, tmp_path):
+        """Test that after a NetBox change, only responses that depend on the changed object type are fetched."""
+        with NetBoxStub(patch_panel_topology()) as stub:
+            stub.add_object_change("2024-01-01T00:00:00Z")
+            first_cyjs, _ = export_cyjs(stub.url, tmp_path)
+            stub.add_object_change("2024-01-02T00:00:00Z", "dcim.cable", 100)
+            stub.requests.clear()
+            second_cyjs, stats = export_cyjs(stub.url, tmp_path)
+            paths = [path.split('?')[0] for _, path in stub.requests]
+        assert second_cyjs == first_cyjs
+        assert stats['hits'] > 0 and stats['misses'] > 0
+        assert "/api/dcim/cables/" in paths and "/api/dcim/interfaces/" in paths
+        assert "/api/dcim/devices/" not in paths and "/api/dcim/sites/" not in paths
+
+    def test_changed_data(self, tmp_path):
+        """Test that changes in NetBox data are exported, when there is no change log to compare epochs."""
+        data = patch_panel_topology()
+        with NetBoxStub(data) as stub:
+            export_cyjs(stub.url, tmp_path)
+            data.configs[1] = "hostname r1-new"
+            cyjs, stats = export_cyjs(stub.url, tmp_path)
+        assert stats['hits'] == 0
+        assert "hostname r1-new" in cyjs
+
+    def test_unwritable_cache(self, tmp_path, capsys):
+        """Test that the export succeeds, with a warning, when responses can't be stored, or the cache can't be created."""
+        with NetBoxStub(patch_panel_topology()) as stub:
+            stub.add_object_change("2024-01-01T00:00:00Z")
+            reference = json.dumps(nx.cytoscape_data(NBFactory(stub_config(stub.url)).graph()), indent=4)
+            # Writers can't take the lock of a cache directory with a directory in place of the lock file
+            os.makedirs(tmp_path / "cache" / ".lock")
+            cyjs, stats = export_cyjs(stub.url, tmp_path / "cache")
+            assert cyjs == reference and stats['misses'] > 0
+            assert "Can't store NetBox API responses" in capsys.readouterr().err
+            (tmp_path / "file").write_text("")
+            config = stub_config(stub.url) | {'api_cache': True, 'api_cache_dir': str(tmp_path / "file"), 'api_cache_max_size': 16}
+            nb_factory = NBFactory(config)
+            assert json.dumps(nx.cytoscape_data(nb_factory.graph()), indent=4) == reference
+            assert nb_factory.http_cache is None
+            assert "to cache NetBox API responses" in capsys.readouterr().err
+
+
+class TestHTTPCache:
+    """Test the cache directory."""
+
+    def test_lru_eviction(self, tmp_path):
+        """Test that the least recently used entries are evicted first, until the cache fits its maximum size."""
+        cache = HTTPCache(str(tmp_path), 3000)
+        for n in range(4):
+            cache.put(f"{n:064x}", {'n': n}, b"x" * 1000)
+            os.utime(cache._entry_path(f"{n:064x}"), (n, n))  # pylint: disable=protected-access
+        # reading an entry makes it the most recently used one
+        assert cache.get(f"{0:064x}")[0] == {'n': 0}
+        assert cache.evict() == 2
+        assert cache.get(f"{0:064x}") is not None
+        assert cache.get(f"{3:064x}") is not None
+        assert cache.get(f"{1:064x}") is None and cache.get(f"{2:064x}") is None
+        assert cache.size() <= 3000
+
+    def test_concurrent_writers(self, tmp_path):
+        """Test that readers see complete entries while other threads replace and evict them."""
+        cache = HTTPCache(str(tmp_path), 20000)
+        key = "a" * 64
+        failures = []
+
+        def writer(n):
+            for i in range(50):
+                body = bytes([65 + n]) * (100 + i)
+                cache.put(key, {'length': len(body)}, body)
+                cache.put(f"{n}{i:063x}", {'length': len(body)}, body)
+                entry = cache.get(key)
+                if entry is not None and entry[0]['length'] != len(entry[1]):
+                    failures.append(entry)
+                cache.evict()
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not failures
+        assert not [name for name in os.listdir(tmp_path / "aa") if name.endswith(".tmp")]
+
+    def test_update_epochs(self, tmp_path):
+        """Test that object types get epochs of their latest changes, and all of them the latest one without changes."""
+        cache = HTTPCache(str(tmp_path), 3000)
+        assert cache.update_epochs({'id': 5, 'time': "t5"}, lambda since: []) is None
+        changes = [{'id': 7, 'changed_object_type': "dcim.cable"}, {'id': 6, 'changed_object_type': "dcim.cable"}]
+        assert cache.update_epochs({'id': 7, 'time': "t7"}, lambda since: changes) == {"dcim.cable"}
+        assert cache.epochs['types'] == {"dcim.cable": 7} and cache.epochs['base'] == 5
+        # another run reads the epochs stored in the cache directory
+        cache = HTTPCache(str(tmp_path), 3000)
+        assert cache.update_epochs({'id': 7, 'time': "t7"}, None) == set()
+        assert cache.epochs['types'] == {"dcim.cable": 7}
+        assert cache.update_epochs({'id': 9, 'time': "t9"}, lambda since: None) is None
+        assert cache.epochs == {'change': {'id': 9, 'time': "t9"}, 'base': 9, 'types': {}}
@@ -0,0 +1,113 @@
+"""Unit tests for record and replay of NetBox API traffic."""
+
+import gzip
+import json
+import time
+
+import networkx as nx
+import pytest
+
+from nrx.nrx import NBFactory
+from nrx.cassette import Cassette, CassetteError, request_key, use_cassette
+from .netbox_stub import Faults, NetBoxStub, stub_config, synthetic_topology
+
+# Nothing listens on this URL, replayed exports must not connect to it
+UNREACHABLE_URL = "http://127.0.0.1:9"
+
+
+def export_cyjs(config):
+    """Export the graph as CYJS data."""
+    return json.dumps(nx.cytoscape_data(NBFactory(config).graph()), indent=4)
+
+
+def recorded_responses(path):
+    """Return responses recorded into a cassette file."""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f.readlines()[1:]]
+
+
+def record(url, path, api_backend='sync', **nb_api_params):
+    """Export sites of the synthetic topology from the stand-in server into a cassette, return CYJS data."""
+    config = stub_config(url, api_backend, nb_api_params) | {'export_sites': ['DC1', 'DC2']}
+    with use_cassette(config, record=path):
+        return export_cyjs(config)
+
+
+def replay(path, api_backend='sync', latency=0.0, **nb_api_params):
+    """Export the same sites from a cassette, return CYJS data."""
+    config = stub_config(UNREACHABLE_URL, api_backend, nb_api_params) | {'export_sites': ['DC1', 'DC2']}
+    with use_cassette(config, replay=path, latency=latency):
+        return export_cyjs(config)
+
+
+class TestCassette:
+    """Test that exports replayed from a cassette build the recorded graph without connecting to NetBox."""
+
+    @pytest.mark.parametrize("api_backend", ["sync", "asyncio", "graphql"])
+    def test_record_replay(self, tmp_path, api_backend):
+        """Test that a replayed export is the same as the recorded one, and makes no requests."""
+        if api_backend == "asyncio":
+            pytest.importorskip("aiohttp")
+        path = tmp_path / "export.cassette"
+        with NetBoxStub(synthetic_topology(8, interfaces=4, sites=2, patch_every=3)) as stub:
+            cyjs = record(stub.url, path, api_backend)
+            requests = len(stub.requests)
+        assert len(recorded_responses(path)) == requests
+        assert replay(path, api_backend) == cyjs
+        # A cassette replays any number of times
+        assert replay(path, api_backend) == cyjs
+
+    def test_retries_not_recorded(self, tmp_path):
+        """Test that responses NetBox asked to retry are left out, and the export replays the same."""
+        path = tmp_path / "export.cassette"
+        with NetBoxStub(synthetic_topology(8, interfaces=4, sites=2)) as stub:
+            stub.faults = Faults(error_rate=0.3, seed=1)
+            cyjs = record(stub.url, path, retry_backoff=0.01, overload_retries=8)
+            requests = len(stub.requests)
+        responses = recorded_responses(path)
+        assert 0 < len(responses) < requests
+        assert {r['status'] for r in responses} == {200}
+        assert replay(path, retry_backoff=0.01, overload_retries=8) == cyjs
+
+    def test_latency(self, tmp_path):
+        """Test that replayed responses are delayed by their recorded time only if asked to."""
+        path = tmp_path / "export.cassette"
+        with NetBoxStub(synthetic_topology(4, interfaces=2, sites=2)) as stub:
+            stub.faults = Faults(latency=0.05)
+            record(stub.url, path, site_workers=1)
+        assert min(r['elapsed'] for r in recorded_responses(path)) >= 0.05
+        start = time.perf_counter()
+        replay(path, site_workers=1)
+        assert time.perf_counter() - start < 0.5
+        start = time.perf_counter()
+        replay(path, latency=1.0, site_workers=1)
+        assert time.perf_counter() - start >= 0.5
+
+    def test_replay_debug(self, tmp_path, monkeypatch, capsys):
+        """Test that a replayed export reports HTTP stats in debug mode, with requests held by the governor."""
+        path = tmp_path / "export.cassette"
+        with NetBoxStub(synthetic_topology(8, interfaces=4, sites=2)) as stub:
+            cyjs = record(stub.url, path)
+        monkeypatch.setattr("nrx.log.DEBUG_ON", True)
+        assert replay(path) == cyjs
+        assert "[HTTP] Overload responses: 0, retries: 0" in capsys.readouterr().err
+
+    def test_missing_response(self, tmp_path):
+        """Test that a request that was not recorded fails the export, and so does a file that is not a cassette."""
+        path = tmp_path / "export.cassette"
+        with NetBoxStub(synthetic_topology(4, interfaces=2, sites=2)) as stub:
+            record(stub.url, path)
+        config = stub_config(UNREACHABLE_URL) | {'export_sites': ['DC2']}
+        with use_cassette(config, replay=path), pytest.raises(CassetteError, match="No recorded response"):
+            NBFactory(config)
+        (tmp_path / "export.json").write_text("{}")
+        with pytest.raises(CassetteError):
+            Cassette(tmp_path / "export.json", replay=True).play("GET /api/?")
+
+    def test_request_key(self):
+        """Test that keys don't depend on the server and on the order of query parameters, but on the body."""
+        key = request_key('GET', "http://netbox/api/dcim/devices/?site_id=1&id=2&id=1")
+        assert key == request_key('GET', "https://other:8443/api/dcim/devices/?id=1&site_id=1&id=2")
+        assert key != request_key('POST', "http://netbox/api/dcim/devices/?site_id=1&id=2&id=1", b'{}')
+        with use_cassette({}) as cassette:
+            assert cassette is None
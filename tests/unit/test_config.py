@@ -165,6 +165,13 @@ class TestOutputDirConfig:
                 config=config_path,
                 input='netbox',
                 api='http://netbox.example.com',
+                api_backend=None,
+                cache=None,
+                config_cache=None,
+                compact=None,
+                compress=None,
+                stream=None,
+                incremental=None,
                 site='test-site',
                 sites=None,
                 tags=None,
@@ -201,6 +208,13 @@ class TestOutputDirConfig:
                 config=config_path,
                 input='netbox',
                 api='http://netbox.example.com',
+                api_backend=None,
+                cache=None,
+                config_cache=None,
+                compact=None,
+                compress=None,
+                stream=None,
+                incremental=None,
                 site='test-site',
                 sites=None,
                 tags=None,
@@ -237,6 +251,13 @@ class TestOutputDirConfig:
                 config=config_path,
                 input='netbox',
                 api='http://netbox.example.com',
+                api_backend=None,
+                cache=None,
+                config_cache=None,
+                compact=None,
+                compress=None,
+                stream=None,
+                incremental=None,
                 site='test-site',
                 sites=None,
                 tags=None,
@@ -302,6 +323,13 @@ class TestOutputDirConfig:
                 config=config_path,
                 input='netbox',
                 api='http://netbox.example.com',
+                api_backend=None,
+                cache=None,
+                config_cache=None,
+                compact=None,
+                compress=None,
+                stream=None,
+                incremental=None,
                 site='test-site',
                 sites=None,
                 tags=None,
@@ -376,6 +404,13 @@ class TestTemplatesPathConfig:
                 config=config_path,
                 input='netbox',
                 api='http://netbox.example.com',
+                api_backend=None,
+                cache=None,
+                config_cache=None,
+                compact=None,
+                compress=None,
+                stream=None,
+                incremental=None,
                 site='test-site',
                 sites=None,
                 tags=None,
@@ -412,6 +447,13 @@ class TestTemplatesPathConfig:
                 config=config_path,
                 input='netbox',
                 api='http://netbox.example.com',
+                api_backend=None,
+                cache=None,
+                config_cache=None,
+                compact=None,
+                compress=None,
+                stream=None,
+                incremental=None,
                 site='test-site',
                 sites=None,
                 tags=None,
@@ -503,6 +545,13 @@ class TestPlatformMapConfig:
                 config=config_path,
                 input='netbox',
                 api='http://netbox.example.com',
+                api_backend=None,
+                cache=None,
+                config_cache=None,
+                compact=None,
+                compress=None,
+                stream=None,
+                incremental=None,
                 site='test-site',
                 sites=None,
                 tags=None,
@@ -538,6 +587,13 @@ class TestPlatformMapConfig:
                 config=config_path,
                 input='netbox',
                 api='http://netbox.example.com',
+                api_backend=None,
+                cache=None,
+                config_cache=None,
+                compact=None,
+                compress=None,
+                stream=None,
+                incremental=None,
                 site='test-site',
                 sites=None,
                 tags=None,
@@ -574,6 +630,13 @@ class TestPlatformMapConfig:
                 config=config_path,
                 input='netbox',
                 api='http://netbox.example.com',
+                api_backend=None,
+                cache=None,
+                config_cache=None,
+                compact=None,
+                compress=None,
+                stream=None,
+                incremental=None,
                 site='test-site',
                 sites=None,
                 tags=None,
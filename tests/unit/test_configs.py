@@ -0,0 +1,106 @@
+"""Unit tests for the cache of device configurations rendered by NetBox."""
+
+import gzip
+import json
+
+import networkx as nx
+import pytest
+
+from nrx.nrx import NBFactory
+from nrx.configs import ConfigCache, CONFIG_CACHE_CONFIG_KEY
+from .netbox_stub import NetBoxStub, patch_panel_topology, stub_config, synthetic_topology
+
+
+def export_cyjs(url, cache_dir, api_backend='sync', **config_values):
+    """Export the graph from the stand-in server with the config cache, return CYJS data and the cache statistics."""
+    config = stub_config(url, api_backend) | {'config_cache': True, 'config_cache_dir': str(cache_dir)}
+    config.update(config_values)
+    cyjs = json.dumps(nx.cytoscape_data(NBFactory(config).graph()), indent=4)
+    return cyjs, config[CONFIG_CACHE_CONFIG_KEY].stats
+
+
+def rendered(stub):
+    """Return IDs of devices the stand-in server rendered configurations of."""
+    return sorted(int(path.split("/")[4]) for method, path in stub.requests if path.endswith("/render-config/"))
+
+
+class TestConfigCache:
+    """Test that cached configurations build the same graph, and only changed devices are rendered again."""
+
+    @pytest.mark.parametrize("api_backend", ["sync", "asyncio", "graphql"])
+    def test_unchanged(self, tmp_path, api_backend):
+        """Test that a second run renders no configurations."""
+        if api_backend == "asyncio":
+            pytest.importorskip("aiohttp")
+        with NetBoxStub(patch_panel_topology()) as stub:
+            first_cyjs, stats = export_cyjs(stub.url, tmp_path, api_backend)
+            assert rendered(stub) == [1, 2] and stats == {'hits': 0, 'misses': 2}
+            stub.requests.clear()
+            second_cyjs, stats = export_cyjs(stub.url, tmp_path, api_backend)
+            assert rendered(stub) == []
+        assert second_cyjs == first_cyjs
+        assert stats == {'hits': 2, 'misses': 0}
+
+    def test_changed_inputs(self, tmp_path):
+        """Test that a changed device is rendered again, and all devices are after a template or context change."""
+        data = patch_panel_topology()
+        with NetBoxStub(data) as stub:
+            export_cyjs(stub.url, tmp_path)
+            data.devices[1]["last_updated"] = "2024-01-02T00:00:00Z"
+            data.configs[1] = "hostname r1-new"
+            stub.requests.clear()
+            cyjs, stats = export_cyjs(stub.url, tmp_path)
+            assert rendered(stub) == [1] and stats == {'hits': 1, 'misses': 1}
+            assert "hostname r1-new" in cyjs
+            data.config_inputs["config-templates"][1]["last_updated"] = "2024-01-02T00:00:00Z"
+            stub.requests.clear()
+            export_cyjs(stub.url, tmp_path)
+            assert rendered(stub) == [1, 2]
+            data.config_inputs["config-contexts"][2] = {"id": 2, "name": "dns", "last_updated": "2024-01-03T00:00:00Z"}
+            stub.requests.clear()
+            export_cyjs(stub.url, tmp_path)
+            assert rendered(stub) == [1, 2]
+            # another config template can be assigned to the devices through their role or platform
+            data.config_inputs["device-roles"]["router"]["last_updated"] = "2024-01-04T00:00:00Z"
+            stub.requests.clear()
+            export_cyjs(stub.url, tmp_path)
+            assert rendered(stub) == [1, 2]
+            data.config_inputs["platforms"]["eos"]["last_updated"] = "2024-01-05T00:00:00Z"
+            stub.requests.clear()
+            export_cyjs(stub.url, tmp_path)
+            assert rendered(stub) == [1, 2]
+            stub.requests.clear()
+            export_cyjs(stub.url, tmp_path)
+            assert rendered(stub) == []
+
+    def test_site_pipelines(self, tmp_path):
+        """Test that sites exported concurrently share the cache, and only the configurations of a new site are rendered."""
+        with NetBoxStub(synthetic_topology(8, interfaces=4, sites=2)) as stub:
+            export_cyjs(stub.url, tmp_path, export_sites=['DC1'])
+            stub.requests.clear()
+            _, stats = export_cyjs(stub.url, tmp_path, export_sites=['DC1', 'DC2'])
+            assert len(rendered(stub)) == 4
+            stub.requests.clear()
+            _, stats = export_cyjs(stub.url, tmp_path, export_sites=['DC1', 'DC2'])
+            assert rendered(stub) == []
+        assert stats == {'hits': 8, 'misses': 0}
+
+    def test_unreadable_file(self, tmp_path):
+        """Test that a cache file that can't be read is replaced."""
+        with NetBoxStub(patch_panel_topology()) as stub:
+            path = ConfigCache.for_api(str(tmp_path), stub.url).path
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("not gzip")
+            _, stats = export_cyjs(stub.url, tmp_path)
+        assert stats['misses'] == 2
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            assert set(json.load(f)['devices']) == {'1', '2'}
+
+    def test_unwritable_file(self, tmp_path, capsys):
+        """Test that the export completes with a warning when the cache file can't be written."""
+        blocker = tmp_path / "file"
+        blocker.write_text("not a directory")
+        with NetBoxStub(patch_panel_topology()) as stub:
+            cyjs, stats = export_cyjs(stub.url, blocker / "configs")
+        assert stats['misses'] == 2 and "hostname r1" in cyjs
+        assert "Warning: Can't save device configurations" in capsys.readouterr().err
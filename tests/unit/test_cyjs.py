@@ -0,0 +1,149 @@
+"""Unit tests for the streaming CYJS writer and reader, and compressed CYJS files."""
+
+import io
+import json
+import os
+
+import networkx as nx
+import pytest
+
+from nrx.nrx import NBFactory, NetworkTopology
+from nrx.cyjs import CYJSDecodeError, compact_data, open_cyjs, read_cyjs, read_cyjs_file, write_cyjs
+from .netbox_stub import NetBoxStub, patch_panel_topology, stub_config
+from .topologies import clos, render_config, write_templates
+
+LRG_CYJS = os.path.join(os.path.dirname(__file__), "..", "lrg", "data", "lrg.cyjs")
+
+
+def stub_graph():
+    """Return the graph exported from the stand-in server."""
+    with NetBoxStub(patch_panel_topology()) as stub:
+        return NBFactory(stub_config(stub.url)).graph()
+
+
+def export(url, tmp_path, **config_values):
+    """Export the graph from the stand-in server into a CYJS file under tmp_path, return its path."""
+    nb_network = NBFactory(stub_config(url) | {'output_dir': str(tmp_path)} | config_values)
+    nb_network.graph()
+    nb_network.export_graph_json()
+    return next(tmp_path.glob("*.cyjs*"))
+
+
+def read_topology(tmp_path, file, stream=False):
+    """Build a NetworkTopology from a CYJS file, return its nodes without empty fields, and links."""
+    write_templates(tmp_path / "templates")
+    topo = NetworkTopology(render_config(tmp_path / "templates", tmp_path / "out", cyjs_stream=stream))
+    topo.build_from_file(str(file))
+    return [compact_data(n) for n in topo.topology['nodes']], topo.topology['links']
+
+
+class TestCYJSWriter:
+    """Test that graphs are written element by element in the format of nx.cytoscape_data."""
+
+    @pytest.mark.parametrize("G", [
+        nx.Graph(), nx.Graph(name="empty"), nx.path_graph(1), nx.MultiGraph([(1, 2), (1, 2)]), nx.DiGraph([(1, 2)]),
+        clos(4, spines=2, servers=1, uplinks=1),
+    ])
+    def test_indented(self, G):
+        """Test that the default format is the same as json.dump of nx.cytoscape_data indented by 4 spaces."""
+        f = io.StringIO()
+        assert write_cyjs(G, f) == (G.number_of_nodes(), G.number_of_edges())
+        assert f.getvalue() == json.dumps(nx.cytoscape_data(G), indent=4)
+
+    def test_exported_graph(self):
+        """Test that the graph exported from NetBox is written the same as json.dump of nx.cytoscape_data."""
+        G = stub_graph()
+        f = io.StringIO()
+        write_cyjs(G, f)
+        assert f.getvalue() == json.dumps(nx.cytoscape_data(G), indent=4)
+
+    def test_compact(self):
+        """Test that compact CYJS has an element per line and no empty fields, but the same graph otherwise."""
+        G = stub_graph()
+        G.graph['filters'] = {'tags': []}
+        G.nodes[next(iter(G.nodes))]['device']['serial'] = ""
+        f = io.StringIO()
+        write_cyjs(G, f, compact=True)
+        text = f.getvalue()
+        assert len(text.splitlines()) == G.number_of_nodes() + G.number_of_edges() + 3
+        assert '""' not in text and "null" not in text and "[]," not in text.split("\n", 1)[1]
+        H = nx.cytoscape_graph(json.loads(text))
+        assert H.graph == G.graph
+        assert list(H.nodes) == list(G.nodes) and list(H.edges) == list(G.edges)
+
+
+def assert_same_graph(G, H):
+    """Assert that graphs have the same type, attributes, and nodes and edges in the same order."""
+    assert (G.is_directed(), G.is_multigraph(), G.graph) == (H.is_directed(), H.is_multigraph(), H.graph)
+    assert list(G.nodes(data=True)) == list(H.nodes(data=True))
+    assert list(G.edges(data=True)) == list(H.edges(data=True))
+
+
+class TestCYJSReader:
+    """Test that CYJS parsed in chunks builds the same graph as nx.cytoscape_graph."""
+
+    @pytest.mark.parametrize("chunk_size", [7, 4096, 1024 * 1024])
+    def test_lrg(self, chunk_size):
+        """Test that the lrg graph is read the same, whatever chunks an element or a number is split into."""
+        with open(LRG_CYJS, 'rb') as f:
+            G = read_cyjs(f, chunk_size)
+        with open(LRG_CYJS, 'rb') as f:
+            assert_same_graph(G, nx.cytoscape_graph(json.load(f)))
+        assert_same_graph(read_cyjs_file(LRG_CYJS, stream=True), G)
+        assert_same_graph(read_cyjs_file(LRG_CYJS), G)
+
+    @pytest.mark.parametrize("G", [
+        nx.Graph(), nx.path_graph(3), nx.MultiGraph([(1, 2), (1, 2)]), nx.MultiDiGraph([(1, 2), (2, 1)]),
+        nx.DiGraph([("Zürich", "Genève")]),
+    ])
+    @pytest.mark.parametrize("compact", [False, True])
+    def test_graph_types(self, G, compact):
+        """Test that graphs of every type are read back, with multi-byte characters split between chunks."""
+        f = io.StringIO()
+        write_cyjs(G, f, compact)
+        text = f.getvalue().encode('utf-8')
+        assert_same_graph(read_cyjs(io.BytesIO(text), 1), nx.cytoscape_graph(json.loads(text)))
+
+    @pytest.mark.parametrize("text", [
+        b"", b"[]", b'{"elements": {"nodes": [{"data": {"id": "1"}}]}}', b'{"elements": {"nodes": [{"data": ',
+        b'{"elements": {"nodes": []}} {}', b'{"data": [1',
+    ])
+    @pytest.mark.parametrize("stream", [False, True])
+    def test_invalid(self, tmp_path, text, stream):
+        """Test that files which are not CYJS graphs fail to parse, whole or streamed."""
+        path = tmp_path / "invalid.cyjs"
+        path.write_bytes(text)
+        with pytest.raises(CYJSDecodeError):
+            read_cyjs_file(path, stream)
+
+    def test_stream_type_after_elements(self, tmp_path):
+        """Test that a streamed graph can't change its type after its elements were added."""
+        path = tmp_path / "late.cyjs"
+        path.write_bytes(b'{"data": [], "multigraph": false, "elements": {"nodes": [], '
+                         b'"edges": [{"data": {"source": 1, "target": 2}}]}, "directed": true}')
+        assert read_cyjs_file(path).is_directed()
+        with pytest.raises(CYJSDecodeError):
+            read_cyjs_file(path, stream=True)
+
+
+class TestCompressedCYJS:
+    """Test that exported CYJS files are compressed by extension, and read back as input."""
+
+    @pytest.mark.parametrize("compression, extension, magic", [
+        ('', ".cyjs", b"{"),
+        ('gz', ".cyjs.gz", b"\x1f\x8b"),
+        ('zst', ".cyjs.zst", b"\x28\xb5\x2f\xfd"),
+    ])
+    def test_export(self, tmp_path, compression, extension, magic):
+        """Test that compressed and compact files build the same topology as an indented uncompressed one."""
+        if compression == 'zst':
+            pytest.importorskip("zstandard")
+        with NetBoxStub(patch_panel_topology()) as stub:
+            reference = read_topology(tmp_path / "reference", export(stub.url, tmp_path / "reference"))
+            file = export(stub.url, tmp_path / "compressed", cyjs_compression=compression, cyjs_compact=True)
+        assert file.name.endswith(extension)
+        assert file.read_bytes().startswith(magic)
+        with open_cyjs(file, 'rb') as f:
+            assert json.loads(f.read())['elements']['nodes']
+        assert read_topology(tmp_path / "compressed", file) == reference
+        assert read_topology(tmp_path / "streamed", file, stream=True) == reference
@@ -0,0 +1,178 @@
+"""Unit tests for the block fetch engine."""
+
+import asyncio
+import random
+import time
+from unittest.mock import Mock
+
+import pytest
+import requests
+
+from nrx.fetch import BlockFetcher, AsyncBlockFetcher, PageFetcher, BlockFetchError, URLBudget
+
+
+def http_error(status_code):
+    """Create requests.HTTPError with a response carrying status_code."""
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(f"{status_code} error", response=response)
+
+
+def slow_query(block):
+    """Return one object per ID after a random delay, to shuffle completion order."""
+    time.sleep(random.uniform(0, 0.005))
+    return [f"object-{i}" for i in block]
+
+
+class TestBlockFetcher:
+    """Test BlockFetcher."""
+
+    def test_results_follow_block_order(self):
+        """Test that concurrent fetching returns the same sequence as serial fetching."""
+        ids = list(range(100))
+        serial = list(BlockFetcher(slow_query, workers=1).fetch(ids, 7))
+        concurrent = list(BlockFetcher(slow_query, workers=8).fetch(ids, 7))
+        assert serial == [f"object-{i}" for i in ids]
+        assert concurrent == serial
+
+    def test_empty_ids(self):
+        """Test that no queries are made without IDs."""
+        query = Mock()
+        assert not list(BlockFetcher(query, workers=4).fetch([], 4))
+        query.assert_not_called()
+
+    def test_block_is_halved_on_414(self):
+        """Test that a block rejected with 414 is split in halves and retried."""
+        def query(block):
+            if len(block) > 2:
+                raise http_error(414)
+            return slow_query(block)
+        on_retry = Mock()
+        results = list(BlockFetcher(query, workers=4, on_retry=on_retry).fetch(list(range(16)), 8))
+        assert results == [f"object-{i}" for i in range(16)]
+        # each block of 8 fails, then each block of 4 fails
+        assert on_retry.call_count == 2 + 4
+
+    def test_block_is_halved_on_timeout(self):
+        """Test that a block that times out is split in halves and retried."""
+        def query(block):
+            if len(block) > 4:
+                raise requests.Timeout("read timeout")
+            return slow_query(block)
+        results = list(BlockFetcher(query, workers=2).fetch(list(range(10)), 10))
+        assert results == [f"object-{i}" for i in range(10)]
+
+    def test_max_attempts(self):
+        """Test that BlockFetchError is raised when the block is still too large after max attempts."""
+        def query(block):
+            if len(block) > 1:
+                raise http_error(414)
+            return slow_query(block)
+        with pytest.raises(BlockFetchError):
+            list(BlockFetcher(query, workers=2, max_attempts=3).fetch(list(range(16)), 16))
+
+    def test_blocks_fit_url_budget(self):
+        """Test that blocks are packed with as many IDs as fit into the URL budget."""
+        query = Mock(side_effect=lambda block: block)
+        # 8 bytes per ID of 4 digits: &id=1000
+        fetcher = BlockFetcher(query, url_budget=URLBudget("id", 32), adaptive=False)
+        assert list(fetcher.fetch(list(range(1000, 1010)), 64)) == list(range(1000, 1010))
+        assert [c.args[0] for c in query.call_args_list] == [[1000, 1001, 1002, 1003], [1004, 1005, 1006, 1007],
+                                                             [1008, 1009]]
+
+    def test_block_size_grows_after_success(self):
+        """Test that the block size doubles after rounds without failures."""
+        query = Mock(side_effect=lambda block: block)
+        fetcher = BlockFetcher(query, workers=2)
+        assert list(fetcher.fetch(list(range(30)), 1)) == list(range(30))
+        # rounds of two blocks: 1+1, 2+2, 4+4, 8+8
+        assert [len(c.args[0]) for c in query.call_args_list] == [1, 1, 2, 2, 4, 4, 8, 8]
+        assert fetcher.block_size == 16
+
+    def test_block_size_does_not_grow_back_to_failed_size(self):
+        """Test that after a block was rejected as too large, the block size stays below the failed size."""
+        def query(block):
+            if len(block) > 5:
+                raise http_error(414)
+            return block
+        fetcher = BlockFetcher(query, workers=1, max_attempts=5)
+        assert list(fetcher.fetch(list(range(100)), 8)) == list(range(100))
+        assert fetcher.block_size == 5
+
+    def test_other_errors_are_not_retried(self):
+        """Test that errors other than 414 and timeouts are raised as is."""
+        query = Mock(side_effect=http_error(403))
+        with pytest.raises(requests.exceptions.HTTPError):
+            list(BlockFetcher(query, workers=2).fetch(list(range(8)), 4))
+        assert query.call_count >= 1
+
+
+class TestAsyncBlockFetcher:
+    """Test AsyncBlockFetcher."""
+
+    def test_results_follow_block_order(self):
+        """Test that blocks dispatched at once are merged in the order of the blocks."""
+        async def query(block):
+            await asyncio.sleep(random.uniform(0, 0.005))
+            return [f"object-{i}" for i in block]
+        results = asyncio.run(AsyncBlockFetcher(query).fetch(list(range(100)), 7))
+        assert results == [f"object-{i}" for i in range(100)]
+
+    def test_block_is_halved_on_timeout(self):
+        """Test that a block that times out is split in halves and retried."""
+        async def query(block):
+            if len(block) > 4:
+                raise asyncio.TimeoutError()
+            return [f"object-{i}" for i in block]
+        on_retry = Mock()
+        fetcher = AsyncBlockFetcher(query, workers=2, on_retry=on_retry)
+        results = asyncio.run(fetcher.fetch(list(range(16)), 8))
+        assert results == [f"object-{i}" for i in range(16)]
+        assert on_retry.call_count == 2
+        assert fetcher.block_size == 4
+
+
+def page_query(objects, max_page_size=None, requests_log=None):
+    """Return a query for pages of objects, with an optional page size limit of the server."""
+    def query(offset, limit):
+        if max_page_size is not None:
+            limit = min(limit, max_page_size)
+        if requests_log is not None:
+            requests_log.append(offset)
+        time.sleep(random.uniform(0, 0.005))
+        return objects[offset:offset + limit], len(objects)
+    return query
+
+
+class TestPageFetcher:
+    """Test PageFetcher."""
+
+    def test_results_follow_page_order(self):
+        """Test that concurrent pages are yielded in order, with each page requested once."""
+        objects = list(range(1000))
+        offsets = []
+        assert list(PageFetcher(page_query(objects, requests_log=offsets), workers=4).fetch(30)) == objects
+        assert sorted(offsets) == list(range(0, 1000, 30))
+
+    def test_single_page(self):
+        """Test that results fitting into one page take one request."""
+        offsets = []
+        assert list(PageFetcher(page_query([1, 2], requests_log=offsets), workers=4).fetch(30)) == [1, 2]
+        assert offsets == [0]
+        assert not list(PageFetcher(page_query([]), workers=4).fetch(30))
+
+    def test_server_page_size_limit(self):
+        """Test that pages follow the page size returned by the server when it is smaller than requested."""
+        objects = list(range(100))
+        assert list(PageFetcher(page_query(objects, max_page_size=7), workers=3).fetch(30)) == objects
+
+    def test_pages_in_flight(self):
+        """Test that no more than workers pages are fetched ahead of the consumer."""
+        offsets = []
+        results = PageFetcher(page_query(list(range(100)), requests_log=offsets), workers=2).fetch(10)
+        for _ in range(15):
+            next(results)
+        time.sleep(0.05)
+        # the consumer is in the second page, the third and fourth pages may be fetched already
+        assert len(offsets) <= 4
+        results.close()
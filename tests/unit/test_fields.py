@@ -0,0 +1,102 @@
+"""Unit tests for device fields projection by templates."""
+
+from nrx.nrx import NBFactory, NetworkTopology, export_device_fields
+from .netbox_stub import NetBoxStub, patch_panel_topology, stub_config
+
+
+def write_templates(path):
+    """Templates of a clab-like format, with a platform map and a formats map."""
+    (path / "clab" / "nodes").mkdir(parents=True)
+    (path / "common").mkdir()
+    (path / "platform_map.yaml").write_text("type: platform_map\nversion: v1\nplatforms: {}\nkinds: {}\n")
+    (path / "formats.yaml").write_text("type: formats_map\nversion: v1\nformats:\n  clab:\n    file_format: yaml\n")
+    (path / "clab" / "nodes" / "default.j2").write_text("{{ name }}:\n  serial: {{ serial }}\n")
+    (path / "clab" / "topology.j2").write_text(
+        "{% for n in nodes %}{{ n.asset_tag }} {{ n['comments'] }}{% endfor %}{% include 'common/labels.j2' %}\n")
+    (path / "common" / "labels.j2").write_text("{{ tenant.name }}\n")
+
+
+def topology_config(path, **config_values):
+    """Configuration to render the templates in path."""
+    config = {
+        'output_format': 'clab',
+        'topology_name': 'test',
+        'templates_path': [str(path)],
+        'platform_map': str(path / "platform_map.yaml"),
+        'formats_map': "formats.yaml",
+        'export_device_fields': [],
+    }
+    config.update(config_values)
+    return config
+
+
+def device_requests(stub):
+    """Return paths of device list queries made to the stand-in server."""
+    return [path for _, path in stub.requests if path.startswith('/api/dcim/devices/?')]
+
+
+class TestTemplateDeviceFields:
+    """Test that device fields are taken from templates of the output format, unless configured."""
+
+    def test_fields_referenced_by_templates(self, tmp_path):
+        """Test that variables and attributes of templates, and of templates they include, are found."""
+        write_templates(tmp_path)
+        config = topology_config(tmp_path)
+        fields = export_device_fields(config, NetworkTopology(config))
+        assert {'name', 'serial', 'asset_tag', 'comments', 'tenant'} <= set(fields)
+        assert 'config_context' not in fields
+
+    def test_configured_fields(self, tmp_path):
+        """Test that the configured list replaces template fields, and graph formats export all fields."""
+        write_templates(tmp_path)
+        config = topology_config(tmp_path, export_device_fields=['serial'])
+        assert export_device_fields(config, NetworkTopology(config)) == ['serial']
+        config = topology_config(tmp_path, export_device_fields=['*'])
+        assert export_device_fields(config, NetworkTopology(config)) is None
+        config = topology_config(tmp_path, output_format='cyjs')
+        assert export_device_fields(config, NetworkTopology(config)) is None
+
+    def test_dynamic_include(self, tmp_path):
+        """Test that templates including templates by computed names export all fields."""
+        write_templates(tmp_path)
+        (tmp_path / "clab" / "topology.j2").write_text("{% include 'common/' ~ name ~ '.j2' %}\n")
+        config = topology_config(tmp_path)
+        assert export_device_fields(config, NetworkTopology(config)) is None
+
+
+class TestDeviceFieldsProjection:
+    """Test that only the exported device fields are requested from NetBox and kept in device data."""
+
+    def export_devices(self, stub, device_fields):
+        """Export devices from the stand-in server with a list of device fields."""
+        config = stub_config(stub.url)
+        config['device_fields'] = device_fields
+        return NBFactory(config).nb_net.devices
+
+    def test_projection(self):
+        """Test that NetBox 4 returns the requested fields only, and data nrx needs is still exported."""
+        with NetBoxStub(patch_panel_topology()) as stub:
+            devices = self.export_devices(stub, ['serial'])
+            paths = device_requests(stub)
+        assert all('exclude=config_context' in path and 'fields=' in path for path in paths)
+        assert [d['name'] for d in devices] == ['r1', 'r2']
+        assert devices[0]['serial'] == "SN000001" and devices[0]['vendor'] == "acme"
+        assert 'config_context' not in devices[0] and 'status' not in devices[0]
+        assert devices[0]['config'] == "hostname r1"
+
+    def test_netbox_3_projection(self):
+        """Test that NetBox 3 is asked to leave out config contexts only, and the rest is pruned by nrx."""
+        with NetBoxStub(patch_panel_topology(), api_version="3.7") as stub:
+            devices = self.export_devices(stub, ['config_context'])
+            paths = device_requests(stub)
+        assert not [path for path in paths if 'exclude=' in path or 'fields=' in path]
+        assert devices[0]['config_context'] == {'ntp': ["10.0.0.1"]}
+        assert 'serial' not in devices[0]
+
+    def test_all_fields(self):
+        """Test that all fields are requested and kept without a list of device fields."""
+        with NetBoxStub(patch_panel_topology()) as stub:
+            devices = self.export_devices(stub, None)
+            paths = device_requests(stub)
+        assert not [path for path in paths if 'exclude=' in path or 'fields=' in path]
+        assert 'config_context' in devices[0] and 'status' in devices[0]
@@ -0,0 +1,126 @@
+"""Unit tests for the adaptive concurrency governor of NetBox API requests."""
+
+import json
+import threading
+import time
+
+import networkx as nx
+import pytest
+import requests
+
+from nrx.nrx import NBFactory
+from nrx.governor import ConcurrencyGovernor, TimeoutHTTPAdapter, retry_after_seconds
+from .netbox_stub import NetBoxStub, patch_panel_topology, stub_config
+
+
+def export_cyjs(url, **nb_api_params):
+    """Export the graph from the stand-in server as CYJS data, and return it with the governor of the export."""
+    nb_factory = NBFactory(stub_config(url, 'sync', nb_api_params))
+    governor = nb_factory.nb_session.http_session.get_adapter(url).governor
+    return json.dumps(nx.cytoscape_data(nb_factory.graph()), indent=4), governor
+
+
+def governed_session(governor):
+    """HTTP session with requests sent through the governor."""
+    session = requests.Session()
+    session.mount("http://", TimeoutHTTPAdapter(10, governor=governor))
+    return session
+
+
+class TestConcurrencyGovernor:
+    """Test that the limit on requests in flight follows AIMD."""
+
+    def test_additive_increase_multiplicative_decrease(self):
+        """Test that an overload halves the limit once per window of requests, and successes grow it back."""
+        governor = ConcurrencyGovernor(8)
+        before = governor.acquire()
+        started = governor.acquire()
+        governor.release(started, "/api/")
+        governor.release(governor.acquire(), "/api/", overloaded=True)
+        assert governor.limit == 4
+        # a request started before the decrease was caused by the same load
+        governor.release(before, "/api/", overloaded=True)
+        assert governor.limit == 4
+        for _ in range(4):
+            governor.release(governor.acquire(), "/api/")
+        assert 4.9 < governor.limit < 5
+        assert governor.stats['overloads'] == 2 and governor.stats['min_limit'] == 4
+
+    def test_slow_requests(self):
+        """Test that latency far beyond the usual latency of an endpoint decreases the limit."""
+        governor = ConcurrencyGovernor(8)
+        governor.release(governor.acquire(), "/api/dcim/cables/")
+        governor.release(governor.acquire() - 2, "/api/dcim/interfaces/")
+        assert governor.limit == 8
+        governor.acquire()
+        governor.release(time.monotonic() - 2, "/api/dcim/cables/")
+        assert governor.limit == 4
+
+    def test_fixed_limit(self):
+        """Test that a non-adaptive governor keeps the limit, and blocks requests beyond it."""
+        governor = ConcurrencyGovernor(1, adaptive=False)
+        started = governor.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: acquired.set() if governor.acquire() else None)
+        thread.start()
+        assert not acquired.wait(0.1)
+        governor.release(started, "/api/", overloaded=True)
+        assert acquired.wait(5)
+        thread.join()
+        assert governor.limit == 1
+
+    def test_retry_after_seconds(self):
+        """Test that Retry-After is read as delay-seconds or an HTTP date."""
+        assert retry_after_seconds("3") == 3.0
+        assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+        assert retry_after_seconds("soon") is None
+        assert retry_after_seconds(None) is None
+
+
+class TestGovernedRequests:
+    """Test that overloaded requests are retried through the governor."""
+
+    def test_export_with_overloads(self):
+        """Test that an export retries 429 responses after Retry-After and builds the same graph."""
+        with NetBoxStub(patch_panel_topology()) as stub:
+            expected_cyjs, _ = export_cyjs(stub.url)
+            stub.faults.overloads = 3
+            stub.faults.retry_after = "0"
+            cyjs, governor = export_cyjs(stub.url)
+        assert cyjs == expected_cyjs
+        assert governor.stats['overloads'] == 3 and governor.stats['retries'] == 3
+        assert governor.stats['min_limit'] < governor.max_limit
+
+    def test_retries_with_backoff(self):
+        """Test that 503 responses are retried with backoff until retries run out, and writes are not retried."""
+        governor = ConcurrencyGovernor(4, retries=2, backoff=0.01)
+        with NetBoxStub(patch_panel_topology()) as stub:
+            session = governed_session(governor)
+            stub.faults.overloads = 2
+            stub.faults.status = 503
+            assert session.get(f"{stub.url}/api/dcim/sites/").status_code == 200
+            stub.faults.overloads = 3
+            assert session.get(f"{stub.url}/api/dcim/sites/").status_code == 503
+            stub.faults.overloads = 1
+            assert session.post(f"{stub.url}/api/dcim/devices/1/render-config/").status_code == 200
+            stub.faults.overloads = 1
+            assert session.post(f"{stub.url}/api/dcim/sites/").status_code == 503
+            assert len(stub.requests) == 3 + 3 + 2 + 1
+        assert governor.stats['retries'] == 2 + 2 + 1
+        assert governor.in_flight == 0
+
+    def test_connection_resets(self):
+        """Test that connections reset by the server are retried, and failures to connect are raised right away."""
+        governor = ConcurrencyGovernor(4, retries=2, backoff=0.01)
+        session = governed_session(governor)
+        with NetBoxStub(patch_panel_topology()) as stub:
+            stub.faults.resets = 2
+            assert session.get(f"{stub.url}/api/dcim/sites/").status_code == 200
+            assert len(stub.requests) == 3
+            url = stub.url
+        assert governor.stats['retries'] == 2 and governor.stats['overloads'] == 2
+        # a new connection to the stopped server is refused
+        with pytest.raises(requests.ConnectionError):
+            governed_session(governor).get(f"{url}/api/dcim/sites/")
+        assert governor.stats['retries'] == 2 and governor.stats['overloads'] == 2
+        assert governor.in_flight == 0
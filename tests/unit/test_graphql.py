@@ -0,0 +1,123 @@
+"""Unit tests for the GraphQL NetBox API backend."""
+
+import json
+
+import networkx as nx
+
+from nrx.nrx import NBFactory
+from nrx.graphql_api import graphql_literal, graphql_devices_filter, devices_query, choice_value, rest_values, \
+                            link_ends
+from .netbox_stub import NetBoxStub, patch_panel_topology, stub_config
+
+
+def without_urls(values):
+    """Return values without URLs of NetBox objects, which GraphQL API doesn't provide."""
+    if isinstance(values, list):
+        return [without_urls(v) for v in values]
+    if not isinstance(values, dict):
+        return values
+    return {k: without_urls(v) for k, v in values.items() if k != 'url'}
+
+
+def export_cyjs(url, api_backend, device_fields=None):
+    """Export the graph from the stand-in server as CYJS data, without URLs of NetBox objects."""
+    config = stub_config(url, api_backend, {'graphql_page_size': 1})
+    if device_fields is not None:
+        config['device_fields'] = device_fields
+    cyjs = without_urls(nx.cytoscape_data(NBFactory(config).graph()))
+    return json.dumps(cyjs, indent=4, sort_keys=True)
+
+
+class TestGraphQLBackend:
+    """Test that the GraphQL backend builds the same graph as the REST API backend."""
+
+    def test_same_graph_as_sync_backend(self):
+        """Test that nodes with all their device data and links match, including links through patch panels."""
+        with NetBoxStub(patch_panel_topology()) as stub:
+            sync_cyjs = export_cyjs(stub.url, 'sync')
+            sync_requests = list(stub.requests)
+            stub.requests.clear()
+            graphql_cyjs = export_cyjs(stub.url, 'graphql')
+            graphql_requests = list(stub.requests)
+        assert graphql_cyjs == sync_cyjs
+        assert len(json.loads(graphql_cyjs)['elements']['edges']) == 6
+        # two devices in pages of one device, and one more page to find the end of the list
+        assert sum(1 for _, path in graphql_requests if path.startswith('/graphql/')) == 3
+        assert not any(path.startswith(('/api/dcim/interfaces', '/api/dcim/cables')) for _, path in graphql_requests)
+        assert len(graphql_requests) < len(sync_requests)
+
+    def test_device_fields_of_templates(self):
+        """Test that device fields outside of the ones templates use are neither requested nor exported."""
+        with NetBoxStub(patch_panel_topology()) as stub:
+            sync_cyjs = export_cyjs(stub.url, 'sync', ['serial'])
+            graphql_cyjs = export_cyjs(stub.url, 'graphql', ['serial'])
+        assert graphql_cyjs == sync_cyjs
+        device = next(n['data']['device'] for n in json.loads(graphql_cyjs)['elements']['nodes']
+                      if 'device' in n['data'])
+        assert device['serial'] == 'SN000001'
+        assert 'custom_fields' not in device and 'config_context' not in device
+
+
+class TestGraphQLQueries:
+    """Test GraphQL query construction and conversion of results."""
+
+    def test_graphql_literal(self):
+        """Test that input object keys are not quoted, and strings are."""
+        value = {'site': {'id': {'in_list': ['1', '2']}}, 'offset': 0, 'flag': True}
+        assert graphql_literal(value) == '{site: {id: {in_list: ["1", "2"]}}, offset: 0, flag: true}'
+
+    def test_devices_filter_by_version(self):
+        """Test filters generated from REST filtersets before NetBox 4.3, and typed lookups after."""
+        assert graphql_devices_filter((4, 2), [1], ['router'], ['a', 'b']) == (
+            {'site_id': ['1'], 'role': ['router'], 'tag': ['a', 'b']}, [])
+        assert graphql_devices_filter((4, 3), [1], ['router'], ['a', 'b']) == (
+            {'site': {'id': {'in_list': ['1']}}, 'role': {'slug': {'in_list': ['router']}}}, ['a', 'b'])
+
+    def test_devices_query_without_filters(self):
+        """Test that the filters argument is omitted when there is nothing to filter by."""
+        query = devices_query({}, 100, 50)
+        assert 'filters:' not in query
+        assert 'device_list(pagination: {offset: 100, limit: 50})' in query
+
+    def test_devices_query_fields(self):
+        """Test that the query selects device fields of templates in addition to the ones nrx needs."""
+        query = devices_query({}, 0, 50, ['serial', 'not_in_graphql'])
+        assert ' serial ' in query and ' site { id display name slug } ' in query
+        assert 'not_in_graphql' not in query and 'config_context' not in query
+        assert 'config_context' in devices_query({}, 0, 50)
+
+    def test_choice_value(self):
+        """Test conversion of choice enum names into REST API choice values."""
+        assert choice_value('type', 'TYPE_1000BASE_T') == '1000base-t'
+        assert choice_value('type', 'TYPE_2_5GBASE_T') == '2.5gbase-t'
+        assert choice_value('type', 'TYPE_IEEE802_11AC') == 'ieee802.11ac'
+        assert choice_value('status', 'STATUS_ACTIVE') == 'active'
+        assert choice_value('airflow', 'AIRFLOW_FRONT_TO_REAR') == 'front-to-rear'
+
+    def test_rest_values_choices(self):
+        """Test that choice fields get values and labels like REST API ones."""
+        values = rest_values({'id': '1', 'status': 'STATUS_DECOMMISSIONING', 'face': None,
+                              'interfaces': [{'id': '2', 'type': 'TYPE_VIRTUAL'}]})
+        assert values == {'id': 1, 'status': {'value': 'decommissioning', 'label': 'Decommissioning'}, 'face': None,
+                          'interfaces': [{'id': 2, 'type': {'value': 'virtual', 'label': 'virtual'}}]}
+
+    def test_link_ends_follow_cable_sides(self):
+        """Test that a direct link is ordered by the cable A and B ends, regardless of the interface it is found from."""
+        device = {'id': '2', 'name': 'r2'}
+        interface = {'id': '21', 'name': 'eth1', 'cable_end': 'B',
+                     'cable': {'id': '100', 'terminations': [{'cable_end': 'A'}, {'cable_end': 'B'}]},
+                     'link_peers': [{'__typename': 'InterfaceType', 'id': '11', 'name': 'eth1',
+                                     'device': {'id': '1', 'name': 'r1'}}],
+                     'connected_endpoints': []}
+        ends = link_ends(interface, device)
+        a, b = ends[0], ends[1]
+        assert (a['id'], a['device']['id']) == (11, 1)
+        assert (b['id'], b['device']['id']) == (21, 2)
+
+    def test_link_ends_multiple_terminations(self):
+        """Test that cables with more than one termination on an end are skipped."""
+        interface = {'id': '21', 'name': 'eth1', 'cable_end': 'B',
+                     'cable': {'id': '100', 'terminations': [{'cable_end': 'A'}, {'cable_end': 'A'},
+                                                             {'cable_end': 'B'}]},
+                     'link_peers': [], 'connected_endpoints': []}
+        assert not link_ends(interface, {'id': '2', 'name': 'r2'})
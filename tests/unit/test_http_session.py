@@ -0,0 +1,32 @@
+"""Unit tests for the shared NetBox API HTTP session."""
+
+from nrx.nrx import NBFactory, http_connection_stats
+from nrx.governor import TimeoutHTTPAdapter
+from .netbox_stub import NetBoxStub, patch_panel_topology, stub_config
+
+
+class TestHTTPSession:
+    """Test that all NetBox API requests reuse connections of one pooled session."""
+
+    def test_connections_are_reused(self):
+        """Test that devices, configurations, interfaces and cables are fetched over kept-alive connections."""
+        with NetBoxStub(patch_panel_topology()) as stub:
+            nb_factory = NBFactory(stub_config(stub.url))
+            sent = len(stub.requests)
+        stats = http_connection_stats(nb_factory.nb_session.http_session)
+        assert stats['requests'] == sent
+        assert stats['connections'] <= nb_factory.api_params['configs_workers']
+        assert stats['connections'] < stats['requests']
+
+    def test_pool_size(self):
+        """Test that the pool is sized to concurrent requests, and an adapter is mounted without a timeout."""
+        with NetBoxStub(patch_panel_topology()) as stub:
+            config = stub_config(stub.url, 'sync', {'configs_workers': 16})
+            config['api_timeout'] = 0
+            nb_factory = NBFactory(config)
+            adapter = nb_factory.nb_session.http_session.get_adapter(stub.url)
+            assert isinstance(adapter, TimeoutHTTPAdapter) and adapter.timeout is None
+            assert adapter.poolmanager.connection_pool_kw['maxsize'] == 16
+            nb_factory = NBFactory(stub_config(stub.url, 'sync', {'pool_maxsize': 2}))
+            adapter = nb_factory.nb_session.http_session.get_adapter(stub.url)
+            assert adapter.poolmanager.connection_pool_kw['maxsize'] == 2
@@ -0,0 +1,191 @@
+"""Unit tests for incremental export from a snapshot and the NetBox change log."""
+
+import json
+from urllib.parse import parse_qs, urlsplit
+
+import networkx as nx
+
+from nrx.nrx import NBFactory
+from nrx.incremental import Snapshot, ChangeSet, SNAPSHOT_KEY
+from .netbox_stub import NetBoxStub, patch_panel_topology, stub_config
+
+T0 = "2024-01-01T00:00:00Z"
+T1 = "2024-01-02T00:00:00Z"
+
+
+def export_cyjs(url, snapshot_path=None, **config_values):
+    """Export CYJS graph from the stand-in server, and save it as a snapshot if snapshot_path is set."""
+    config = stub_config(url)
+    config.update(config_values)
+    if snapshot_path is not None:
+        config['incremental_snapshot'] = str(snapshot_path)
+    cyjs = json.dumps(nx.cytoscape_data(NBFactory(config).graph()), indent=4)
+    if snapshot_path is not None:
+        snapshot_path.write_text(cyjs, encoding='utf-8')
+    return cyjs
+
+
+def topology(cyjs):
+    """Return devices and links of CYJS graph, independent of node numbering and snapshot data."""
+    graph = nx.cytoscape_graph(json.loads(cyjs))
+    snapshot = Snapshot(graph)
+    skip = ['node_id', 'device_index']
+    devices = {d['name']: {k: v for k, v in d.items() if k not in skip} for d in snapshot.devices}
+    names = {d['id']: d['name'] for d in snapshot.devices}
+    interfaces = {n: (names[snapshot.interface_devices[graph.nodes[n]['interface']['id']]], graph.nodes[n]['interface']['name'])
+                  for n in graph.nodes if graph.nodes[n]['type'] == 'interface'}
+    return devices, sorted(tuple(sorted([interfaces[a], interfaces[b]])) for a, b in graph.edges
+                           if a in interfaces and b in interfaces)
+
+
+def data_requests(stub):
+    """Return requests for devices, interfaces, cables and configurations."""
+    return [path for _, path in stub.requests if not path.startswith(('/api/core/', '/api/dcim/sites/')) and path != '/api/']
+
+
+class TestIncrementalExport:
+    """Test that snapshots updated with NetBox changes match full exports."""
+
+    def test_snapshot_without_changes(self, tmp_path):
+        """Test that a snapshot with no changes since is written again without fetching data."""
+        snapshot_path = tmp_path / "snapshot.cyjs"
+        with NetBoxStub(patch_panel_topology()) as stub:
+            stub.add_object_change(T0)
+            first_cyjs = export_cyjs(stub.url, snapshot_path)
+            stub.requests.clear()
+            second_cyjs = export_cyjs(stub.url, snapshot_path)
+            assert not data_requests(stub)
+        assert second_cyjs == first_cyjs
+        metadata = dict(json.loads(second_cyjs)['data'])[SNAPSHOT_KEY]
+        assert metadata['change'] == {'id': 1, 'time': T0}
+        assert metadata['filters']['export_sites'] == ['DC1']
+
+    def test_device_change(self, tmp_path):
+        """Test that only the changed device and its configuration are fetched again."""
+        snapshot_path = tmp_path / "snapshot.cyjs"
+        data = patch_panel_topology()
+        with NetBoxStub(data) as stub:
+            stub.add_object_change(T0)
+            export_cyjs(stub.url, snapshot_path)
+            data.devices[2]["serial"] = "SN2"
+            data.configs[2] = "hostname r2-new"
+            stub.add_object_change(T1, "dcim.device", 2)
+            stub.requests.clear()
+            incremental_cyjs = export_cyjs(stub.url, snapshot_path)
+            requests = data_requests(stub)
+            full_cyjs = export_cyjs(stub.url)
+        assert topology(incremental_cyjs) == topology(full_cyjs)
+        assert '/api/dcim/devices/2/render-config/' in requests
+        assert '/api/dcim/devices/1/render-config/' not in requests
+        assert not [path for path in requests if path.startswith('/api/dcim/cables/')]
+
+    def test_new_link(self, tmp_path):
+        """Test that links of devices with new cable terminations are fetched again, and other links are kept."""
+        snapshot_path = tmp_path / "snapshot.cyjs"
+        data = patch_panel_topology()
+        data.add_device(5, "r3", 1)
+        data.add_interface(13, 1, "eth3")
+        data.add_interface(51, 5, "eth1")
+        with NetBoxStub(data) as stub:
+            stub.add_object_change(T0)
+            export_cyjs(stub.url, snapshot_path)
+            data.add_cable(104, ("dcim.interface", 13), ("dcim.interface", 51))
+            stub.add_object_change(T1, "dcim.cable", 104, "create")
+            stub.add_object_change(T1, "dcim.cabletermination", 1, "create", ("dcim.interface", 13))
+            stub.add_object_change(T1, "dcim.cabletermination", 2, "create", ("dcim.interface", 51))
+            stub.requests.clear()
+            incremental_cyjs = export_cyjs(stub.url, snapshot_path)
+            requests = data_requests(stub)
+            full_cyjs = export_cyjs(stub.url)
+        assert topology(incremental_cyjs) == topology(full_cyjs)
+        assert (("r1", "eth3"), ("r3", "eth1")) in topology(incremental_cyjs)[1]
+        assert not [path for path in requests if 'render-config' in path]
+        # interfaces of r2 are taken from the snapshot
+        assert not [path for path in requests if path.startswith('/api/dcim/interfaces/') and 'device_id=2' in path]
+
+    def test_many_changed_interfaces(self, tmp_path):
+        """Test that interfaces changed since the snapshot are looked up in blocks of IDs, not of devices."""
+        snapshot_path = tmp_path / "snapshot.cyjs"
+        data = patch_panel_topology()
+        with NetBoxStub(data) as stub:
+            stub.add_object_change(T0)
+            export_cyjs(stub.url, snapshot_path)
+            for n in range(60):
+                data.add_interface(1000 + n, 1, f"eth{100 + n}")
+                data.add_interface(2000 + n, 2, f"eth{100 + n}")
+                data.add_cable(1000 + n, ("dcim.interface", 1000 + n), ("dcim.interface", 2000 + n))
+                stub.add_object_change(T1, "dcim.cabletermination", 2 * n + 1, "create", ("dcim.interface", 1000 + n))
+                stub.add_object_change(T1, "dcim.cabletermination", 2 * n + 2, "create", ("dcim.interface", 2000 + n))
+            stub.requests.clear()
+            incremental_cyjs = export_cyjs(stub.url, snapshot_path)
+            queries = [parse_qs(urlsplit(path).query) for path in data_requests(stub)
+                       if path.startswith('/api/dcim/interfaces/?')]
+            full_cyjs = export_cyjs(stub.url)
+        assert topology(incremental_cyjs) == topology(full_cyjs)
+        id_blocks = [len(query['id']) for query in queries if 'id' in query]
+        assert sum(id_blocks) == 120 and len(id_blocks) <= 2
+
+    def test_full_export_fallbacks(self, tmp_path):
+        """Test that changed filters and changes that can't be applied incrementally lead to a full export."""
+        snapshot_path = tmp_path / "snapshot.cyjs"
+        with NetBoxStub(patch_panel_topology()) as stub:
+            stub.add_object_change(T0)
+            export_cyjs(stub.url, snapshot_path)
+            stub.requests.clear()
+            export_cyjs(stub.url, snapshot_path, export_links=False)
+            assert '/api/dcim/devices/1/render-config/' in data_requests(stub)
+            stub.add_object_change(T1, "dcim.cable", 100)
+            stub.add_object_change(T1, "wireless.wirelesslink", 1)
+            stub.requests.clear()
+            export_cyjs(stub.url, snapshot_path, export_links=False)
+            assert '/api/dcim/devices/1/render-config/' in data_requests(stub)
+
+
+class TestChangeSet:
+    """Test mapping of NetBox changes to devices."""
+
+    def snapshot(self):
+        """Snapshot of a direct link between r1 and r2."""
+        graph = nx.Graph()
+        graph.add_node(0, type="device", device={'id': 1, 'name': "r1", 'device_index': 0, 'primary_ip4': "10.0.0.1/32"})
+        graph.add_node(1, type="device", device={'id': 2, 'name': "r2", 'device_index': 1})
+        graph.add_node(2, type="interface", side="a", interface={'id': 11, 'name': "eth1", 'interface_index': 0})
+        graph.add_node(3, type="interface", side="b", interface={'id': 21, 'name': "eth1", 'interface_index': 1})
+        graph.add_edges_from([(0, 2), (1, 3), (2, 3)])
+        graph.graph[SNAPSHOT_KEY] = {'interface_cables': {'11': 100, '21': 100}, 'links': [[100, 11, 21]]}
+        return Snapshot(graph)
+
+    def test_snapshot_links(self):
+        """Test that links are read from the snapshot data, and interfaces are matched to their devices."""
+        snapshot = self.snapshot()
+        assert snapshot.links == [(100, 11, 21)]
+        assert snapshot.interface_devices == {11: 1, 21: 2}
+
+    def test_changes_to_devices(self):
+        """Test that changes are mapped to device records and links to fetch again."""
+        changes = [
+            {'changed_object_type': 'dcim.cable', 'changed_object_id': 100, 'action': {'value': 'delete'}},
+            {'changed_object_type': 'ipam.ipaddress', 'changed_object_id': 5, 'action': {'value': 'update'},
+             'prechange_data': {'address': "10.0.0.1/32"}, 'postchange_data': {'address': "10.0.0.9/32"}},
+            {'changed_object_type': 'dcim.interface', 'changed_object_id': 99, 'action': {'value': 'create'},
+             'related_object_type': 'dcim.device', 'related_object_id': 3},
+            {'changed_object_type': 'dcim.cabletermination', 'changed_object_id': 7, 'action': {'value': 'create'},
+             'related_object_type': 'dcim.interface', 'related_object_id': 98},
+            {'changed_object_type': 'dcim.powerport', 'changed_object_id': 1, 'action': {'value': 'create'}},
+        ]
+        change_set = ChangeSet(self.snapshot(), changes)
+        assert change_set.full_reason is None
+        assert change_set.devices == {1}
+        assert change_set.link_devices == {1, 2, 3}
+        assert change_set.interfaces == {98}
+        assert not change_set.all_links and not change_set.all_devices
+
+    def test_changes_of_paths_and_related_objects(self):
+        """Test that changes of patch panel ports relink all devices, and changes of sites refetch all devices."""
+        changes = [
+            {'changed_object_type': 'dcim.rearport', 'changed_object_id': 1, 'action': {'value': 'update'}},
+            {'changed_object_type': 'dcim.site', 'changed_object_id': 1, 'action': {'value': 'update'}},
+        ]
+        change_set = ChangeSet(self.snapshot(), changes)
+        assert change_set.all_links and change_set.all_devices
+        assert ChangeSet(self.snapshot(), [{'changed_object_type': 'vpn.tunnel'}]).full_reason is not None
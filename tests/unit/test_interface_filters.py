@@ -0,0 +1,143 @@
+"""Unit tests for interface type and tag filters applied by NetBox."""
+
+import json
+import threading
+
+import networkx as nx
+import pytest
+
+from nrx.nrx import NBFactory
+from .netbox_stub import NetBoxStub, patch_panel_topology, stub_config
+
+
+def tagged_topology():
+    """Patch panel topology with a Fibre Channel link, and links tagged by names that differ from slugs."""
+    data = patch_panel_topology()
+    data.add_interface(13, 1, "fc1", if_type="8gfc-sfpp", tags=["Core Links"])
+    data.add_interface(23, 2, "fc1", if_type="8gfc-sfpp", tags=["Core Links"])
+    data.add_cable(104, ("dcim.interface", 13), ("dcim.interface", 23))
+    data.interfaces[11]["tags"] = [data.tag("Core Links")]
+    data.interfaces[21]["tags"] = [data.tag("Core Links")]
+    data.interfaces[12]["tags"] = [data.tag("edge")]
+    data.interfaces[22]["tags"] = [data.tag("edge")]
+    return data
+
+
+def export_cyjs(url, api_backend='sync', interface_tags=None, **nb_api_params):
+    """Export the graph from the stand-in server as CYJS data."""
+    config = stub_config(url, api_backend, nb_api_params)
+    config['export_interface_tags'] = interface_tags or []
+    return json.dumps(nx.cytoscape_data(NBFactory(config).graph()), indent=4)
+
+
+def interface_requests(stub):
+    """Return paths of interface list queries made to the stand-in server."""
+    return [path for _, path in stub.requests if path.startswith('/api/dcim/interfaces/?')]
+
+
+def fail_later_page(stub, status):
+    """Answer the first query of a later page of interfaces of a device block with status, return its path."""
+    get = stub.get
+    failed = []
+    lock = threading.Lock()
+
+    def failing_get(path):
+        with lock:
+            if len(failed) == 0 and path.startswith('/api/dcim/interfaces/?') and 'offset=' in path:
+                failed.append(path)
+                return status, {"detail": "Injected error."}
+        return get(path)
+    stub.get = failing_get
+    return failed
+
+
+def exported_interfaces(cyjs):
+    """Return names of exported interfaces with their device names."""
+    graph = nx.cytoscape_graph(json.loads(cyjs))
+    names = []
+    for n in graph.nodes:
+        if graph.nodes[n]['type'] == 'interface':
+            device = [graph.nodes[p]['device']['name'] for p in graph.adj[n] if graph.nodes[p]['type'] == 'device']
+            names.append(f"{device[0]}:{graph.nodes[n]['interface']['name']}")
+    return sorted(names)
+
+
+class TestInterfaceFilters:
+    """Test that NetBox filters interfaces by type and tags, and nrx builds the same graph as when it filters them."""
+
+    def test_types_filtered_by_netbox(self):
+        """Test that non-Ethernet interfaces are not requested."""
+        with NetBoxStub(tagged_topology()) as stub:
+            client_cyjs = export_cyjs(stub.url, server_interface_filters=False)
+            stub.requests.clear()
+            server_cyjs = export_cyjs(stub.url)
+            requests = interface_requests(stub)
+        assert server_cyjs == client_cyjs
+        assert all('type__n=8gfc-sfpp' in path for path in requests)
+        assert exported_interfaces(server_cyjs) == ['r1:eth1', 'r1:eth2', 'r2:eth1', 'r2:eth2']
+
+    def test_tags_queried_separately(self):
+        """Test that each tag is queried by its slug, and interfaces with any of the tags keep the NetBox order."""
+        with NetBoxStub(tagged_topology()) as stub:
+            client_cyjs = export_cyjs(stub.url, interface_tags=['Core Links', 'edge'], server_interface_filters=False)
+            stub.requests.clear()
+            server_cyjs = export_cyjs(stub.url, interface_tags=['Core Links', 'edge'])
+            requests = interface_requests(stub)
+            single_tag_cyjs = export_cyjs(stub.url, interface_tags=['Core Links'])
+        assert server_cyjs == client_cyjs
+        assert [path for path in requests if 'tag=core-links' in path]
+        assert [path for path in requests if 'tag=edge' in path]
+        assert [path for path in requests if 'fields=id' in path and 'tag=' not in path]
+        assert exported_interfaces(single_tag_cyjs) == ['r1:eth1', 'r2:eth1']
+
+    def test_unknown_tags(self):
+        """Test that tags that don't exist in NetBox select no interfaces."""
+        with NetBoxStub(tagged_topology()) as stub:
+            cyjs = export_cyjs(stub.url, interface_tags=['missing'])
+            requests = interface_requests(stub)
+        assert not requests
+        assert not exported_interfaces(cyjs)
+
+    def test_rejected_types_filter(self):
+        """Test that nrx filters interfaces by itself when NetBox doesn't know some of the types."""
+        with NetBoxStub(tagged_topology()) as stub:
+            expected_cyjs = export_cyjs(stub.url)
+            stub.data.interface_types = ['1000base-t', '8gfc-sfpp']
+            stub.requests.clear()
+            cyjs = export_cyjs(stub.url)
+            requests = interface_requests(stub)
+        assert cyjs == expected_cyjs
+        assert 'type__n=' in requests[0] and 'type__n=' not in requests[-1]
+
+    def test_block_too_large_on_later_page(self):
+        """Test that a block failing on a later page is fetched again in halves, with the types filter kept."""
+        with NetBoxStub(tagged_topology()) as stub:
+            expected_cyjs = export_cyjs(stub.url)
+            failed = fail_later_page(stub, 414)
+            stub.requests.clear()
+            cyjs = export_cyjs(stub.url, page_size=1, blocks_workers=1)
+            requests = interface_requests(stub)
+        assert len(failed) == 1 and 'device_id=' in failed[0]
+        assert cyjs == expected_cyjs
+        assert all('type__n=' in path for path in requests)
+
+    def test_rejected_later_page(self):
+        """Test that a later page rejected by NetBox fails the export, instead of interfaces being fetched again unfiltered."""
+        with NetBoxStub(tagged_topology()) as stub:
+            failed = fail_later_page(stub, 400)
+            with pytest.raises(SystemExit):
+                export_cyjs(stub.url, page_size=1, blocks_workers=1)
+            requests = interface_requests(stub)
+        assert len(failed) == 1
+        assert all('type__n=' in path for path in requests)
+
+    def test_asyncio_backend(self):
+        """Test that the asyncio backend queries tags separately and builds the same graph."""
+        pytest.importorskip("aiohttp")
+        with NetBoxStub(tagged_topology()) as stub:
+            sync_cyjs = export_cyjs(stub.url, interface_tags=['Core Links', 'edge'])
+            stub.requests.clear()
+            async_cyjs = export_cyjs(stub.url, 'asyncio', interface_tags=['Core Links', 'edge'])
+            requests = interface_requests(stub)
+        assert async_cyjs == sync_cyjs
+        assert [path for path in requests if 'tag=edge' in path]
@@ -1,8 +1,13 @@
 """Unit tests for NBFactory class."""
 
+import json
 import sys
+import time
+from types import SimpleNamespace
 from unittest.mock import Mock, MagicMock, patch
 
+import networkx as nx
+
 # Mock pynetbox exceptions before importing nrx
 mock_pynetbox_module = MagicMock()
 mock_pynetbox_module.core.query.RequestError = Exception
@@ -11,7 +16,7 @@ sys.modules['pynetbox'] = mock_pynetbox_module
 sys.modules['pynetbox.core'] = mock_pynetbox_module.core
 sys.modules['pynetbox.core.query'] = mock_pynetbox_module.core.query
 
-from nrx.nrx import NBFactory  # pylint: disable=wrong-import-position
+from nrx.nrx import NBFactory, NBNetwork, format_uses_configs  # pylint: disable=wrong-import-position
 
 
 def make_mock_device_dict_compatible(mock_device, device_dict):
@@ -105,7 +110,7 @@ class TestNBFactoryInitialization:
         nb_factory = NBFactory(config)
 
         # Verify nb_sites is initialized as list, not None
-        assert nb_factory.nb_sites == []
+        assert nb_factory.nb_sites == []  # pylint: disable=use-implicit-booleaness-not-comparison
         assert isinstance(nb_factory.nb_sites, list)
         assert nb_factory.nb_sites is not None
 
@@ -391,3 +396,227 @@ class TestInitDevice:
         # Verify it uses device_role instead of role for v3.x
         assert result['role'] == 'leaf'
         assert result['role_name'] == 'Leaf'
+
+
+def make_mock_device(device_id, name):
+    """Create a minimal mock device that can pass through _init_device."""
+    mock_device = Mock()
+    mock_device.id = device_id
+    mock_device.name = name
+    mock_device.site = None
+    mock_device.platform = None
+    mock_device.device_type = None
+    mock_device.role = None
+    mock_device.primary_ip4 = None
+    mock_device.primary_ip6 = None
+    make_mock_device_dict_compatible(mock_device, {'id': device_id, 'name': name})
+    return mock_device
+
+
+class TestDeviceConfigs:
+    """Test device configuration export stage."""
+
+    @patch('nrx.nrx.pynetbox')
+    def test_configs_fetched_after_devices(self, mock_pynetbox):
+        """Test that configurations are fetched for every device and matched in order."""
+        mock_api = setup_mock_api(mock_pynetbox)
+        mock_post = mock_api.http_session.post
+        mock_api.dcim.devices.filter.return_value = [make_mock_device(i, f"device-{i}") for i in range(1, 21)]
+
+        def render_config(url, **_):
+            device_id = url.split('/')[-3]
+            response = Mock()
+            response.text = f'{{"content": "hostname device-{device_id}"}}'
+            return response
+        mock_post.side_effect = render_config
+
+        config = create_test_config()
+        config['export_configs'] = True
+        config['output_format'] = 'cyjs'
+        config['nb_api_params']['configs_workers'] = 4
+        nb_factory = NBFactory(config)
+
+        assert mock_post.call_count == 20
+        for d in nb_factory.nb_net.devices:
+            assert d['config'] == f"hostname {d['name']}"
+
+    @patch('nrx.nrx.pynetbox')
+    def test_configs_skipped_when_format_does_not_use_them(self, mock_pynetbox):
+        """Test that no render-config requests are made if the output format has no use for configs."""
+        mock_api = setup_mock_api(mock_pynetbox)
+        mock_post = mock_api.http_session.post
+        mock_api.dcim.devices.filter.return_value = [make_mock_device(1, "device-1")]
+
+        config = create_test_config()
+        config['export_configs'] = True
+        config['output_format'] = 'graphite'
+        config['format'] = {'file_format': 'json'}
+        nb_factory = NBFactory(config)
+
+        mock_post.assert_not_called()
+        assert nb_factory.nb_net.devices[0]['config'] == ''
+
+
+class TestFormatUsesConfigs:
+    """Test detection of output formats that consume device configurations."""
+
+    def test_graph_formats_keep_configs(self):
+        """Test that graph exports always keep configurations."""
+        assert format_uses_configs({'output_format': 'cyjs'})
+        assert format_uses_configs({'output_format': 'gml'})
+
+    def test_startup_config_mode(self):
+        """Test that startup_config_mode from the formats map takes precedence."""
+        assert format_uses_configs({'output_format': 'clab', 'format': {'startup_config_mode': 'file'}})
+        assert format_uses_configs({'output_format': 'graphite', 'format': {'startup_config_mode': 'inline'}})
+        assert not format_uses_configs({'output_format': 'clab', 'format': {'startup_config_mode': 'none'}})
+
+    def test_fallback_without_startup_config_mode(self):
+        """Test the fallback for formats maps without startup_config_mode."""
+        assert format_uses_configs({'output_format': 'cml', 'format': {'file_format': 'yaml'}})
+        assert not format_uses_configs({'output_format': 'graphite', 'format': {'file_format': 'json'}})
+        assert not format_uses_configs({'output_format': 'd2', 'format': {}})
+
+
+class Interfaces:  # pylint: disable=too-few-public-methods
+    """Stand-in for pynetbox Interfaces records used as cable terminations."""
+    def __init__(self, interface_id, name, device_id, cable_id=None):
+        self.id = interface_id
+        self.name = name
+        self.device = SimpleNamespace(id=device_id)
+        self.type = SimpleNamespace(value="1000base-t")
+        self.tags = []
+        self.cable = SimpleNamespace(id=cable_id)
+
+
+class CountingDict(dict):
+    """Dict that counts key lookups."""
+    lookups = 0
+
+    def get(self, key, default=None):
+        self.lookups += 1
+        return super().get(key, default)
+
+    def __getitem__(self, key):
+        self.lookups += 1
+        return super().__getitem__(key)
+
+
+class CountingList(list):
+    """List that counts elements visited by iterating or searching it."""
+    visits = 0
+
+    def __iter__(self):
+        self.visits += len(self)
+        return super().__iter__()
+
+    def __contains__(self, value):
+        self.visits += len(self)
+        return super().__contains__(value)
+
+    def index(self, *args):
+        self.visits += len(self)
+        return super().index(*args)
+
+
+def build_synthetic_network(nb_factory, num_interfaces):
+    """Populate NBNetwork with devices that have 2 interfaces each, and return cables connecting them in a ring."""
+    num_devices = num_interfaces // 2
+    for device_id in range(1, num_devices + 1):
+        nb_factory.nb_net.add_device(device_id, {"id": device_id, "type": "device", "name": f"device-{device_id}"})
+    cables = []
+    for device_id in range(1, num_devices + 1):
+        peer_id = device_id % num_devices + 1
+        int_a = Interfaces(device_id * 2, "eth2", device_id)
+        int_b = Interfaces(peer_id * 2 - 1, "eth1", peer_id)
+        cable_id = device_id
+        for interface in (int_a, int_b):
+            nb_factory.nb_net.add_interface(interface.id, cable_id,
+                                            {"id": interface.id, "type": "interface", "name": interface.name})
+        cables.append(SimpleNamespace(id=cable_id, a_terminations=[int_a], b_terminations=[int_b]))
+    return cables
+
+
+class TestNBNetworkIndexes:
+    """Test NBNetwork indexes used to assemble links."""
+
+    def test_cable_ids_deduplicated(self):
+        """Test that a cable is registered only once even though both of its ends are exported."""
+        nb_net = NBNetwork()
+        assert nb_net.add_interface(1, 100, {"id": 1})
+        assert nb_net.add_interface(2, 100, {"id": 2})
+        assert not nb_net.add_interface(2, 100, {"id": 2})
+        assert nb_net.cable_ids == {100}
+        assert nb_net.interface_ids == [1, 2]
+        assert nb_net.interfaces_by_id[2]["interface_index"] == 1
+
+    @patch('nrx.nrx.pynetbox')
+    def test_link_assembly_scales_linearly(self, mock_pynetbox):
+        """Test that each link of a 50k-interface synthetic topology is assembled with the same number of index
+        lookups, without scanning record lists."""
+        setup_mock_api(mock_pynetbox)
+        mock_pynetbox.models.dcim.Interfaces = Interfaces
+
+        for num_interfaces in (12500, 50000):
+            nb_factory = NBFactory(create_test_config())
+            cables = build_synthetic_network(nb_factory, num_interfaces)
+            nb_net = nb_factory.nb_net
+            nb_net.devices_by_id = CountingDict(nb_net.devices_by_id)
+            nb_net.interfaces_by_id = CountingDict(nb_net.interfaces_by_id)
+            nb_net.devices, nb_net.interfaces, nb_net.device_ids = (CountingList(nb_net.devices),
+                                                                    CountingList(nb_net.interfaces),
+                                                                    CountingList(nb_net.device_ids))
+            for cable in cables:
+                nb_factory._add_cable_to_graph(cable)  # pylint: disable=protected-access
+            assert nb_factory.G.number_of_nodes() == num_interfaces * 3 // 2
+            assert nb_factory.G.number_of_edges() == num_interfaces * 3 // 2
+            # Two device and two interface lookups per link, whatever the size of the network
+            assert nb_net.devices_by_id.lookups + nb_net.interfaces_by_id.lookups == 4 * len(cables)
+            assert nb_net.devices.visits == nb_net.interfaces.visits == nb_net.device_ids.visits == 0
+
+
+class TestConcurrentBlockFetch:
+    """Test that concurrent fetching of interfaces and cables builds the same graph as serial fetching."""
+
+    @staticmethod
+    def export_cyjs(mock_pynetbox, workers):
+        """Export a synthetic ring topology through mocked interfaces and cables endpoints."""
+        mock_api = setup_mock_api(mock_pynetbox)
+        mock_pynetbox.models.dcim.Interfaces = Interfaces
+        mock_pynetbox.core.query.RequestError = Exception
+        mock_pynetbox.core.query.ContentError = Exception
+        num_devices = 40
+        mock_api.dcim.devices.filter.return_value = [make_mock_device(i, f"device-{i:02}") for i in range(1, num_devices + 1)]
+        interfaces, cables = {}, {}
+        for device_id in range(1, num_devices + 1):
+            peer_id = device_id % num_devices + 1
+            int_a = Interfaces(device_id * 2, "eth2", device_id, device_id)
+            int_b = Interfaces(peer_id * 2 - 1, "eth1", peer_id, device_id)
+            for interface in (int_a, int_b):
+                interfaces.setdefault(interface.device.id, []).append(interface)
+            cables[device_id] = SimpleNamespace(id=device_id, a_terminations=[int_a], b_terminations=[int_b])
+
+        # Blocks of lower IDs take longer, so that blocks are completed in the reverse of their order
+        def filter_interfaces(device_id, **_):
+            time.sleep(0.002 * (num_devices - min(device_id)) / num_devices)
+            return [i for d in device_id for i in sorted(interfaces[d], key=lambda i: i.name)]
+
+        def filter_cables(id):  # pylint: disable=redefined-builtin
+            time.sleep(0.002 * (num_devices - min(id)) / num_devices)
+            return [cables[c] for c in sorted(id)]
+
+        mock_api.dcim.interfaces.filter.side_effect = filter_interfaces
+        mock_api.dcim.cables.filter.side_effect = filter_cables
+        config = create_test_config()
+        config['export_interface_tags'] = []
+        config['nb_api_params'] = {'interfaces_block_size': 3, 'cables_block_size': 5, 'blocks_workers': workers}
+        nb_factory = NBFactory(config)
+        return json.dumps(nx.cytoscape_data(nb_factory.graph()), indent=4)
+
+    @patch('nrx.nrx.pynetbox')
+    def test_concurrent_export_is_identical_to_serial(self, mock_pynetbox):
+        """Test that CYJS data is byte-identical with 1 and 8 block workers."""
+        serial = self.export_cyjs(mock_pynetbox, 1)
+        concurrent = self.export_cyjs(mock_pynetbox, 8)
+        assert concurrent == serial
+        assert len(json.loads(serial)['elements']['edges']) == 40 * 3
@@ -0,0 +1,148 @@
+"""Unit tests for local cable path tracing."""
+
+import json
+
+import networkx as nx
+
+from nrx.nrx import NBFactory
+from nrx.paths import CablePaths
+from .netbox_stub import NetBoxData, NetBoxStub, patch_panel_topology, stub_config
+
+
+def interface(interface_id):
+    """Termination of an interface, with a string standing for its object."""
+    return ('dcim.interface', interface_id, f"interface-{interface_id}")
+
+
+def front_port(port_id):
+    """Termination of a front port."""
+    return ('dcim.frontport', port_id, None)
+
+
+def rear_port(port_id):
+    """Termination of a rear port."""
+    return ('dcim.rearport', port_id, None)
+
+
+def trunk_paths():
+    """Two pairs of interfaces connected over a trunk between rear ports with two positions."""
+    paths = CablePaths()
+    for n in [1, 2]:
+        paths.add_front_port(10 + n, 10, n)
+        paths.add_front_port(20 + n, 20, n)
+        paths.add_cable(100 + n, [interface(n)], [front_port(10 + n)])
+        paths.add_cable(200 + n, [front_port(20 + n)], [interface(20 + n)])
+    paths.add_rear_port(10, 2)
+    paths.add_rear_port(20, 2)
+    paths.add_cable(300, [rear_port(10)], [rear_port(20)])
+    return paths
+
+
+def trunk_topology():
+    """Routers connected over a trunk between patch panels, and to a patch panel in another site."""
+    data = NetBoxData()
+    data.add_site(1, "DC1")
+    data.add_site(2, "DC2")
+    data.add_device(1, "r1", 1)
+    data.add_device(2, "r2", 1)
+    data.add_device(3, "pp1", 1, role="patch-panel")
+    data.add_device(4, "pp2", 1, role="patch-panel")
+    data.add_device(5, "pp3", 2, role="patch-panel")
+    data.add_device(6, "pp4", 1, role="patch-panel")
+    data.add_rear_port(41, 3, "rear1", positions=2)
+    data.add_rear_port(42, 4, "rear1", positions=2)
+    data.add_rear_port(43, 5, "rear1")
+    data.add_rear_port(44, 6, "rear1")
+    for n in [1, 2]:
+        data.add_interface(10 + n, 1, f"eth{n}")
+        data.add_interface(20 + n, 2, f"eth{n}")
+        data.add_front_port(30 + n, 3, f"front{n}", 41, position=n)
+        data.add_front_port(32 + n, 4, f"front{n}", 42, position=n)
+    data.add_interface(13, 1, "eth3")
+    data.add_interface(23, 2, "eth3")
+    data.add_front_port(35, 5, "front1", 43)
+    data.add_front_port(36, 6, "front1", 44)
+    # r1 eth1 <-> r2 eth2 and r1 eth2 <-> r2 eth1, over the trunk
+    data.add_cable(101, ("dcim.interface", 11), ("dcim.frontport", 31))
+    data.add_cable(102, ("dcim.interface", 12), ("dcim.frontport", 32))
+    data.add_cable(103, ("dcim.rearport", 41), ("dcim.rearport", 42))
+    data.add_cable(104, ("dcim.frontport", 34), ("dcim.interface", 21))
+    data.add_cable(105, ("dcim.frontport", 33), ("dcim.interface", 22))
+    # r1 eth3 <-> r2 eth3, through a patch panel in the site that is not exported
+    data.add_cable(106, ("dcim.interface", 13), ("dcim.frontport", 35))
+    data.add_cable(107, ("dcim.rearport", 43), ("dcim.rearport", 44))
+    data.add_cable(108, ("dcim.frontport", 36), ("dcim.interface", 23))
+    return data
+
+
+def export_cyjs(url, local_cable_tracing):
+    """Export the graph from the stand-in server as CYJS data."""
+    nb_factory = NBFactory(stub_config(url, 'sync', {'local_cable_tracing': local_cable_tracing}))
+    return json.dumps(nx.cytoscape_data(nb_factory.graph()), indent=4)
+
+
+def trace_requests(stub):
+    """Return paths of trace requests made to the stand-in server."""
+    return [path for _, path in stub.requests if path.endswith('/trace/')]
+
+
+class TestCablePaths:
+    """Test CablePaths."""
+
+    def test_positions_of_rear_ports(self):
+        """Test that paths over a trunk come out at the front ports of the same positions."""
+        paths = trunk_paths()
+        assert paths.far_end('dcim.interface', 1) == "interface-21"
+        assert paths.far_end('dcim.interface', 2) == "interface-22"
+        assert paths.far_end('dcim.interface', 22) == "interface-2"
+
+    def test_unresolved_paths(self):
+        """Test that paths through unknown ports, or without a cable, are not resolved."""
+        paths = trunk_paths()
+        del paths.rear_fronts[(20, 2)]
+        assert paths.far_end('dcim.interface', 1) == "interface-21"
+        assert paths.far_end('dcim.interface', 2) is None
+        assert paths.far_end('dcim.interface', 99) is None
+
+    def test_multiple_terminations(self):
+        """Test that cables with more than one termination on an end are not followed."""
+        paths = CablePaths()
+        paths.add_cable(1, [interface(1)], [interface(2), interface(3)])
+        assert paths.far_end('dcim.interface', 1) is None
+
+    def test_cabling_loop(self):
+        """Test that a loop in cabling data does not hang the tracing."""
+        paths = CablePaths()
+        for n in [1, 2]:
+            paths.add_rear_port(10 * n, 1)
+            paths.add_front_port(10 * n + 1, 10 * n, 1)
+        paths.add_cable(1, [interface(1)], [front_port(11)])
+        paths.add_cable(2, [rear_port(10)], [rear_port(20)])
+        # front port 11 is listed on two cables, which leads back to it
+        paths.add_cable(3, [front_port(21)], [front_port(11)])
+        assert paths.far_end('dcim.interface', 1) is None
+
+
+class TestLocalCableTracing:
+    """Test that paths resolved locally build the same graph as NetBox traces."""
+
+    def test_no_traces_for_resolved_paths(self):
+        """Test that cables through patch panels are resolved without trace requests."""
+        with NetBoxStub(patch_panel_topology()) as stub:
+            traced_cyjs = export_cyjs(stub.url, False)
+            assert len(trace_requests(stub)) == 2
+            stub.requests.clear()
+            local_cyjs = export_cyjs(stub.url, True)
+            assert not trace_requests(stub)
+        assert local_cyjs == traced_cyjs
+
+    def test_trace_fallback(self):
+        """Test that positions of trunks are followed, and paths leaving exported sites are traced by NetBox."""
+        with NetBoxStub(trunk_topology()) as stub:
+            traced_cyjs = export_cyjs(stub.url, False)
+            stub.requests.clear()
+            local_cyjs = export_cyjs(stub.url, True)
+            assert sorted(trace_requests(stub)) == ['/api/dcim/interfaces/13/trace/', '/api/dcim/interfaces/23/trace/']
+        assert local_cyjs == traced_cyjs
+        # three links, each with one edge between interfaces and two edges between interfaces and devices
+        assert len(json.loads(local_cyjs)['elements']['edges']) == 9
@@ -0,0 +1,45 @@
+"""Unit tests for compact records of network topology objects."""
+
+import json
+
+import pytest
+
+from nrx.nrx import NBNetwork
+from nrx.records import InterfaceRecord
+
+
+class TestInterfaceRecord:
+    """Test that interface records read like the interface dicts they replace."""
+
+    def test_dict_view(self):
+        """Test that a record converts to the same dict, with the keys in the same order, without the cable ID."""
+        nb_net = NBNetwork()
+        nb_net.add_device(1, {"id": 1, "name": "r1"})
+        nb_net.add_interface(11, 100, InterfaceRecord(11, "eth1"))
+        i = nb_net.interfaces_by_id[11]
+        assert json.dumps(dict(i)) == json.dumps({"id": 11, "type": "interface", "name": "eth1", "node_id": 1,
+                                                  "interface_index": 0})
+        assert i["name"] == "eth1" and i.get("cable_id") is None and i.cable_id == 100
+        assert not hasattr(i, "__dict__")
+
+    def test_fields_are_fixed(self):
+        """Test that keys outside of the exported fields can't be set or read."""
+        i = InterfaceRecord(11, "eth1")
+        i["node_id"] = 5
+        assert i.node_id == 5
+        with pytest.raises(KeyError):
+            i["speed"] = 1000
+        with pytest.raises(KeyError):
+            i["type"] = "device"
+        with pytest.raises(KeyError):
+            _ = i["speed"]
+
+    def test_interfaces_from_snapshot(self):
+        """Test that interface data of an exported graph is added as a record."""
+        nb_net = NBNetwork()
+        assert nb_net.add_interface(21, 200, {"id": 21, "type": "interface", "name": "eth1", "node_id": 7,
+                                              "interface_index": 3})
+        i = nb_net.interfaces_by_id[21]
+        assert isinstance(i, InterfaceRecord)
+        assert (i.name, i.node_id, i.interface_index, i.cable_id) == ("eth1", 0, 0, 200)
+        assert nb_net.interface_ids == [21]
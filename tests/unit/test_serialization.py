@@ -0,0 +1,68 @@
+"""Unit tests for JSON and YAML serialization backends."""
+
+import io
+import json
+import math
+
+import pytest
+
+from nrx import serialization
+from nrx.serialization import dump_json, dump_yaml, dumps_json, load_json, load_yaml, loads_json
+
+DATA = {"elements": {"nodes": [{"data": {"id": "0", "name": "r1", "config": "hostname r1\n", "primary_ip4": None,
+                                         "tags": [], "level": 4, "weight": 0.5, "virtual": False}}]},
+        "name": "Zürich"}
+
+
+@pytest.fixture(params=["accelerated", "fallback"])
+def backend(request, monkeypatch):
+    """Run a test with the accelerated JSON backend, if it is installed, and with the standard one."""
+    if request.param == "fallback":
+        monkeypatch.setattr(serialization, "orjson", None)
+    elif serialization.orjson is None:
+        pytest.skip("orjson is not installed")
+
+
+@pytest.mark.usefixtures("backend")
+class TestJSONSerialization:
+    """Test that every JSON backend reads and writes the same data as the json module."""
+
+    def test_json(self):
+        """Test that JSON is parsed from str, bytes and files, and serialized to the same data."""
+        text = json.dumps(DATA)
+        assert loads_json(text) == DATA
+        assert loads_json(text.encode('utf-8')) == DATA
+        assert load_json(io.BytesIO(text.encode('utf-8'))) == DATA
+        assert json.loads(dumps_json(DATA)) == DATA
+        f = io.StringIO()
+        dump_json(DATA, f)
+        assert json.loads(f.getvalue()) == DATA
+
+    def test_indented_json(self):
+        """Test that indented JSON is written in the format of the json module."""
+        f = io.StringIO()
+        dump_json(DATA, f, indent=4)
+        assert f.getvalue() == json.dumps(DATA, indent=4)
+        assert dumps_json(DATA, indent=4) == json.dumps(DATA, indent=4)
+
+    def test_json_fallback(self):
+        """Test that data only the json module handles is still read and written, and invalid JSON fails."""
+        assert math.isnan(loads_json('{"x": NaN}')['x'])
+        assert loads_json(dumps_json({"big": 2 ** 70})) == {"big": 2 ** 70}
+        surrogates = b'\xff'.decode('utf-8', errors='surrogateescape')
+        assert loads_json(dumps_json({"body": surrogates})) == {"body": surrogates}
+        with pytest.raises(ValueError):
+            loads_json('{"x": ')
+
+
+class TestYAMLSerialization:
+    """Test that the YAML backend reads and writes the same data as PyYAML."""
+
+    def test_yaml(self):
+        """Test that YAML documents are read and written the same way as with PyYAML safe functions."""
+        text = dump_yaml(DATA)
+        assert load_yaml(text) == DATA
+        assert load_yaml(io.StringIO(text)) == DATA
+        f = io.StringIO()
+        dump_yaml({"b": 1, "a": [1, 2]}, f, default_flow_style=False)
+        assert f.getvalue() == "a:\n- 1\n- 2\nb: 1\n"
@@ -0,0 +1,92 @@
+"""Unit tests for concurrent acquisition of exported sites."""
+
+import json
+from urllib.parse import parse_qs, urlsplit
+
+import networkx as nx
+
+from nrx.nrx import NBFactory
+from nrx.sites import nb_device_order, worker_shares
+from .netbox_stub import NetBoxData, NetBoxStub, stub_config
+
+
+def multi_site_topology():
+    """Routers of three sites, with names interleaved across the sites and ordered naturally, and cables between the sites."""
+    data = NetBoxData()
+    data.add_site(1, "DC1")
+    data.add_site(2, "DC2")
+    data.add_site(3, "DC3")
+    for device_id, name, site_id in [(1, "r4", 1), (2, "r2", 1), (3, "r1", 2), (4, "r3", 3), (5, "r5", 2), (6, "r10", 1)]:
+        data.add_device(device_id, name, site_id)
+        data.add_interface(device_id * 10 + 1, device_id, "eth1")
+        data.add_interface(device_id * 10 + 2, device_id, "eth2")
+    data.add_cable(100, ("dcim.interface", 11), ("dcim.interface", 21))
+    data.add_cable(101, ("dcim.interface", 12), ("dcim.interface", 31))
+    data.add_cable(102, ("dcim.interface", 22), ("dcim.interface", 41))
+    data.add_cable(103, ("dcim.interface", 42), ("dcim.interface", 51))
+    data.configs = {1: "hostname r4", 3: "hostname r1"}
+    return data
+
+
+def export_cyjs(url, **nb_api_params):
+    """Export routers of all three sites from the stand-in server as CYJS data."""
+    config = stub_config(url, 'sync', nb_api_params)
+    config['export_sites'] = ['DC1', 'DC2', 'DC3']
+    return json.dumps(nx.cytoscape_data(NBFactory(config).graph()), indent=4)
+
+
+def device_site_ids(stub):
+    """Return site_id filters of device list queries made to the stand-in server."""
+    queries = [parse_qs(urlsplit(path).query) for _, path in stub.requests if path.startswith('/api/dcim/devices/?')]
+    return [sorted(query['site_id']) for query in queries if 'site_id' in query]
+
+
+class TestSites:
+    """Test that sites fetched concurrently merge into the graph a single pipeline builds."""
+
+    def test_same_graph(self):
+        """Test that node IDs, cables between sites and configurations match a single pipeline."""
+        with NetBoxStub(multi_site_topology()) as stub:
+            expected_cyjs = export_cyjs(stub.url, site_workers=1)
+            assert ['1', '2', '3'] in device_site_ids(stub)
+            stub.requests.clear()
+            cyjs = export_cyjs(stub.url)
+            site_ids = device_site_ids(stub)
+        assert cyjs == expected_cyjs
+        # devices of all the sites are not listed again to order them
+        assert ['1', '2', '3'] not in site_ids
+        assert ['1'] in site_ids and ['2'] in site_ids and ['3'] in site_ids
+        graph = nx.cytoscape_graph(json.loads(cyjs))
+        devices = [graph.nodes[n]['device']['name'] for n in sorted(graph.nodes) if graph.nodes[n]['type'] == 'device']
+        assert devices == ['r1', 'r2', 'r3', 'r4', 'r5', 'r10']
+        # both ends of the four cables, three of them between sites
+        assert len([n for n in graph.nodes if graph.nodes[n]['type'] == 'interface']) == 8
+
+    def test_fewer_blocks_workers(self):
+        """Test that sites fetched at a time each get a blocks worker, when there are fewer of them than sites."""
+        with NetBoxStub(multi_site_topology()) as stub:
+            expected_cyjs = export_cyjs(stub.url, site_workers=1)
+            assert export_cyjs(stub.url, site_workers=3, blocks_workers=2) == expected_cyjs
+
+    def test_worker_shares(self):
+        """Test that workers are split as evenly as possible, the remainder to the first parts, at least one each."""
+        assert worker_shares(8, 3) == [3, 3, 2]
+        assert worker_shares(6, 3) == [2, 2, 2]
+        assert worker_shares(2, 3) == [1, 1, 1]
+        assert worker_shares(4, 1) == [4]
+
+    def test_without_links(self):
+        """Test that sites are merged in order when only devices are exported."""
+        with NetBoxStub(multi_site_topology()) as stub:
+            config = stub_config(stub.url)
+            config['export_sites'] = ['DC1', 'DC2', 'DC3']
+            config['export_links'] = False
+            graph = NBFactory(config).graph()
+        names = [graph.nodes[n]['device']['name'] for n in sorted(graph.nodes)]
+        assert names == ['r1', 'r2', 'r3', 'r4', 'r5', 'r10']
+
+    def test_device_order(self):
+        """Test that devices are ordered by name with numbers ordered naturally, then by ID, unnamed ones last."""
+        devices = [("r10", 1), (None, 2), ("r9", 3), ("r9", 0), ("a1b2", 4), ("a1b10", 5)]
+        assert sorted(devices, key=lambda d: nb_device_order(*d)) == [
+            ("a1b2", 4), ("a1b10", 5), ("r9", 0), ("r9", 3), ("r10", 1), (None, 2)]
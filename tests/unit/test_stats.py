@@ -0,0 +1,92 @@
+"""Unit tests for export phase statistics."""
+
+import json
+import os
+import tempfile
+import time
+
+import networkx as nx
+import pytest
+
+from nrx.nrx import NBFactory
+from nrx.stats import ExportStats, STATS_CONFIG_KEY, export_phase
+from .netbox_stub import NetBoxStub, patch_panel_topology, stub_config
+
+
+def export_with_stats(url, api_backend='sync'):
+    """Export the graph from the stand-in server with export stats, return CYJS data and the stats."""
+    config = stub_config(url, api_backend)
+    config[STATS_CONFIG_KEY] = ExportStats()
+    cyjs = json.dumps(nx.cytoscape_data(NBFactory(config).graph()), indent=4)
+    return cyjs, config[STATS_CONFIG_KEY]
+
+
+class TestExportStats:
+    """Test accounting of time, requests, bytes and objects to phases."""
+
+    def test_nested_phases(self):
+        """Test that a nested phase is accounted to itself only, and phases with the same name add up."""
+        stats = ExportStats()
+        with stats.phase("render") as phase:
+            stats.count_response(100)
+            phase.count("nodes", 2)
+            with stats.phase("write") as nested:
+                stats.count_response(10)
+                time.sleep(0.05)
+                nested.count("files")
+        with stats.phase("write") as phase:
+            phase.count("files")
+        assert list(stats.phases) == ["render", "write"]
+        render, write = stats.phases["render"], stats.phases["write"]
+        assert (render.requests, render.bytes, render.objects) == (1, 100, {"nodes": 2})
+        assert (write.requests, write.bytes, write.objects) == (1, 10, {"files": 2})
+        assert render.seconds < 0.05 <= write.seconds
+        assert stats.total().requests == 2 and stats.total().bytes == 110
+
+    def test_without_stats(self):
+        """Test that phases of a configuration without stats are not recorded."""
+        with export_phase({}, "devices") as phase:
+            phase.count("devices", 3)
+        assert phase.objects == {"devices": 3}
+
+    def test_report(self):
+        """Test the text table and the JSON file."""
+        stats = ExportStats()
+        with stats.phase("devices") as phase:
+            stats.count_response(2048)
+            phase.count("devices", 4)
+        assert "4 devices" in stats.table().splitlines()[1]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "stats.json")
+            stats.write_json(path)
+            with open(path, encoding='utf-8') as f:
+                report = json.load(f)
+        assert report['total']['requests'] == 1 and report['total']['bytes'] == 2048
+        assert report['phases'][0] == {'name': 'devices', 'seconds': report['phases'][0]['seconds'],
+                                       'requests': 1, 'bytes': 2048, 'objects': {'devices': 4}}
+
+
+class TestExportPhases:
+    """Test that NetBox exports record their phases."""
+
+    @pytest.mark.parametrize("api_backend", ["sync", "asyncio"])
+    def test_export_phases(self, api_backend):
+        """Test that each request is counted once, and the graph is the same as without stats."""
+        if api_backend == "asyncio":
+            pytest.importorskip("aiohttp")
+        with NetBoxStub(patch_panel_topology()) as stub:
+            expected_cyjs = json.dumps(nx.cytoscape_data(NBFactory(stub_config(stub.url, api_backend)).graph()),
+                                       indent=4)
+            stub.requests.clear()
+            cyjs, stats = export_with_stats(stub.url, api_backend)
+            requests = len(stub.requests)
+        assert cyjs == expected_cyjs
+        phases = stats.phases
+        assert list(phases) == ["connect", "sites", "devices", "configs", "interfaces", "cables", "traces", "graph"]
+        assert sum(phase.requests for phase in phases.values()) == stats.total().requests == requests
+        assert stats.total().bytes > 0
+        assert phases["devices"].objects == {"devices": 2}
+        assert phases["configs"].objects == {"configs": 2}
+        assert phases["interfaces"].objects == {"interfaces": 4}
+        assert phases["traces"].objects == {"cables": 2}
+        assert phases["graph"].objects == {"nodes": 6, "edges": 6}
@@ -0,0 +1,52 @@
+"""Unit tests for exports of synthetic topologies from the stand-in server with injected faults."""
+
+import json
+
+import networkx as nx
+import pytest
+
+from nrx.nrx import NBFactory
+from .netbox_stub import Faults, NetBoxStub, stub_config, synthetic_topology
+
+
+def export_cyjs(url, api_backend='sync', **nb_api_params):
+    """Export routers of both sites of the synthetic topology as CYJS data."""
+    config = stub_config(url, api_backend, nb_api_params)
+    config['export_sites'] = ['DC1', 'DC2']
+    return json.dumps(nx.cytoscape_data(NBFactory(config).graph()), indent=4)
+
+
+class TestSyntheticTopology:
+    """Test that synthetic topologies export the same way with any backend, and despite injected errors."""
+
+    def test_topology(self):
+        """Test that all routers are exported with links through patch panels and between sites."""
+        data = synthetic_topology(6, interfaces=4, sites=2, patch_every=3)
+        with NetBoxStub(data) as stub:
+            graph = nx.cytoscape_data(NBFactory(stub_config(stub.url) | {'export_sites': ['DC1', 'DC2']}).graph())
+        nodes = [n['data'] for n in graph['elements']['nodes']]
+        assert len([n for n in nodes if n['type'] == 'device']) == 6
+        # 6 routers with 2 links to the next one, 4 of them through patch panels
+        assert len([n for n in nodes if n['type'] == 'interface']) == 6 * 2 * 2
+        assert len(data.ports["front-ports"]) == 4 * 2
+
+    def test_asyncio_backend(self):
+        """Test that the asyncio backend builds the same graph as the sync backend with a single pipeline."""
+        pytest.importorskip("aiohttp")
+        with NetBoxStub(synthetic_topology(8, interfaces=4, sites=2, patch_every=3)) as stub:
+            expected_cyjs = export_cyjs(stub.url, site_workers=1)
+            assert export_cyjs(stub.url, 'asyncio') == expected_cyjs
+
+    def test_injected_errors(self):
+        """Test that an export retries responses the server fails under load, and builds the same graph."""
+        with NetBoxStub(synthetic_topology(8, interfaces=4, sites=2, patch_every=3)) as stub:
+            expected_cyjs = export_cyjs(stub.url)
+            stub.requests.clear()
+            stub.faults = Faults(latency=0.001, error_rate=0.2, seed=1)
+            cyjs = export_cyjs(stub.url, retry_backoff=0.01, overload_retries=8)
+            requests = len(stub.requests)
+            stub.faults = Faults()
+            stub.requests.clear()
+            export_cyjs(stub.url)
+        assert cyjs == expected_cyjs
+        assert requests > len(stub.requests)
@@ -0,0 +1,69 @@
+"""Unit tests for synthetic topologies rendered through NetworkTopology."""
+
+import pytest
+import yaml
+
+from nrx.nrx import NetworkTopology
+from .topologies import campus, clos, fat_tree, render_config, ring, write_cyjs, write_templates
+
+
+def network_topology(tmp_path):
+    """Return a NetworkTopology rendering templates written into tmp_path."""
+    write_templates(tmp_path / "templates")
+    return NetworkTopology(render_config(tmp_path / "templates", tmp_path / "out"))
+
+
+def build(tmp_path, G):
+    """Build a NetworkTopology from a graph."""
+    topo = network_topology(tmp_path)
+    topo.build_from_graph(G)
+    return topo
+
+
+class TestSyntheticTopologies:
+    """Test that synthetic topologies have the expected devices and links, and render like exported ones."""
+
+    @pytest.mark.parametrize("G, devices, links", [
+        (fat_tree(4), 4 + 4 * (2 + 2) + 16, 4 * (2 * 2 + 2 * 2 + 2 * 2)),
+        (clos(8, spines=4, servers=2, uplinks=2), 4 + 8 + 8 * 2, 8 * 4 * 2 + 8 * 2),
+        (ring(10, sites=2), 10, 10),
+        (campus(3, access=4), 2 + 3 * (2 + 4), 1 + 3 * (1 + 2 * 2 + 4 * 2)),
+    ])
+    def test_size(self, tmp_path, G, devices, links):
+        """Test numbers of devices and links, and that each interface is an end of one link."""
+        topo = build(tmp_path, G)
+        assert len(topo.topology['nodes']) == devices
+        assert len(topo.topology['links']) == links
+        ends = [(l[side]['node'], l[side]['interface']) for l in topo.topology['links'] for side in ['a', 'b']]
+        assert len(set(ends)) == 2 * links
+        assert None not in [name for end in ends for name in end]
+
+    def test_platforms(self, tmp_path):
+        """Test interface names of platforms, sites and replaced platforms of roles."""
+        topo = build(tmp_path, fat_tree(4, platforms={'spine': 'cisco-nxos-9000'}))
+        nodes = {n['name']: n for n in topo.topology['nodes']}
+        assert list(nodes['fat-tree-pod1-edge-1']['interfaces']) == ['Ethernet0', 'Ethernet12', 'Ethernet4', 'Ethernet8']
+        assert nodes['fat-tree-pod1-agg-1']['model'] == 'n9k-c93180yc-fx'
+        assert nodes['fat-tree-core-1']['platform'] == 'eos'
+        assert {n['site'] for n in build(tmp_path / "ring", ring(6, sites=3)).topology['nodes']} == \
+            {'ring-1', 'ring-2', 'ring-3'}
+
+    def test_render_from_file(self, tmp_path):
+        """Test that a topology read from a CYJS file renders all devices, links and configurations."""
+        write_cyjs(campus(2, access=3), tmp_path / "campus.cyjs")
+        topo = network_topology(tmp_path)
+        topo.build_from_file(tmp_path / "campus.cyjs")
+        topo.export_topology()
+        with open(tmp_path / "out" / "campus.clab.yaml", encoding="utf-8") as f:
+            clab = yaml.safe_load(f)
+        assert clab['name'] == 'campus'
+        assert len(clab['topology']['nodes']) == 2 + 2 * (2 + 3)
+        assert len(clab['topology']['links']) == 1 + 2 * (1 + 2 * 2 + 3 * 2)
+        assert clab['topology']['nodes']['campus-core-2']['labels'] == {'graph-level': 3, 'graph-rank': 1.0}
+        assert (tmp_path / "out" / "campus-b2-access-3.config").read_text(encoding="utf-8") == \
+            "hostname campus-b2-access-3\n"
+
+    def test_arity(self):
+        """Test that fat-trees of an odd arity are rejected."""
+        with pytest.raises(ValueError):
+            fat_tree(3)
@@ -0,0 +1,136 @@
+"""Unit tests for binary topology snapshots."""
+
+import io
+import json
+import os
+import struct
+import zlib
+
+import networkx as nx
+import pytest
+
+from nrx.nrx import NBFactory, NetworkTopology
+from nrx.cyjs import read_cyjs_file, write_cyjs
+from nrx.topology_snapshot import SNAPSHOT_FILE_HEADER, SNAPSHOT_FILE_MAGIC, TopologySnapshot, TopologySnapshotError
+from .netbox_stub import NetBoxStub, patch_panel_topology, stub_config
+from .topologies import render_config, write_templates
+
+LRG_CYJS = os.path.join(os.path.dirname(__file__), "..", "lrg", "data", "lrg.cyjs")
+
+
+def cyjs_text(G):
+    """Return a graph written as CYJS."""
+    f = io.StringIO()
+    write_cyjs(G, f)
+    return f.getvalue()
+
+
+def build_topology(tmp_path, **config_values):
+    """Return a NetworkTopology rendering templates written into tmp_path."""
+    write_templates(tmp_path / "templates")
+    return NetworkTopology(render_config(tmp_path / "templates", tmp_path / "out", **config_values))
+
+
+class TestTopologySnapshot:
+    """Test that snapshots keep graphs exported by nrx, and index their devices and interfaces."""
+
+    def test_lrg(self, tmp_path):
+        """Test that the lrg graph is read back from a snapshot the same, from a file a fraction of its CYJS size."""
+        G = read_cyjs_file(LRG_CYJS)
+        path = tmp_path / "lrg.nrxs"
+        size = TopologySnapshot.from_graph(G).write(path)
+        assert size == path.stat().st_size < os.path.getsize(LRG_CYJS) / 10
+        snapshot = TopologySnapshot.read(path)
+        assert snapshot.size() == (G.number_of_nodes(), G.number_of_edges())
+        assert cyjs_text(snapshot.graph()) == cyjs_text(G)
+
+    def test_indexes(self, tmp_path):
+        """Test that devices and their interfaces are found by device name."""
+        G = read_cyjs_file(LRG_CYJS)
+        path = tmp_path / "lrg.nrxs"
+        TopologySnapshot.from_graph(G).write(path)
+        snapshot = TopologySnapshot.read(path)
+        n = next(n for n, attrs in G.nodes.items() if attrs['type'] == 'device')
+        name = G.nodes[n]['device']['name']
+        assert snapshot.device(name) == G.nodes[n]['device']
+        assert snapshot.device_interfaces(name) == [G.nodes[i]['interface'] for i in G.adj[n]]
+        assert snapshot.device("missing") is None and snapshot.device_interfaces("missing") == []
+
+    def test_array_layout(self):
+        """Test that arrays are kept as little-endian integers of standard sizes, whatever the platform."""
+        data = TopologySnapshot.from_graph(read_cyjs_file(LRG_CYJS)).to_bytes()
+        length = SNAPSHOT_FILE_HEADER.unpack_from(data)[2]
+        body = zlib.decompress(data[SNAPSHOT_FILE_HEADER.size:])
+        arrays = json.loads(body[:length])['arrays']
+        assert {code for code, _ in arrays} <= set("BHIq")
+        assert len(body) == length + sum(struct.calcsize(f"<{size}{code}") for code, size in arrays)
+
+    def test_field_types(self):
+        """Test that fields of every type are kept, and fields some records don't have stay missing."""
+        G = nx.Graph(name="fields")
+        G.add_node(1, type="device", device={"name": "r1", "big": 2 ** 70, "tags": ["a"], "virtual": True, "ip": None})
+        G.add_node(2, type="device", device={"name": "r2", "ctx": {"ntp": ["10.0.0.1"]}, "weight": 0.5})
+        G.add_node(3, type="interface", interface={"name": "eth1"}, side="a")
+        G.add_edge(1, 3)
+        H = TopologySnapshot.from_bytes(TopologySnapshot.from_graph(G).to_bytes()).graph()
+        assert list(H.nodes(data=True)) == list(G.nodes(data=True))
+        assert list(H.edges) == list(G.edges)
+        assert [list(H.nodes[n]) for n in H] == [list(G.nodes[n]) for n in G]
+
+    @pytest.mark.parametrize("edit", [
+        lambda G: G.add_node(9, type="router"),
+        lambda G: G.add_edge(0, 68),
+        lambda G: G.add_edge(1108, 1109, weight=1),
+    ])
+    def test_unsupported_graph(self, edit):
+        """Test that graphs other than the ones nrx exports can't be kept."""
+        G = read_cyjs_file(LRG_CYJS)
+        edit(G)
+        with pytest.raises(TopologySnapshotError):
+            TopologySnapshot.from_graph(G)
+
+    @pytest.mark.parametrize("data", [
+        b"", b"{}" * 16, SNAPSHOT_FILE_HEADER.pack(SNAPSHOT_FILE_MAGIC, 99, 0),
+        SNAPSHOT_FILE_HEADER.pack(SNAPSHOT_FILE_MAGIC, 1, 2) + b"not zlib",
+    ])
+    def test_invalid(self, data):
+        """Test that files which are not snapshots fail to read."""
+        with pytest.raises(TopologySnapshotError):
+            TopologySnapshot.from_bytes(data)
+
+    @pytest.mark.parametrize("corrupt", [
+        lambda data: data[:len(data) // 2],
+        lambda data: data[:SNAPSHOT_FILE_HEADER.size + 2],
+        lambda data: SNAPSHOT_FILE_HEADER.pack(SNAPSHOT_FILE_MAGIC, 1, 3) + data[SNAPSHOT_FILE_HEADER.size:],
+        lambda data: SNAPSHOT_FILE_HEADER.pack(SNAPSHOT_FILE_MAGIC, 1, 2 ** 40) + data[SNAPSHOT_FILE_HEADER.size:],
+        lambda data: SNAPSHOT_FILE_HEADER.pack(b"NRXZ", 1, 0) + data[SNAPSHOT_FILE_HEADER.size:],
+    ])
+    def test_corrupted(self, corrupt):
+        """Test that truncated snapshots, and snapshots with a corrupted header, fail to read."""
+        data = TopologySnapshot.from_graph(read_cyjs_file(LRG_CYJS)).to_bytes()
+        with pytest.raises(TopologySnapshotError):
+            TopologySnapshot.from_bytes(corrupt(data))
+
+    @pytest.mark.parametrize("description", [b"[]", b'{"arrays": [["x", 1]]}', b'{"arrays": []}', "\u00e9".encode('latin-1')])
+    def test_corrupted_description(self, description):
+        """Test that snapshots with a description of columns that is not one fail to read."""
+        data = SNAPSHOT_FILE_HEADER.pack(SNAPSHOT_FILE_MAGIC, 1, len(description)) + zlib.compress(description)
+        with pytest.raises(TopologySnapshotError):
+            TopologySnapshot.from_bytes(data)
+
+
+class TestSnapshotInput:
+    """Test that snapshots exported from NetBox are converted like the exported graph."""
+
+    def test_export(self, tmp_path):
+        """Test that a snapshot builds the same topology as the graph it was exported from."""
+        with NetBoxStub(patch_panel_topology()) as stub:
+            nb_network = NBFactory(stub_config(stub.url) | {'output_format': 'snapshot', 'output_dir': str(tmp_path)})
+            nb_network.export_graph_snapshot()
+        path = tmp_path / f"{nb_network.topology_name}.nrxs"
+        exported = build_topology(tmp_path / "exported")
+        exported.build_from_graph(nb_network.graph())
+        converted = build_topology(tmp_path / "converted", input_source='snapshot')
+        converted.build_from_file(str(path))
+        assert converted.topology == exported.topology
+        assert cyjs_text(converted.G) == cyjs_text(nb_network.graph())
@@ -0,0 +1,238 @@
+"""Synthetic network topologies as nrx graphs, to test and benchmark the render path at scale.
+
+Graphs have the nodes, node IDs, indexes and node order of graphs NBFactory exports from NetBox: device nodes
+first, then interface nodes of each device, with links added in the order of their cables. Devices have
+platforms, models and interface names of real network operating systems, and roles nrx ranks by level.
+"""
+
+import json
+
+import networkx as nx
+
+# Platform slugs of the platform map, with the device type and interface naming of each platform.
+# Interface names are formatted with start + (port - 1) * step for port numbers 1, 2, ...
+PLATFORMS = {
+    "eos": {"platform_name": "Arista EOS", "vendor": "arista", "vendor_name": "Arista",
+            "model": "dcs-7280cr3-32p4", "model_name": "DCS-7280CR3-32P4",
+            "interface": "Ethernet{}/1", "start": 1, "step": 1},
+    "sr-linux": {"platform_name": "Nokia SR Linux", "vendor": "nokia", "vendor_name": "Nokia",
+                 "model": "7220-ixr-d2", "model_name": "7220 IXR-D2",
+                 "interface": "ethernet-1/{}", "start": 1, "step": 1},
+    "sonic": {"platform_name": "SONiC", "vendor": "dell", "vendor_name": "Dell",
+              "model": "s5248f-on", "model_name": "S5248F-ON",
+              "interface": "Ethernet{}", "start": 0, "step": 4},
+    "cisco-nxos-9000": {"platform_name": "Cisco NX-OS 9000", "vendor": "cisco", "vendor_name": "Cisco",
+                        "model": "n9k-c93180yc-fx", "model_name": "N9K-C93180YC-FX",
+                        "interface": "Ethernet1/{}", "start": 1, "step": 1},
+    "cisco-ios": {"platform_name": "Cisco IOS", "vendor": "cisco", "vendor_name": "Cisco",
+                  "model": "isr4451-x", "model_name": "ISR4451-X",
+                  "interface": "GigabitEthernet0/0/{}", "start": 0, "step": 1},
+    "cisco-catalyst-ios": {"platform_name": "Cisco Catalyst IOS", "vendor": "cisco", "vendor_name": "Cisco",
+                           "model": "c9300-48p", "model_name": "C9300-48P",
+                           "interface": "GigabitEthernet1/0/{}", "start": 1, "step": 1},
+    "ubuntu": {"platform_name": "Ubuntu", "vendor": "supermicro", "vendor_name": "Supermicro",
+               "model": "sys-1029u-tn10rt", "model_name": "SYS-1029U-TN10RT",
+               "interface": "eth{}", "start": 1, "step": 1},
+}
+
+
+class TopologyBuilder:
+    """Devices and links of a topology, built into a graph the way NBFactory builds it"""
+    def __init__(self, name, configs=True):
+        self.name = name
+        self.configs = configs
+        self.devices = []
+        # Interface names of each device, by device index
+        self.interfaces = []
+        # Links as ((device index, interface name), (device index, interface name))
+        self.links = []
+
+    def add_device(self, name, role, platform, site=None):
+        """Add a device with a role and a platform slug of PLATFORMS, return its device index"""
+        d = {
+            "id": len(self.devices) + 1,
+            "type": "device",
+            "name": name,
+            "node_id": len(self.devices),
+            "site": site if site is not None else self.name,
+            "platform": platform,
+        }
+        d.update({k: v for k, v in PLATFORMS[platform].items() if k not in ["interface", "start", "step"]})
+        d["role"] = role
+        d["role_name"] = role.replace("-", " ").title()
+        d["primary_ip4"] = ""
+        d["primary_ip6"] = ""
+        d["config"] = f"hostname {name}\n" if self.configs else ""
+        d["device_index"] = len(self.devices)
+        self.devices.append(d)
+        self.interfaces.append([])
+        return d["device_index"]
+
+    def add_interface(self, device_index):
+        """Add the next port of a device, return its interface name"""
+        platform = PLATFORMS[self.devices[device_index]["platform"]]
+        port = len(self.interfaces[device_index])
+        name = platform["interface"].format(platform["start"] + port * platform["step"])
+        self.interfaces[device_index].append(name)
+        return name
+
+    def add_link(self, a, b):
+        """Link next ports of devices with indexes a and b"""
+        self.links.append(((a, self.add_interface(a)), (b, self.add_interface(b))))
+
+    def graph(self):
+        """Return the topology as a NetworkX graph of nrx"""
+        G = nx.Graph(name=self.name)
+        node_ids = {}
+        node_id = len(self.devices)
+        for device_index, names in enumerate(self.interfaces):
+            for name in names:
+                node_ids[(device_index, name)] = node_id
+                node_id += 1
+        for a, b in self.links:
+            G.add_nodes_from([
+                (a[0], {"side": "a", "type": "device", "device": self.devices[a[0]]}),
+                (b[0], {"side": "b", "type": "device", "device": self.devices[b[0]]}),
+            ])
+            G.add_nodes_from([
+                (node_ids[a], {"side": "a", "type": "interface", "interface": self._interface(node_ids, a)}),
+                (node_ids[b], {"side": "b", "type": "interface", "interface": self._interface(node_ids, b)}),
+            ])
+            G.add_edges_from([(a[0], node_ids[a]), (b[0], node_ids[b]), (node_ids[a], node_ids[b])])
+        for d in self.devices:
+            if d["node_id"] not in G.nodes:
+                G.add_node(d["node_id"], type="device", device=d)
+        return G
+
+    def _interface(self, node_ids, end):
+        """Return interface data of a link end, with NetBox IDs following the device IDs"""
+        node_id = node_ids[end]
+        return {"id": 100000 + node_id, "type": "interface", "name": end[1], "node_id": node_id,
+                "interface_index": node_id - len(self.devices)}
+
+
+def role_platforms(defaults, platforms):
+    """Return platforms by role, with the ones given in platforms replacing the defaults"""
+    return defaults | (platforms or {})
+
+
+def add_pod(topo, pod, half, cores, platforms):
+    """Add a pod of a fat-tree, with aggregation switches connected to their share of the core switches"""
+    aggs = [topo.add_device(f"{pod}-agg-{a + 1}", "spine", platforms["spine"]) for a in range(half)]
+    edges = [topo.add_device(f"{pod}-edge-{e + 1}", "leaf", platforms["leaf"]) for e in range(half)]
+    for a, agg in enumerate(aggs):
+        for core in cores[a * half:(a + 1) * half]:
+            topo.add_link(agg, core)
+        for edge in edges:
+            topo.add_link(edge, agg)
+    for e, edge in enumerate(edges):
+        for h in range(half):
+            topo.add_link(topo.add_device(f"{pod}-host-{e * half + h + 1}", "server", platforms["server"]), edge)
+
+
+def fat_tree(k, name="fat-tree", platforms=None, configs=True):
+    """k-ary fat-tree: k pods of k/2 aggregation and k/2 edge switches, (k/2)^2 core switches and k/2 hosts
+    per edge switch, 5k^2/4 switches and k^3/4 hosts in total"""
+    if k < 2 or k % 2 != 0:
+        raise ValueError(f"fat-tree arity has to be an even number, got {k}")
+    platforms = role_platforms({"super-spine": "eos", "spine": "eos", "leaf": "sonic", "server": "ubuntu"}, platforms)
+    topo = TopologyBuilder(name, configs)
+    half = k // 2
+    cores = [topo.add_device(f"{name}-core-{c + 1}", "super-spine", platforms["super-spine"]) for c in range(half * half)]
+    for p in range(k):
+        add_pod(topo, f"{name}-pod{p + 1}", half, cores, platforms)
+    return topo.graph()
+
+
+def clos(leaves, spines=4, servers=0, uplinks=1, name="clos", platforms=None, configs=True):
+    """3-stage Clos of leaves connected to each spine with uplinks links each, and servers per leaf"""
+    platforms = role_platforms({"spine": "sr-linux", "leaf": "sr-linux", "server": "ubuntu"}, platforms)
+    topo = TopologyBuilder(name, configs)
+    spine_indexes = [topo.add_device(f"{name}-spine-{s + 1}", "spine", platforms["spine"]) for s in range(spines)]
+    for l in range(leaves):
+        leaf = topo.add_device(f"{name}-leaf-{l + 1}", "leaf", platforms["leaf"])
+        for spine in spine_indexes:
+            for _ in range(uplinks):
+                topo.add_link(leaf, spine)
+        for s in range(servers):
+            topo.add_link(topo.add_device(f"{name}-leaf-{l + 1}-server-{s + 1}", "server", platforms["server"]), leaf)
+    return topo.graph()
+
+
+def ring(routers, sites=1, name="ring", platforms=None, configs=True):
+    """Ring of routers linked to the next router, with consecutive routers in each of the sites"""
+    if routers < 3:
+        raise ValueError(f"a ring needs at least 3 routers, got {routers}")
+    platforms = role_platforms({"router": "cisco-ios"}, platforms)
+    topo = TopologyBuilder(name, configs)
+    indexes = [topo.add_device(f"{name}-r{n + 1}", "router", platforms["router"], f"{name}-{n * sites // routers + 1}")
+               for n in range(routers)]
+    for n, router in enumerate(indexes):
+        topo.add_link(router, indexes[(n + 1) % routers])
+    return topo.graph()
+
+
+def campus(buildings, access=8, name="campus", platforms=None, configs=True):
+    """Campus of a core pair, and a pair of distribution switches in each building with access switches
+    connected to both of them"""
+    platforms = role_platforms({"core-switch": "cisco-nxos-9000", "distribution-switch": "cisco-catalyst-ios",
+                                "access-switch": "cisco-catalyst-ios"}, platforms)
+    topo = TopologyBuilder(name, configs)
+    cores = [topo.add_device(f"{name}-core-{c + 1}", "core-switch", platforms["core-switch"]) for c in range(2)]
+    topo.add_link(cores[0], cores[1])
+    for b in range(buildings):
+        site = f"{name}-b{b + 1}"
+        dists = [topo.add_device(f"{site}-dist-{d + 1}", "distribution-switch", platforms["distribution-switch"], site)
+                 for d in range(2)]
+        topo.add_link(dists[0], dists[1])
+        for dist in dists:
+            for core in cores:
+                topo.add_link(dist, core)
+        for a in range(access):
+            switch = topo.add_device(f"{site}-access-{a + 1}", "access-switch", platforms["access-switch"], site)
+            for dist in dists:
+                topo.add_link(switch, dist)
+    return topo.graph()
+
+
+def write_cyjs(G, path):
+    """Write a graph into a CYJS file the way nrx exports it"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(nx.cytoscape_data(G), f, indent=4)
+
+
+def write_templates(path):
+    """Write templates of a Containerlab-like format into path, rendering every device with default templates
+    and saving device configurations into files"""
+    for ttype in ["nodes", "interface_names"]:
+        (path / "clab" / ttype).mkdir(parents=True)
+    (path / "platform_map.yaml").write_text("type: platform_map\nversion: v1\nplatforms: {}\nkinds: {}\n")
+    (path / "formats.yaml").write_text(
+        "type: formats_map\nversion: v1\nformats:\n  clab:\n    file_format: yaml\n    startup_config_mode: file\n")
+    (path / "clab" / "interface_names" / "default.j2").write_text("eth{{ index + 1 }}")
+    (path / "clab" / "nodes" / "default.j2").write_text(
+        "{{ name }}:\n  kind: linux\n  image: {{ platform }}\n  group: {{ role }}\n  labels:\n"
+        "    graph-level: {{ level }}\n    graph-rank: {{ rank }}\n"
+        "{% if startup_config is defined %}\n  startup-config: {{ startup_config }}\n{% endif %}\n")
+    (path / "clab" / "topology.j2").write_text(
+        "name: {{ name }}\ntopology:\n  nodes:\n"
+        "{% for n in rendered_nodes %}\n    {{ n | trim | indent(4) }}\n{% endfor %}\n"
+        "  links:\n{% for l in links %}\n"
+        "    - endpoints: [\"{{ l.a.node }}:{{ l.a.e_interface }}\", \"{{ l.b.node }}:{{ l.b.e_interface }}\"]\n"
+        "{% endfor %}\n")
+
+
+def render_config(path, output_dir, **config_values):
+    """Configuration of NetworkTopology to render templates written by write_templates into path"""
+    config = {
+        'output_format': 'clab',
+        'topology_name': '',
+        'output_dir': str(output_dir),
+        'templates_path': [str(path)],
+        'platform_map': str(path / "platform_map.yaml"),
+        'formats_map': "formats.yaml",
+        'device_role_levels': {'server': 0, 'leaf': 1, 'access-switch': 1, 'spine': 2, 'distribution-switch': 2,
+                               'super-spine': 3, 'core-switch': 3, 'router': 4},
+    }
+    config.update(config_values)
+    return config